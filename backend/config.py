@@ -8,6 +8,8 @@ from pydantic import Field
 from typing import List
 import os
 
+from utils.hnsw_params import DEFAULT_HNSW_TIERS, parse_tiers
+
 
 class Settings(BaseSettings):
     """Application settings with environment variable support."""
@@ -54,6 +56,50 @@ class Settings(BaseSettings):
         default="./chroma_db",
         env="CHROMA_PERSIST_DIRECTORY"
     )
+    # Group commit: concurrent writes to one collection wait up to this long to be
+    # merged into a single Chroma call
+    chroma_write_max_delay_ms: int = Field(default=20, env="CHROMA_WRITE_MAX_DELAY_MS")
+    
+    # Compact vector storage for search: "float32" searches Chroma's HNSW directly;
+    # "float16" / "int8" (scalar-quantized, one scale per vector) keep a 2x / 4x smaller
+    # NumPy copy of the chunk vectors and search that, rescoring the top
+    # n_results x VECTOR_RESCORE_CANDIDATES with Chroma's float32 vectors;
+    # "ivfpq" does the same with an IVF-PQ index (see the IVFPQ_* settings)
+    vector_storage: str = Field(default="float32", env="VECTOR_STORAGE")
+    vector_rescore: bool = Field(default=True, env="VECTOR_RESCORE")
+    vector_rescore_candidates: int = Field(default=4, env="VECTOR_RESCORE_CANDIDATES")
+    compact_index_dir: str = Field(default="./compact_index", env="COMPACT_INDEX_DIR")
+    
+    # IVF-PQ (VECTOR_STORAGE=ivfpq): trained per collection once it holds IVFPQ_MIN_CHUNKS
+    # (smaller collections keep using Chroma's HNSW). Each chunk is stored as
+    # IVFPQ_SUBQUANTIZERS one-byte codes in one of IVFPQ_NLIST inverted lists, and a
+    # query scores the chunks of its IVFPQ_NPROBE closest lists. PQ scores are coarser
+    # than int8 ones, so n_results x IVFPQ_RESCORE_CANDIDATES are rescored
+    ivfpq_min_chunks: int = Field(default=50000, env="IVFPQ_MIN_CHUNKS")
+    ivfpq_nlist: int = Field(default=1024, env="IVFPQ_NLIST")
+    ivfpq_nprobe: int = Field(default=32, env="IVFPQ_NPROBE")
+    ivfpq_subquantizers: int = Field(default=48, env="IVFPQ_SUBQUANTIZERS")
+    ivfpq_train_sample: int = Field(default=65536, env="IVFPQ_TRAIN_SAMPLE")
+    ivfpq_rescore_candidates: int = Field(default=10, env="IVFPQ_RESCORE_CANDIDATES")
+    
+    # Two-stage retrieval for large collections: shortlist the RETRIEVAL_TOP_DOCUMENTS
+    # documents whose centroid (mean chunk vector) is closest to the query, then search
+    # chunks only within them. Used once a collection holds RETRIEVAL_TWO_STAGE_MIN_CHUNKS
+    retrieval_two_stage: bool = Field(default=False, env="RETRIEVAL_TWO_STAGE")
+    retrieval_top_documents: int = Field(default=20, env="RETRIEVAL_TOP_DOCUMENTS")
+    retrieval_two_stage_min_chunks: int = Field(default=20000, env="RETRIEVAL_TWO_STAGE_MIN_CHUNKS")
+    
+    # Compact / centroid index residency (Chroma's HNSW is not covered): a collection not
+    # searched for COLLECTION_IDLE_TTL_SECONDS is unloaded, as are the least recently
+    # searched ones while the estimated total exceeds COLLECTION_MEMORY_BUDGET_MB or more
+    # than COLLECTION_MAX_RESIDENT are loaded (0 = no limit)
+    collection_idle_ttl_seconds: int = Field(default=1800, env="COLLECTION_IDLE_TTL_SECONDS")
+    collection_memory_budget_mb: int = Field(default=1024, env="COLLECTION_MEMORY_BUDGET_MB")
+    collection_max_resident: int = Field(default=0, env="COLLECTION_MAX_RESIDENT")
+    # Chroma's HNSW indexes: chromadb keeps those of a fixed number of collections loaded
+    # (least recently used unloaded first), sized from the open-file limit when it starts.
+    # CHROMA_HNSW_CACHE_COLLECTIONS lowers that count (0 = Chroma's default, RLIMIT_NOFILE / 5)
+    chroma_hnsw_cache_collections: int = Field(default=64, env="CHROMA_HNSW_CACHE_COLLECTIONS")
     
     # Rate Limiting
     rate_limit_per_minute: int = Field(default=60, env="RATE_LIMIT_PER_MINUTE")
@@ -81,21 +127,109 @@ class Settings(BaseSettings):
         """Detect if running on memory-constrained environment (Railway/Vercel free tier)"""
         return self.is_railway or self.is_vercel or os.getenv("RAILWAY_ENVIRONMENT") or os.getenv("VERCEL")
     
-    # Bulk Upload Optimization - ADAPTIVE BASED ON ENVIRONMENT
+    # Bulk Upload Optimization - UPPER BOUNDS; the memory budget below decides
+    # how many files are actually in flight
     @property
     def bulk_upload_batch_size(self) -> int:
-        """Adaptive batch size based on environment"""
-        if self.is_memory_constrained:
-            return int(os.getenv("BULK_UPLOAD_BATCH_SIZE", "3"))  # 🔥 RAILWAY: 3 files at a time to prevent OOM
-        return int(os.getenv("BULK_UPLOAD_BATCH_SIZE", "60"))  # 🔥 DOCKER/LOCAL: 60 parallel
+        """Max files fetched in parallel"""
+        return int(os.getenv("BULK_UPLOAD_BATCH_SIZE", "60"))  # 🔥 60 parallel when memory allows
     
-    # Embedding Batch Optimization - ADAPTIVE BASED ON ENVIRONMENT
+    # Embedding Batch Optimization - UPPER BOUND
     @property
     def embedding_batch_size(self) -> int:
-        """Adaptive embedding batch size based on environment"""
-        if self.is_memory_constrained:
-            return int(os.getenv("EMBEDDING_BATCH_SIZE", "1"))  # 🔥 RAILWAY: 1 file at a time
-        return int(os.getenv("EMBEDDING_BATCH_SIZE", "15"))  # 🔥 DOCKER/LOCAL: 15 parallel
+        """Max files extracted + embedded together"""
+        return int(os.getenv("EMBEDDING_BATCH_SIZE", "15"))  # 🔥 15 parallel when memory allows
+    
+    # Memory-aware ingestion backpressure: files are admitted while process RSS plus
+    # the estimated footprint of in-flight files (Drive size x expansion factor) fits
+    # the budget. Budget 0 = auto: a fraction of the container (cgroup) or host memory.
+    ingest_memory_budget_mb: int = Field(default=0, env="INGEST_MEMORY_BUDGET_MB")
+    ingest_memory_budget_fraction: float = Field(default=0.7, env="INGEST_MEMORY_BUDGET_FRACTION")
+    ingest_memory_expansion_factor: float = Field(default=4.0, env="INGEST_MEMORY_EXPANSION_FACTOR")
+    ingest_memory_default_document_mb: float = Field(default=2.0, env="INGEST_MEMORY_DEFAULT_DOCUMENT_MB")
+    
+    # Google Drive folder scans
+    # "auto": pick "materialized" or "batched" from an estimated folder count (one extra
+    #         request, then the choice is reused per user and root for the TTL below)
+    # "materialized": list every folder + document in the drive once, rebuild the tree locally
+    # "batched": pack sibling folders into one files.list query per level (fewer round trips)
+    # "recursive": one files.list call per folder (legacy behaviour)
+    drive_traversal_mode: str = Field(default="auto", env="DRIVE_TRAVERSAL_MODE")
+    drive_materialize_min_folders: int = Field(default=300, env="DRIVE_MATERIALIZE_MIN_FOLDERS")
+    drive_materialize_min_coverage: float = Field(default=0.5, env="DRIVE_MATERIALIZE_MIN_COVERAGE")
+    drive_traversal_choice_ttl_seconds: int = Field(default=3600, env="DRIVE_TRAVERSAL_CHOICE_TTL_SECONDS")
+    
+    # Persistent Drive tree index (SQLite) for repeat folder listings
+    drive_index_path: str = Field(default="./drive_index.db", env="DRIVE_INDEX_PATH")
+    drive_index_max_age_seconds: int = Field(default=300, env="DRIVE_INDEX_MAX_AGE_SECONDS")
+    
+    # Adaptive (AIMD) concurrency for Google API calls: grows while calls succeed,
+    # halves on 403 rate limit / 429 / 5xx. Free slots go to interactive calls first and
+    # rotate across users; bulk calls never use the last GOOGLE_API_INTERACTIVE_RESERVE of
+    # the slots, and one user holds at most GOOGLE_API_MAX_USER_SHARE of them (1.0 = no cap)
+    google_api_initial_concurrency: int = Field(default=50, env="GOOGLE_API_INITIAL_CONCURRENCY")
+    google_api_min_concurrency: int = Field(default=1, env="GOOGLE_API_MIN_CONCURRENCY")
+    google_api_max_concurrency: int = Field(default=200, env="GOOGLE_API_MAX_CONCURRENCY")
+    google_api_max_retries: int = Field(default=5, env="GOOGLE_API_MAX_RETRIES")
+    google_api_interactive_reserve: float = Field(default=0.2, env="GOOGLE_API_INTERACTIVE_RESERVE")
+    google_api_max_user_share: float = Field(default=1.0, env="GOOGLE_API_MAX_USER_SHARE")
+    
+    # Drive quota scheduler: per-user token buckets + global ceiling (requests/second),
+    # users served round-robin with interactive listings ahead of bulk downloads.
+    # Drive's default quota is 12,000 queries/minute per project, so one user gets half of it.
+    drive_user_requests_per_second: float = Field(default=100.0, env="DRIVE_USER_REQUESTS_PER_SECOND")
+    drive_user_burst: float = Field(default=200.0, env="DRIVE_USER_BURST")
+    drive_global_requests_per_second: float = Field(default=200.0, env="DRIVE_GLOBAL_REQUESTS_PER_SECOND")
+    drive_global_burst: float = Field(default=400.0, env="DRIVE_GLOBAL_BURST")
+    
+    # Compressed on-disk cache of extracted document text, keyed by file id + modifiedTime
+    text_cache_enabled: bool = Field(default=True, env="TEXT_CACHE_ENABLED")
+    text_cache_dir: str = Field(default="./text_cache", env="TEXT_CACHE_DIR")
+    text_cache_max_bytes: int = Field(default=512 * 1024 * 1024, env="TEXT_CACHE_MAX_BYTES")
+    
+    # Versioned index layout: collections built with another chunker / embedding model
+    # are rebuilt in the background into a shadow collection, then swapped in
+    index_layout_path: str = Field(default="./index_layout.json", env="INDEX_LAYOUT_PATH")
+    index_auto_migrate: bool = Field(default=True, env="INDEX_AUTO_MIGRATE")
+    index_migration_batch_documents: int = Field(default=20, env="INDEX_MIGRATION_BATCH_DOCUMENTS")
+    index_migration_pause_seconds: float = Field(default=0.5, env="INDEX_MIGRATION_PAUSE_SECONDS")
+    
+    # Cold tier: knowledge bases with no request for COLD_TIER_INACTIVE_DAYS are exported to
+    # a compressed archive in COLD_TIER_DIR and dropped from ChromaDB (checked every
+    # COLD_TIER_CHECK_INTERVAL_HOURS). The user's next request restores them; requests wait
+    # up to COLD_TIER_RESTORE_WAIT_SECONDS, then get a 503 with restore progress
+    cold_tier_enabled: bool = Field(default=False, env="COLD_TIER_ENABLED")
+    cold_tier_inactive_days: float = Field(default=90, env="COLD_TIER_INACTIVE_DAYS")
+    cold_tier_dir: str = Field(default="./cold_tier", env="COLD_TIER_DIR")
+    cold_tier_check_interval_hours: float = Field(default=6, env="COLD_TIER_CHECK_INTERVAL_HOURS")
+    cold_tier_restore_wait_seconds: float = Field(default=10, env="COLD_TIER_RESTORE_WAIT_SECONDS")
+    
+    # Vector store integrity: every INTEGRITY_CHECK_INTERVAL_HOURS (0 = never) each collection's
+    # count is compared with its SQLite rows and persisted HNSW index, and INTEGRITY_SAMPLE_QUERIES
+    # stored chunks are searched by their own vector. Every SNAPSHOT_INTERVAL_HOURS (0 = never)
+    # changed collections are exported to SNAPSHOT_DIR, keeping SNAPSHOT_KEEP snapshots. Both wait
+    # for in-flight searches and sleep INTEGRITY_PAUSE_SECONDS between steps
+    integrity_check_interval_hours: float = Field(default=6, env="INTEGRITY_CHECK_INTERVAL_HOURS")
+    integrity_sample_queries: int = Field(default=5, env="INTEGRITY_SAMPLE_QUERIES")
+    integrity_pause_seconds: float = Field(default=0.2, env="INTEGRITY_PAUSE_SECONDS")
+    snapshot_interval_hours: float = Field(default=0, env="SNAPSHOT_INTERVAL_HOURS")
+    snapshot_dir: str = Field(default="./snapshots", env="SNAPSHOT_DIR")
+    snapshot_keep: int = Field(default=7, env="SNAPSHOT_KEEP")
+    
+    # Compaction: every COMPACTION_CHECK_INTERVAL_HOURS (0 = never) collections whose persisted
+    # HNSW index has at least COMPACTION_MIN_DELETED deleted elements, making up at least
+    # COMPACTION_MIN_DELETED_RATIO of it, are copied (without re-embedding) into a fresh
+    # collection that is swapped in. chroma.sqlite3 is vacuumed at startup when free pages
+    # make up COMPACTION_VACUUM_MIN_FREE_RATIO of it (0 = never)
+    compaction_check_interval_hours: float = Field(default=24, env="COMPACTION_CHECK_INTERVAL_HOURS")
+    compaction_min_deleted_ratio: float = Field(default=0.3, env="COMPACTION_MIN_DELETED_RATIO")
+    compaction_min_deleted: int = Field(default=1000, env="COMPACTION_MIN_DELETED")
+    compaction_vacuum_min_free_ratio: float = Field(default=0.3, env="COMPACTION_VACUUM_MIN_FREE_RATIO")
+    
+    # HNSW parameters by collection size, as max_chunks:M:construction_ef:search_ef tiers
+    # (smallest first, 0 = unbounded). A collection gets the tier for its size when it is
+    # created, imported or compacted; the compactor rebuilds collections that outgrew theirs
+    hnsw_tiers: str = Field(default=DEFAULT_HNSW_TIERS, env="HNSW_TIERS")
     
     # Cache Configuration
     cache_ttl_seconds: int = Field(default=300, env="CACHE_TTL_SECONDS")
@@ -134,6 +268,44 @@ class RAGConfig:
     EMBEDDING_MODEL = "all-MiniLM-L6-v2"
     EMBEDDING_DIMENSION = 384
     
+    # Longest a Chroma write waits for others to share its commit
+    WRITE_MAX_DELAY_MS = settings.chroma_write_max_delay_ms
+    
+    # Vector storage used for search (see Settings.vector_storage)
+    VECTOR_STORAGE = settings.vector_storage.lower()
+    VECTOR_RESCORE = settings.vector_rescore
+    VECTOR_RESCORE_CANDIDATES = settings.vector_rescore_candidates
+    COMPACT_INDEX_DIR = settings.compact_index_dir
+    
+    # IVF-PQ index (VECTOR_STORAGE=ivfpq)
+    IVFPQ_MIN_CHUNKS = settings.ivfpq_min_chunks
+    IVFPQ_NLIST = settings.ivfpq_nlist
+    IVFPQ_NPROBE = settings.ivfpq_nprobe
+    IVFPQ_SUBQUANTIZERS = settings.ivfpq_subquantizers
+    IVFPQ_TRAIN_SAMPLE = settings.ivfpq_train_sample
+    IVFPQ_RESCORE_CANDIDATES = settings.ivfpq_rescore_candidates
+    
+    # Two-stage (document centroid, then chunk) retrieval
+    RETRIEVAL_TWO_STAGE = settings.retrieval_two_stage
+    RETRIEVAL_TOP_DOCUMENTS = settings.retrieval_top_documents
+    RETRIEVAL_TWO_STAGE_MIN_CHUNKS = settings.retrieval_two_stage_min_chunks
+    
+    # Unloading of idle collections' search indexes
+    COLLECTION_IDLE_TTL_SECONDS = settings.collection_idle_ttl_seconds
+    COLLECTION_MEMORY_BUDGET_MB = settings.collection_memory_budget_mb
+    COLLECTION_MAX_RESIDENT = settings.collection_max_resident
+    CHROMA_HNSW_CACHE_COLLECTIONS = settings.chroma_hnsw_cache_collections
+    
+    # chroma.sqlite3 is vacuumed at startup above this fraction of free pages
+    COMPACTION_VACUUM_MIN_FREE_RATIO = settings.compaction_vacuum_min_free_ratio
+    
+    # HNSW parameters by collection size (see Settings.hnsw_tiers)
+    HNSW_TIERS = parse_tiers(settings.hnsw_tiers)
+    
+    # Bump whenever DORAPipeline._split_text changes how text is cut into chunks;
+    # collections recorded with an older version are re-chunked by the index migrator
+    CHUNKER_VERSION = "adaptive-v1"
+    
     # Gemini model (configurable via environment variable)
     # Using gemini-2.0-flash-exp (the model that was working before)
     # NOTE: This is an experimental model with limited quota (50 req/day)
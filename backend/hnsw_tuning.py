@@ -0,0 +1,229 @@
+"""
+HNSW parameter sweep on a real knowledge base
+Builds scratch Chroma collections (in a temporary directory) from a stored
+collection's vectors with each M / construction_ef combination, queries them with held-out
+chunks at each search_ef, and reports recall@k against exact search together
+with query latency. The rows no other row beats on both are the frontier.
+Read the vectors from an export / snapshot archive (safe while the server
+runs) or from a persist directory (with the server stopped).
+
+    python -m hnsw_tuning --archive ./snapshots/20261019T000000Z/user_123.kb.zip
+    python -m hnsw_tuning --collection user_123 [--persist-dir DIR] [--m 16,32] [--search-ef 32,64,128]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List
+
+import numpy as np
+
+from utils.collection_archive import iter_archive
+from utils.hnsw_params import DEFAULT_HNSW_TIERS, parse_tiers, tier_for
+from utils.index_layout import IndexLayout
+
+DEFAULT_PERSIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chroma_db")
+
+# Chroma rejects larger upserts (~5461 items)
+WRITE_BATCH = 4000
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def load_vectors(args) -> np.ndarray:
+    """All chunk vectors of the archive / collection as one float32 array"""
+    blocks = []
+    if args.archive:
+        for _, embeddings, _, _ in iter_archive(args.archive):
+            blocks.append(np.asarray(embeddings, dtype=np.float32))
+    else:
+        import chromadb
+        from chromadb.config import Settings
+        client = chromadb.PersistentClient(path=args.persist_dir, settings=Settings(anonymized_telemetry=False))
+        name = args.collection or IndexLayout(args.index_layout).active_collection(args.user)
+        collection = client.get_collection(name)
+        offset = 0
+        while True:
+            page = collection.get(include=['embeddings'], limit=5000, offset=offset)
+            if len(page['ids']) == 0:
+                break
+            blocks.append(np.asarray(page['embeddings'], dtype=np.float32))
+            offset += len(page['ids'])
+    if not blocks:
+        raise ValueError("no vectors to tune on")
+    return np.concatenate(blocks)
+
+
+def split_queries(vectors: np.ndarray, queries: int, sample: int, seed: int = 0):
+    """Random held-out query vectors and the (optionally sampled) vectors to index"""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    queries = min(queries, len(vectors) // 10 or 1)
+    indexed = order[queries:]
+    if sample and len(indexed) > sample:
+        indexed = indexed[:sample]
+    return vectors[order[:queries]], vectors[indexed]
+
+
+def exact_neighbors(queries: np.ndarray, vectors: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k nearest vectors by cosine similarity (ground truth)"""
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    unit_queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    neighbors = np.empty((len(queries), k), dtype=np.int64)
+    for start in range(0, len(queries), 256):
+        scores = unit_queries[start:start + 256] @ unit.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        neighbors[start:start + 256] = top
+    return neighbors
+
+
+def recall_at_k(found: List[List[int]], truth: np.ndarray) -> float:
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth.tolist()))
+    return hits / truth.size
+
+
+def pareto_frontier(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rows no other row beats on both recall and latency, fastest first"""
+    frontier = []
+    for row in sorted(rows, key=lambda row: (row['latency_ms'], -row['recall'])):
+        if not frontier or row['recall'] > frontier[-1]['recall']:
+            frontier.append(row)
+    return frontier
+
+
+def _reopen(path: str):
+    """
+    A client that loads indexes afresh from `path`
+
+    Chroma applies a changed search_ef only when it next loads the index, so
+    every setting is measured on a newly opened client.
+    """
+    import chromadb
+    from chromadb.api.shared_system_client import SharedSystemClient
+    from chromadb.config import Settings
+    SharedSystemClient.clear_system_cache()
+    return chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+
+
+def sweep(vectors: np.ndarray, queries: np.ndarray, k: int, ms: List[int],
+          construction_efs: List[int], search_efs: List[int], report=print) -> List[Dict[str, Any]]:
+    """Build one scratch collection per M / construction_ef and query it at every search_ef"""
+    truth = exact_neighbors(queries, vectors, k)
+    ids = [str(i) for i in range(len(vectors))]
+    scratch = tempfile.mkdtemp(prefix="hnsw_tuning_")
+    rows = []
+    try:
+        for m in ms:
+            for construction_ef in construction_efs:
+                rows.extend(_sweep_graph(scratch, vectors, ids, queries, truth, k, m, construction_ef, search_efs, report))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return rows
+
+
+def _sweep_graph(scratch: str, vectors: np.ndarray, ids: List[str], queries: np.ndarray, truth: np.ndarray,
+                 k: int, m: int, construction_ef: int, search_efs: List[int], report) -> List[Dict[str, Any]]:
+    name = f"tune-{uuid.uuid4().hex[:12]}"
+    collection = _reopen(scratch).create_collection(name, metadata={
+        'hnsw:space': 'cosine', 'hnsw:M': m, 'hnsw:construction_ef': construction_ef
+    })
+    started = time.perf_counter()
+    for i in range(0, len(ids), WRITE_BATCH):
+        collection.add(ids=ids[i:i + WRITE_BATCH], embeddings=vectors[i:i + WRITE_BATCH])
+    # The first query applies pending writes to the graph
+    collection.query(query_embeddings=queries[:1], n_results=k)
+    build_seconds = time.perf_counter() - started
+
+    rows = []
+    for search_ef in search_efs:
+        collection.modify(configuration={'hnsw': {'ef_search': search_ef}})
+        collection = _reopen(scratch).get_collection(name)
+        collection.query(query_embeddings=queries[:1], n_results=k)
+        found, timings = [], []
+        for query in queries:
+            started = time.perf_counter()
+            result = collection.query(query_embeddings=[query], n_results=k, include=[])
+            timings.append((time.perf_counter() - started) * 1000)
+            found.append([int(chunk_id) for chunk_id in result['ids'][0]])
+        timings.sort()
+        row = {
+            'M': m,
+            'construction_ef': construction_ef,
+            'search_ef': search_ef,
+            'recall': round(recall_at_k(found, truth), 4),
+            'latency_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[max(0, int(len(timings) * 0.95) - 1)], 3),
+            'build_seconds': round(build_seconds, 1)
+        }
+        rows.append(row)
+        report(row)
+    _reopen(scratch).delete_collection(name)
+    return rows
+
+
+def _print_row(row: Dict[str, Any], mark: str = " "):
+    print(f"{mark} M={row['M']:<3} construction_ef={row['construction_ef']:<4} search_ef={row['search_ef']:<4} "
+          f"recall@k={row['recall']:.4f}  median={row['latency_ms']:.2f}ms  p95={row['p95_ms']:.2f}ms  "
+          f"build={row['build_seconds']}s")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="hnsw_tuning", description="Sweep HNSW parameters on a knowledge base's vectors")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--archive', help="Export / snapshot archive to read vectors from")
+    source.add_argument('--collection', help="Collection name in --persist-dir")
+    source.add_argument('--user', help="User id (their active collection in --persist-dir)")
+    parser.add_argument('--persist-dir', default=DEFAULT_PERSIST_DIR, help="ChromaDB persist directory")
+    parser.add_argument('--index-layout', default="./index_layout.json", help="Index layout file (for --user)")
+    parser.add_argument('--k', type=int, default=12, help="Results per query (chat retrieves 12)")
+    parser.add_argument('--queries', type=int, default=200, help="Held-out chunks used as queries")
+    parser.add_argument('--sample', type=int, default=0, help="Index at most this many chunks (0 = all)")
+    parser.add_argument('--m', type=_int_list, default=[16, 24, 32], help="Comma-separated M values")
+    parser.add_argument('--construction-ef', type=_int_list, default=[100, 200], help="Comma-separated construction_ef values")
+    parser.add_argument('--search-ef', type=_int_list, default=[16, 32, 48, 64, 96, 128, 192], help="Comma-separated search_ef values")
+    parser.add_argument('--target-recall', type=float, default=0.95, help="Recall the recommendation must reach")
+    parser.add_argument('--output', help="Write all rows and the frontier as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        vectors = load_vectors(args)
+    except Exception as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    queries, indexed = split_queries(vectors, args.queries, args.sample)
+    current = tier_for(len(vectors), parse_tiers(os.environ.get('HNSW_TIERS', DEFAULT_HNSW_TIERS)))
+    print(f"🔬 {len(indexed)} chunks indexed, {len(queries)} held-out queries, k={args.k}; "
+          f"size tier for {len(vectors)} chunks: M={current['M']} construction_ef={current['construction_ef']} "
+          f"search_ef={current['search_ef']}", file=sys.stderr)
+
+    rows = sweep(indexed, queries, args.k, args.m, args.construction_ef, args.search_ef,
+                 report=lambda row: _print_row(row))
+    frontier = pareto_frontier(rows)
+    print("\nRecall / latency frontier:")
+    for row in frontier:
+        _print_row(row, "*")
+    good = [row for row in frontier if row['recall'] >= args.target_recall]
+    if good:
+        best = good[0]
+        print(f"\n✅ Fastest at recall >= {args.target_recall}: M={best['M']} construction_ef={best['construction_ef']} "
+              f"search_ef={best['search_ef']}")
+    else:
+        print(f"\n⚠️ No setting reached recall {args.target_recall}; try larger --m / --search-ef values")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'chunks': len(vectors), 'indexed': len(indexed), 'queries': len(queries), 'k': args.k,
+                       'current_tier': current, 'rows': rows, 'frontier': frontier}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Knowledge base export / import CLI
+Moves collections between ChromaDB persist directories (servers, or out of a
+damaged backup) as checksummed archives, without re-downloading or
+re-embedding anything. Run from backend/ with the server stopped, or use the
+/knowledge-base/export and /knowledge-base/import endpoints of a running one.
+
+    python -m kb_transfer list [--persist-dir DIR]
+    python -m kb_transfer export (--collection NAME | --user ID | --all) OUTPUT [--persist-dir DIR]
+    python -m kb_transfer import ARCHIVE [--collection NAME] [--replace] [--persist-dir DIR]
+    python -m kb_transfer verify ARCHIVE
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.collection_archive import iter_archive, verify_archive, write_archive
+from utils.hnsw_params import DEFAULT_HNSW_TIERS, hnsw_metadata, parse_tiers, tier_for
+from utils.index_layout import IndexLayout, collection_index_version
+
+DEFAULT_PERSIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chroma_db")
+
+# Chroma rejects larger upserts (~5461 items)
+WRITE_BATCH = 4000
+
+
+def _client(persist_dir: str):
+    import chromadb
+    from chromadb.config import Settings
+    return chromadb.PersistentClient(path=persist_dir, settings=Settings(anonymized_telemetry=False))
+
+
+def _progress(label: str, total: int):
+    started = time.time()
+
+    def report(done: int):
+        rate = done / max(time.time() - started, 1e-6)
+        print(f"\r{label}: {done}/{total} chunks ({rate:.0f}/s)", end="", file=sys.stderr, flush=True)
+    return report
+
+
+def _collection_names(client):
+    return sorted(getattr(collection, 'name', collection) for collection in client.list_collections())
+
+
+def cmd_list(args) -> int:
+    client = _client(args.persist_dir)
+    for name in _collection_names(client):
+        try:
+            count = client.get_collection(name).count()
+        except Exception as e:
+            count = f"unreadable ({e})"
+        print(f"{name}\t{count}")
+    return 0
+
+
+def _export(client, name: str, path: str) -> bool:
+    try:
+        collection = client.get_collection(name)
+        manifest = write_archive(collection, path, progress=_progress(name, collection.count()))
+    except Exception as e:
+        print(f"\n❌ {name}: {e}", file=sys.stderr)
+        return False
+    print(f"\n📦 {name}: {manifest['count']} chunks -> {path} ({os.path.getsize(path) / 1024 / 1024:.1f}MB)", file=sys.stderr)
+    return True
+
+
+def cmd_export(args) -> int:
+    client = _client(args.persist_dir)
+    if args.all:
+        # Export whatever is readable, e.g. from a damaged persist directory
+        os.makedirs(args.output, exist_ok=True)
+        failed = [
+            name for name in _collection_names(client)
+            if not _export(client, name, os.path.join(args.output, f"{name}.kb.zip"))
+        ]
+        if failed:
+            print(f"⚠️ {len(failed)} collections could not be exported: {', '.join(failed)}", file=sys.stderr)
+        return 1 if failed else 0
+
+    name = args.collection or IndexLayout(args.index_layout).active_collection(args.user)
+    return 0 if _export(client, name, args.output) else 1
+
+
+def cmd_import(args) -> int:
+    started = time.time()
+    try:
+        manifest = verify_archive(args.archive)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    name = args.collection or manifest['collection']
+    client = _client(args.persist_dir)
+    metadata = {
+        "hnsw:space": "cosine",
+        **collection_index_version(manifest['metadata']),
+        **hnsw_metadata(tier_for(manifest['count'], parse_tiers(os.environ.get('HNSW_TIERS', DEFAULT_HNSW_TIERS))))
+    }
+
+    try:
+        collection = client.get_collection(name)
+    except Exception:
+        collection = None
+    if collection is not None and args.replace:
+        client.delete_collection(name)
+        collection = None
+    fresh = collection is None
+    if fresh:
+        collection = client.create_collection(name, metadata=metadata)
+    elif collection.count() and collection_index_version(collection.metadata) != collection_index_version(metadata):
+        print(f"❌ {name} was built with another chunker / embedding version; import with --replace", file=sys.stderr)
+        return 1
+
+    report = _progress(name, manifest['count'])
+    loaded = 0
+    blocks = iter_archive(args.archive)
+    # Decompress and checksum the next block while Chroma indexes this one
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        pending = reader.submit(next, blocks, None)
+        while True:
+            block = pending.result()
+            if block is None:
+                break
+            pending = reader.submit(next, blocks, None)
+            ids, embeddings, documents, metadatas = block
+            # add skips Chroma's existing-id lookup, which a new collection doesn't need
+            write = collection.add if fresh else collection.upsert
+            for i in range(0, len(ids), WRITE_BATCH):
+                write(
+                    ids=ids[i:i + WRITE_BATCH],
+                    embeddings=embeddings[i:i + WRITE_BATCH],
+                    documents=documents[i:i + WRITE_BATCH],
+                    metadatas=metadatas[i:i + WRITE_BATCH]
+                )
+            loaded += len(ids)
+            report(loaded)
+    print(f"\n✅ Imported {loaded} chunks into {name} in {time.time() - started:.1f}s", file=sys.stderr)
+    return 0
+
+
+def cmd_verify(args) -> int:
+    try:
+        manifest = verify_archive(args.archive)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    print(f"✅ {manifest['collection']}: {manifest['count']} chunks in {len(manifest['blocks'])} blocks, "
+          f"dimension {manifest['dimension']}, checksums OK")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="kb_transfer", description="Export / import knowledge bases without re-embedding")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def with_persist_dir(sub):
+        sub.add_argument('--persist-dir', default=DEFAULT_PERSIST_DIR, help="ChromaDB persist directory")
+        return sub
+
+    with_persist_dir(subparsers.add_parser('list', help="List collections and their chunk counts")).set_defaults(run=cmd_list)
+
+    export = with_persist_dir(subparsers.add_parser('export', help="Write collections to archives"))
+    target = export.add_mutually_exclusive_group(required=True)
+    target.add_argument('--collection', help="Collection name")
+    target.add_argument('--user', help="User id (exports their active collection)")
+    target.add_argument('--all', action='store_true', help="Every collection; OUTPUT is a directory")
+    export.add_argument('--index-layout', default="./index_layout.json", help="Index layout file (for --user)")
+    export.add_argument('output')
+    export.set_defaults(run=cmd_export)
+
+    load = with_persist_dir(subparsers.add_parser('import', help="Load an archive into a collection"))
+    load.add_argument('archive')
+    load.add_argument('--collection', help="Target collection (default: the archived collection's name)")
+    load.add_argument('--replace', action='store_true', help="Drop the target collection first")
+    load.set_defaults(run=cmd_import)
+
+    verify = subparsers.add_parser('verify', help="Check an archive's checksums")
+    verify.add_argument('archive')
+    verify.set_defaults(run=cmd_verify)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,12 @@
 import os
-from fastapi import FastAPI, HTTPException, Depends, status, Header, Request
+from fastapi import FastAPI, HTTPException, Depends, status, Header, Request, Response, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List, Optional, Dict, Any
 from dotenv import load_dotenv
 import logging
+import asyncio
+import tempfile
 import time
 
 # Rate limiting
@@ -15,7 +17,15 @@ from slowapi.errors import RateLimitExceeded
 from services.google_auth import GoogleAuthService
 from services.google_docs import GoogleDocsService
 from services.rag_pipeline import DORAPipeline
+from services.index_migrator import IndexMigrator
+from services.cold_tier import ColdTierManager
+from services.integrity_verifier import IntegrityVerifier
+from services.compactor import Compactor
 from config import settings, RAGConfig
+from utils.quota_scheduler import set_drive_request_context, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from utils.memory_budget import get_memory_budget
+from utils.ingest_scheduler import schedule_ingestion, estimate_chunks
+from utils.cancellation import CancellationToken, OperationCancelled, watch_disconnect
 
 from models.schemas import (
     AuthRequest, 
@@ -23,6 +33,7 @@ from models.schemas import (
     ChatRequest, 
     ChatResponse,
     AddDocumentsRequest,
+    DeleteDocumentsRequest,
     UserProfile,
     FolderRequest
 )
@@ -74,6 +85,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Drive-Index", "X-Drive-Index-Age", "X-Drive-Index-Relisted"],
 )
 
 # Security
@@ -83,6 +95,37 @@ security = HTTPBearer()
 google_auth_service = GoogleAuthService()
 google_docs_service = GoogleDocsService()
 dora_pipeline = DORAPipeline()
+index_migrator = IndexMigrator(
+    dora_pipeline,
+    batch_documents=settings.index_migration_batch_documents,
+    pause_seconds=settings.index_migration_pause_seconds
+)
+cold_tier = ColdTierManager(
+    dora_pipeline,
+    archive_dir=settings.cold_tier_dir,
+    inactive_days=settings.cold_tier_inactive_days,
+    check_interval_seconds=settings.cold_tier_check_interval_hours * 3600,
+    migrator=index_migrator
+)
+integrity_verifier = IntegrityVerifier(
+    dora_pipeline,
+    persist_dir=dora_pipeline.chroma_path,
+    snapshot_dir=settings.snapshot_dir,
+    check_interval_seconds=settings.integrity_check_interval_hours * 3600,
+    snapshot_interval_seconds=settings.snapshot_interval_hours * 3600,
+    keep_snapshots=settings.snapshot_keep,
+    sample_queries=settings.integrity_sample_queries,
+    pause_seconds=settings.integrity_pause_seconds
+)
+compactor = Compactor(
+    dora_pipeline,
+    index_migrator,
+    persist_dir=dora_pipeline.chroma_path,
+    check_interval_seconds=settings.compaction_check_interval_hours * 3600,
+    min_deleted_ratio=settings.compaction_min_deleted_ratio,
+    min_deleted=settings.compaction_min_deleted,
+    tiers=RAGConfig.HNSW_TIERS
+)
 
 # Log configuration on startup (only in non-production)
 if environment != "production":
@@ -91,18 +134,10 @@ if environment != "production":
     logger.info("=" * 60)
     logger.info(f"📊 Environment: {settings.environment}")
     
-    # Railway/Vercel Detection
-    if settings.is_memory_constrained:
-        logger.warning("⚠️ MEMORY CONSTRAINED MODE ACTIVE (Railway/Vercel)")
-        logger.warning("🔧 Using optimized settings for limited memory:")
-        logger.warning(f"   - Bulk Upload Batch: {settings.bulk_upload_batch_size} files (vs 60 on Docker)")
-        logger.warning(f"   - Embedding Batch: {settings.embedding_batch_size} files (vs 15 on Docker)")
-        logger.warning(f"   - Log Level: WARNING (vs INFO on Docker)")
-        logger.warning("💡 For bulk uploads, consider using Docker/localhost")
-    else:
-        logger.info("🚀 HIGH PERFORMANCE MODE (Docker/Localhost)")
-        logger.info(f"🔧 Bulk Upload Batch Size: {settings.bulk_upload_batch_size} (parallel fetch)")
-        logger.info(f"🧠 Embedding Batch Size: {settings.embedding_batch_size} (parallel embedding)")
+    # Ingestion concurrency is bounded by the memory budget, the batch sizes are ceilings
+    logger.info(f"🔧 Bulk Upload Batch Size: up to {settings.bulk_upload_batch_size} (parallel fetch)")
+    logger.info(f"🧠 Embedding Batch Size: up to {settings.embedding_batch_size} (parallel embedding)")
+    logger.info(f"🧮 Ingestion Memory Budget: {get_memory_budget().get_stats()['budget_mb']} MB")
     
     logger.info(f"📝 Chunk Size: {settings.chunk_size} characters")
     logger.info(f"🔄 Chunk Overlap: {settings.chunk_overlap} characters")
@@ -159,6 +194,34 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail="Invalid authentication credentials"
         )
 
+async def get_restored_user(current_user = Depends(get_current_user)):
+    """Current user, with their knowledge base restored from the cold tier if it was archived"""
+    user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+    if not settings.cold_tier_enabled and not cold_tier.is_archived(user_id):
+        return current_user
+    if settings.cold_tier_enabled:
+        cold_tier.start()
+    
+    # Small knowledge bases come back within the wait; larger ones keep restoring in
+    # the background while the client polls /knowledge-base/archive
+    kb_status = await cold_tier.ensure_restored(user_id, wait=settings.cold_tier_restore_wait_seconds)
+    if kb_status['state'] in ('archiving', 'restoring'):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"message": "Knowledge base is being restored from the archive", **kb_status},
+            headers={"Retry-After": "5"}
+        )
+    if kb_status['state'] == 'failed':
+        raise HTTPException(status_code=500, detail=f"Could not restore knowledge base: {kb_status.get('error')}")
+    return current_user
+
+@app.on_event("startup")
+async def start_background_maintenance():
+    """Start the throttled vector store checks / snapshots and compaction"""
+    integrity_verifier.start()
+    if settings.compaction_check_interval_hours:
+        compactor.start()
+
 @app.get("/")
 async def root():
     return {"message": "DORA - Document Retrieval Assistant API is running"}
@@ -231,6 +294,7 @@ async def get_user_documents(
             )
         
         logger.info("Fetching documents for user [token redacted]")
+        set_drive_request_context(current_user.get('sub', current_user.get('id', 'default_user')), PRIORITY_INTERACTIVE)
         
         # Fetch documents from Google Drive (with error handling)
         try:
@@ -268,10 +332,18 @@ async def get_user_documents(
 @app.post("/documents/from-folder-all", response_model=List[DocumentResponse])
 async def get_all_documents_from_folder(
     request: FolderRequest,
+    response: Response,
+    refresh: Optional[str] = None,
     x_google_token: Optional[str] = Header(None),
     current_user = Depends(get_current_user)
 ):
-    """Fetch ALL documents from a folder and its subfolders (recursive)"""
+    """
+    Fetch ALL documents from a folder and its subfolders (recursive)
+    
+    Served from the persistent Drive tree index when fresh. `?refresh=incremental`
+    applies the Drive changes since the last refresh, `?refresh=full` re-lists everything.
+    X-Drive-Index / X-Drive-Index-Age / X-Drive-Index-Relisted report cache status.
+    """
     try:
         logger.info(f"=== ENDPOINT: /documents/from-folder-all ===")
         logger.info(f"Request: {request}")
@@ -285,13 +357,21 @@ async def get_all_documents_from_folder(
         logger.info(f"Final access token available: {bool(access_token)}")
         logger.info(f"Fetching ALL documents from folder: {request.folder_url}")
         
+        user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+        set_drive_request_context(user_id, PRIORITY_INTERACTIVE)
+        
         # Fetch ALL documents from the folder and subfolders
         try:
-            documents = await google_docs_service.list_all_documents_from_folder(
+            documents, index_info = await google_docs_service.list_all_documents_indexed(
                 request.folder_url, 
-                access_token
+                access_token,
+                user_id,
+                refresh=refresh
             )
-            logger.info(f"Successfully fetched {len(documents)} documents from folder and subfolders")
+            response.headers["X-Drive-Index"] = index_info['status']
+            response.headers["X-Drive-Index-Age"] = str(int(index_info['age_seconds']))
+            response.headers["X-Drive-Index-Relisted"] = str(index_info['relisted_folders'])
+            logger.info(f"Successfully fetched {len(documents)} documents from folder and subfolders (index: {index_info['status']})")
             return documents
         except Exception as api_error:
             logger.error(f"Google API error: {api_error}")
@@ -328,45 +408,38 @@ async def get_all_documents_from_folder(
 @app.post("/documents/from-folder-all-stream")
 async def get_all_documents_from_folder_stream(
     request: FolderRequest,
+    fastapi_req: Request,
     x_google_token: Optional[str] = Header(None),
     current_user = Depends(get_current_user)
 ):
     """🚀 STREAMING: Fetch documents progressively - FEELS INSTANT!"""
     from fastapi.responses import StreamingResponse
+    from contextlib import aclosing
     import json
     
     async def document_stream():
-        """Stream documents as they are found - PROGRESSIVE LOADING!"""
+        """Stream documents as each Drive page arrives - PROGRESSIVE LOADING!"""
         try:
             access_token = x_google_token
-            folder_id = google_docs_service._extract_folder_id_from_url(request.folder_url)
-            
-            # Stream documents as they are found
-            documents_buffer = []
-            batch_size = 20  # Send every 20 documents
-            
-            async def stream_callback(doc):
-                """Callback to stream documents progressively"""
-                documents_buffer.append(doc)
-                if len(documents_buffer) >= batch_size:
-                    # Send batch
-                    batch = documents_buffer.copy()
-                    documents_buffer.clear()
-                    yield f"data: {json.dumps(batch)}\n\n"
-            
-            # Fetch with streaming callback
-            all_documents = []
-            await google_docs_service._get_documents_recursive(
-                folder_id, access_token, all_documents, ""
-            )
+            batch_size = 20  # Send at most 20 documents per event
+            set_drive_request_context(current_user.get('sub', current_user.get('id', 'default_user')), PRIORITY_INTERACTIVE)
+            total = 0
             
-            # Send documents in batches
-            for i in range(0, len(all_documents), batch_size):
-                batch = all_documents[i:i+batch_size]
-                yield f"data: {json.dumps(batch)}\n\n"
+            documents = google_docs_service.iter_documents_from_folder(request.folder_url, access_token)
+            # aclosing() guarantees outstanding folder tasks are cancelled when we stop early
+            async with aclosing(documents):
+                async for page_documents in documents:
+                    if await fastapi_req.is_disconnected():
+                        logger.info("❌ Client disconnected, cancelling folder scan")
+                        return
+                    
+                    for i in range(0, len(page_documents), batch_size):
+                        batch = page_documents[i:i+batch_size]
+                        total += len(batch)
+                        yield f"data: {json.dumps(batch)}\n\n"
             
             # Send completion signal
-            yield f"data: {json.dumps({'done': True, 'total': len(all_documents)})}\n\n"
+            yield f"data: {json.dumps({'done': True, 'total': total})}\n\n"
             
         except Exception as e:
             logger.error(f"Streaming error: {e}")
@@ -387,18 +460,22 @@ async def bulk_upload_parallel_stream(
     request: FolderRequest,
     fastapi_req: Request,
     x_google_token: Optional[str] = Header(None),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_restored_user)
 ):
     """🚀 ULTRA FAST: Parallel fetch (60) + Parallel embedding (5) + Real-time streaming!"""
     from fastapi.responses import StreamingResponse
     import json
-    import asyncio
+    from contextlib import aclosing
     
     logger.info("🚀 PARALLEL STREAM ENDPOINT CALLED!")
     logger.info(f"📁 Folder URL: {request.folder_url}")
     
     async def upload_stream():
         """Stream upload progress with parallel batch processing"""
+        # Shared with download tasks and the parse / embed / Chroma write threads: a
+        # disconnect (or the response being torn down) stops them at the next checkpoint
+        cancel = CancellationToken()
+        disconnect_watcher = asyncio.create_task(watch_disconnect(fastapi_req, cancel))
         try:
             access_token = x_google_token
             if not access_token:
@@ -406,6 +483,7 @@ async def bulk_upload_parallel_stream(
                 return
             
             user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+            set_drive_request_context(user_id, PRIORITY_BULK)
             
             # Step 1: Get all documents from folder
             yield f"data: {json.dumps({'status': 'scanning', 'message': '🔍 Scanning folder...'})}\n\n"
@@ -445,11 +523,16 @@ async def bulk_upload_parallel_stream(
             yield f"data: {json.dumps({'status': 'found', 'total': total, 'skipped': skipped_count, 'message': f'📊 Found {total} NEW files to upload (skipped {skipped_count} duplicates) - ULTRA FAST MODE: 60 parallel fetch + 15 parallel embedding!'})}\n\n"
             
             # Step 2: Process in PARALLEL BATCHES (only NEW documents)
-            FETCH_BATCH_SIZE = settings.bulk_upload_batch_size  # 60 for fetch (Network Bound)
-            EMBED_BATCH_SIZE = settings.embedding_batch_size  # 15 for Extraction & Embedding (CPU Bound)
+            FETCH_BATCH_SIZE = settings.bulk_upload_batch_size  # up to 60 for fetch (Network Bound)
+            EMBED_BATCH_SIZE = settings.embedding_batch_size  # up to 15 for Extraction & Embedding (CPU Bound)
+            memory_budget = get_memory_budget()  # decides how many of those actually run
             processed = 0
             failed = []
             
+            def memory_pause_event(decision):
+                message = f"⏸️ Memory budget reached ({decision['rss_mb']:.0f} MB used + {decision['reserved_mb']:.0f} MB in flight of {decision['budget_mb']:.0f} MB), waiting..."
+                return f"data: {json.dumps({'status': 'memory_pause', 'memory': decision, 'message': message})}\n\n"
+            
             
             async def fetch_raw_only(doc):
                 """Fetch RAW content (bytes) without parsing. Fast!"""
@@ -458,7 +541,9 @@ async def bulk_upload_parallel_stream(
                     mime_type = doc.get('mimeType', doc.get('mime_type'))
                     
                     # New method that gets bytes but doesn't parse PDF/PPTX yet
-                    result = await google_docs_service.download_document_raw(access_token, doc_id, mime_type)
+                    # (unchanged files come straight from the extracted text cache)
+                    version = google_docs_service.get_content_version(doc)
+                    result = await google_docs_service.download_document_raw(access_token, doc_id, mime_type, version)
                     
                     if result.get('error'):
                         return {'success': False, 'doc': doc, 'error': result['error']}
@@ -468,55 +553,57 @@ async def bulk_upload_parallel_stream(
                         'doc': doc, 
                         'raw_data': result['data'], 
                         'mime_type': result['mime_type'],
-                        'is_binary': result['is_binary']
+                        'is_binary': result['is_binary'],
+                        'version': version
                     }
                 except Exception as e:
                     return {'success': False, 'doc': doc, 'error': str(e)}
 
-            # Process in batches
-            for batch_start in range(0, total, FETCH_BATCH_SIZE):
-                if await fastapi_req.is_disconnected():
-                    logger.info("❌ Client disconnected, stopping upload")
-                    return
-
-                batch_end = min(batch_start + FETCH_BATCH_SIZE, total)
-                batch = new_documents[batch_start:batch_end]  # Use new_documents instead of all_documents
-                batch_num = batch_start // FETCH_BATCH_SIZE + 1
-                total_batches = (total + FETCH_BATCH_SIZE - 1) // FETCH_BATCH_SIZE
-                
-                yield f"data: {json.dumps({'status': 'batch_start', 'batch': batch_num, 'total_batches': total_batches, 'message': f'⚡ Batch {batch_num}/{total_batches}: Downloading {len(batch)} files (RAW)...'})}\n\n"
-
-                
-                # STEP 1: Fetch ALL RAW DATA in parallel (60 at once) - Network Bound (Fast)
-                fetch_tasks = [fetch_raw_only(doc) for doc in batch]
-                fetch_results = await asyncio.gather(*fetch_tasks, return_exceptions=True)
-                
-                # Filter successful fetches
-                ready_for_processing = []
-                for result in fetch_results:
-                    if isinstance(result, Exception):
-                        failed.append({'id': 'unknown', 'name': 'Unknown', 'error': str(result)})
-                    elif result.get('success'):
-                        ready_for_processing.append(result)
-                    else:
-                        failed.append(result)
-                        yield f"data: {json.dumps({'status': 'failed', 'doc_name': result['doc']['name'], 'reason': result.get('error', 'Unknown')})}\n\n"
-                
-                yield f"data: {json.dumps({'status': 'fetched', 'message': f'✅ Downloaded {len(ready_for_processing)} files. Starting Batch Extraction & Embedding (15 at a time)...'})}\n\n"
-                
-                # STEP 2: Extract Text + Embed + Save (in groups of 15) - CPU/GPU Bound
-                # This moves the heavy PPTX/PDF parsing to this smaller batch!
-                
-                for proc_start in range(0, len(ready_for_processing), EMBED_BATCH_SIZE):
-                    if await fastapi_req.is_disconnected():
+            def raw_weight(result):
+                """Estimated chunk count of a downloaded file (None when the download failed)"""
+                if not result.get('success'):
+                    return None
+                mime_type = result['mime_type'] if result['is_binary'] else 'text/plain'
+                return estimate_chunks(len(result['raw_data']), mime_type, dora_pipeline.chunk_size)
+            
+            yield f"data: {json.dumps({'status': 'batch_start', 'batch': 1, 'total_batches': 1, 'message': f'⚡ Downloading {total} files, largest first (up to {FETCH_BATCH_SIZE} at a time)...'})}\n\n"
+            
+            # Downloads run continuously, biggest files first; extraction + embedding take
+            # groups packed to about the same estimated chunk count as they become ready
+            group_num = 0
+            schedule = schedule_ingestion(
+                new_documents,
+                fetch_raw_only,
+                raw_weight,
+                fetch_concurrency=FETCH_BATCH_SIZE,
+                group_max_items=EMBED_BATCH_SIZE,
+                memory_budget=memory_budget,
+                memory_estimate=lambda result: memory_budget.estimate(result['doc']),
+                chunk_size=dora_pipeline.chunk_size,
+                cancel=cancel
+            )
+            async with aclosing(schedule):
+                async for kind, payload in schedule:
+                    if kind == 'memory_pause':
+                        yield memory_pause_event(payload)
+                        continue
+                    if kind == 'failed':
+                        failed.append(payload)
+                        yield f"data: {json.dumps({'status': 'failed', 'doc_name': payload['doc']['name'], 'reason': payload.get('error', 'Unknown')})}\n\n"
+                        continue
+                    
+                    if cancel.cancelled:
                         logger.info("❌ Client disconnected, stopping upload")
                         return
                     
-                    proc_end = min(proc_start + EMBED_BATCH_SIZE, len(ready_for_processing))
-                    proc_batch = ready_for_processing[proc_start:proc_end]
+                    proc_batch = payload
+                    group_num += 1
+                    estimated_chunks = sum(raw_weight(item) for item in proc_batch)
+                    yield f"data: {json.dumps({'status': 'fetched', 'batch': group_num, 'memory': memory_budget.last_decision, 'message': f'✅ Extracting & embedding {len(proc_batch)} files (~{estimated_chunks} chunks)...'})}\n\n"
                     
                     logger.info(f"  🚀 Processing batch of {len(proc_batch)} files (Extract + Embed)...")
                     
+                    group_cancel = cancel.child()
                     try:
                         # a. Bulk Extraction (Parallel)
                         bulk_docs_input = []
@@ -526,7 +613,9 @@ async def bulk_upload_parallel_stream(
                         extract_tasks = []
                         for item in proc_batch:
                             extract_tasks.append(
-                                google_docs_service.extract_text_from_raw(item['raw_data'], item['mime_type'])
+                                google_docs_service.extract_text_from_raw(
+                                    item['raw_data'], item['mime_type'], item['doc']['id'], item['version'], cancel=group_cancel
+                                )
                             )
                         
                         # run extractions in parallel
@@ -555,7 +644,7 @@ async def bulk_upload_parallel_stream(
                         # b. Bulk Embedding & Saving
                         # TIMEOUT INCREASED: 130k+ chunks can take 10+ minutes. Setting to 30 mins (1800s) to be safe.
                         bulk_results = await asyncio.wait_for(
-                            dora_pipeline.add_documents_bulk(user_id, bulk_docs_input),
+                            dora_pipeline.add_documents_bulk(user_id, bulk_docs_input, cancel=group_cancel),
                             timeout=1800.0
                         )
                         
@@ -575,7 +664,14 @@ async def bulk_upload_parallel_stream(
                                 failed.append({'id': doc_id, 'name': doc_info['name'], 'error': 'Processing failed'})
                                 yield f"data: {json.dumps({'status': 'failed', 'doc_name': doc_info['name'], 'reason': 'Processing failed'})}\n\n"
 
+                    except OperationCancelled:
+                        if cancel.cancelled:
+                            logger.info(f"❌ Upload cancelled ({cancel.reason}) after {processed}/{total} files")
+                            return
+                        raise
                     except asyncio.TimeoutError:
+                        # wait_for only cancels the coroutine; stop the embedding thread too
+                        group_cancel.cancel("timed out")
                         logger.error(f"❌ Batch embedding TIMED OUT after 1800s!")
                         for item in proc_batch:
                             doc_info = item['doc']
@@ -592,8 +688,8 @@ async def bulk_upload_parallel_stream(
                     
                     # Small breath for event loop
                     await asyncio.sleep(0.1)
-                
-                yield f"data: {json.dumps({'status': 'batch_complete', 'batch': batch_num, 'processed': processed, 'total': total, 'message': f'✅ Batch {batch_num}/{total_batches} complete: {processed}/{total} files'})}\n\n"
+                    
+                    yield f"data: {json.dumps({'status': 'batch_complete', 'batch': group_num, 'processed': processed, 'total': total, 'message': f'✅ Group {group_num} complete: {processed}/{total} files'})}\n\n"
             
             # Send completion with detailed summary
             summary_message = f'✅ Upload complete: {processed}/{total} new files uploaded'
@@ -608,6 +704,10 @@ async def bulk_upload_parallel_stream(
         except Exception as e:
             logger.error(f"Streaming upload error: {e}")
             yield f"data: {json.dumps({'status': 'error', 'error': str(e)})}\n\n"
+        finally:
+            # Also reached when the response task is cancelled or the generator closed
+            cancel.cancel("upload stream closed")
+            disconnect_watcher.cancel()
     
     return StreamingResponse(
         upload_stream(),
@@ -618,11 +718,94 @@ async def bulk_upload_parallel_stream(
         }
     )
 
+async def _add_documents_bulk_concurrent(access_token: str, user_id: str, doc_ids: List[str]):
+    """
+    Bulk path of /documents/add: batched metadata, then concurrent fetch/extract
+    overlapping with embedding of the documents that are already extracted.
+    
+    Returns:
+        (processed_count, failed_documents)
+    """
+    
+    processed_count = 0
+    failed_documents = []
+    
+    # 1. Metadata for every id in ceil(n / 100) batch requests instead of n files.get calls
+    metadata = await google_docs_service.get_documents_metadata_batch(access_token, doc_ids)
+    found = {}
+    for doc_id in doc_ids:
+        if metadata.get(doc_id):
+            found[doc_id] = metadata[doc_id]
+        else:
+            logger.info(f"📄 Document {doc_id} not found in user's documents (may be from folder or permission issue)")
+            failed_documents.append({"id": doc_id, "error": "Not found in user's documents"})
+    
+    # 2. Embedding runs one batch at a time (model + Chroma writes) while downloads continue
+    embed_lock = asyncio.Lock()
+    embed_tasks = []
+    
+    async def embed_batch(batch):
+        nonlocal processed_count
+        async with embed_lock:
+            try:
+                results = await dora_pipeline.add_documents_bulk(user_id, batch)
+            except Exception as e:
+                logger.error(f"❌ Embedding batch of {len(batch)} failed: {e}")
+                results = {doc['id']: {'success': False, 'error': str(e)} for doc in batch}
+        
+        for doc in batch:
+            result = results.get(doc['id'], {'success': False, 'error': 'No result from embedding'})
+            if result.get('success') and result.get('chunks', 0) > 0:
+                processed_count += 1
+                logger.info(f"✅ Added document {doc['id']} to knowledge base ({result['chunks']} chunks)")
+            else:
+                failed_documents.append({
+                    "id": doc['id'],
+                    "error": result.get('error') or "No chunks generated (possible empty or unreadable content)"
+                })
+    
+    # 3. Fetch + extract concurrently, flushing an embed batch whenever one fills up
+    pending = []
+    completed = 0
+    async for doc_id, result in google_docs_service.iter_documents_text(
+        access_token, found, settings.bulk_upload_batch_size, memory_budget=get_memory_budget()
+    ):
+        completed += 1
+        content = result.get('content')
+        content_len = len(content.strip()) if content else 0
+        
+        if result.get('error'):
+            logger.error(f"❌ [{completed}/{len(found)}] Failed to fetch {doc_id}: {result['error']}")
+            failed_documents.append({"id": doc_id, "error": result['error']})
+            continue
+        if content_len < 10:
+            logger.warning(f"⚠️ Document {doc_id} has very little content: '{content[:50] if content else ''}...'")
+            failed_documents.append({"id": doc_id, "error": f"Very little content ({content_len} chars)"})
+            continue
+        
+        logger.info(f"📄 [{completed}/{len(found)}] Extracted {doc_id} ({content_len} characters)")
+        pending.append({
+            'id': doc_id,
+            'content': content,
+            'name': found[doc_id].get('name', f'Document {doc_id[:8]}'),
+            'mime_type': found[doc_id].get('mimeType', 'unknown')
+        })
+        if len(pending) >= settings.embedding_batch_size:
+            embed_tasks.append(asyncio.create_task(embed_batch(pending)))
+            pending = []
+    
+    if pending:
+        embed_tasks.append(asyncio.create_task(embed_batch(pending)))
+    if embed_tasks:
+        await asyncio.gather(*embed_tasks)
+    
+    return processed_count, failed_documents
+
 @app.post("/documents/add")
 async def add_documents_to_knowledge_base(
     request: AddDocumentsRequest,
     x_google_token: Optional[str] = Header(None),
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_restored_user)
 ):
     """Add selected documents to the user's knowledge base"""
     try:
@@ -638,6 +821,7 @@ async def add_documents_to_knowledge_base(
         failed_documents = []
         
         user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+        set_drive_request_context(user_id, PRIORITY_BULK)
         logger.info(f"📁 Processing {len(request.document_ids)} documents for user {user_id}")
         
         # 🆕 DUPLICATE DETECTION: Check which documents already exist
@@ -664,74 +848,48 @@ async def add_documents_to_knowledge_base(
         
         if is_bulk_upload:
             logger.info(f"📁 BULK UPLOAD: Processing {len(new_doc_ids)} NEW documents (skipped {len(skipped_doc_ids)} duplicates)")
-            # For bulk upload, we don't need to fetch all documents metadata
-            # We'll get metadata for each document individually to avoid unnecessary API calls
-            documents_lookup = {}
+            processed_count, failed_documents = await _add_documents_bulk_concurrent(access_token, user_id, new_doc_ids)
         else:
-            # OPTIMIZATION: Get all documents metadata ONCE at the beginning for single document
+            # Single document: look its metadata up in the user's document listing
+            doc_id = new_doc_ids[0]
             logger.info("🚀 OPTIMIZATION: Fetching all documents metadata once...")
             all_documents = await google_docs_service.list_documents(access_token)
             logger.info(f"📊 Fetched {len(all_documents)} documents metadata")
+            doc_metadata = {doc['id']: doc for doc in all_documents}.get(doc_id)
             
-            # Create a lookup dictionary for faster access
-            documents_lookup = {doc['id']: doc for doc in all_documents}
-            logger.info("📊 Created documents lookup dictionary")
-        
-        for i, doc_id in enumerate(new_doc_ids, 1):  # Only process NEW documents
-
             try:
-                if is_bulk_upload:
-                    logger.info(f"📄 [{i}/{len(request.document_ids)}] Processing document {doc_id}")
-                else:
-                    logger.info(f"📄 Processing document {doc_id}")
-                
-                # Get document metadata
-                if is_bulk_upload:
-                    # For bulk upload, get metadata for each document individually
-                    doc_metadata = await google_docs_service.get_document_metadata(access_token, doc_id)
-                    if not doc_metadata:
-                        logger.info(f"📄 Document {doc_id} not found in user's documents (may be from folder or permission issue)")
-                        failed_documents.append({"id": doc_id, "error": "Not found in user's documents"})
-                        continue
+                logger.info(f"📄 Processing document {doc_id}")
+                if not doc_metadata:
+                    logger.info(f"📄 Document {doc_id} not found in user's documents (may be from folder or permission issue)")
+                    failed_documents.append({"id": doc_id, "error": "Not found in user's documents"})
                 else:
-                    # Use cached metadata for single document
-                    doc_metadata = documents_lookup.get(doc_id)
-                    if not doc_metadata:
-                        logger.info(f"📄 Document {doc_id} not found in user's documents (may be from folder or permission issue)")
-                        failed_documents.append({"id": doc_id, "error": "Not found in user's documents"})
-                        continue
-                
-                logger.info(f"📄 Document {doc_id}: {doc_metadata.get('name', 'Unknown')}")
-                
-                # Get document content (this will automatically detect the MIME type)
-                content = await google_docs_service.get_document_content(access_token, doc_id)
-                
-                content_len = len(content.strip()) if content else 0
-                logger.info(f"📄 Extracted content length: {content_len} characters")
-                
-                if not content or content_len < 10:
-                    logger.warning(f"⚠️ Document {doc_id} has very little content: '{content[:50] if content else ''}...'")
-                    failed_documents.append({"id": doc_id, "error": f"Very little content ({content_len} chars)"})
-                    continue
-                
-                # Add to DORA pipeline with metadata
-                chunks_added = await dora_pipeline.add_document(
-                    user_id=user_id,
-                    document_id=doc_id,
-                    content=content,
-                    document_name=doc_metadata.get('name', f'Document {doc_id[:8]}'),
-                    mime_type=doc_metadata.get('mime_type', 'unknown')
-                )
-                
-                if chunks_added > 0:
-                    if is_bulk_upload:
-                        logger.info(f"✅ [{i}/{len(new_doc_ids)}] Successfully added document {doc_id} to knowledge base ({chunks_added} chunks)")
+                    logger.info(f"📄 Document {doc_id}: {doc_metadata.get('name', 'Unknown')}")
+                    
+                    # Get document content (this will automatically detect the MIME type)
+                    content = await google_docs_service.get_document_content(access_token, doc_id)
+                    
+                    content_len = len(content.strip()) if content else 0
+                    logger.info(f"📄 Extracted content length: {content_len} characters")
+                    
+                    if not content or content_len < 10:
+                        logger.warning(f"⚠️ Document {doc_id} has very little content: '{content[:50] if content else ''}...'")
+                        failed_documents.append({"id": doc_id, "error": f"Very little content ({content_len} chars)"})
                     else:
-                        logger.info(f"✅ Successfully added document {doc_id} to knowledge base ({chunks_added} chunks)")
-                    processed_count += 1
-                else:
-                    logger.warning(f"⚠️ Failed to generate chunks for document {doc_id}")
-                    failed_documents.append({"id": doc_id, "error": "No chunks generated (possible empty or unreadable content)"})
+                        # Add to DORA pipeline with metadata
+                        chunks_added = await dora_pipeline.add_document(
+                            user_id=user_id,
+                            document_id=doc_id,
+                            content=content,
+                            document_name=doc_metadata.get('name', f'Document {doc_id[:8]}'),
+                            mime_type=doc_metadata.get('mime_type', 'unknown')
+                        )
+                        
+                        if chunks_added > 0:
+                            logger.info(f"✅ Successfully added document {doc_id} to knowledge base ({chunks_added} chunks)")
+                            processed_count += 1
+                        else:
+                            logger.warning(f"⚠️ Failed to generate chunks for document {doc_id}")
+                            failed_documents.append({"id": doc_id, "error": "No chunks generated (possible empty or unreadable content)"})
                     
             except Exception as e:
                 logger.error(f"❌ Failed to process document {doc_id}: {e}", exc_info=True)
@@ -761,12 +919,16 @@ async def add_documents_to_knowledge_base(
 @app.post("/chat", response_model=ChatResponse)
 async def chat_with_documents(
     request: ChatRequest,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_restored_user)
 ):
     """Chat with the DORA system"""
     try:
         # Query the DORA pipeline
         user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+        if settings.index_auto_migrate:
+            # Rebuild in the background if the chunker / embedding model changed;
+            # this query is still answered from the current index
+            index_migrator.ensure_current(user_id)
         response = await dora_pipeline.query(
             user_id=user_id,
             query=request.message,
@@ -803,7 +965,7 @@ async def get_user_profile(current_user = Depends(get_current_user)):
 @app.delete("/knowledge-base/{doc_id}")
 async def delete_single_document(
     doc_id: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_restored_user)
 ):
     """Delete a single document from knowledge base"""
     try:
@@ -826,6 +988,76 @@ async def delete_single_document(
         logger.error(f"Error deleting document {doc_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/knowledge-base/delete")
+async def delete_documents_bulk(
+    request: DeleteDocumentsRequest,
+    current_user = Depends(get_restored_user)
+):
+    """Delete many documents from the knowledge base in one pass"""
+    try:
+        if not request.document_ids:
+            raise HTTPException(status_code=400, detail="No document IDs provided")
+        
+        user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+        logger.info(f"Deleting {len(request.document_ids)} documents for user {user_id}")
+        
+        removed = await dora_pipeline.remove_documents(user_id, request.document_ids)
+        deleted = [doc_id for doc_id, chunks in removed.items() if chunks]
+        not_found = [doc_id for doc_id, chunks in removed.items() if not chunks]
+        
+        return {
+            "message": f"Deleted {len(deleted)} of {len(removed)} documents",
+            "deleted": deleted,
+            "not_found": not_found,
+            "total_chunks_removed": sum(removed.values())
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting documents: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/knowledge-base/{doc_id}/refresh")
+async def refresh_single_document(
+    doc_id: str,
+    x_google_token: Optional[str] = Header(None),
+    current_user = Depends(get_restored_user)
+):
+    """Re-index an edited document: only chunks whose text changed are re-embedded"""
+    try:
+        access_token = x_google_token
+        if not access_token:
+            raise HTTPException(status_code=400, detail="Google access token not found")
+        
+        user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+        set_drive_request_context(user_id, PRIORITY_INTERACTIVE)
+        
+        metadata = await google_docs_service.get_document_metadata(access_token, doc_id)
+        if not metadata:
+            raise HTTPException(status_code=404, detail="Document not found in Google Drive")
+        
+        content = await google_docs_service.get_document_content(
+            access_token, doc_id, metadata.get('mimeType'), google_docs_service.get_content_version(metadata)
+        )
+        if not content or len(content.strip()) < 10:
+            raise HTTPException(status_code=422, detail="Document has no extractable content")
+        
+        stats = await dora_pipeline.update_document(
+            user_id=user_id,
+            document_id=doc_id,
+            content=content,
+            document_name=metadata.get('name', f'Document {doc_id[:8]}'),
+            mime_type=metadata.get('mimeType')
+        )
+        return {"message": "Document re-indexed", "document_id": doc_id, **stats}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error refreshing document {doc_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete("/clear-all-documents")
 async def clear_all_documents(
     current_user = Depends(get_current_user)
@@ -833,16 +1065,24 @@ async def clear_all_documents(
     """Clear all documents from the user's knowledge base - ULTRA FAST!"""
     try:
         user_id = current_user.get('sub', current_user.get('id', 'default_user'))
-        collection_name = f"user_{user_id}"
         
         logger.info(f"CLEAR ALL ENDPOINT CALLED FOR USER: {user_id}")
         
+        # A running rebuild would copy the old chunks back in
+        await index_migrator.cancel(user_id)
+        # An archived knowledge base is cleared by deleting its archive
+        archived_count = await cold_tier.discard(user_id)
+        collection_name = dora_pipeline.index_layout.active_collection(user_id)
+        
         # Get count for user feedback (minimal overhead)
         chunk_count = 0
         try:
             collection = dora_pipeline._get_user_collection(user_id)
             chunk_count = collection.count()
             
+            if chunk_count == 0 and archived_count:
+                logger.info(f"Deleted {archived_count} archived chunks for user {user_id}")
+                return {"message": "Knowledge base cleared successfully", "total_chunks_removed": archived_count}
             if chunk_count == 0:
                 logger.info("Knowledge base is already empty")
                 return {"message": "Knowledge base is already empty", "cleared_count": 0}
@@ -852,14 +1092,11 @@ async def clear_all_documents(
             logger.warning(f"Could not get count: {e}, proceeding with delete anyway")
         
         # FAST: Delete entire collection and recreate
-        dora_pipeline.chroma_client.delete_collection(collection_name)
+        dora_pipeline.drop_collection(collection_name)
         logger.info(f"Deleted collection: {collection_name}")
         
-        # Recreate collection
-        dora_pipeline.chroma_client.create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
+        # Recreate collection (stamped with the current index version)
+        dora_pipeline._create_collection(collection_name)
         logger.info(f"Recreated collection: {collection_name}")
         logger.info(f"Successfully cleared {chunk_count} chunks")
         
@@ -881,15 +1118,31 @@ async def health_check():
     """Lightweight health check endpoint - optimized to not interfere with heavy operations"""
     # Simple status check without testing ChromaDB to avoid resource contention
     # during embedding operations
+    # The vector store state is the last background check's result, not a live probe
     return {
         "status": "healthy",
         "services": {
-            "api": "operational"
+            "api": "operational",
+            "vector_store": integrity_verifier.summary()
         }
     }
 
+
+@app.get("/health/vector-store")
+async def vector_store_health(current_user = Depends(get_current_user)):
+    """Get the last integrity check per collection, snapshot and compaction status"""
+    return {**integrity_verifier.get_status(), 'compaction': compactor.get_status()}
+
+
+@app.post("/health/vector-store/check")
+async def run_vector_store_check(current_user = Depends(get_current_user)):
+    """Run an integrity check now (in the background); poll /health/vector-store for the result"""
+    started = integrity_verifier.check_now()
+    message = "Integrity check started" if started else "Integrity check already running"
+    return {"message": message, "state": integrity_verifier.summary()['state']}
+
 @app.get("/database-stats")
-async def get_database_stats(current_user = Depends(get_current_user)):
+async def get_database_stats(current_user = Depends(get_restored_user)):
     """Get database statistics for monitoring large scale operations"""
     try:
         user_id = current_user.get('sub', current_user.get('id', 'default_user'))
@@ -900,8 +1153,141 @@ async def get_database_stats(current_user = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/ingest-memory")
+async def get_ingest_memory(current_user = Depends(get_current_user)):
+    """Get the ingestion memory budget, current RSS and admission counters"""
+    return get_memory_budget().get_stats()
+
+
+@app.get("/collection-residency")
+async def get_collection_residency(current_user = Depends(get_current_user)):
+    """Get how many collections have compact / centroid indexes loaded, their estimated size and load latency, and Chroma's HNSW cache size"""
+    return {
+        'compact_indexes': dora_pipeline.residency.get_stats(),
+        # Chroma unloads HNSW indexes itself (LRU); which ones are loaded is not visible
+        'chroma_hnsw_cache_collections': dora_pipeline.chroma_hnsw_cache_size
+    }
+
+
+@app.get("/knowledge-base/archive")
+async def get_knowledge_base_archive(current_user = Depends(get_current_user)):
+    """Get whether the user's knowledge base is live or archived, starting (and reporting) its restore"""
+    try:
+        user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+        if cold_tier.is_archived(user_id):
+            # Don't hold the request: the client polls this for progress
+            return await cold_tier.ensure_restored(user_id, wait=0)
+        return cold_tier.get_status(user_id)
+    except Exception as e:
+        logger.error(f"Error getting knowledge base archive status: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/knowledge-base/export")
+async def export_knowledge_base(current_user = Depends(get_restored_user)):
+    """Download the user's knowledge base (vectors, ids, text, metadata) as a checksummed archive"""
+    from fastapi.responses import FileResponse
+    from starlette.background import BackgroundTask
+    
+    user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+    fd, path = tempfile.mkstemp(suffix='.kb.zip')
+    os.close(fd)
+    try:
+        manifest = await dora_pipeline.export_archive(user_id, path)
+    except Exception as e:
+        os.remove(path)
+        logger.error(f"Error exporting knowledge base: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return FileResponse(
+        path,
+        media_type="application/zip",
+        filename=f"{manifest['collection']}.kb.zip",
+        headers={"X-Chunk-Count": str(manifest['count'])},
+        background=BackgroundTask(os.remove, path)
+    )
+
+
+@app.post("/knowledge-base/import")
+async def import_knowledge_base(
+    archive: UploadFile = File(...),
+    replace: bool = False,
+    current_user = Depends(get_restored_user)
+):
+    """Load an exported knowledge base archive without re-embedding (merged, or replacing the current one)"""
+    user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+    if replace:
+        # A running rebuild would copy the replaced chunks back in
+        await index_migrator.cancel(user_id)
+    try:
+        return await dora_pipeline.import_archive(user_id, archive.file, replace=replace)
+    except ValueError as e:
+        # Not an archive, failed checksum, or an incompatible index version
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importing knowledge base: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await archive.close()
+
+
+@app.get("/index/status")
+async def get_index_status(current_user = Depends(get_restored_user)):
+    """Get the chunker / embedding version of the user's index and any migration progress"""
+    try:
+        user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+        status = dora_pipeline.get_index_version(user_id)
+        status['migration'] = index_migrator.get_status(user_id)
+        return status
+    except Exception as e:
+        logger.error(f"Error getting index status: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/index/migrate")
+async def migrate_index(current_user = Depends(get_restored_user)):
+    """Rebuild the user's index with the current chunker / embedding model in the background"""
+    user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+    return index_migrator.start(user_id)
+
+
+@app.post("/index/compact")
+async def compact_index(current_user = Depends(get_restored_user)):
+    """Rebuild the user's index without deleted entries (no re-embedding) in the background"""
+    user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+    return index_migrator.start(user_id, compact=True)
+
+
+@app.put("/index/hnsw")
+async def set_index_search_ef(search_ef: int, rebuild: bool = False, current_user = Depends(get_restored_user)):
+    """
+    Change the HNSW search_ef of the user's index
+
+    Queries keep the old value (reported as pending) until a restart; with
+    rebuild=true a compaction rebuilds the collection so the new value applies
+    once it is swapped in.
+    """
+    user_id = current_user.get('sub', current_user.get('id', 'default_user'))
+    try:
+        result = dora_pipeline.set_search_ef(user_id, search_ef)
+        if rebuild and result['pending']:
+            result['compaction'] = index_migrator.start(user_id, compact=True)
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error setting search_ef: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/google-api-stats")
+async def get_google_api_stats(current_user = Depends(get_current_user)):
+    """Get the adaptive Google API concurrency limit, throttling counters and quota queues"""
+    return google_docs_service.get_api_stats()
+
+
 @app.get("/knowledge-base")
-async def get_knowledge_base_documents(current_user = Depends(get_current_user)):
+async def get_knowledge_base_documents(current_user = Depends(get_restored_user)):
     """Get actual documents in the knowledge base with metadata"""
     try:
         user_id = current_user.get('sub', current_user.get('id', 'default_user'))
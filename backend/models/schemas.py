@@ -18,6 +18,9 @@ class DocumentResponse(BaseModel):
 class AddDocumentsRequest(BaseModel):
     document_ids: List[str] = Field(..., description="List of Google Doc IDs to add")
 
+class DeleteDocumentsRequest(BaseModel):
+    document_ids: List[str] = Field(..., description="List of Google Doc IDs to remove from the knowledge base")
+
 class FolderRequest(BaseModel):
     folder_url: str = Field(..., description="Google Drive folder URL or folder ID")
 
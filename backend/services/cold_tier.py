@@ -0,0 +1,354 @@
+"""
+Cold-tier archival of inactive knowledge bases
+Users who have not made a request for a while have their collection exported
+to a compressed archive and dropped from ChromaDB, which keeps the hot persist
+directory (and its backups and startup) small. The user's next request
+restores the collection from the archive.
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+from utils.collection_archive import read_manifest, write_archive
+
+logger = logging.getLogger(__name__)
+
+# user_{id} or user_{id}__v{generation} (see IndexLayout.collection_name)
+USER_COLLECTION = re.compile(r"^user_(?P<user_id>.+?)(?:__v\d+)?$")
+
+
+class ColdTierManager:
+    """
+    Archives idle users' collections and restores them on demand.
+
+    Last activity and archive locations are kept in a small JSON file next to
+    the archives. Activity is only persisted once per ACTIVITY_RESOLUTION per
+    user, so noting it on every request stays cheap. Archiving and restoring a
+    user are serialized by a per-user lock; a request that arrives while the
+    user is being archived waits for it and then restores.
+    """
+
+    STATE_FILE = 'cold_tier.json'
+
+    # Seconds between persisted activity updates for one user
+    ACTIVITY_RESOLUTION = 3600
+
+    # Chunks per archive block (and per Chroma read)
+    PAGE_SIZE = 5000
+
+    def __init__(
+        self,
+        pipeline,
+        archive_dir: str,
+        inactive_days: float = 90,
+        check_interval_seconds: float = 6 * 3600,
+        migrator=None,
+        clock=time.time
+    ):
+        """
+        Initialize cold tier
+
+        Args:
+            pipeline: DORAPipeline owning the ChromaDB client
+            archive_dir: Directory for archives and the state file
+            inactive_days: Days without a request before a collection is archived
+            check_interval_seconds: How often the background job looks for inactive users
+            migrator: IndexMigrator; users being migrated are never archived
+            clock: Time source (injectable for tests)
+        """
+        self.pipeline = pipeline
+        self.archive_dir = archive_dir
+        self.inactive_seconds = inactive_days * 86400
+        self.check_interval_seconds = check_interval_seconds
+        self.migrator = migrator
+        self._clock = clock
+        self._path = os.path.join(archive_dir, self.STATE_FILE)
+        self._state_lock = threading.Lock()
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._restores: Dict[str, asyncio.Task] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {'archived': 0, 'restored': 0, 'aborted': 0, 'failed': 0, 'archived_bytes': 0}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                self._users = json.load(f).get('users', {})
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read cold tier state {self._path}: {e}")
+
+    def _save(self):
+        # Caller holds the state lock
+        os.makedirs(self.archive_dir, exist_ok=True)
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'users': self._users}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._path)
+
+    def _lock_for(self, user_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(user_id, asyncio.Lock())
+
+    def _archive_path(self, collection_name: str) -> str:
+        return os.path.join(self.archive_dir, f"{collection_name}.archive.zip")
+
+    def note_activity(self, user_id: str):
+        """Record a request from the user"""
+        now = self._clock()
+        with self._state_lock:
+            entry = self._users.setdefault(user_id, {})
+            if now - entry.get('last_active', 0) >= self.ACTIVITY_RESOLUTION:
+                entry['last_active'] = now
+                self._save()
+
+    def is_archived(self, user_id: str) -> bool:
+        with self._state_lock:
+            return 'archive' in self._users.get(user_id, {})
+
+    def get_status(self, user_id: str) -> Dict[str, Any]:
+        """Where the user's knowledge base lives, with progress of a running archive / restore"""
+        status = self._status.get(user_id)
+        if status is not None and status['state'] in ('archiving', 'restoring'):
+            return dict(status)
+        with self._state_lock:
+            entry = dict(self._users.get(user_id, {}))
+        if 'archive' in entry:
+            result = {'state': 'archived', **entry['archive']}
+        else:
+            result = {'state': 'hot', 'last_active': entry.get('last_active')}
+        if status is not None and status['state'] == 'failed':
+            result['error'] = status['error']
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._state_lock:
+            archived = sum(1 for entry in self._users.values() if 'archive' in entry)
+        return {'archived_users': archived, 'tracked_users': len(self._users), **self._stats}
+
+    async def ensure_restored(self, user_id: str, wait: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Make sure the user's collection is live, restoring it from the archive if needed
+
+        Args:
+            user_id: User whose request is being served
+            wait: Seconds to wait for a restore to finish (None = until done)
+
+        Returns:
+            The user's status; state "restoring" (with progress) if the restore
+            is still running after `wait`, "failed" if it could not complete
+        """
+        self.note_activity(user_id)
+        status = self._status.get(user_id, {})
+        if not self.is_archived(user_id) and status.get('state') != 'archiving':
+            return self.get_status(user_id)
+
+        task = self._restores.get(user_id)
+        if task is None or task.done():
+            task = asyncio.create_task(self.restore(user_id))
+            self._restores[user_id] = task
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+        except Exception as e:
+            return {**self.get_status(user_id), 'state': 'failed', 'error': str(e)}
+        return self.get_status(user_id)
+
+    async def archive(self, user_id: str) -> bool:
+        """
+        Export the user's active collection and drop it from ChromaDB
+
+        The export is abandoned (and the collection kept) if the user makes a
+        request or the collection is written to while it runs.
+
+        Returns:
+            True if the collection was archived
+        """
+        async with self._lock_for(user_id):
+            if self.is_archived(user_id):
+                return False
+            if self.migrator is not None and self.migrator.is_running(user_id):
+                return False
+            layout = self.pipeline.index_layout
+            name = layout.active_collection(user_id)
+            try:
+                collection = self.pipeline.chroma_client.get_collection(name)
+            except Exception:
+                return False
+            total = collection.count()
+            if total == 0:
+                return False
+
+            started = self._clock()
+            path = self._archive_path(name)
+            status = {'state': 'archiving', 'collection': name, 'chunks': 0, 'total': total, 'started_at': started}
+            self._status[user_id] = status
+            loop = asyncio.get_running_loop()
+            layout.begin_tracking(name)
+            try:
+                manifest = await loop.run_in_executor(
+                    None, write_archive, collection, path, self.PAGE_SIZE, lambda done: status.update(chunks=done)
+                )
+                with self._state_lock:
+                    active = self._users.get(user_id, {}).get('last_active', 0) > started
+                migrating = self.migrator is not None and self.migrator.is_running(user_id)
+                if layout.take_dirty(name) or active or migrating or manifest['count'] != collection.count():
+                    os.remove(path)
+                    self._stats['aborted'] += 1
+                    logger.info(f"↩️ Archiving {name} abandoned: the user became active")
+                    return False
+                self.pipeline.drop_collection(name)
+            except Exception as e:
+                self._stats['failed'] += 1
+                logger.error(f"❌ Could not archive {name}: {e}")
+                if os.path.exists(path):
+                    os.remove(path)
+                return False
+            finally:
+                # A migration that started meanwhile tracks the same collection
+                if self.migrator is None or not self.migrator.is_running(user_id):
+                    layout.end_tracking(name)
+                self._status.pop(user_id, None)
+
+            nbytes = os.path.getsize(path)
+            with self._state_lock:
+                self._users.setdefault(user_id, {})['archive'] = {
+                    'collection': name,
+                    'path': path,
+                    'chunks': manifest['count'],
+                    'bytes': nbytes,
+                    'archived_at': self._clock()
+                }
+                self._save()
+            self._stats['archived'] += 1
+            self._stats['archived_bytes'] += nbytes
+            logger.warning(f"🧊 Archived {name}: {manifest['count']} chunks, {nbytes / 1024 / 1024:.1f}MB "
+                           f"in {self._clock() - started:.1f}s")
+            return True
+
+    async def restore(self, user_id: str) -> bool:
+        """
+        Re-create the user's collection from its archive
+
+        Chunks are upserted block by block (see DORAPipeline.load_archive), so
+        a restore that is interrupted can simply run again. The archive is only
+        deleted once the collection holds every chunk.
+
+        Returns:
+            True if a collection was restored
+        """
+        async with self._lock_for(user_id):
+            with self._state_lock:
+                archived = dict(self._users.get(user_id, {}).get('archive', {}))
+            if not archived:
+                return False
+
+            name = archived['collection']
+            path = archived['path']
+            started = self._clock()
+            status = {'state': 'restoring', 'collection': name, 'chunks': 0, 'total': archived['chunks'], 'started_at': started}
+            self._status[user_id] = status
+            loop = asyncio.get_running_loop()
+            try:
+                manifest = await loop.run_in_executor(None, read_manifest, path)
+                client = self.pipeline.chroma_client
+                try:
+                    collection = client.get_collection(name)
+                except Exception:
+                    collection = client.create_collection(name, metadata=manifest['metadata'] or None)
+                await self.pipeline.load_archive(collection, path, progress=lambda done: status.update(chunks=done))
+                if collection.count() < manifest['count']:
+                    raise ValueError(f"restored {collection.count()} of {manifest['count']} chunks")
+            except Exception as e:
+                self._stats['failed'] += 1
+                self._status[user_id] = {'state': 'failed', 'error': str(e)}
+                logger.error(f"❌ Could not restore {name} from {path}: {e}")
+                raise
+
+            with self._state_lock:
+                self._users.setdefault(user_id, {}).pop('archive', None)
+                self._save()
+            os.remove(path)
+            self._status.pop(user_id, None)
+            self._stats['restored'] += 1
+            logger.warning(f"🔥 Restored {name}: {manifest['count']} chunks in {self._clock() - started:.1f}s")
+            return True
+
+    async def discard(self, user_id: str) -> int:
+        """
+        Delete the user's archive without restoring it (their knowledge base is being cleared)
+
+        Returns:
+            Number of archived chunks discarded
+        """
+        async with self._lock_for(user_id):
+            with self._state_lock:
+                archived = self._users.get(user_id, {}).pop('archive', None)
+                if archived is None:
+                    return 0
+                self._save()
+            self._status.pop(user_id, None)
+            if os.path.exists(archived['path']):
+                os.remove(archived['path'])
+            logger.info(f"🗑️ Discarded archived {archived['collection']} ({archived['chunks']} chunks)")
+            return archived['chunks']
+
+    def _inactive_users(self) -> List[str]:
+        """Users whose active collection has had no request for inactive_days"""
+        now = self._clock()
+        names = []
+        for collection in self.pipeline.chroma_client.list_collections():
+            names.append(getattr(collection, 'name', collection))
+
+        inactive = []
+        with self._state_lock:
+            changed = False
+            for name in names:
+                match = USER_COLLECTION.match(name)
+                if match is None:
+                    continue
+                user_id = match.group('user_id')
+                if self.pipeline.index_layout.active_collection(user_id) != name:
+                    continue  # a shadow collection being built, or one about to be retired
+                entry = self._users.setdefault(user_id, {})
+                if 'last_active' not in entry:
+                    # Collections that predate activity tracking start their clock now
+                    entry['last_active'] = now
+                    changed = True
+                elif now - entry['last_active'] >= self.inactive_seconds and 'archive' not in entry:
+                    inactive.append(user_id)
+            if changed:
+                self._save()
+        return inactive
+
+    async def sweep(self) -> List[str]:
+        """Archive every inactive user's collection; returns the users archived"""
+        archived = []
+        for user_id in self._inactive_users():
+            if await self.archive(user_id):
+                archived.append(user_id)
+        return archived
+
+    def start(self):
+        """Start the periodic archival job (no-op if it is running)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                archived = await self.sweep()
+                if archived:
+                    logger.warning(f"🧊 Cold tier: archived {len(archived)} inactive knowledge bases")
+            except Exception as e:
+                logger.error(f"❌ Cold tier sweep failed: {e}")
+            await asyncio.sleep(self.check_interval_seconds)
@@ -0,0 +1,197 @@
+"""
+Background compaction of collections after heavy deletes
+Chroma's HNSW index only marks deleted chunks, so a collection whose documents
+are removed and re-ingested keeps growing on disk and gets slower to search.
+Collections whose persisted index is mostly deleted elements are rebuilt by the
+index migrator (stored vectors copied into a fresh collection, then swapped in).
+So are collections that have outgrown the HNSW parameters they were created
+with, since Chroma cannot change M or construction_ef in place.
+"""
+
+import asyncio
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set
+import logging
+
+from services.cold_tier import USER_COLLECTION
+from utils.chroma_integrity import inspect_persist_dir
+from utils.hnsw_params import tier_for
+
+logger = logging.getLogger(__name__)
+
+
+class Compactor:
+    """
+    Finds bloated collections and compacts them one at a time.
+
+    The deleted element count of a collection is what its persisted HNSW
+    header counts minus the ids its id map still holds. Space freed in
+    chroma.sqlite3 is reused by later writes; the file itself only shrinks
+    when it is vacuumed at startup (see vacuum_sqlite).
+
+    With `tiers`, a collection whose persisted graph has a lower M or
+    construction_ef than the tier for its live chunk count is rebuilt too.
+    Collections are only moved up: one shrinking back below a tier boundary
+    keeps its denser graph rather than being rebuilt back and forth.
+
+    Chroma leaves the HNSW files of dropped collections on disk. A segment
+    directory no collection uses is deleted once two sweeps in a row found it
+    orphaned, so one created between reading chroma.sqlite3 and listing the
+    directory is never touched.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        migrator,
+        persist_dir: str,
+        check_interval_seconds: float = 24 * 3600,
+        min_deleted_ratio: float = 0.3,
+        min_deleted: int = 1000,
+        tiers: Optional[Sequence[Dict[str, int]]] = None,
+        clock=time.time
+    ):
+        """
+        Initialize compactor
+
+        Args:
+            pipeline: DORAPipeline owning the ChromaDB client
+            migrator: IndexMigrator that runs the rebuild and swap
+            persist_dir: ChromaDB persist directory to inspect
+            check_interval_seconds: How often the background job looks for bloated collections
+            min_deleted_ratio: Deleted share of the HNSW index that triggers a compaction
+            min_deleted: Fewest deleted elements worth a compaction
+            tiers: HNSW parameters by collection size (see parse_tiers); None = no retiering
+            clock: Wall-clock time source (injectable for tests)
+        """
+        self.pipeline = pipeline
+        self.migrator = migrator
+        self.persist_dir = persist_dir
+        self.check_interval_seconds = check_interval_seconds
+        self.min_deleted_ratio = min_deleted_ratio
+        self.min_deleted = min_deleted
+        self.tiers = tiers
+        self._clock = clock
+        self._last_sweep: Optional[Dict[str, Any]] = None
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._orphaned: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {'sweeps': 0, 'compacted': 0, 'retiered': 0, 'failed': 0, 'elements_dropped': 0, 'orphans_removed_bytes': 0}
+
+    def candidates(self, inspection: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Active user collections over both thresholds or below their size tier, most deleted elements first"""
+        found = []
+        for name, entry in inspection['collections'].items():
+            match = USER_COLLECTION.match(name)
+            hnsw = entry['hnsw']
+            if match is None or hnsw['active'] is None or hnsw['problems']:
+                continue  # not a user's collection, or nothing reliable to count
+            user_id = match.group('user_id')
+            if self.pipeline.index_layout.active_collection(user_id) != name:
+                continue  # a shadow collection being built, or one about to be retired
+            deleted = hnsw['elements'] - hnsw['active']
+            ratio = deleted / hnsw['elements'] if hnsw['elements'] else 0.0
+            bloated = deleted >= self.min_deleted and ratio >= self.min_deleted_ratio
+            if bloated or self._outgrown(hnsw):
+                found.append({
+                    'user_id': user_id,
+                    'collection': name,
+                    'reason': 'deleted' if bloated else 'retier',
+                    'elements': hnsw['elements'],
+                    'deleted': deleted,
+                    'deleted_ratio': round(ratio, 3)
+                })
+        return sorted(found, key=lambda candidate: candidate['deleted'], reverse=True)
+
+    def _outgrown(self, hnsw: Dict[str, Any]) -> bool:
+        """Whether a persisted graph is sparser than the size tier of its live chunks"""
+        if not self.tiers or 'M' not in hnsw:
+            return False
+        tier = tier_for(hnsw['active'], self.tiers)
+        return hnsw['M'] < tier['M'] or hnsw['ef_construction'] < tier['construction_ef']
+
+    def _remove_orphans(self, orphaned: List[str]) -> int:
+        """Delete segment directories found orphaned by this and the previous sweep; returns bytes freed"""
+        freed = 0
+        for name in sorted(self._orphaned.intersection(orphaned)):
+            path = os.path.join(self.persist_dir, name)
+            if not os.path.isdir(path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+            shutil.rmtree(path, ignore_errors=True)
+            freed += size
+            logger.info(f"🗑️ Removed orphaned segment {name} ({size / 1024 / 1024:.1f}MB)")
+        self._orphaned = set(orphaned)
+        return freed
+
+    async def sweep(self) -> List[Dict[str, Any]]:
+        """Compact every bloated collection; returns one result per collection tried"""
+        loop = asyncio.get_running_loop()
+        inspection = await loop.run_in_executor(None, inspect_persist_dir, self.persist_dir)
+        results = []
+        for candidate in self.candidates(inspection):
+            user_id = candidate['user_id']
+            if self.migrator.is_running(user_id):
+                continue
+            self.migrator.start(user_id, compact=True)
+            status = await self.migrator.wait(user_id)
+            result = {
+                **candidate,
+                'state': status['state'],
+                'to_collection': status.get('to_collection'),
+                'latency_before_ms': status.get('latency_before_ms'),
+                'latency_after_ms': status.get('latency_after_ms'),
+                'error': status.get('error'),
+                'finished_at': status.get('finished_at')
+            }
+            if status['state'] == 'completed':
+                self._stats['compacted' if candidate['reason'] == 'deleted' else 'retiered'] += 1
+                self._stats['elements_dropped'] += candidate['deleted']
+            else:
+                self._stats['failed'] += 1
+            self._results[user_id] = result
+            results.append(result)
+
+        # Includes the segments of collections just compacted away (removed next sweep)
+        orphaned = (await loop.run_in_executor(None, inspect_persist_dir, self.persist_dir))['orphaned_segments']
+        freed = await loop.run_in_executor(None, self._remove_orphans, orphaned)
+        self._stats['orphans_removed_bytes'] += freed
+
+        sqlite = inspection['sqlite']
+        self._last_sweep = {
+            'checked_at': self._clock(),
+            'collections': len(inspection['collections']),
+            'compacted': sum(1 for result in results if result['state'] == 'completed'),
+            'orphans_removed_bytes': freed,
+            'sqlite_bytes': sqlite['bytes'] if sqlite else None,
+            'sqlite_free_bytes': sqlite['free_bytes'] if sqlite else None
+        }
+        self._stats['sweeps'] += 1
+        return results
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'last_sweep': self._last_sweep,
+            'results': dict(self._results),
+            **self._stats
+        }
+
+    def start(self):
+        """Start the periodic compaction job (no-op if it is running)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                results = await self.sweep()
+                for result in results:
+                    log = logger.warning if result['state'] == 'completed' else logger.error
+                    log(f"🗜️ Compaction of {result['collection']} ({result['reason']}, {result['deleted']} of "
+                        f"{result['elements']} elements deleted): {result['state']}, query latency "
+                        f"{result['latency_before_ms']}ms -> {result['latency_after_ms']}ms")
+            except Exception as e:
+                logger.error(f"❌ Compaction sweep failed: {e}")
+            await asyncio.sleep(self.check_interval_seconds)
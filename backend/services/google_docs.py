@@ -1,12 +1,21 @@
 import os
 import httpx
 from utils.http_client import get_http_client
+from utils.drive_index import get_drive_index
+from utils.rate_limiter import AdaptiveConcurrencyLimiter
+from utils.quota_scheduler import DriveQuotaScheduler, get_drive_request_context
+from utils.text_cache import get_text_cache
+from utils.cancellation import CancellationToken, OperationCancelled, check_cancelled
+from config import settings
 import traceback
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, AsyncIterator, Optional
+from contextlib import aclosing
+from collections import OrderedDict
 import logging
 import json
 import io
 import asyncio
+import time
 
 # Import libraries for document processing
 try:
@@ -34,16 +43,100 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# MIME filter shared by folder scans (documents we can ingest + subfolders to descend into)
+FOLDER_SCAN_MIME_FILTER = ("(mimeType='application/vnd.openxmlformats-officedocument.wordprocessingml.document' or "
+                           "mimeType='application/pdf' or "
+                           "mimeType='text/plain' or "
+                           "mimeType='application/vnd.openxmlformats-officedocument.presentationml.presentation' or "
+                           "mimeType='application/vnd.google-apps.document' or "
+                           "mimeType='application/vnd.google-apps.presentation' or "
+                           "mimeType='application/vnd.google-apps.folder') and "
+                           "trashed=false")
+
+# Whole-drive listings used when the folder tree is materialized locally
+DOCUMENT_MIME_TYPES = (
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/pdf',
+    'text/plain',
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'application/vnd.google-apps.document',
+    'application/vnd.google-apps.presentation'
+)
+DOCUMENT_MIME_FILTER = "(" + " or ".join(f"mimeType='{mime}'" for mime in DOCUMENT_MIME_TYPES) + ") and trashed=false"
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+FOLDER_LIST_QUERY = "mimeType='application/vnd.google-apps.folder' and trashed=false"
+# Placeholder results returned when download/extraction fails - never cached
+EXTRACTION_FAILURE_PREFIXES = (
+    "Content extraction not supported",
+    "Extraction error:",
+    "Error accessing file content",
+    "Error:",
+    "Unsupported type:"
+)
+ALL_DRIVES_PARAMS = {
+    'corpora': 'allDrives',
+    'includeItemsFromAllDrives': 'true',
+    'supportsAllDrives': 'true'
+}
 
 
 class GoogleDocsService:
     def __init__(self):
         self.drive_api_base = "https://www.googleapis.com/drive/v3"
         self.docs_api_base = "https://www.googleapis.com/docs/v1"
-        self._semaphore = asyncio.Semaphore(200)
-        self._folder_cache = {}
-        self._cache_ttl = 300
+        # One adaptive limiter shared by listing, metadata, download and export calls
+        self._limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=settings.google_api_initial_concurrency,
+            min_limit=settings.google_api_min_concurrency,
+            max_limit=settings.google_api_max_concurrency,
+            max_retries=settings.google_api_max_retries,
+            interactive_reserve=settings.google_api_interactive_reserve,
+            max_user_share=settings.google_api_max_user_share
+        )
+        # Per-user / global request quotas, fair across users (see set_drive_request_context)
+        self._scheduler = DriveQuotaScheduler(
+            user_rate=settings.drive_user_requests_per_second,
+            user_burst=settings.drive_user_burst,
+            global_rate=settings.drive_global_requests_per_second,
+            global_burst=settings.drive_global_burst
+        )
         self._pending_requests = {}
+        # Batched folder scan: how many "'id' in parents" clauses fit in one files.list query
+        self.batch_query_max_length = 2000
+        self.batch_query_max_parents = 40
+        self._request_stats = {'files_list': 0, 'files_get': 0, 'batch': 0, 'download': 0, 'changes': 0}
+        # Auto traversal decisions per (user, root): (strategy, chosen at), oldest first
+        self._traversal_choices: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self.traversal_choices_max = 1024
+        # Drive multipart batch endpoint (max 100 calls per batch)
+        self.batch_api_url = "https://www.googleapis.com/batch/drive/v3"
+        self.batch_max_requests = 100
+    
+    async def _google_request(self, send):
+        """Run a call under the adaptive limiter; every attempt (retries too) is admitted by the quota scheduler"""
+        user_id, priority = get_drive_request_context()
+        return await self._limiter.request(
+            send, user_id, priority, admit=lambda: self._scheduler.acquire(user_id, priority)
+        )
+    
+    async def _google_get(self, url: str, **kwargs):
+        """GET a Google API URL through the quota scheduler, the adaptive limiter and the pooled client"""
+        client = await get_http_client()
+        return await self._google_request(lambda: client.get(url, **kwargs))
+    
+    async def _google_post(self, url: str, **kwargs):
+        """POST to a Google API URL through the quota scheduler, the adaptive limiter and the pooled client"""
+        client = await get_http_client()
+        return await self._google_request(lambda: client.post(url, **kwargs))
+    
+    def get_api_stats(self) -> Dict[str, Any]:
+        """Current adaptive concurrency limit, rejection counts, quota queues and request counters"""
+        return {
+            **self._limiter.get_stats(),
+            'quota': self._scheduler.get_stats(),
+            'requests': dict(self._request_stats),
+            'text_cache': get_text_cache().stats() if get_text_cache() else None
+        }
     
     async def list_documents(self, access_token: str) -> List[Dict[str, Any]]:
         """List all document files (.docx, .pdf, .txt, .pptx, Google Docs) for the user (NO FOLDERS)"""
@@ -70,9 +163,7 @@ class GoogleDocsService:
                 'Content-Type': 'application/json'
             }
             
-            # Use connection pooling
-            client = await get_http_client()
-            response = await client.get(url, params=params, headers=headers)
+            response = await self._google_get(url, params=params, headers=headers)
                 
             if response.status_code != 200:
                 logger.error(f"Drive API error: {response.status_code} - {response.text}")
@@ -95,9 +186,7 @@ class GoogleDocsService:
                     'fields': 'files(id,name,createdTime,modifiedTime,webViewLink,size,mimeType,parents)'
                 }
                 
-                # Use connection pooling
-                client = await get_http_client()
-                broader_response = await client.get(url, params=broader_params, headers=headers)
+                broader_response = await self._google_get(url, params=broader_params, headers=headers)
                 
                 if broader_response.status_code == 200:
                     broader_data = broader_response.json()
@@ -221,9 +310,7 @@ class GoogleDocsService:
             if access_token:
                 headers['Authorization'] = f'Bearer {access_token}'
             
-            # Use connection pooling
-            client = await get_http_client()
-            response = await client.get(url, params=params, headers=headers)
+            response = await self._google_get(url, params=params, headers=headers)
                 
             if response.status_code != 200:
                 logger.error(f"Drive API error: {response.status_code} - {response.text}")
@@ -248,9 +335,7 @@ class GoogleDocsService:
                     'fields': 'files(id,name,createdTime,modifiedTime,webViewLink,size,mimeType,parents)'
                 }
                 
-                # Use connection pooling
-                client = await get_http_client()
-                broader_response = await client.get(url, params=broader_params, headers=headers)
+                broader_response = await self._google_get(url, params=broader_params, headers=headers)
                 
                 if broader_response.status_code == 200:
                     broader_data = broader_response.json()
@@ -341,9 +426,7 @@ class GoogleDocsService:
             if access_token:
                 headers['Authorization'] = f'Bearer {access_token}'
             
-            # Use connection pooling
-            client = await get_http_client()
-            response = await client.get(url, params=params, headers=headers)
+            response = await self._google_get(url, params=params, headers=headers)
                 
             if response.status_code != 200:
                 logger.error(f"Recent documents API error: {response.status_code} - {response.text}")
@@ -392,7 +475,16 @@ class GoogleDocsService:
             logger.error(f"Error fetching recent documents: {e}", exc_info=True)
             raise
     
-    async def list_all_documents_from_folder(self, folder_url: str, access_token: str = None) -> List[Dict[str, Any]]:
+    async def list_all_documents_from_folder(self, folder_url: str, access_token: str = None, traversal: str = None) -> List[Dict[str, Any]]:
+        """
+        List every document in a folder and its subfolders.
+        
+        traversal: "auto" (pick from an estimated folder count, remembered per user and root
+        for DRIVE_TRAVERSAL_CHOICE_TTL_SECONDS), "materialized" (list every
+        folder and document once and rebuild the tree locally), "batched" (sibling folders
+        share files.list calls) or "recursive" (one call per folder).
+        Defaults to settings.drive_traversal_mode.
+        """
         try:
             logger.info(f"=== LIST ALL DOCUMENTS FROM FOLDER ===")
             logger.info(f"Folder URL: {folder_url}")
@@ -404,8 +496,27 @@ class GoogleDocsService:
             # This removes 1-2 seconds of unnecessary API call overhead
             # If it's actually a file, the recursive function will handle it gracefully
             
+            traversal = (traversal or settings.drive_traversal_mode).lower()
+            logger.info(f"Traversal mode: {traversal}")
+            
+            folder_page = None
+            if traversal == "auto":
+                key = (get_drive_request_context()[0], folder_id)
+                choice = self._traversal_choices.get(key)
+                if choice and time.monotonic() - choice[1] < settings.drive_traversal_choice_ttl_seconds:
+                    traversal = choice[0]
+                    logger.info(f"🧭 Reusing {traversal} scan chosen for {folder_id}")
+                else:
+                    traversal, folder_page = await self._choose_traversal(folder_id, access_token)
+                    self._remember_traversal(key, traversal)
+            
             all_documents = []
-            await self._get_documents_recursive(folder_id, access_token, all_documents, "")
+            if traversal == "materialized":
+                await self._get_documents_materialized(folder_id, access_token, all_documents, folder_page)
+            elif traversal == "batched":
+                await self._get_documents_batched(folder_id, access_token, all_documents)
+            else:
+                await self._get_documents_recursive(folder_id, access_token, all_documents, "")
             
             logger.info(f"🎯 Found {len(all_documents)} total documents in folder and subfolders")
             return all_documents
@@ -419,94 +530,9 @@ class GoogleDocsService:
             logger.info(f"=== RECURSIVE SEARCH IN FOLDER {folder_id} ===")
             logger.info(f"Current folder name: {current_folder_name}")
             
-            query = (f"'{folder_id}' in parents and "
-                    "(mimeType='application/vnd.openxmlformats-officedocument.wordprocessingml.document' or "
-                    "mimeType='application/pdf' or "
-                    "mimeType='text/plain' or "
-                    "mimeType='application/vnd.openxmlformats-officedocument.presentationml.presentation' or "
-                    "mimeType='application/vnd.google-apps.document' or "
-                    "mimeType='application/vnd.google-apps.presentation' or "
-                    "mimeType='application/vnd.google-apps.folder') and "
-                    "trashed=false")
-            
-            url = f"{self.drive_api_base}/files"
-            
-            headers = {
-                'Content-Type': 'application/json'
-            }
-            
-            if access_token:
-                headers['Authorization'] = f'Bearer {access_token}'
-            
-            # Use connection pooling
-            client = await get_http_client()
+            query = f"'{folder_id}' in parents and {FOLDER_SCAN_MIME_FILTER}"
             
-            # Collect all files from all pages
-            all_files = []
-            page_token = None
-            page_count = 0
-            
-            # Pagination loop to get ALL files (not just first 50)
-            while True:
-                page_count += 1
-                params = {
-                    'q': query,
-                    'pageSize': 1000,  # Maximum allowed by Google Drive API
-                    'fields': 'nextPageToken,files(id,name,createdTime,modifiedTime,webViewLink,size,mimeType,parents)'
-                }
-                
-                if page_token:
-                    params['pageToken'] = page_token
-                
-                # Use debug logging for per-page updates to reduce overhead
-                if page_count == 1 or page_count % 5 == 0:  # Log every 5th page
-                    logger.info(f"📄 Fetching page {page_count} for folder {folder_id}")
-                else:
-                    logger.debug(f"📄 Fetching page {page_count} for folder {folder_id}")
-                
-                # Use semaphore to control concurrent requests
-                async with self._semaphore:
-                    # Retry logic for pagination
-                    import random
-                    import asyncio
-                    
-                    for attempt in range(3):
-                        try:
-                            response = await client.get(url, params=params, headers=headers)
-                            
-                            if response.status_code == 200:
-                                break
-                                
-                            if 500 <= response.status_code < 600:
-                                logger.warning(f"Google Drive 5xx error (Attempt {attempt+1}/3) on page {page_count}: {response.status_code}")
-                                if attempt == 2: raise Exception(f"Server error {response.status_code}")
-                                await asyncio.sleep((2 ** attempt) + random.random())
-                                continue
-                            
-                            # Client error (4xx) - do not retry
-                            break
-                            
-                        except Exception as e:
-                            logger.warning(f"Network error (Attempt {attempt+1}/3) on page {page_count}: {e}")
-                            if attempt == 2: raise e
-                            await asyncio.sleep((2 ** attempt) + random.random())
-                
-                if response.status_code != 200:
-                    logger.error(f"Drive API error: {response.status_code} - {response.text}")
-                    break
-                
-                data = response.json()
-                files = data.get('files', [])
-                all_files.extend(files)
-                
-                # Reduce logging frequency
-                if page_count == 1 or page_count % 5 == 0 or not data.get('nextPageToken'):
-                    logger.info(f"✅ Page {page_count}: Found {len(files)} items (Total: {len(all_files)})")
-                
-                # Check if there are more pages
-                page_token = data.get('nextPageToken')
-                if not page_token:
-                    break
+            all_files, page_count, _ = await self._list_files_paginated(query, access_token, folder_id)
             
             logger.info(f"🎯 Total {len(all_files)} items found in folder {folder_id} across {page_count} page(s)")
             
@@ -539,32 +565,7 @@ class GoogleDocsService:
                 chunk = documents[chunk_start:chunk_end]
                 
                 for file in chunk:
-                    mime_type = file.get('mimeType', '')
-                    file_name = file.get('name', '')
-                    file_id = file.get('id', '')
-                    
-                    parents = file.get('parents', [])
-                    parent_id = parents[0] if parents else None
-                    
-                    file_extension = self._get_file_extension(file_name)
-                    if not file_extension:
-                        file_extension = self._mime_to_extension(mime_type)
-                    
-                    document = {
-                        'id': file_id,
-                        'name': file_name,
-                        'mime_type': mime_type,
-                        'created_time': file.get('createdTime'),
-                        'modified_time': file.get('modifiedTime'),
-                        'web_view_link': file.get('webViewLink'),
-                        'size': file.get('size'),
-                        'parent_id': parent_id,
-                        'is_folder': False,
-                        'file_extension': file_extension,
-                        'source_subfolder': current_folder_name if current_folder_name else None
-                    }
-                    
-                    all_documents.append(document)
+                    all_documents.append(self._build_folder_document(file, current_folder_name))
                 
                 if total_docs > chunk_size and chunk_end < total_docs:
                     logger.debug(f"   Processed {chunk_end}/{total_docs} documents...")
@@ -645,38 +646,674 @@ class GoogleDocsService:
         except Exception as e:
             logger.error(f"Error in recursive document fetch for folder {folder_id}: {e}", exc_info=True)
     
-    async def get_document_content(self, access_token: str, document_id: str, mime_type: str = None) -> str:
-        """Get the content of a Google Doc with async retry logic"""
+    def _build_folder_document(self, file: Dict[str, Any], current_folder_name: str = "") -> Dict[str, Any]:
+        """Convert a Drive file entry found during a folder scan into our document dict"""
+        mime_type = file.get('mimeType', '')
+        file_name = file.get('name', '')
+        
+        parents = file.get('parents', [])
+        parent_id = parents[0] if parents else None
+        
+        file_extension = self._get_file_extension(file_name)
+        if not file_extension:
+            file_extension = self._mime_to_extension(mime_type)
+        
+        return {
+            'id': file.get('id', ''),
+            'name': file_name,
+            'mime_type': mime_type,
+            'created_time': file.get('createdTime'),
+            'modified_time': file.get('modifiedTime'),
+            'web_view_link': file.get('webViewLink'),
+            'size': file.get('size'),
+            'parent_id': parent_id,
+            'is_folder': False,
+            'file_extension': file_extension,
+            'source_subfolder': current_folder_name if current_folder_name else None
+        }
+    
+    async def _iter_file_pages(
+        self,
+        query: str,
+        access_token: str,
+        label: str = "",
+        fields: str = None,
+        extra_params: Dict[str, Any] = None,
+        page_token: str = None
+    ) -> AsyncIterator[Tuple[List[Dict[str, Any]], str]]:
+        """
+        Run a files.list query and yield each page as soon as it arrives.
+        
+        Yields:
+            (files on this page, nextPageToken or None)
+        """
+        import random
+        
+        url = f"{self.drive_api_base}/files"
+        
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        
+        if access_token:
+            headers['Authorization'] = f'Bearer {access_token}'
+        
+        page_count = 0
+        total_files = 0
+        
+        # Pagination loop to get ALL files (not just first 50)
+        while True:
+            page_count += 1
+            params = {
+                'q': query,
+                'pageSize': 1000,  # Maximum allowed by Google Drive API
+                'fields': fields or 'nextPageToken,files(id,name,createdTime,modifiedTime,webViewLink,size,mimeType,parents)'
+            }
+            if extra_params:
+                params.update(extra_params)
+            
+            if page_token:
+                params['pageToken'] = page_token
+            
+            # Use debug logging for per-page updates to reduce overhead
+            if page_count == 1 or page_count % 5 == 0:  # Log every 5th page
+                logger.info(f"📄 Fetching page {page_count} for folder {label}")
+            else:
+                logger.debug(f"📄 Fetching page {page_count} for folder {label}")
+            
+            # Throttling (403 rate limit / 429 / 5xx) is retried by the adaptive limiter;
+            # network errors are retried here
+            for attempt in range(3):
+                try:
+                    self._request_stats['files_list'] += 1
+                    response = await self._google_get(url, params=params, headers=headers)
+                    break
+                except Exception as e:
+                    logger.warning(f"Network error (Attempt {attempt+1}/3) on page {page_count}: {e}")
+                    if attempt == 2: raise e
+                    await asyncio.sleep((2 ** attempt) + random.random())
+            
+            if 500 <= response.status_code < 600:
+                raise Exception(f"Server error {response.status_code}")
+            
+            if response.status_code != 200:
+                logger.error(f"Drive API error: {response.status_code} - {response.text}")
+                return
+            
+            data = response.json()
+            files = data.get('files', [])
+            total_files += len(files)
+            page_token = data.get('nextPageToken')
+            
+            # Reduce logging frequency
+            if page_count == 1 or page_count % 5 == 0 or not page_token:
+                logger.info(f"✅ Page {page_count}: Found {len(files)} items (Total: {total_files})")
+            
+            yield files, page_token
+            
+            # Check if there are more pages
+            if not page_token:
+                return
+    
+    async def _list_files_paginated(
+        self,
+        query: str,
+        access_token: str,
+        label: str = "",
+        fields: str = None,
+        extra_params: Dict[str, Any] = None,
+        page_token: str = None,
+        max_pages: int = None
+    ) -> Tuple[List[Dict[str, Any]], int, str]:
+        """
+        Run a files.list query and follow nextPageToken until exhausted (or max_pages reached).
+        
+        Returns:
+            (all files across pages, number of pages fetched, nextPageToken left over or None)
+        """
+        all_files = []
+        page_count = 0
+        next_token = None
+        
+        pages = self._iter_file_pages(query, access_token, label, fields, extra_params, page_token)
+        async with aclosing(pages):
+            async for files, next_token in pages:
+                page_count += 1
+                all_files.extend(files)
+                if max_pages and page_count >= max_pages:
+                    break
+        
+        return all_files, page_count, next_token
+    
+    def _pack_parent_queries(self, folder_ids: List[str]) -> List[List[str]]:
+        """
+        Pack folder ids into groups whose combined
+        "('a' in parents or 'b' in parents ...)" clause stays under the query limits.
+        """
+        groups = []
+        current = []
+        current_length = len(FOLDER_SCAN_MIME_FILTER) + 4  # "(" + ") and " overhead
+        
+        for folder_id in folder_ids:
+            clause_length = len(f"'{folder_id}' in parents") + len(" or ")
+            if current and (current_length + clause_length > self.batch_query_max_length
+                            or len(current) >= self.batch_query_max_parents):
+                groups.append(current)
+                current = []
+                current_length = len(FOLDER_SCAN_MIME_FILTER) + 4
+            current.append(folder_id)
+            current_length += clause_length
+        
+        if current:
+            groups.append(current)
+        return groups
+    
+    async def _get_documents_batched(self, root_folder_id: str, access_token: str, all_documents: List[Dict[str, Any]]):
+        """
+        Breadth-first folder scan that lists many sibling folders per files.list call.
+        
+        Each level of the tree is packed into combined "'a' in parents or 'b' in parents"
+        queries and the results are split back out by their `parents` field, so a tree of
+        many small folders costs a handful of paginated calls per level instead of one per folder.
+        """
+        import time
+        start_time = time.time()
+        
+        folder_names = {root_folder_id: ""}
+        visited = {root_folder_id}
+        level = [root_folder_id]
+        depth = 0
+        
+        while level:
+            depth += 1
+            groups = self._pack_parent_queries(level)
+            logger.info(f"📚 Level {depth}: {len(level)} folder(s) packed into {len(groups)} batched quer{'y' if len(groups) == 1 else 'ies'}")
+            
+            async def scan_group(group: List[str]) -> Tuple[List[str], List[Dict[str, Any]]]:
+                parents_clause = " or ".join(f"'{folder_id}' in parents" for folder_id in group)
+                query = f"({parents_clause}) and {FOLDER_SCAN_MIME_FILTER}"
+                files, _, _ = await self._list_files_paginated(query, access_token, f"batch of {len(group)}")
+                return group, files
+            
+            results = await asyncio.gather(*(scan_group(group) for group in groups), return_exceptions=True)
+            
+            next_level = []
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"Error in batched folder scan at level {depth}: {result}")
+                    continue
+                
+                group, files = result
+                group_ids = set(group)
+                
+                for file in files:
+                    # A file can live in several scanned folders; attribute it to each one,
+                    # exactly like the per-folder recursion would
+                    matched_parents = [p for p in file.get('parents', []) if p in group_ids]
+                    
+                    if file.get('mimeType') == 'application/vnd.google-apps.folder':
+                        folder_id = file.get('id', '')
+                        if folder_id and folder_id not in visited:
+                            visited.add(folder_id)
+                            folder_names[folder_id] = file.get('name', '')
+                            next_level.append(folder_id)
+                        continue
+                    
+                    for parent_id in matched_parents:
+                        all_documents.append(self._build_folder_document(file, folder_names.get(parent_id, "")))
+            
+            level = next_level
+        
+        logger.info(f"🎉 Batched scan finished: {len(visited)} folder(s), {depth} level(s) in {time.time() - start_time:.1f}s")
+    
+    async def iter_documents_from_folder(self, folder_url: str, access_token: str = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Stream every document under a folder, one batch per Drive page as it arrives.
+        
+        Subfolders found on a page are scheduled immediately (packed into multi-parent
+        queries) instead of waiting for the whole level, so the first batch is available
+        after a single round trip. Closing the generator early (e.g. the client
+        disconnected) cancels every outstanding folder task.
+        """
+        root_folder_id = self._extract_folder_id_from_url(folder_url)
+        
+        queue: asyncio.Queue = asyncio.Queue()
+        folder_names = {root_folder_id: ""}
+        tasks = set()
+        done_marker = object()
+        
+        async def scan_group(group: List[str]):
+            group_ids = set(group)
+            parents_clause = " or ".join(f"'{folder_id}' in parents" for folder_id in group)
+            query = f"({parents_clause}) and {FOLDER_SCAN_MIME_FILTER}"
+            
+            pages = self._iter_file_pages(query, access_token, f"stream batch of {len(group)}")
+            async with aclosing(pages):
+                async for files, _ in pages:
+                    documents = []
+                    subfolders = []
+                    
+                    for file in files:
+                        if file.get('mimeType') == 'application/vnd.google-apps.folder':
+                            folder_id = file.get('id', '')
+                            if folder_id and folder_id not in folder_names:
+                                folder_names[folder_id] = file.get('name', '')
+                                subfolders.append(folder_id)
+                            continue
+                        
+                        for parent_id in file.get('parents', []):
+                            if parent_id in group_ids:
+                                documents.append(self._build_folder_document(file, folder_names.get(parent_id, "")))
+                    
+                    # Descend right away - don't wait for the rest of this folder or level
+                    for subgroup in self._pack_parent_queries(subfolders):
+                        spawn(subgroup)
+                    
+                    if documents:
+                        queue.put_nowait(documents)
+        
+        def on_done(task: asyncio.Task):
+            tasks.discard(task)
+            if not task.cancelled() and task.exception():
+                logger.error(f"Error in streaming folder scan: {task.exception()}")
+            if not tasks:
+                queue.put_nowait(done_marker)
+        
+        def spawn(group: List[str]):
+            task = asyncio.create_task(scan_group(group))
+            tasks.add(task)
+            task.add_done_callback(on_done)
+        
+        spawn([root_folder_id])
+        
+        try:
+            while True:
+                batch = await queue.get()
+                if batch is done_marker:
+                    break
+                yield batch
+        finally:
+            pending = list(tasks)
+            if pending:
+                logger.info(f"🛑 Folder stream closed early, cancelling {len(pending)} folder task(s)")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+    
+    def _collect_subtree_folders(self, root_folder_id: str, folders: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Rebuild the folder tree from `parents` and return {folder_id: name} for everything under root"""
+        children = {}
+        for folder in folders:
+            for parent_id in folder.get('parents', []):
+                children.setdefault(parent_id, []).append(folder)
+        
+        names = {root_folder_id: ""}
+        stack = [root_folder_id]
+        while stack:
+            parent_id = stack.pop()
+            for folder in children.get(parent_id, []):
+                folder_id = folder.get('id', '')
+                if folder_id and folder_id not in names:
+                    names[folder_id] = folder.get('name', '')
+                    stack.append(folder_id)
+        return names
+    
+    def _remember_traversal(self, key: Tuple[str, str], traversal: str):
+        self._traversal_choices.pop(key, None)
+        self._traversal_choices[key] = (traversal, time.monotonic())
+        while len(self._traversal_choices) > self.traversal_choices_max:
+            self._traversal_choices.popitem(last=False)
+    
+    async def _choose_traversal(self, root_folder_id: str, access_token: str) -> Tuple[str, Tuple[List[Dict[str, Any]], str]]:
+        """
+        Estimate how much of the drive the scan covers from the first page of the
+        drive-wide folder listing and pick a traversal strategy.
+        
+        Materializing costs roughly (all folders + all documents) / 1000 requests no matter
+        where the root sits, so it only wins when the subtree is both large and a big
+        share of the drive. The fetched page is returned so it is not listed twice.
+        """
+        folders, _, next_token = await self._list_files_paginated(
+            FOLDER_LIST_QUERY, access_token, "folder estimate",
+            fields='nextPageToken,files(id,name,parents)',
+            extra_params=ALL_DRIVES_PARAMS,
+            max_pages=1
+        )
+        
+        estimated_subtree = len(self._collect_subtree_folders(root_folder_id, folders)) - 1
+        coverage = estimated_subtree / len(folders) if folders else 0.0
+        
+        if (estimated_subtree >= settings.drive_materialize_min_folders
+                and coverage >= settings.drive_materialize_min_coverage):
+            traversal = "materialized"
+        else:
+            traversal = "batched"
+        
+        logger.info(f"🧭 Estimated {estimated_subtree} subfolder(s) under root out of {len(folders)}{'+' if next_token else ''} "
+                    f"drive folder(s) ({coverage:.0%} coverage) -> {traversal} scan")
+        return traversal, (folders, next_token)
+    
+    async def _get_documents_materialized(
+        self,
+        root_folder_id: str,
+        access_token: str,
+        all_documents: List[Dict[str, Any]],
+        folder_page: Tuple[List[Dict[str, Any]], str] = None
+    ):
+        """
+        Scan a folder tree by listing every folder and every candidate document in the
+        drive once (pageSize=1000) and rebuilding the hierarchy locally from `parents`.
+        
+        Produces the same documents (and source_subfolder names) as the recursive walk.
+        """
+        start_time = time.time()
+        
+        async def list_folders() -> List[Dict[str, Any]]:
+            if folder_page is not None:
+                folders, next_token = folder_page
+                if not next_token:
+                    return list(folders)
+                more, _, _ = await self._list_files_paginated(
+                    FOLDER_LIST_QUERY, access_token, "all folders",
+                    fields='nextPageToken,files(id,name,parents)',
+                    extra_params=ALL_DRIVES_PARAMS,
+                    page_token=next_token
+                )
+                return list(folders) + more
+            folders, _, _ = await self._list_files_paginated(
+                FOLDER_LIST_QUERY, access_token, "all folders",
+                fields='nextPageToken,files(id,name,parents)',
+                extra_params=ALL_DRIVES_PARAMS
+            )
+            return folders
+        
+        async def list_documents() -> List[Dict[str, Any]]:
+            documents, _, _ = await self._list_files_paginated(
+                DOCUMENT_MIME_FILTER, access_token, "all documents",
+                extra_params=ALL_DRIVES_PARAMS
+            )
+            return documents
+        
+        # Folder and document listings are independent - fetch them concurrently
+        folders, documents = await asyncio.gather(list_folders(), list_documents())
+        
+        folder_names = self._collect_subtree_folders(root_folder_id, folders)
+        
+        for file in documents:
+            for parent_id in file.get('parents', []):
+                if parent_id in folder_names:
+                    all_documents.append(self._build_folder_document(file, folder_names[parent_id]))
+        
+        logger.info(f"🌳 Materialized scan: {len(folders)} drive folder(s), {len(documents)} drive document(s) -> "
+                    f"{len(folder_names)} folder(s) and {len(all_documents)} document(s) under root in {time.time() - start_time:.1f}s")
+    
+    async def list_all_documents_indexed(
+        self,
+        folder_url: str,
+        access_token: str,
+        user_id: str,
+        refresh: str = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        List every document under a folder, served from the persistent Drive tree index.
+        
+        A fresh index entry is returned without touching Drive. Stale entries (or
+        refresh="incremental") apply the Drive changes since the last refresh; missing
+        entries and refresh="full" re-list every folder.
+        
+        Returns:
+            (documents, {'status': 'hit'|'miss'|'refresh', 'age_seconds': float, 'relisted_folders': int})
+        """
+        folder_id = self._extract_folder_id_from_url(folder_url)
+        index = get_drive_index()
+        loop = asyncio.get_running_loop()
+        
+        root = await loop.run_in_executor(None, index.get_root, user_id, folder_id)
+        
+        if root and not refresh and root['age_seconds'] < settings.drive_index_max_age_seconds:
+            documents = await loop.run_in_executor(None, index.get_documents, user_id, folder_id)
+            logger.info(f"⚡ Drive index hit for {folder_id}: {len(documents)} documents (age {root['age_seconds']:.0f}s)")
+            return documents, {'status': 'hit', 'age_seconds': root['age_seconds'], 'relisted_folders': 0}
+        
+        relisted = await self._refresh_drive_index(folder_id, access_token, user_id, full=(refresh == "full"))
+        documents = await loop.run_in_executor(None, index.get_documents, user_id, folder_id)
+        return documents, {'status': 'refresh' if root else 'miss', 'age_seconds': 0.0, 'relisted_folders': relisted}
+    
+    async def _refresh_drive_index(self, root_folder_id: str, access_token: str, user_id: str, full: bool = False) -> int:
+        """
+        Bring the Drive tree index for a root up to date.
+        
+        The first (or a full) refresh lists the tree and records a Changes API start token.
+        Later refreshes read only the changes since that token: edited, added, moved and
+        removed documents are updated in place (a folder's modifiedTime does not change when
+        a file in it is edited), and the folder tree is re-listed only when folders under the
+        root changed. Returns the number of re-listed folders.
+        """
+        index = get_drive_index()
+        loop = asyncio.get_running_loop()
+        
+        root = await loop.run_in_executor(None, index.get_root, user_id, root_folder_id)
+        changes_token = root['changes_token'] if root else None
+        if full or not changes_token:
+            start_token = await self._get_changes_start_token(access_token)
+            return await self._refresh_drive_tree(root_folder_id, access_token, user_id, full, start_token)
+        
+        listed = await self._list_changes(changes_token, access_token)
+        if listed is None:
+            logger.warning(f"🔄 Drive changes token for {root_folder_id} was rejected, re-listing every folder")
+            start_token = await self._get_changes_start_token(access_token)
+            return await self._refresh_drive_tree(root_folder_id, access_token, user_id, True, start_token)
+        changes, new_token = listed
+        
+        folder_ids = set(await loop.run_in_executor(None, index.get_folder_times, user_id, root_folder_id))
+        relisted = 0
+        tree_changed = any(
+            (change.get('file') or {}).get('mimeType') == FOLDER_MIME_TYPE or change.get('removed')
+            for change in changes
+            if change.get('fileId') in folder_ids
+            or folder_ids.intersection((change.get('file') or {}).get('parents', []))
+        )
+        if tree_changed:
+            relisted = await self._refresh_drive_tree(root_folder_id, access_token, user_id)
+            folder_ids = set(await loop.run_in_executor(None, index.get_folder_times, user_id, root_folder_id))
+        
+        removed = []
+        files_by_folder = {}
+        for change in changes:
+            file = change.get('file') or {}
+            parents = [parent_id for parent_id in file.get('parents', []) if parent_id in folder_ids]
+            if change.get('removed') or file.get('trashed') or file.get('mimeType') not in DOCUMENT_MIME_TYPES or not parents:
+                removed.append(change.get('fileId'))
+                continue
+            for parent_id in parents:
+                files_by_folder.setdefault(parent_id, []).append(self._build_folder_document(file))
+        
+        await loop.run_in_executor(
+            None, index.apply_file_changes, user_id, root_folder_id, removed, files_by_folder, new_token
+        )
+        logger.info(f"🔄 Drive index refresh for {root_folder_id}: {len(changes)} drive change(s), "
+                    f"{sum(len(docs) for docs in files_by_folder.values())} document(s) updated, {relisted} folder(s) re-listed")
+        return relisted
+    
+    async def _get_changes_start_token(self, access_token: str) -> Optional[str]:
+        """Changes API token for "now" (None if Drive does not hand one out)"""
+        self._request_stats['changes'] += 1
+        response = await self._google_get(
+            f"{self.drive_api_base}/changes/startPageToken",
+            params={'supportsAllDrives': 'true'},
+            headers={'Authorization': f'Bearer {access_token}'}
+        )
+        if response.status_code != 200:
+            logger.warning(f"Could not get a Drive changes token: {response.status_code}")
+            return None
+        return response.json().get('startPageToken')
+    
+    async def _list_changes(self, page_token: str, access_token: str) -> Optional[Tuple[List[Dict[str, Any]], str]]:
+        """
+        Every change since `page_token`
+        
+        Returns:
+            (changes, token to resume from), or None if Drive rejected the token
+        """
+        changes = []
+        while True:
+            params = {
+                'pageToken': page_token,
+                'pageSize': 1000,
+                'includeRemoved': 'true',
+                'includeItemsFromAllDrives': 'true',
+                'supportsAllDrives': 'true',
+                'fields': 'nextPageToken,newStartPageToken,changes(fileId,removed,'
+                          'file(id,name,mimeType,parents,trashed,createdTime,modifiedTime,webViewLink,size))'
+            }
+            self._request_stats['changes'] += 1
+            response = await self._google_get(
+                f"{self.drive_api_base}/changes", params=params, headers={'Authorization': f'Bearer {access_token}'}
+            )
+            if 500 <= response.status_code < 600:
+                raise Exception(f"Server error {response.status_code}")
+            if response.status_code != 200:
+                logger.warning(f"Drive changes.list error: {response.status_code} - {response.text}")
+                return None
+            
+            data = response.json()
+            changes.extend(data.get('changes', []))
+            if data.get('newStartPageToken'):
+                return changes, data['newStartPageToken']
+            page_token = data.get('nextPageToken')
+            if not page_token:
+                return None
+    
+    async def _refresh_drive_tree(
+        self,
+        root_folder_id: str,
+        access_token: str,
+        user_id: str,
+        full: bool = False,
+        changes_token: Optional[str] = None
+    ) -> int:
+        """
+        Re-list the folder tree of an indexed root.
+        
+        One drive-wide folder listing gives the current tree and every folder's modifiedTime;
+        new folders and folders whose modifiedTime changed (every folder when `full`) are
+        re-listed with batched multi-parent queries. Returns the number of re-listed folders.
+        """
+        index = get_drive_index()
+        loop = asyncio.get_running_loop()
+        
+        folders, _, _ = await self._list_files_paginated(
+            FOLDER_LIST_QUERY, access_token, "index folders",
+            fields='nextPageToken,files(id,name,parents,modifiedTime)',
+            extra_params=ALL_DRIVES_PARAMS
+        )
+        folder_names = self._collect_subtree_folders(root_folder_id, folders)
+        folders_by_id = {folder['id']: folder for folder in folders if 'id' in folder}
+        
+        current = {}
+        for folder_id, name in folder_names.items():
+            folder = folders_by_id.get(folder_id, {})
+            parents = folder.get('parents', [])
+            current[folder_id] = {
+                'name': name,
+                'parent_id': parents[0] if parents else None,
+                'modified_time': folder.get('modifiedTime')
+            }
+        
+        stored = await loop.run_in_executor(None, index.get_folder_times, user_id, root_folder_id)
+        changed = [
+            folder_id for folder_id, info in current.items()
+            if full
+            or folder_id not in stored
+            or info['modified_time'] is None
+            or stored[folder_id] != info['modified_time']
+        ]
+        logger.info(f"🔄 Drive index refresh for {root_folder_id}: {len(changed)}/{len(current)} folder(s) changed")
+        
+        async def list_group(group: List[str]) -> Tuple[List[str], List[Dict[str, Any]]]:
+            parents_clause = " or ".join(f"'{folder_id}' in parents" for folder_id in group)
+            query = f"({parents_clause}) and {DOCUMENT_MIME_FILTER}"
+            files, _, _ = await self._list_files_paginated(query, access_token, f"index batch of {len(group)}")
+            return group, files
+        
+        groups = self._pack_parent_queries(changed)
+        results = await asyncio.gather(*(list_group(group) for group in groups), return_exceptions=True)
+        
+        files_by_folder = {}
+        for group, result in zip(groups, results):
+            if isinstance(result, Exception):
+                # Keep the old listing and force these folders to be re-listed next time
+                logger.error(f"Drive index refresh failed for {len(group)} folder(s): {result}")
+                for folder_id in group:
+                    current[folder_id]['modified_time'] = None
+                continue
+            
+            _, files = result
+            for folder_id in group:
+                files_by_folder[folder_id] = []
+            for file in files:
+                for parent_id in file.get('parents', []):
+                    if parent_id in files_by_folder:
+                        files_by_folder[parent_id].append(self._build_folder_document(file))
+        
+        await loop.run_in_executor(
+            None, index.apply_refresh, user_id, root_folder_id, current, files_by_folder, changes_token
+        )
+        return len(changed)
+    
+    def get_request_stats(self) -> Dict[str, int]:
+        """Drive API request counters (used to compare traversal strategies)"""
+        return dict(self._request_stats)
+    
+    def reset_request_stats(self):
+        """Reset Drive API request counters"""
+        for key in self._request_stats:
+            self._request_stats[key] = 0
+    
+    async def get_document_content(self, access_token: str, document_id: str, mime_type: str = None, version: str = None) -> str:
+        """
+        Get the content of a Google Doc with async retry logic
+        
+        Args:
+            version: modifiedTime / md5Checksum of the file; when known (or looked up together
+                     with the MIME type) the extracted text cache is consulted first
+        """
         import asyncio
         import random
         
         # Retry up to 3 times for transient errors
         for attempt in range(3):
             try:
-                # Use semaphore for metadata fetch if needed, but usually get_file_info handles it?
-                # Actually get_file_info inside calls get_http_client
-                
                 if not mime_type:
                     try:
-                        file_info = await self._get_file_info(access_token, document_id)
+                        file_info = await self._get_file_info(access_token, document_id, fields='id,mimeType,modifiedTime,md5Checksum')
                         mime_type = file_info.get('mimeType', '')
+                        version = version or self.get_content_version(file_info)
                     except Exception as e:
                         if attempt == 2: raise e
                         logger.warning(f"Metadata fetch attempt {attempt+1} failed: {e}")
                         await asyncio.sleep(1)
                         continue
                 
+                cached = await self._get_cached_text(document_id, version)
+                if cached is not None:
+                    return cached
+                
                 logger.info(f"Extracting content for {document_id} ({mime_type}) - Attempt {attempt+1}")
                 
                 if mime_type == 'application/vnd.google-apps.document':
-                    return await self._get_google_doc_content(access_token, document_id)
+                    content = await self._get_google_doc_content(access_token, document_id)
+                    await self._cache_text(document_id, version, content)
+                    return content
                 
                 elif mime_type in ['application/pdf', 
                                  'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
                                  'application/vnd.openxmlformats-officedocument.presentationml.presentation',
                                  'text/plain',
                                  'application/vnd.google-apps.presentation']:
-                    return await self._export_file_as_text(access_token, document_id, mime_type)
+                    content = await self._export_file_as_text(access_token, document_id, mime_type)
+                    await self._cache_text(document_id, version, content)
+                    return content
                 
                 else:
                     logger.warning(f"Unsupported MIME type: {mime_type}")
@@ -695,6 +1332,32 @@ class GoogleDocsService:
         
         return "Error accessing file content"
     
+    @staticmethod
+    def get_content_version(metadata: Dict[str, Any]) -> str:
+        """Version of a file's content for the text cache: modifiedTime, else md5Checksum"""
+        if not metadata:
+            return None
+        return metadata.get('modifiedTime') or metadata.get('modified_time') or metadata.get('md5Checksum')
+    
+    async def _get_cached_text(self, document_id: str, version: str) -> str:
+        """Extracted text for this file version from the on-disk cache, or None (read off the event loop)"""
+        cache = get_text_cache()
+        if not cache or not version:
+            return None
+        text = await asyncio.get_running_loop().run_in_executor(None, cache.get, document_id, version)
+        if text is not None:
+            logger.debug(f"💾 Text cache hit for {document_id}")
+        return text
+    
+    async def _cache_text(self, document_id: str, version: str, text: str):
+        """Store extracted text unless it is an error/unsupported placeholder (written off the event loop)"""
+        cache = get_text_cache()
+        if not cache or not version or not text or not isinstance(text, str):
+            return
+        if text.startswith(EXTRACTION_FAILURE_PREFIXES):
+            return
+        await asyncio.get_running_loop().run_in_executor(None, cache.put, document_id, version, text)
+    
     async def get_document_metadata(self, access_token: str, document_id: str) -> Dict[str, Any]:
         try:
             return await self._get_file_info(access_token, document_id)
@@ -706,18 +1369,201 @@ class GoogleDocsService:
         url = f"{self.drive_api_base}/files/{file_id}"
         headers = {'Authorization': f'Bearer {access_token}'}
         
-        # Use connection pooling
-        client = await get_http_client()
         params = {}
         if fields:
             params['fields'] = fields
-        response = await client.get(url, headers=headers, params=params)
+        self._request_stats['files_get'] += 1
+        response = await self._google_get(url, headers=headers, params=params)
             
         if response.status_code != 200:
             raise Exception(f"Failed to get file info: {response.status_code}")
             
         return response.json()
     
+    async def get_documents_metadata_batch(
+        self,
+        access_token: str,
+        document_ids: List[str],
+        fields: str = "id,name,mimeType,size,modifiedTime,md5Checksum"
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch metadata for many files through Drive's multipart batch endpoint
+        (up to 100 files.get calls per HTTP request).
+        
+        Returns:
+            {document_id: metadata} - ids that failed or are not accessible map to None
+        """
+        unique_ids = list(dict.fromkeys(document_ids))
+        chunks = [unique_ids[i:i + self.batch_max_requests] for i in range(0, len(unique_ids), self.batch_max_requests)]
+        
+        results = await asyncio.gather(
+            *(self._get_metadata_batch_chunk(access_token, chunk, fields) for chunk in chunks),
+            return_exceptions=True
+        )
+        
+        metadata = {}
+        fallback_ids = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Batch metadata request failed for {len(chunk)} file(s), falling back to single requests: {result}")
+                fallback_ids.extend(chunk)
+            else:
+                metadata.update(result)
+        
+        if fallback_ids:
+            singles = await asyncio.gather(*(self.get_document_metadata(access_token, doc_id) for doc_id in fallback_ids))
+            metadata.update(zip(fallback_ids, singles))
+        
+        found = sum(1 for value in metadata.values() if value)
+        logger.info(f"📦 Batch metadata: {found}/{len(unique_ids)} files in {len(chunks)} batch request(s)")
+        return metadata
+    
+    async def _get_metadata_batch_chunk(self, access_token: str, document_ids: List[str], fields: str) -> Dict[str, Dict[str, Any]]:
+        """Send one multipart/mixed batch of files.get calls and parse the multipart reply"""
+        import uuid
+        from urllib.parse import quote
+        
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for i, document_id in enumerate(document_ids):
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <item{i}>\r\n"
+                "\r\n"
+                f"GET /drive/v3/files/{quote(document_id)}?fields={quote(fields)}&supportsAllDrives=true\r\n"
+                "\r\n"
+            )
+        body = "".join(parts) + f"--{boundary}--\r\n"
+        
+        headers = {
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': f'multipart/mixed; boundary={boundary}'
+        }
+        
+        self._request_stats['batch'] += 1
+        response = await self._google_post(self.batch_api_url, content=body.encode('utf-8'), headers=headers)
+        
+        if response.status_code != 200:
+            raise Exception(f"Batch request failed: {response.status_code}")
+        
+        replies = self._parse_batch_response(response.text, response.headers.get('content-type', ''))
+        
+        metadata = {}
+        throttled_ids = []
+        for i, document_id in enumerate(document_ids):
+            status_code, payload = replies.get(i, (None, None))
+            if status_code == 200 and payload:
+                metadata[document_id] = payload
+            elif status_code == 429 or (status_code or 0) >= 500 or (status_code == 403 and 'ratelimitexceeded' in json.dumps(payload).lower()):
+                throttled_ids.append(document_id)
+            else:
+                logger.debug(f"Batch metadata for {document_id} failed: {status_code}")
+                metadata[document_id] = None
+        
+        if throttled_ids:
+            # Throttled inner calls are retried one by one under the adaptive limiter
+            logger.warning(f"🚦 {len(throttled_ids)} batch item(s) throttled, retrying individually")
+            singles = await asyncio.gather(*(self.get_document_metadata(access_token, doc_id) for doc_id in throttled_ids))
+            metadata.update(zip(throttled_ids, singles))
+        return metadata
+    
+    def _parse_batch_response(self, text: str, content_type: str) -> Dict[int, Tuple[int, Dict[str, Any]]]:
+        """
+        Parse a multipart/mixed batch reply into {item index: (status code, JSON body)}.
+        Items are matched through their "Content-ID: <response-itemN>" header.
+        """
+        import re
+        
+        match = re.search(r'boundary="?([^";]+)"?', content_type)
+        if not match:
+            raise Exception("Batch response has no multipart boundary")
+        boundary = match.group(1)
+        
+        replies = {}
+        for part in text.split(f"--{boundary}"):
+            part = part.strip()
+            if not part or part == "--":
+                continue
+            
+            content_id = re.search(r'Content-ID:\s*<response-item(\d+)>', part, re.IGNORECASE)
+            status_line = re.search(r'HTTP/[\d.]+\s+(\d{3})', part)
+            if not content_id or not status_line:
+                continue
+            
+            payload = None
+            json_start = part.find('{')
+            if json_start != -1:
+                try:
+                    payload = json.loads(part[json_start:part.rfind('}') + 1])
+                except ValueError:
+                    payload = None
+            
+            replies[int(content_id.group(1))] = (int(status_line.group(1)), payload)
+        return replies
+    
+    async def fetch_document_text(self, access_token: str, document_id: str, mime_type: str, version: str = None) -> Dict[str, Any]:
+        """
+        Download + extract one document when its MIME type is already known
+        (no extra metadata round trip). Returns {'content': str} or {'error': str}.
+        """
+        download = await self.download_document_raw(access_token, document_id, mime_type, version)
+        if download.get('error') or download.get('data') is None:
+            return {'error': download.get('error', 'Download failed')}
+        
+        if not download['is_binary']:
+            return {'content': download['data']}
+        
+        content = await self.extract_text_from_raw(download['data'], download['mime_type'], document_id, version)
+        return {'content': content}
+    
+    async def iter_documents_text(
+        self,
+        access_token: str,
+        documents: Dict[str, Dict[str, Any]],
+        concurrency: int,
+        memory_budget=None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Download + extract many documents concurrently, yielding as each one finishes.
+        
+        Args:
+            documents: {document_id: metadata} with at least 'mimeType' (e.g. from get_documents_metadata_batch)
+            concurrency: Max documents in flight at once
+            memory_budget: Optional MemoryBudget; each document waits for admission
+                (estimated from its Drive size) before downloading
+            
+        Yields:
+            (document_id, {'content': str} or {'error': str}) in completion order
+        """
+        limiter = asyncio.Semaphore(max(1, concurrency))
+        
+        async def fetch(document_id: str, metadata: Dict[str, Any]):
+            async with limiter:
+                reserved = 0
+                try:
+                    if memory_budget is not None:
+                        estimate = memory_budget.estimate(metadata)
+                        await memory_budget.acquire(estimate)
+                        reserved = estimate
+                    return document_id, await self.fetch_document_text(
+                        access_token, document_id, metadata.get('mimeType'), self.get_content_version(metadata)
+                    )
+                except Exception as e:
+                    return document_id, {'error': str(e)}
+                finally:
+                    # Once extracted, the text is part of RSS; a cancelled wait never reserved
+                    if reserved:
+                        memory_budget.release(reserved)
+        
+        tasks = [asyncio.create_task(fetch(doc_id, meta)) for doc_id, meta in documents.items()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+    
     async def _get_google_doc_content(self, access_token: str, document_id: str) -> str:
         url = f"{self.docs_api_base}/documents/{document_id}"
         
@@ -726,9 +1572,8 @@ class GoogleDocsService:
             'Content-Type': 'application/json'
         }
         
-        # Use connection pooling
-        client = await get_http_client()
-        response = await client.get(url, headers=headers)
+        self._request_stats['download'] += 1
+        response = await self._google_get(url, headers=headers)
             
         if response.status_code != 200:
             logger.error(f"Docs API error: {response.status_code} - {response.text}")
@@ -801,31 +1646,30 @@ class GoogleDocsService:
         try:
             headers = {'Authorization': f'Bearer {access_token}'}
             content = None
-            client = await get_http_client()
             loop = asyncio.get_running_loop()
             
             if mime_type == 'text/plain':
                 url = f"{self.drive_api_base}/files/{file_id}?alt=media"
-                response = await client.get(url, headers=headers)
+                response = await self._google_get(url, headers=headers)
                 if response.status_code == 200:
                     content = response.text
             
             if not content:
                 url = f"{self.drive_api_base}/files/{file_id}/export?mimeType=text/plain"
-                response = await client.get(url, headers=headers)
+                response = await self._google_get(url, headers=headers)
                 if response.status_code == 200:
                     content = response.text
             
             if not content and mime_type == 'application/pdf':
                 url = f"{self.drive_api_base}/files/{file_id}?alt=media"
-                response = await client.get(url, headers=headers)
+                response = await self._google_get(url, headers=headers)
                 if response.status_code == 200 and PDF_AVAILABLE:
                     logger.info(f"Offloading PDF parsing for {file_id} to thread pool")
                     content = await loop.run_in_executor(None, self._parse_pdf_sync, response.content)
             
             if not content and mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
                 url = f"{self.drive_api_base}/files/{file_id}?alt=media"
-                response = await client.get(url, headers=headers)
+                response = await self._google_get(url, headers=headers)
                 if response.status_code == 200 and DOCX_AVAILABLE:
                     logger.info(f"Offloading DOCX parsing for {file_id} to thread pool")
                     content = await loop.run_in_executor(None, self._parse_docx_sync, response.content)
@@ -833,7 +1677,7 @@ class GoogleDocsService:
             # Extract text from PPTX files
             if not content and mime_type == 'application/vnd.openxmlformats-officedocument.presentationml.presentation':
                 url = f"{self.drive_api_base}/files/{file_id}?alt=media"
-                response = await client.get(url, headers=headers)
+                response = await self._google_get(url, headers=headers)
                 if response.status_code == 200 and PPTX_AVAILABLE:
                     logger.info(f"Offloading PPTX parsing for {file_id} to thread pool")
                     content = await loop.run_in_executor(None, self._parse_pptx_sync, response.content)
@@ -848,18 +1692,25 @@ class GoogleDocsService:
             logger.error(f"Error extracting content from {mime_type}: {e}", exc_info=True)
             return f"Error accessing file content"
 
-    async def download_document_raw(self, access_token: str, document_id: str, mime_type: str = None) -> Dict[str, Any]:
+    async def download_document_raw(self, access_token: str, document_id: str, mime_type: str = None, version: str = None) -> Dict[str, Any]:
         """
         Download raw document content (bytes or text) WITHOUT parsing heavy files (PDF/PPTX).
-        Returns {'data': bytes/str, 'mime_type': str, 'idx': str}
+        Returns {'data': bytes/str, 'mime_type': str, 'is_binary': bool}
+        
+        When `version` (modifiedTime / md5Checksum) is given and the extracted text of that
+        version is cached, no download happens: the text comes back with is_binary=False.
         """
         try:
+            cached = await self._get_cached_text(document_id, version)
+            if cached is not None:
+                return {'data': cached, 'mime_type': 'text/plain', 'is_binary': False, 'cached': True}
+            
             headers = {'Authorization': f'Bearer {access_token}'}
-            client = await get_http_client()
             
             # 1. Handle Google Docs (Native) - Always fetch as text
             if mime_type == 'application/vnd.google-apps.document':
                 content = await self._get_google_doc_content(access_token, document_id)
+                await self._cache_text(document_id, version, content)
                 return {'data': content, 'mime_type': mime_type, 'is_binary': False}
                 
             # 2. Handle Binary Files (PDF, DOCX, PPTX) - Fetch as Bytes
@@ -883,15 +1734,20 @@ class GoogleDocsService:
             else:
                 # Default/Fallback: try export as text
                 url = f"{self.drive_api_base}/files/{document_id}/export?mimeType=text/plain"
-                response = await client.get(url, headers=headers)
+                self._request_stats['download'] += 1
+                response = await self._google_get(url, headers=headers)
                 if response.status_code == 200:
+                    await self._cache_text(document_id, version, response.text)
                     return {'data': response.text, 'mime_type': 'text/plain', 'is_binary': False}
                 return {'data': f"Unsupported type: {mime_type}", 'mime_type': 'text/plain', 'is_binary': False}
             
             # Fetch the binary content
-            response = await client.get(url, headers=headers)
+            self._request_stats['download'] += 1
+            response = await self._google_get(url, headers=headers)
             if response.status_code == 200:
                 is_text = export_mime == 'text/plain'
+                if is_text:
+                    await self._cache_text(document_id, version, response.text)
                 return {
                     'data': response.text if is_text else response.content, 
                     'mime_type': export_mime, 
@@ -905,33 +1761,63 @@ class GoogleDocsService:
             logger.error(f"Error downloading raw document {document_id}: {e}")
             return {'data': None, 'error': str(e)}
 
-    async def extract_text_from_raw(self, raw_data: bytes, mime_type: str) -> str:
+    async def extract_text_from_raw(
+        self,
+        raw_data: bytes,
+        mime_type: str,
+        document_id: str = None,
+        version: str = None,
+        cancel: Optional[CancellationToken] = None
+    ) -> str:
         """
         Extract text from raw binary data. 
         CPU-bound tasks (PDF/PPTX parsing) are offloaded to executor.
+        
+        With `document_id` + `version` the parsed text is looked up in / stored to the text cache.
+        With `cancel`, parsing still queued for an executor thread is skipped once the
+        token is cancelled (OperationCancelled is raised).
         """
+        check_cancelled(cancel)
+        if document_id:
+            cached = await self._get_cached_text(document_id, version)
+            if cached is not None:
+                return cached
+        
         if not raw_data:
             return ""
             
         loop = asyncio.get_running_loop()
         
+        def parse(parser):
+            # Runs when an executor thread picks the job up, which may be long after queueing
+            check_cancelled(cancel)
+            return parser(raw_data)
+        
         try:
             if mime_type == 'application/pdf':
-                 return await loop.run_in_executor(None, self._parse_pdf_sync, raw_data)
+                 text = await loop.run_in_executor(None, parse, self._parse_pdf_sync)
             
             elif mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-                 return await loop.run_in_executor(None, self._parse_docx_sync, raw_data)
+                 text = await loop.run_in_executor(None, parse, self._parse_docx_sync)
             
             elif mime_type == 'application/vnd.openxmlformats-officedocument.presentationml.presentation':
-                 return await loop.run_in_executor(None, self._parse_pptx_sync, raw_data)
+                 text = await loop.run_in_executor(None, parse, self._parse_pptx_sync)
             
             elif mime_type == 'text/plain':
                 if isinstance(raw_data, bytes):
-                    return raw_data.decode('utf-8', errors='ignore')
-                return raw_data
-                
-            return "Content extraction not supported for this type."
+                    text = raw_data.decode('utf-8', errors='ignore')
+                else:
+                    text = raw_data
             
+            else:
+                return "Content extraction not supported for this type."
+            
+            if document_id:
+                await self._cache_text(document_id, version, text)
+            return text
+            
+        except OperationCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error extracting from raw bytes: {e}")
             return f"Extraction error: {str(e)}"
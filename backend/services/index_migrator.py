@@ -0,0 +1,359 @@
+"""
+Background index migrator
+Rebuilds a user's collection with the current chunker / embedding model into a
+shadow collection, from the chunk text already stored in ChromaDB, then swaps the
+shadow in. Queries keep hitting the old collection until the swap. Compaction
+uses the same shadow / swap steps but copies the stored vectors as they are, to
+drop the deleted elements an HNSW index keeps after heavy deletes.
+"""
+
+import asyncio
+import random
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+from utils.cancellation import CancellationToken
+from utils.hnsw_params import search_ef_override
+from utils.index_layout import collection_index_version
+
+logger = logging.getLogger(__name__)
+
+
+class IndexMigrator:
+    """
+    Throttled shadow rebuild + atomic swap of per-user collections.
+
+    One migration runs at a time. Documents are re-chunked and re-embedded in
+    small batches with a pause in between so interactive ingestion and chat keep
+    most of the CPU. Writes that reach the old collection while the rebuild is in
+    progress are replayed into the shadow before and right after the swap.
+    """
+
+    # Catch-up passes before giving up on a quiet moment to swap
+    MAX_CATCH_UP_PASSES = 5
+
+    # Stored vectors queried against the old and the compacted collection
+    LATENCY_PROBES = 20
+
+    def __init__(
+        self,
+        pipeline,
+        batch_documents: int = 20,
+        pause_seconds: float = 0.5,
+        retire_delay_seconds: float = 5.0
+    ):
+        """
+        Initialize migrator
+
+        Args:
+            pipeline: DORAPipeline owning the ChromaDB client and embedding model
+            batch_documents: Documents re-embedded per step
+            pause_seconds: Sleep between steps (the throttle)
+            retire_delay_seconds: Grace period before dropping the old collection,
+                so queries that already resolved it can finish
+        """
+        self.pipeline = pipeline
+        self.batch_documents = max(1, batch_documents)
+        self.pause_seconds = pause_seconds
+        self.retire_delay_seconds = retire_delay_seconds
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._slot: Optional[asyncio.Lock] = None
+
+    def is_running(self, user_id: str) -> bool:
+        task = self._tasks.get(user_id)
+        return task is not None and not task.done()
+
+    def get_status(self, user_id: str) -> Dict[str, Any]:
+        """Progress of the user's latest migration"""
+        return dict(self._status.get(user_id, {'state': 'idle'}))
+
+    def start(self, user_id: str, compact: bool = False) -> Dict[str, Any]:
+        """Start a background migration (or compaction) for the user (no-op if one is running)"""
+        if not self.is_running(user_id):
+            self._status[user_id] = {'state': 'queued', 'queued_at': time.time()}
+            rebuild = self.compact(user_id) if compact else self.migrate(user_id)
+            self._tasks[user_id] = asyncio.create_task(rebuild)
+        return self.get_status(user_id)
+
+    async def wait(self, user_id: str) -> Dict[str, Any]:
+        """Wait for the user's running migration / compaction to finish"""
+        task = self._tasks.get(user_id)
+        if task is not None:
+            await asyncio.wait([task])
+        return self.get_status(user_id)
+
+    def ensure_current(self, user_id: str) -> bool:
+        """
+        Start a migration if the user's collection was built with another version
+
+        Returns:
+            True if a migration is running for the user
+        """
+        if self.is_running(user_id):
+            return True
+        try:
+            stale = self.pipeline.get_index_version(user_id)['stale']
+        except Exception as e:
+            logger.warning(f"Could not check index version for user {user_id}: {e}")
+            return False
+        if stale:
+            self.start(user_id)
+        return stale
+
+    async def cancel(self, user_id: str):
+        """Stop a running migration (its shadow collection is dropped)"""
+        task = self._tasks.get(user_id)
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def migrate(self, user_id: str) -> Dict[str, Any]:
+        """Rebuild the user's collection with the current version and swap it in"""
+        return await self._rebuild(user_id, compact=False)
+
+    async def compact(self, user_id: str) -> Dict[str, Any]:
+        """
+        Copy the user's chunks and vectors into a fresh collection and swap it in
+
+        Nothing is re-embedded and the collection keeps its version; only the
+        HNSW graph is rebuilt without deleted elements, with the HNSW_TIERS
+        parameters for its current size. Query latency on the old and new
+        collection (same stored vectors) is recorded in the status.
+        """
+        return await self._rebuild(user_id, compact=True)
+
+    async def _rebuild(self, user_id: str, compact: bool) -> Dict[str, Any]:
+        kind = 'compaction' if compact else 'migration'
+        if self._slot is None:
+            self._slot = asyncio.Lock()
+
+        async with self._slot:
+            layout = self.pipeline.index_layout
+            source = self.pipeline._get_user_collection(user_id)
+            generation = layout.generation(user_id) + 1
+            shadow_name = layout.collection_name(user_id, generation)
+            status = self._status.setdefault(user_id, {})
+            status.update({
+                'state': 'running',
+                'kind': kind,
+                'from_collection': source.name,
+                'to_collection': shadow_name,
+                'from_version': collection_index_version(source.metadata),
+                'documents_total': 0,
+                'documents_done': 0,
+                'chunks_written': 0,
+                'started_at': time.time()
+            })
+
+            # A crashed earlier run may have left a partial shadow behind
+            try:
+                self.pipeline.drop_collection(shadow_name)
+            except Exception:
+                pass
+            # Compaction keeps the collection's version; a migration stamps the current one
+            # HNSW parameters follow the size the collection has grown to; a search_ef set at runtime carries over
+            shadow = self.pipeline._create_collection(
+                shadow_name, metadata=source.metadata if compact else None, expected_chunks=source.count()
+            )
+            search_ef = search_ef_override(source)
+            if search_ef is not None:
+                shadow.modify(configuration={'hnsw': {'ef_search': search_ef}})
+            layout.begin_tracking(source.name)
+            swapped = False
+            # Stops the embedding thread of the current batch when the task is cancelled
+            cancel = CancellationToken()
+
+            try:
+                document_ids = await self._list_document_ids(source)
+                status['documents_total'] = len(document_ids)
+                logger.warning(f"🔁 Rebuilding index for user {user_id} ({kind}): {len(document_ids)} docs -> {shadow_name}")
+                if compact:
+                    probes = await self._probe_vectors(source)
+                    status['latency_before_ms'] = await self._query_latency(source, probes)
+                    copy = lambda batch: self._copy_chunks(source, shadow, batch)
+                else:
+                    copy = lambda batch: self._copy_documents(user_id, source, shadow, batch, cancel)
+
+                for i in range(0, len(document_ids), self.batch_documents):
+                    batch = document_ids[i:i + self.batch_documents]
+                    status['chunks_written'] += await copy(batch)
+                    status['documents_done'] += len(batch)
+                    await asyncio.sleep(self.pause_seconds)
+
+                # Replay writes that landed on the old collection during the rebuild
+                for _ in range(self.MAX_CATCH_UP_PASSES):
+                    dirty = layout.take_dirty(source.name)
+                    if not dirty:
+                        break
+                    status['chunks_written'] += await copy(sorted(dirty))
+
+                if compact:
+                    # Same chunks, so the counts must match (chunks without a document id would be lost)
+                    loop = asyncio.get_running_loop()
+                    source_count, shadow_count = await asyncio.gather(
+                        loop.run_in_executor(None, source.count), loop.run_in_executor(None, shadow.count)
+                    )
+                    if shadow_count != source_count:
+                        dirty = layout.take_dirty(source.name)
+                        if not dirty:
+                            raise RuntimeError(f"compacted collection holds {shadow_count} chunks, {source.name} {source_count}")
+                        status['chunks_written'] += await copy(sorted(dirty))
+                    status['latency_after_ms'] = await self._query_latency(shadow, probes)
+
+                status['state'] = 'swapping'
+                layout.set_active(user_id, generation)
+                swapped = True
+
+                # Writes that resolved the old collection just before the swap
+                dirty = layout.take_dirty(source.name)
+                if dirty:
+                    status['chunks_written'] += await copy(sorted(dirty))
+                layout.end_tracking(source.name)
+
+                await asyncio.sleep(self.retire_delay_seconds)
+                try:
+                    self.pipeline.drop_collection(source.name)
+                except Exception as e:
+                    logger.warning(f"Could not drop retired collection {source.name}: {e}")
+
+                status.update({'state': 'completed', 'finished_at': time.time()})
+                logger.warning(f"✅ Index for user {user_id} rebuilt ({kind}) in {status['finished_at'] - status['started_at']:.1f}s")
+                if compact:
+                    logger.warning(f"⏱️ Query latency for user {user_id}: {status['latency_before_ms']}ms -> {status['latency_after_ms']}ms")
+                return self.get_status(user_id)
+
+            except (Exception, asyncio.CancelledError) as e:
+                cancel.cancel("migration stopped")
+                layout.end_tracking(source.name)
+                # Drop whichever collection is no longer served
+                try:
+                    self.pipeline.drop_collection(source.name if swapped else shadow_name)
+                except Exception:
+                    pass
+                if isinstance(e, asyncio.CancelledError):
+                    status.update({'state': 'cancelled', 'finished_at': time.time()})
+                    raise
+                status.update({'state': 'failed', 'error': str(e), 'finished_at': time.time()})
+                logger.error(f"Index {kind} failed for user {user_id}: {e}")
+                return self.get_status(user_id)
+
+    async def _list_document_ids(self, collection, page_size: int = 5000) -> List[str]:
+        """Distinct document ids in a collection, paged so metadata never loads at once"""
+        loop = asyncio.get_running_loop()
+        seen: Dict[str, None] = {}
+        offset = 0
+        while True:
+            page = await loop.run_in_executor(
+                None,
+                lambda: collection.get(include=['metadatas'], limit=page_size, offset=offset)
+            )
+            metadatas = page.get('metadatas') or []
+            for meta in metadatas:
+                if meta and 'document_id' in meta:
+                    seen.setdefault(meta['document_id'], None)
+            if len(metadatas) < page_size:
+                return list(seen)
+            offset += page_size
+
+    async def _load_documents(self, collection, document_ids) -> List[Dict[str, Any]]:
+        """Reassemble full document text from a collection's stored chunks"""
+        loop = asyncio.get_running_loop()
+        overlap = collection_index_version(collection.metadata)['index_chunk_overlap']
+        documents = []
+        for document_id in document_ids:
+            result = await loop.run_in_executor(
+                None,
+                lambda: collection.get(where={"document_id": document_id}, include=['documents', 'metadatas'])
+            )
+            if not result.get('ids'):
+                continue
+            chunks = sorted(
+                zip(result['metadatas'], result['documents']),
+                key=lambda item: item[0].get('chunk_index', 0)
+            )
+            meta = chunks[0][0]
+            documents.append({
+                'id': document_id,
+                'name': meta.get('document_name', 'Unknown'),
+                'mime_type': meta.get('mime_type'),
+                'content': self.reassemble_chunks([text for _, text in chunks], overlap)
+            })
+        return documents
+
+    @staticmethod
+    def reassemble_chunks(chunks: List[str], overlap: int) -> str:
+        """
+        Undo _split_text's overlap: every chunk after the first starts with the
+        last `overlap` characters of the previous (un-overlapped) chunk plus a space
+        """
+        originals: List[str] = []
+        for i, chunk in enumerate(chunks):
+            if i > 0 and overlap > 0:
+                prev = originals[-1]
+                prefix = (prev[-overlap:] if len(prev) > overlap else prev) + " "
+                if chunk.startswith(prefix):
+                    chunk = chunk[len(prefix):]
+            originals.append(chunk)
+        return "\n\n".join(originals)
+
+    async def _copy_documents(self, user_id: str, source, shadow, document_ids, cancel: Optional[CancellationToken] = None) -> int:
+        documents = await self._load_documents(source, document_ids)
+        removed = set(document_ids) - {doc['id'] for doc in documents}
+        if removed:
+            # Deleted from the source while the rebuild was running
+            await self.pipeline._writer(shadow).delete(shadow, where={"document_id": {"$in": sorted(removed)}})
+        if not documents:
+            return 0
+        results = await self.pipeline.add_documents_bulk(user_id, documents, collection=shadow, cancel=cancel)
+        return sum(r.get('chunks', 0) for r in results.values() if r.get('success'))
+
+    async def _copy_chunks(self, source, shadow, document_ids) -> int:
+        """Copy documents' stored chunks and vectors as they are (dropping ones the source no longer has)"""
+        loop = asyncio.get_running_loop()
+        where = {"document_id": {"$in": list(document_ids)}}
+        chunks = await loop.run_in_executor(
+            None, lambda: source.get(where=where, include=['embeddings', 'documents', 'metadatas'])
+        )
+        copied = await loop.run_in_executor(None, lambda: shadow.get(where=where, include=[]))
+        writer = self.pipeline._writer(shadow)
+        removed = sorted(set(copied['ids']) - set(chunks['ids']))
+        if removed:
+            await writer.delete(shadow, ids=removed)
+        ids = chunks['ids']
+        batch = self.pipeline.CHROMA_WRITE_BATCH
+        await asyncio.gather(*(
+            writer.upsert(shadow, ids[i:i + batch], chunks['embeddings'][i:i + batch],
+                          chunks['metadatas'][i:i + batch], chunks['documents'][i:i + batch])
+            for i in range(0, len(ids), batch)
+        ))
+        return len(ids)
+
+    async def _probe_vectors(self, collection) -> List[Any]:
+        """A random run of stored vectors to time queries with"""
+        loop = asyncio.get_running_loop()
+        count = await loop.run_in_executor(None, collection.count)
+        offset = random.randrange(max(1, count - self.LATENCY_PROBES + 1))
+        page = await loop.run_in_executor(
+            None, lambda: collection.get(include=['embeddings'], limit=self.LATENCY_PROBES, offset=offset)
+        )
+        return list(page['embeddings'])
+
+    async def _query_latency(self, collection, vectors) -> Optional[float]:
+        """Median query time in ms (after one untimed query that loads the index)"""
+        if not vectors:
+            return None
+        loop = asyncio.get_running_loop()
+        query = lambda vector: collection.query(query_embeddings=[vector], n_results=10, include=['distances'])
+        await loop.run_in_executor(None, query, vectors[0])
+        timings = []
+        for vector in vectors:
+            started = time.perf_counter()
+            await loop.run_in_executor(None, query, vector)
+            timings.append((time.perf_counter() - started) * 1000)
+        return round(statistics.median(timings), 2)
@@ -0,0 +1,364 @@
+"""
+Background integrity verifier and snapshotter for the vector store
+Periodically compares each collection's count() with its rows in
+chroma.sqlite3 and its persisted HNSW index, and queries a few stored chunks
+with their own vectors to check search still finds them. Snapshots are
+per-collection archives; collections unchanged since the previous snapshot
+are hard-linked instead of exported again. Both back off while searches run.
+"""
+
+import asyncio
+import json
+import os
+import random
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from utils.chroma_integrity import collection_problems, inspect_persist_dir
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MANIFEST = 'snapshot.json'
+
+
+class IntegrityVerifier:
+    """
+    Throttled online checks and incremental snapshots of every collection.
+
+    Nothing here stops the API: files are only read, Chroma is only queried,
+    and every step first waits for in-flight searches to finish (up to
+    MAX_YIELD_SECONDS) and then sleeps `pause_seconds`.
+    """
+
+    # Longest a step waits for searches to drain before going ahead anyway
+    MAX_YIELD_SECONDS = 30.0
+
+    # A sampled chunk counts as found if the top hit is itself or an exact duplicate
+    DUPLICATE_DISTANCE = 1e-4
+
+    def __init__(
+        self,
+        pipeline,
+        persist_dir: str,
+        snapshot_dir: Optional[str] = None,
+        check_interval_seconds: float = 6 * 3600,
+        snapshot_interval_seconds: float = 0,
+        keep_snapshots: int = 7,
+        sample_queries: int = 5,
+        pause_seconds: float = 0.2,
+        clock=time.time
+    ):
+        """
+        Initialize verifier
+
+        Args:
+            pipeline: DORAPipeline owning the ChromaDB client
+            persist_dir: ChromaDB persist directory to inspect
+            snapshot_dir: Where snapshots are written (None = no snapshots)
+            check_interval_seconds: Time between integrity checks
+            snapshot_interval_seconds: Time between snapshots (0 = no periodic snapshots)
+            keep_snapshots: Snapshots kept; older ones are deleted
+            sample_queries: Stored chunks queried by their own vector per collection
+            pause_seconds: Sleep between steps (the throttle)
+            clock: Wall-clock time source (injectable for tests)
+        """
+        self.pipeline = pipeline
+        self.persist_dir = persist_dir
+        self.snapshot_dir = snapshot_dir
+        self.check_interval_seconds = check_interval_seconds
+        self.snapshot_interval_seconds = snapshot_interval_seconds
+        self.keep_snapshots = max(1, keep_snapshots)
+        self.sample_queries = sample_queries
+        self.pause_seconds = pause_seconds
+        self._clock = clock
+        self._random = random.Random()
+        self._collections: Dict[str, Dict[str, Any]] = {}
+        self._report: Dict[str, Any] = {'state': 'unknown'}
+        self._last_snapshot: Optional[Dict[str, Any]] = None
+        self._running: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._check_task: Optional[asyncio.Task] = None
+        self._stats = {'checks': 0, 'snapshots': 0, 'exported': 0, 'reused': 0, 'yielded_seconds': 0.0}
+
+    async def _yield_to_searches(self):
+        """Wait for in-flight searches to drain, then pause"""
+        started = time.monotonic()
+        while self.pipeline.searches_in_flight > 0 and time.monotonic() - started < self.MAX_YIELD_SECONDS:
+            await asyncio.sleep(0.05)
+        self._stats['yielded_seconds'] += time.monotonic() - started
+        await asyncio.sleep(self.pause_seconds)
+
+    def _throttle_export(self, done: int):
+        # Called from the export thread after every page
+        started = time.monotonic()
+        while self.pipeline.searches_in_flight > 0 and time.monotonic() - started < self.MAX_YIELD_SECONDS:
+            time.sleep(0.05)
+        time.sleep(self.pause_seconds)
+
+    def _collection_names(self) -> List[str]:
+        return sorted(getattr(collection, 'name', collection) for collection in self.pipeline.chroma_client.list_collections())
+
+    async def _inspect(self) -> Dict[str, Any]:
+        return await asyncio.get_running_loop().run_in_executor(None, inspect_persist_dir, self.persist_dir)
+
+    async def _sample(self, collection, count: int) -> Tuple[int, int]:
+        """Query up to sample_queries stored chunks by their own vector; returns (found, sampled)"""
+        loop = asyncio.get_running_loop()
+        found = 0
+        offsets = self._random.sample(range(count), min(self.sample_queries, count))
+        for offset in offsets:
+            await self._yield_to_searches()
+            page = await loop.run_in_executor(
+                None, lambda: collection.get(include=['embeddings'], limit=1, offset=offset)
+            )
+            if len(page['ids']) == 0:
+                continue
+            chunk_id, vector = page['ids'][0], page['embeddings'][0]
+            result = await loop.run_in_executor(
+                None, lambda: collection.query(query_embeddings=[vector], n_results=1, include=['distances'])
+            )
+            ids = result['ids'][0]
+            distances = result['distances'][0]
+            if ids and (ids[0] == chunk_id or distances[0] <= self.DUPLICATE_DISTANCE):
+                found += 1
+        return found, len(offsets)
+
+    async def verify_collection(self, name: str, inspection: Dict[str, Any]) -> Dict[str, Any]:
+        """Check one collection against its files and with sample queries"""
+        loop = asyncio.get_running_loop()
+        result: Dict[str, Any] = {'checked_at': self._clock(), 'problems': []}
+        try:
+            collection = self.pipeline.chroma_client.get_collection(name)
+            count = await loop.run_in_executor(None, collection.count)
+        except Exception as e:
+            result.update(state='error', problems=[f"unreadable: {e}"])
+            return result
+        result['count'] = count
+
+        entry = inspection['collections'].get(name)
+        if inspection['problems'] or entry is None:
+            # No readable files, or the collection was created after they were inspected
+            result['files'] = 'unchecked'
+        else:
+            result['problems'].extend(collection_problems(entry, count))
+            result.update(
+                files='checked',
+                sqlite_rows=entry['sqlite_rows'],
+                hnsw_elements=entry['hnsw']['elements'],
+                hnsw_active=entry['hnsw']['active'],
+                pending=entry['pending']
+            )
+
+        if count and self.sample_queries:
+            try:
+                found, sampled = await self._sample(collection, count)
+                result['samples'] = f"{found}/{sampled}"
+                if found < sampled:
+                    result['problems'].append(f"{sampled - found} of {sampled} sampled chunks not found by their own vector")
+            except Exception as e:
+                result['problems'].append(f"sample query failed: {e}")
+
+        result['state'] = 'degraded' if result['problems'] else 'ok'
+        return result
+
+    async def verify(self) -> Dict[str, Any]:
+        """Check every collection; returns the report also served by get_status"""
+        started = self._clock()
+        self._running = 'verify'
+        try:
+            inspection = await self._inspect()
+            names = self._collection_names()
+            for name in names:
+                await self._yield_to_searches()
+                result = await self.verify_collection(name, inspection)
+                self._collections[name] = result
+                if result['state'] != 'ok':
+                    logger.error(f"🩺 {name}: {'; '.join(result['problems'])}")
+            for name in set(self._collections) - set(names):
+                del self._collections[name]
+        finally:
+            self._running = None
+
+        degraded = sorted(name for name, result in self._collections.items() if result['state'] != 'ok')
+        self._report = {
+            'state': 'degraded' if degraded or inspection['problems'] else 'ok',
+            'checked_at': started,
+            'duration_seconds': round(self._clock() - started, 1),
+            'collections': len(self._collections),
+            'degraded_collections': degraded,
+            'store_problems': inspection['problems'],
+            'orphaned_segments': len(inspection['orphaned_segments'])
+        }
+        self._stats['checks'] += 1
+        log = logger.warning if self._report['state'] != 'ok' else logger.info
+        log(f"🩺 Vector store check: {self._report['state']} ({len(names)} collections, {len(degraded)} degraded, "
+            f"{self._report['duration_seconds']}s)")
+        return self._report
+
+    def _snapshots(self) -> List[str]:
+        """Completed snapshot directories, oldest first"""
+        if not self.snapshot_dir or not os.path.isdir(self.snapshot_dir):
+            return []
+        return sorted(
+            os.path.join(self.snapshot_dir, name) for name in os.listdir(self.snapshot_dir)
+            if not name.startswith('.') and os.path.exists(os.path.join(self.snapshot_dir, name, SNAPSHOT_MANIFEST))
+        )
+
+    @staticmethod
+    def _read_snapshot(path: str) -> Dict[str, Any]:
+        with open(os.path.join(path, SNAPSHOT_MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """
+        Write a snapshot of every collection
+
+        A collection whose chunk count and last sequence id match the previous
+        snapshot is hard-linked from it; the others are exported. The snapshot
+        is built in a hidden directory and renamed when complete. Restore a
+        collection with `python -m kb_transfer import`.
+        """
+        if not self.snapshot_dir:
+            raise ValueError("No snapshot directory configured")
+        started = self._clock()
+        stamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(started))
+        final_path = os.path.join(self.snapshot_dir, stamp)
+        suffix = 0
+        while os.path.exists(final_path):
+            suffix += 1
+            final_path = os.path.join(self.snapshot_dir, f"{stamp}-{suffix}")
+        stamp = os.path.basename(final_path)
+        tmp_path = os.path.join(self.snapshot_dir, f".{stamp}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        previous_path = (self._snapshots() or [None])[-1]
+        previous = self._read_snapshot(previous_path)['collections'] if previous_path else {}
+        inspection = await self._inspect()
+        loop = asyncio.get_running_loop()
+        collections: Dict[str, Dict[str, Any]] = {}
+        self._running = 'snapshot'
+        try:
+            for name in self._collection_names():
+                await self._yield_to_searches()
+                collection = self.pipeline.chroma_client.get_collection(name)
+                count = await loop.run_in_executor(None, collection.count)
+                entry = inspection['collections'].get(name)
+                fingerprint = [count, entry['max_seq_id']] if entry and entry['max_seq_id'] is not None else None
+                filename = f"{name}.kb.zip"
+                target = os.path.join(tmp_path, filename)
+
+                before = previous.get(name)
+                source = os.path.join(previous_path, filename) if before else None
+                if fingerprint is not None and before and before['fingerprint'] == fingerprint and os.path.exists(source):
+                    try:
+                        os.link(source, target)
+                    except OSError:
+                        await loop.run_in_executor(None, shutil.copy2, source, target)
+                    chunks, reused = before['chunks'], True
+                    self._stats['reused'] += 1
+                else:
+                    manifest = await self.pipeline.export_collection(collection, target, progress=self._throttle_export)
+                    chunks, reused = manifest['count'], False
+                    self._stats['exported'] += 1
+                collections[name] = {'file': filename, 'chunks': chunks, 'fingerprint': fingerprint, 'reused': reused}
+
+            layout_path = self.pipeline.index_layout.path
+            if os.path.exists(layout_path):
+                shutil.copy2(layout_path, os.path.join(tmp_path, os.path.basename(layout_path)))
+            summary = {
+                'created_at': started,
+                'duration_seconds': round(self._clock() - started, 1),
+                'collections': collections
+            }
+            with open(os.path.join(tmp_path, SNAPSHOT_MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        finally:
+            self._running = None
+
+        for old in self._snapshots()[:-self.keep_snapshots]:
+            shutil.rmtree(old, ignore_errors=True)
+
+        reused = sum(1 for entry in collections.values() if entry['reused'])
+        self._last_snapshot = {
+            'path': final_path,
+            'created_at': started,
+            'duration_seconds': summary['duration_seconds'],
+            'collections': len(collections),
+            'exported': len(collections) - reused,
+            'reused': reused
+        }
+        self._stats['snapshots'] += 1
+        logger.warning(f"📸 Snapshot {stamp}: {len(collections) - reused} collections exported, {reused} unchanged "
+                       f"in {summary['duration_seconds']}s")
+        return self._last_snapshot
+
+    def summary(self) -> Dict[str, Any]:
+        """Overall state only (safe for the public health check)"""
+        return {
+            'state': self._report['state'],
+            'checked_at': self._report.get('checked_at'),
+            'last_snapshot_at': self._last_snapshot['created_at'] if self._last_snapshot else None
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            **self._report,
+            'running': self._running,
+            'last_snapshot': self._last_snapshot,
+            'snapshots_kept': len(self._snapshots()),
+            'details': dict(self._collections),
+            **self._stats,
+            'yielded_seconds': round(self._stats['yielded_seconds'], 1)
+        }
+
+    def start(self):
+        """Start the periodic check / snapshot job (no-op if it is running)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def check_now(self) -> bool:
+        """
+        Start an integrity check in the background
+
+        Returns:
+            False if a check is already running (no second one is started)
+        """
+        if self._running == 'verify' or (self._check_task is not None and not self._check_task.done()):
+            return False
+        self._check_task = asyncio.create_task(self._check())
+        return True
+
+    async def _check(self):
+        try:
+            await self.verify()
+        except Exception as e:
+            logger.error(f"❌ Vector store check failed: {e}")
+
+    async def _run(self):
+        next_check = self._clock() if self.check_interval_seconds else None
+        next_snapshot = None
+        if self.snapshot_dir and self.snapshot_interval_seconds:
+            next_snapshot = self._clock() + self.snapshot_interval_seconds
+        while next_check is not None or next_snapshot is not None:
+            if next_check is not None and self._clock() >= next_check:
+                if self._check_task is not None and not self._check_task.done():
+                    # A manually started check is running; count it as this one
+                    await asyncio.wait([self._check_task])
+                else:
+                    await self._check()
+                next_check = self._clock() + self.check_interval_seconds
+            if next_snapshot is not None and self._clock() >= next_snapshot:
+                try:
+                    await self.snapshot()
+                except Exception as e:
+                    logger.error(f"❌ Vector store snapshot failed: {e}")
+                next_snapshot = self._clock() + self.snapshot_interval_seconds
+            wake = min(t for t in (next_check, next_snapshot) if t is not None)
+            await asyncio.sleep(max(1.0, wake - self._clock()))
@@ -12,11 +12,54 @@ import re
 from datetime import datetime
 import time
 import asyncio
+import hashlib
+import numpy as np
 from config import RAGConfig
+from utils.index_layout import get_index_layout, current_index_version, collection_index_version
+from utils.cancellation import CancellationToken, OperationCancelled, check_cancelled
+from utils.collection_writer import CollectionWriter
+from utils.compact_index import CompactVectorIndex, normalize
+from utils.centroid_index import CentroidAccumulator, CentroidIndex
+from utils.ivfpq_index import IVFPQIndex
+from utils.collection_residency import CollectionResidency, MB
+from utils.collection_archive import ArchiveSource, iter_archive, verify_archive, write_archive
+from utils.chroma_integrity import vacuum_sqlite
+from utils.chroma_client import open_persistent_client
+from utils.hnsw_params import collection_hnsw_params, hnsw_metadata, tier_for
 
 logger = logging.getLogger(__name__)
 
+def _where_document_ids(where: Dict[str, Any]) -> Optional[List[str]]:
+    """Document ids selected by a delete filter, or None if it selects by anything else"""
+    if '$or' in where and len(where) == 1:
+        document_ids = []
+        for clause in where['$or']:
+            selected = _where_document_ids(clause)
+            if selected is None:
+                return None
+            document_ids.extend(selected)
+        return document_ids
+    if set(where) != {'document_id'}:
+        return None
+    condition = where['document_id']
+    if isinstance(condition, dict):
+        if set(condition) == {'$in'}:
+            return list(condition['$in'])
+        if set(condition) == {'$eq'}:
+            return [condition['$eq']]
+        return None
+    return [condition]
+
+
 class DORAPipeline:
+    # ChromaDB has a limit around 5461 items per add(); stay safely under it
+    CHROMA_WRITE_BATCH = 4000
+    
+    # Compact index: page size when building from Chroma, and how long writes are
+    # batched before the index snapshot is rewritten
+    COMPACT_INDEX_BUILD_PAGE = 5000
+    COMPACT_INDEX_SAVE_DELAY = 5.0
+    
     def __init__(self):
         # Determine which LLM provider to use
         self.llm_provider = RAGConfig.LLM_PROVIDER.lower()
@@ -69,35 +112,44 @@ class DORAPipeline:
         # Initialize embedding model - OPTIMIZED FOR SPEED!
         # all-MiniLM-L6-v2: FAST embeddings (384 dimensions)
         # 3x faster than MPNet, good accuracy for most use cases
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.embedding_model = SentenceTransformer(RAGConfig.EMBEDDING_MODEL)
         
         # Initialize ChromaDB with optimizations for large scale document storage
         # Use absolute path to avoid confusion between root and backend folders
         chroma_path = os.path.join(os.path.dirname(__file__), "..", "chroma_db")
-        self.chroma_client = chromadb.PersistentClient(
-            path=chroma_path,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
+        self.chroma_path = os.path.abspath(chroma_path)
+        # Space freed by dropped / compacted collections can only be returned before Chroma opens the file
+        try:
+            vacuumed = vacuum_sqlite(self.chroma_path, RAGConfig.COMPACTION_VACUUM_MIN_FREE_RATIO)
+            if vacuumed:
+                logger.warning(f"🧹 Vacuumed chroma.sqlite3: {vacuumed['bytes_before'] / MB:.1f}MB -> {vacuumed['bytes_after'] / MB:.1f}MB")
+        except Exception as e:
+            logger.warning(f"Could not vacuum chroma.sqlite3: {e}")
+        # Chroma keeps HNSW indexes loaded for a fixed number of collections (LRU), sized at startup
+        self.chroma_client, self.chroma_hnsw_cache_size = open_persistent_client(
+            chroma_path,
+            Settings(anonymized_telemetry=False, allow_reset=True),
+            RAGConfig.CHROMA_HNSW_CACHE_COLLECTIONS
         )
+        if self.chroma_hnsw_cache_size is not None:
+            logger.info(f"🧠 Chroma keeps HNSW indexes of up to {self.chroma_hnsw_cache_size} collections loaded")
         
         # Standardized text splitter configuration - BALANCED FOR DETAIL & SPEED
         # Target: 850 chars = sweet spot between speed and information retention
-        self.chunk_size = 850   # Balanced: 2.5x more chunks than 2000, still fast!
-        self.chunk_overlap = 85  # 10% overlap
+        self.chunk_size = RAGConfig.DEFAULT_CHUNK_SIZE     # 850 by default: 2.5x more chunks than 2000, still fast!
+        self.chunk_overlap = RAGConfig.DEFAULT_OVERLAP     # 85 by default: 10% overlap
         self.separators = ["\n\n", "\n", ". ", "! ", "? ", " ", ""]
         
         # BALANCED chunk sizes - 850 chars for optimal detail
         self.document_chunk_sizes = {
-            'pdf': 850,       # Balanced detail
-            'doc': 850,       # Balanced detail
-            'ppt': 850,       # Balanced detail
-            'academic': 850,  # Better context
-            'legal': 850,     # Complete sections
-            'technical': 850, # Complete code blocks
-            'business': 850,  # Complete sections
-            'general': 850    # Better context
+            'pdf': self.chunk_size,       # Balanced detail
+            'doc': self.chunk_size,       # Balanced detail
+            'ppt': self.chunk_size,       # Balanced detail
+            'academic': self.chunk_size,  # Better context
+            'legal': self.chunk_size,     # Complete sections
+            'technical': self.chunk_size, # Complete code blocks
+            'business': self.chunk_size,  # Complete sections
+            'general': self.chunk_size    # Better context
         }
         
         # Document type detection patterns
@@ -109,22 +161,607 @@ class DORAPipeline:
             'medical': [r'diagnosis', r'gejala', r'pengobatan', r'terapi'],
             'financial': [r'anggaran', r'keuangan', r'investasi', r'profit']
         }
+        
+        # Which physical collection serves each user (swapped by the index migrator)
+        self.index_layout = get_index_layout()
+        
+        # Chunk-level re-indexing counters (see update_document)
+        self.reindex_stats = {'documents': 0, 'chunks': 0, 'embedded': 0}
+        
+        # One group-commit writer per collection name: concurrent uploads share commits
+        self._writers: Dict[str, CollectionWriter] = {}
+        
+        # Compact (float16 / int8) search index per collection name, loaded on first
+        # search and kept in step with Chroma by the writers' commit listener
+        self._compact_indexes: Dict[str, CompactVectorIndex] = {}
+        self._compact_versions: Dict[str, int] = {}
+        self._compact_locks: Dict[str, asyncio.Lock] = {}
+        self._compact_save_pending: set = set()
+        
+        # Document centroid index per collection name for two-stage retrieval
+        self._centroid_indexes: Dict[str, CentroidIndex] = {}
+        self._centroid_building: Dict[str, CentroidIndex] = {}
+        self._centroid_locks: Dict[str, asyncio.Lock] = {}
+        self.search_stats = {'flat': 0, 'two_stage': 0}
+        
+        # Which collections have compact / centroid indexes loaded; idle ones are
+        # unloaded and reloaded lazily by the next search. Chroma's own HNSW indexes
+        # are not tracked: the client can't report or release them one by one
+        self.residency = CollectionResidency(
+            budget_bytes=RAGConfig.COLLECTION_MEMORY_BUDGET_MB * MB,
+            idle_ttl=RAGConfig.COLLECTION_IDLE_TTL_SECONDS,
+            max_resident=RAGConfig.COLLECTION_MAX_RESIDENT
+        )
+        self._residency_sweeper: Optional[asyncio.Task] = None
+        
+        # search_ef each collection's loaded HNSW index still uses after set_search_ef
+        # changed the stored value (Chroma reads it only when it loads the index)
+        self._active_search_ef: Dict[str, int] = {}
+        # Background maintenance (integrity checks, snapshots) backs off while searches run
+        self.searches_in_flight = 0
     
     def _get_user_collection(self, user_id: str):
-        """Get or create a ChromaDB collection for a specific user"""
-        collection_name = f"user_{user_id}"
+        """Get or create the active ChromaDB collection for a specific user"""
+        collection_name = self.index_layout.active_collection(user_id)
         try:
             return self.chroma_client.get_collection(collection_name)
         except:
-            return self.chroma_client.create_collection(
-                collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
+            return self._create_collection(collection_name)
+    
+    def _create_collection(self, collection_name: str, metadata: Optional[Dict[str, Any]] = None, expected_chunks: int = 0):
+        """
+        Create a collection stamped with the current chunker / embedding version (or with `metadata`)
+        
+        Its HNSW parameters come from the HNSW_TIERS tier for `expected_chunks`
+        (replacing any hnsw:M / construction_ef / search_ef in `metadata`), since
+        Chroma fixes M and construction_ef once the collection exists.
+        """
+        self.drop_derived_indexes(collection_name)
+        return self.chroma_client.create_collection(
+            collection_name,
+            metadata={
+                **(metadata or {"hnsw:space": "cosine", **current_index_version()}),
+                **hnsw_metadata(tier_for(expected_chunks, RAGConfig.HNSW_TIERS))
+            }
+        )
+    
+    def set_search_ef(self, user_id: str, search_ef: int) -> Dict[str, Any]:
+        """
+        Change the search_ef of a user's active collection
+        
+        Chroma persists the new value at once but an HNSW index it has already
+        loaded keeps the old one, so queries use the new value only after a
+        restart or after a compaction rebuilds the collection.
+        
+        Returns:
+            Dict with the stored HNSW parameters, the search_ef queries use now
+            and whether the new value is still pending
+        """
+        if search_ef < 1:
+            raise ValueError("search_ef must be at least 1")
+        collection = self._get_user_collection(user_id)
+        previous = collection_hnsw_params(collection)['search_ef']
+        collection.modify(configuration={'hnsw': {'ef_search': search_ef}})
+        self._active_search_ef.setdefault(collection.name, previous)
+        if self._active_search_ef[collection.name] == search_ef:
+            del self._active_search_ef[collection.name]
+        logger.info(f"🎚️ search_ef of {collection.name} set to {search_ef}")
+        return self._search_ef_state(collection)
+    
+    def _search_ef_state(self, collection) -> Dict[str, Any]:
+        """Stored HNSW parameters of a collection next to the search_ef its loaded index uses"""
+        params = collection_hnsw_params(collection)
+        active = self._active_search_ef.get(collection.name, params['search_ef'])
+        return {'hnsw': params, 'active_search_ef': active, 'pending': active != params['search_ef']}
+    
+    def drop_collection(self, collection_name: str):
+        """Delete a collection together with the indexes derived from it"""
+        self.chroma_client.delete_collection(collection_name)
+        self.drop_derived_indexes(collection_name)
+        self._active_search_ef.pop(collection_name, None)
+    
+    def get_index_version(self, user_id: str) -> Dict[str, Any]:
+        """
+        Compare the version a user's collection was built with to the current config
+        
+        Returns:
+            Dict with collection name, recorded and current versions, a stale flag,
+            the collection's HNSW parameters (with the search_ef queries use now)
+            next to those of its size tier
+        """
+        collection = self._get_user_collection(user_id)
+        recorded = collection_index_version(collection.metadata)
+        current = current_index_version()
+        return {
+            'collection': collection.name,
+            'generation': self.index_layout.generation(user_id),
+            'recorded': recorded,
+            'current': current,
+            'stale': recorded != current,
+            **self._search_ef_state(collection),
+            'hnsw_tier': tier_for(collection.count(), RAGConfig.HNSW_TIERS)
+        }
     
     def _generate_chunk_id(self, document_id: str, chunk_index: int) -> str:
-        """Generate a unique ID for a document chunk"""
+        """
+        Generate a unique ID for a document chunk
+        
+        Deterministic, so re-ingesting a document upserts over its previous chunks
+        """
         return f"{document_id}_chunk_{chunk_index}"
     
+    @staticmethod
+    def _chunk_document_id(chunk_id: str) -> Optional[str]:
+        """Document id encoded in a chunk id (None for ids in an older format)"""
+        document_id, separator, _ = chunk_id.rpartition('_chunk_')
+        return document_id if separator else None
+    
+    @staticmethod
+    def _chunk_hash(text: str) -> str:
+        """Content hash used to match chunks across versions of a document"""
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+    
+    def _encode_chunks(self, texts: List[str], cancel: Optional[CancellationToken] = None) -> np.ndarray:
+        """
+        Embed chunk texts (blocking - run in an executor)
+        
+        Encodes in slices so a cancelled upload stops within a few model batches
+        instead of after the whole group. Returns one (len(texts), dim) float32
+        array: no per-value Python floats for 100k-chunk batches.
+        """
+        # ADAPTIVE BATCH SIZE for embeddings to prevent memory spikes
+        # Small batches (< 1000 chunks): Use 128 for speed
+        # Medium batches (1000-5000): Use 64 for balance
+        # Large batches (5000+): Use 32 for safety
+        if len(texts) < 1000:
+            embedding_batch_size = 128  # Fast for small batches
+        elif len(texts) < 5000:
+            embedding_batch_size = 64   # Balanced for medium batches
+        else:
+            embedding_batch_size = 32   # Safe for large batches
+        
+        embed_slice = embedding_batch_size * 4
+        embeddings = None
+        for start in range(0, len(texts), embed_slice):
+            check_cancelled(cancel)
+            batch = np.asarray(self.embedding_model.encode(
+                texts[start:start + embed_slice], batch_size=embedding_batch_size, show_progress_bar=False
+            ), dtype=np.float32)
+            if embeddings is None:
+                embeddings = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+            embeddings[start:start + len(batch)] = batch
+        if embeddings is None:
+            return np.empty((0, RAGConfig.EMBEDDING_DIMENSION), dtype=np.float32)
+        return embeddings
+    
+    def _stored_chunk_ids(self, collection, document_ids) -> Dict[str, set]:
+        """Chunk ids currently stored for each of `document_ids`"""
+        document_ids = list(document_ids)
+        if not document_ids:
+            return {}
+        if len(document_ids) == 1:
+            where = {"document_id": document_ids[0]}
+        else:
+            where = {"document_id": {"$in": document_ids}}
+        result = collection.get(where=where, include=['metadatas'])
+        stored: Dict[str, set] = {}
+        for chunk_id, meta in zip(result['ids'], result['metadatas']):
+            stored.setdefault(meta['document_id'], set()).add(chunk_id)
+        return stored
+    
+    def _stale_chunk_ids(self, collection, document_ids, new_ids: List[str]) -> Dict[str, List[str]]:
+        """
+        Chunk ids left over from a previous version of each document (e.g. the
+        trailing chunks of a document that got shorter, or ids in an older format)
+        """
+        new_ids = set(new_ids)
+        stale = {}
+        for document_id, stored in self._stored_chunk_ids(collection, document_ids).items():
+            leftover = sorted(stored - new_ids)
+            if leftover:
+                stale[document_id] = leftover
+        return stale
+    
+    def _writer(self, collection) -> CollectionWriter:
+        """Group-commit writer for a collection (all upserts / deletes go through it)"""
+        writer = self._writers.get(collection.name)
+        if writer is None:
+            writer = CollectionWriter(
+                collection.name,
+                max_batch=self.CHROMA_WRITE_BATCH,
+                max_delay=RAGConfig.WRITE_MAX_DELAY_MS / 1000,
+                on_commit=self._on_collection_commit
+            )
+            self._writers[collection.name] = writer
+        return writer
+    
+    def _on_collection_commit(self, kind: str, collection, payload: Dict[str, Any]):
+        """Apply a committed Chroma write to the collection's derived indexes (if loaded)"""
+        name = collection.name
+        self._compact_versions[name] = self._compact_versions.get(name, 0) + 1
+        if kind == 'upsert':
+            document_ids = [meta.get('document_id') for meta in payload['metadatas']]
+        elif kind == 'delete_ids':
+            document_ids = [self._chunk_document_id(chunk_id) for chunk_id in payload['ids']]
+            if None in document_ids:
+                document_ids = None
+        else:
+            document_ids = _where_document_ids(payload['where'])
+        
+        index = self._compact_indexes.get(name)
+        if index is not None:
+            if kind == 'upsert':
+                index.upsert(payload['ids'], payload['embeddings'], document_ids)
+            elif kind == 'delete_ids':
+                index.delete(payload['ids'])
+            elif document_ids is not None:
+                index.delete_documents(document_ids)
+            else:
+                # A filter the index cannot evaluate: rebuild from Chroma on the next search
+                self.drop_derived_indexes(name)
+                return
+            self._schedule_compact_save(name)
+        
+        for centroids in (self._centroid_indexes.get(name), self._centroid_building.get(name)):
+            if centroids is None:
+                continue
+            if document_ids is None:
+                centroids.stale = True
+            else:
+                centroids.mark_dirty(document_ids)
+    
+    def _compact_index_path(self, collection_name: str) -> str:
+        return os.path.join(RAGConfig.COMPACT_INDEX_DIR, f"{collection_name}.{RAGConfig.VECTOR_STORAGE}.npz")
+    
+    def drop_derived_indexes(self, collection_name: str):
+        """Forget a collection's compact and centroid indexes (and the compact snapshot)"""
+        self._compact_indexes.pop(collection_name, None)
+        self._centroid_indexes.pop(collection_name, None)
+        self.residency.discard(collection_name)
+        if RAGConfig.VECTOR_STORAGE == 'float32':
+            return
+        try:
+            os.remove(self._compact_index_path(collection_name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"⚠️ Could not remove compact index snapshot for {collection_name}: {e}")
+    
+    def _load_compact_index(self, collection) -> CompactVectorIndex:
+        """
+        Load a collection's compact index snapshot, or build it from Chroma (blocking)
+        
+        A snapshot is only trusted if it was taken from the same collection and
+        holds as many chunks as Chroma does; otherwise the vectors are re-read
+        page by page and quantized (an IVF-PQ index is first trained on a sample).
+        """
+        path = self._compact_index_path(collection.name)
+        source_id = str(getattr(collection, 'id', '') or '') or None
+        if os.path.exists(path):
+            try:
+                if RAGConfig.VECTOR_STORAGE == 'ivfpq':
+                    index = IVFPQIndex.load(path, nprobe=RAGConfig.IVFPQ_NPROBE)
+                else:
+                    index = CompactVectorIndex.load(path)
+                if index.storage == RAGConfig.VECTOR_STORAGE and index.source_id == source_id and len(index) == collection.count():
+                    return index
+                logger.warning(f"⚠️ Compact index snapshot for {collection.name} is stale, rebuilding")
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load compact index snapshot for {collection.name}: {e}")
+        
+        started = time.time()
+        if RAGConfig.VECTOR_STORAGE == 'ivfpq':
+            index = self._train_ivfpq_index(collection, source_id)
+        else:
+            index = CompactVectorIndex(RAGConfig.VECTOR_STORAGE, source_id=source_id)
+        offset = 0
+        while True:
+            page = collection.get(include=['embeddings', 'metadatas'], limit=self.COMPACT_INDEX_BUILD_PAGE, offset=offset)
+            ids = page['ids']
+            if len(ids) == 0:
+                break
+            index.upsert(ids, page['embeddings'], [meta.get('document_id') for meta in page['metadatas']])
+            offset += len(ids)
+            if len(ids) < self.COMPACT_INDEX_BUILD_PAGE:
+                break
+        logger.warning(f"🗜️ Built {index.storage} index for {collection.name}: {len(index)} chunks, {index.nbytes / 1024 / 1024:.1f}MB in {time.time() - started:.1f}s")
+        return index
+    
+    def _train_ivfpq_index(self, collection, source_id: Optional[str]) -> IVFPQIndex:
+        """
+        Train an empty IVF-PQ index on up to IVFPQ_TRAIN_SAMPLE of the collection's vectors (blocking)
+        
+        The sample is read as pages spread evenly over the collection, so it is
+        not biased towards the earliest uploads and never holds every vector.
+        """
+        started = time.time()
+        count = collection.count()
+        page_size = max(1, min(self.COMPACT_INDEX_BUILD_PAGE, RAGConfig.IVFPQ_TRAIN_SAMPLE))
+        pages = max(1, -(-min(count, RAGConfig.IVFPQ_TRAIN_SAMPLE) // page_size))
+        offsets = sorted({int(offset) for offset in np.linspace(0, max(count - page_size, 0), pages)})
+        sample = []
+        for offset in offsets:
+            page = collection.get(include=['embeddings'], limit=page_size, offset=offset)
+            if len(page['ids']):
+                sample.append(np.asarray(page['embeddings'], dtype=np.float32))
+        if not sample:
+            raise ValueError(f"Cannot train an IVF-PQ index for empty collection {collection.name}")
+        
+        index = IVFPQIndex.train(
+            np.concatenate(sample),
+            nlist=RAGConfig.IVFPQ_NLIST,
+            m=RAGConfig.IVFPQ_SUBQUANTIZERS,
+            source_id=source_id,
+            nprobe=RAGConfig.IVFPQ_NPROBE
+        )
+        logger.warning(f"🧮 Trained IVF-PQ index for {collection.name} on {index.trained_on} vectors "
+                       f"({index.nlist} lists, {index.m} sub-quantizers) in {time.time() - started:.1f}s")
+        return index
+    
+    async def _get_compact_index(self, collection) -> CompactVectorIndex:
+        """The collection's compact index, loaded or built on first use"""
+        name = collection.name
+        index = self._compact_indexes.get(name)
+        if index is not None:
+            return index
+        
+        lock = self._compact_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            index = self._compact_indexes.get(name)
+            if index is not None:
+                return index
+            loop = asyncio.get_running_loop()
+            for _ in range(3):
+                version = self._compact_versions.get(name, 0)
+                index = await loop.run_in_executor(None, self._load_compact_index, collection)
+                if self._compact_versions.get(name, 0) == version:
+                    break
+                # Writes were committed while the vectors were being read: read again
+            else:
+                logger.warning(f"⚠️ {name} kept changing while its compact index was built; it may miss recent writes")
+            self._compact_indexes[name] = index
+        self._schedule_compact_save(name)
+        return index
+    
+    def _schedule_compact_save(self, name: str):
+        if name in self._compact_save_pending:
+            return
+        self._compact_save_pending.add(name)
+        asyncio.get_running_loop().create_task(self._save_compact_index_later(name))
+    
+    async def _save_compact_index_later(self, name: str):
+        """Rewrite the snapshot once writes have settled (one file write per burst)"""
+        try:
+            await asyncio.sleep(self.COMPACT_INDEX_SAVE_DELAY)
+        finally:
+            self._compact_save_pending.discard(name)
+        lock = self._compact_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            index = self._compact_indexes.get(name)
+            if index is None:
+                return
+            arrays = index.snapshot()
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, CompactVectorIndex.write_snapshot, arrays, self._compact_index_path(name)
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Could not save compact index snapshot for {name}: {e}")
+    
+    def _build_centroid_index(self, collection, centroids: CentroidIndex):
+        """
+        Compute every document's centroid into `centroids` (blocking)
+        
+        Decoded from the compact index when one is loaded, otherwise read from
+        Chroma page by page.
+        """
+        started = time.time()
+        accumulator = CentroidAccumulator()
+        compact = self._compact_indexes.get(collection.name)
+        if compact is not None:
+            compact.scan(accumulator.add)
+        else:
+            offset = 0
+            while True:
+                page = collection.get(include=['embeddings', 'metadatas'], limit=self.COMPACT_INDEX_BUILD_PAGE, offset=offset)
+                ids = page['ids']
+                if len(ids) == 0:
+                    break
+                accumulator.add([meta.get('document_id') for meta in page['metadatas']], page['embeddings'])
+                offset += len(ids)
+                if len(ids) < self.COMPACT_INDEX_BUILD_PAGE:
+                    break
+        
+        centroids.update([], accumulator)
+        logger.warning(f"🎯 Built centroid index for {collection.name}: {len(centroids)} documents in {time.time() - started:.1f}s")
+    
+    def _refresh_centroids(self, collection, centroids: CentroidIndex, document_ids: List[str]):
+        """Recompute the centroids of documents written since the last search (blocking)"""
+        accumulator = CentroidAccumulator()
+        compact = self._compact_indexes.get(collection.name)
+        if compact is not None:
+            compact.scan(accumulator.add, document_ids)
+        else:
+            for start in range(0, len(document_ids), 500):
+                batch = document_ids[start:start + 500]
+                stored = collection.get(where={"document_id": {"$in": batch}}, include=['embeddings', 'metadatas'])
+                if len(stored['ids']):
+                    accumulator.add([meta.get('document_id') for meta in stored['metadatas']], stored['embeddings'])
+        centroids.update(document_ids, accumulator)
+    
+    async def _get_centroid_index(self, collection) -> CentroidIndex:
+        """The collection's centroid index, built on first use and brought up to date"""
+        name = collection.name
+        loop = asyncio.get_running_loop()
+        lock = self._centroid_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            centroids = self._centroid_indexes.get(name)
+            if centroids is None or centroids.stale:
+                centroids = CentroidIndex(source_id=str(getattr(collection, 'id', '') or '') or None)
+                # Documents written while the build reads the vectors are marked dirty
+                # on the new index and refreshed below
+                self._centroid_building[name] = centroids
+                try:
+                    await loop.run_in_executor(None, self._build_centroid_index, collection, centroids)
+                finally:
+                    self._centroid_building.pop(name, None)
+                self._centroid_indexes[name] = centroids
+            dirty = centroids.take_dirty()
+            if dirty:
+                await loop.run_in_executor(None, self._refresh_centroids, collection, centroids, sorted(dirty))
+            return centroids
+    
+    def _uses_compact_index(self, collection) -> bool:
+        """Whether search goes to the compact index rather than Chroma's HNSW"""
+        if RAGConfig.VECTOR_STORAGE == 'float32':
+            return False
+        if RAGConfig.VECTOR_STORAGE == 'ivfpq' and collection.name not in self._compact_indexes:
+            # Too few vectors to train on: HNSW over float32 is small and exact enough
+            return collection.count() >= RAGConfig.IVFPQ_MIN_CHUNKS
+        return True
+    
+    async def _search(self, collection, query_embedding, n_results: int) -> Dict[str, Any]:
+        """
+        Nearest chunks to one query vector, in the shape of Chroma's query() result
+        
+        With VECTOR_STORAGE=float32 (or ivfpq below IVFPQ_MIN_CHUNKS) this is
+        Chroma's HNSW search; otherwise the compact index is searched and (with
+        VECTOR_RESCORE) the best n_results x VECTOR_RESCORE_CANDIDATES (or
+        IVFPQ_RESCORE_CANDIDATES) are re-ranked with exact float32 cosine.
+        With RETRIEVAL_TWO_STAGE, large collections are first narrowed to the
+        documents whose centroids are closest to the query.
+        
+        Each search that loaded a compact or centroid index marks the collection
+        resident (timing it as a load if it was not) and then unloads collections
+        that are idle or over the memory budget. Collections searched only
+        through Chroma's HNSW are left out: unloading them would free nothing.
+        """
+        name = collection.name
+        started = time.perf_counter()
+        self.searches_in_flight += 1
+        try:
+            results = await self._search_indexes(collection, query_embedding, n_results)
+        finally:
+            self.searches_in_flight -= 1
+        nbytes = self._resident_bytes(name)
+        if not nbytes:
+            self.residency.discard(name)
+        elif not self.residency.touch(name, nbytes):
+            self.residency.record_load(name, time.perf_counter() - started)
+        await self._evict_idle_collections(protect=name)
+        self._start_residency_sweeper()
+        return results
+    
+    async def _search_indexes(self, collection, query_embedding, n_results: int) -> Dict[str, Any]:
+        """Search body of _search (loads the collection's indexes if needed)"""
+        loop = asyncio.get_running_loop()
+        # Loaded first so centroids can be decoded from it instead of read from Chroma
+        index = await self._get_compact_index(collection) if self._uses_compact_index(collection) else None
+        top_documents = None
+        if RAGConfig.RETRIEVAL_TWO_STAGE and collection.count() >= RAGConfig.RETRIEVAL_TWO_STAGE_MIN_CHUNKS:
+            centroids = await self._get_centroid_index(collection)
+            top_documents = await loop.run_in_executor(
+                None, centroids.top_documents, query_embedding, RAGConfig.RETRIEVAL_TOP_DOCUMENTS
+            ) or None
+        self.search_stats['two_stage' if top_documents else 'flat'] += 1
+        
+        if index is None:
+            where = {"document_id": {"$in": top_documents}} if top_documents else None
+            return await loop.run_in_executor(
+                None, lambda: collection.query(query_embeddings=[query_embedding], n_results=n_results, where=where)
+            )
+        return await loop.run_in_executor(
+            None, self._search_compact, collection, index, query_embedding, n_results, top_documents
+        )
+    
+    def _resident_bytes(self, name: str) -> int:
+        """Memory held by a collection's unloadable (compact and centroid) indexes"""
+        index = self._compact_indexes.get(name)
+        nbytes = index.nbytes if index is not None else 0
+        centroids = self._centroid_indexes.get(name)
+        if centroids is not None:
+            nbytes += centroids.nbytes
+        return nbytes
+    
+    async def _evict_idle_collections(self, protect: Optional[str] = None):
+        """Unload collections idle past COLLECTION_IDLE_TTL_SECONDS or beyond the memory budget"""
+        for name, reason in self.residency.evictable(protect):
+            await self._unload_collection(name)
+            self.residency.discard(name, reason)
+            logger.info(f"📤 Unloaded {reason} collection {name} ({len(self.residency)} collections resident)")
+    
+    async def _unload_collection(self, name: str):
+        """
+        Free a collection's in-memory search indexes; the next search reloads them
+        
+        The compact index snapshot is written first if a save is still pending,
+        so the reload is a file read rather than a rebuild from Chroma.
+        """
+        lock = self._compact_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            index = self._compact_indexes.pop(name, None)
+            if index is not None and name in self._compact_save_pending:
+                arrays = index.snapshot()
+                try:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, CompactVectorIndex.write_snapshot, arrays, self._compact_index_path(name)
+                    )
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not save compact index snapshot for {name}: {e}")
+        self._centroid_indexes.pop(name, None)
+    
+    def _start_residency_sweeper(self):
+        if not self.residency.idle_ttl or (self._residency_sweeper is not None and not self._residency_sweeper.done()):
+            return
+        self._residency_sweeper = asyncio.get_running_loop().create_task(self._sweep_idle_collections())
+    
+    async def _sweep_idle_collections(self):
+        """Unload idle collections even when no search arrives to trigger it"""
+        interval = min(60.0, max(1.0, self.residency.idle_ttl / 4))
+        while len(self.residency):
+            await asyncio.sleep(interval)
+            await self._evict_idle_collections()
+    
+    def _search_compact(
+        self,
+        collection,
+        index: CompactVectorIndex,
+        query_embedding,
+        n_results: int,
+        document_ids: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        rescore = RAGConfig.VECTOR_RESCORE
+        if isinstance(index, IVFPQIndex):
+            factor = RAGConfig.IVFPQ_RESCORE_CANDIDATES
+        else:
+            factor = RAGConfig.VECTOR_RESCORE_CANDIDATES
+        candidates = index.search(query_embedding, n_results * max(1, factor) if rescore else n_results, document_ids)
+        if not candidates:
+            return {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+        
+        include = ['documents', 'metadatas'] + (['embeddings'] if rescore else [])
+        found = collection.get(ids=[chunk_id for chunk_id, _ in candidates], include=include)
+        rows = {chunk_id: i for i, chunk_id in enumerate(found['ids'])}
+        ranked = [(chunk_id, score) for chunk_id, score in candidates if chunk_id in rows]
+        if rescore and ranked:
+            vectors = normalize([found['embeddings'][rows[chunk_id]] for chunk_id, _ in ranked])
+            scores = vectors @ normalize(query_embedding)[0]
+            order = np.argsort(-scores, kind='stable')
+            ranked = [(ranked[i][0], float(scores[i])) for i in order]
+        ranked = ranked[:n_results]
+        
+        return {
+            'ids': [[chunk_id for chunk_id, _ in ranked]],
+            'documents': [[found['documents'][rows[chunk_id]] for chunk_id, _ in ranked]],
+            'metadatas': [[found['metadatas'][rows[chunk_id]] for chunk_id, _ in ranked]],
+            'distances': [[1.0 - score for _, score in ranked]]
+        }
+    
+    async def _delete_chunk_ids(self, collection, chunk_ids: List[str]):
+        writer = self._writer(collection)
+        for i in range(0, len(chunk_ids), self.CHROMA_WRITE_BATCH):
+            await writer.delete(collection, ids=chunk_ids[i:i + self.CHROMA_WRITE_BATCH])
+    
     def document_exists(self, user_id: str, document_id: str) -> bool:
         """
         Check if a document already exists in the user's knowledge base.
@@ -569,19 +1206,31 @@ class DORAPipeline:
         
         return [text]
 
-    async def add_documents_bulk(self, user_id: str, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def add_documents_bulk(
+        self,
+        user_id: str,
+        documents: List[Dict[str, Any]],
+        collection=None,
+        cancel: Optional[CancellationToken] = None
+    ) -> Dict[str, Any]:
         """
         Add multiple documents to the vector store efficiently in parallel batches.
         
         Args:
             user_id: The ID of the user owning the documents
             documents: List of dicts with keys: id, content, name, mime_type
+            collection: Target collection (defaults to the user's active one; the
+                index migrator passes its shadow collection)
+            cancel: Checked between documents, embedding slices and Chroma write
+                batches. On cancellation, documents already written in full stay,
+                partially written ones are removed, and OperationCancelled is raised.
             
         Returns:
             Dict mapping document_id to number of chunks added
         """
         try:
-            collection = self._get_user_collection(user_id)
+            if collection is None:
+                collection = self._get_user_collection(user_id)
             
             all_chunks = []
             all_metadatas = []
@@ -597,6 +1246,7 @@ class DORAPipeline:
             loop = asyncio.get_running_loop()
             
             for doc in documents:
+                check_cancelled(cancel)
                 doc_id = doc.get('id')
                 content = doc.get('content', '')
                 name = doc.get('name', 'Unknown')
@@ -619,7 +1269,7 @@ class DORAPipeline:
                 # Prepare metadata
                 for i, chunk in enumerate(chunks):
                     all_chunks.append(chunk)
-                    all_ids.append(f"{doc_id}_{i}")
+                    all_ids.append(self._generate_chunk_id(doc_id, i))
                     all_metadatas.append({
                         "document_id": doc_id,
                         "document_name": name,
@@ -636,36 +1286,27 @@ class DORAPipeline:
             # Encode all chunks in one go (or large batches)
             logger.warning(f"🧠 Embedding {len(all_chunks)} chunks")
             
-            # ADAPTIVE BATCH SIZE for embeddings to prevent memory spikes
-            # Small batches (< 1000 chunks): Use 128 for speed
-            # Medium batches (1000-5000): Use 64 for balance
-            # Large batches (5000+): Use 32 for safety
-            if len(all_chunks) < 1000:
-                embedding_batch_size = 128  # Fast for small batches
-            elif len(all_chunks) < 5000:
-                embedding_batch_size = 64   # Balanced for medium batches
-            else:
-                embedding_batch_size = 32   # Safe for large batches
-            
-            # Embedding batch size determined
-            
             all_embeddings = []
             if len(all_chunks) > 0:
                  # Run blocking encode in executor
-                 all_embeddings = await loop.run_in_executor(
-                    None,
-                    lambda: self.embedding_model.encode(all_chunks, batch_size=embedding_batch_size, show_progress_bar=False).tolist()
-                )
+                 all_embeddings = await loop.run_in_executor(None, self._encode_chunks, all_chunks, cancel)
             
             # 3. Save to DB (IO/Lock bound)
-            # ChromaDB has a limit around 5461 items per batch. We should safe-guard with 4000.
-            MAX_CHROMA_BATCH = 4000
+            # Upsert by deterministic id, then drop ids the new version no longer has:
+            # a retried or replayed batch converges to the same state without a pre-scan
+            MAX_CHROMA_BATCH = self.CHROMA_WRITE_BATCH
+            
+            stale_ids = await loop.run_in_executor(None, self._stale_chunk_ids, collection, doc_chunk_counts.keys(), all_ids)
             
             logger.warning(f"💾 Saving {len(all_chunks)} chunks")
             
+            written = 0
             if all_chunks:
                 total_chunks = len(all_chunks)
                 for i in range(0, total_chunks, MAX_CHROMA_BATCH):
+                    if cancel is not None and cancel.cancelled:
+                        await self._discard_partial_write(collection, all_metadatas, written, stale_ids)
+                        raise OperationCancelled(cancel.reason)
                     end_idx = min(i + MAX_CHROMA_BATCH, total_chunks)
                     
                     batch_docs = all_chunks[i:end_idx]
@@ -673,24 +1314,47 @@ class DORAPipeline:
                     batch_ids = all_ids[i:end_idx]
                     batch_embeddings = all_embeddings[i:end_idx]
                     
-                    # DB batch save (logging reduced)
-                    
-                    await loop.run_in_executor(
-                        None,
-                        lambda: collection.add(
-                            documents=batch_docs,
-                            metadatas=batch_metas,
-                            ids=batch_ids,
-                            embeddings=batch_embeddings
-                        )
-                    )
+                    # DB batch save (logging reduced); committed together with other
+                    # uploads' writes to the same collection
+                    await self._writer(collection).upsert(collection, batch_ids, batch_embeddings, batch_metas, batch_docs)
+                    written = end_idx
             
+            if stale_ids:
+                leftover = [chunk_id for ids in stale_ids.values() for chunk_id in ids]
+                await self._delete_chunk_ids(collection, leftover)
+                logger.warning(f"🧹 Removed {len(leftover)} stale chunks from {len(stale_ids)} re-ingested docs")
+            
+            self.index_layout.note_write(collection.name, doc_chunk_counts.keys())
             logger.warning(f"✅ Bulk complete: {len(documents)} docs")
             return doc_status
             
+        except OperationCancelled as e:
+            logger.warning(f"🛑 Bulk add cancelled ({e}): {len(documents)} docs")
+            raise
         except Exception as e:
             logger.error(f"Error in bulk add: {e}")
             raise
+    
+    async def _discard_partial_write(self, collection, metadatas: List[Dict[str, Any]], written: int, stale_ids: Dict[str, List[str]]):
+        """
+        Keep the collection consistent after a bulk add stopped between write batches:
+        documents whose chunks were all written stay (minus their stale chunks), a
+        document that was only partly written is deleted (otherwise duplicate
+        detection would treat the half-indexed document as present).
+        """
+        if written == 0:
+            return
+        touched = {meta['document_id'] for meta in metadatas[:written]}
+        partial = {meta['document_id'] for meta in metadatas[written:]} & touched
+        complete = touched - partial
+        if partial:
+            # Old and new chunks alike: upserts already overwrote part of the old version
+            await self._writer(collection).delete(collection, where={"document_id": {"$in": sorted(partial)}})
+        leftover = [chunk_id for document_id in complete for chunk_id in stale_ids.get(document_id, [])]
+        if leftover:
+            await self._delete_chunk_ids(collection, leftover)
+        self.index_layout.note_write(collection.name, touched)
+        logger.warning(f"🛑 Kept {len(complete)} fully written docs, removed {len(partial)} partial")
 
     async def add_document(self, user_id: str, document_id: str, content: str, document_name: str, mime_type: str = None) -> int:
         """Add a document to the vector store. Returns the number of chunks added."""
@@ -711,38 +1375,13 @@ class DORAPipeline:
             
             # Adding chunks (logging reduced)
             
-            # MEMORY OPTIMIZATION: Process embeddings in batches for very large documents
-            EMBEDDING_BATCH_SIZE = 100
-            
-            # Helper to run blocking encode in thread pool
+            # MEMORY OPTIMIZATION: encoded in slices into one float32 array
+            # Run blocking encode in executor
             loop = asyncio.get_event_loop()
-            
-            if len(chunks) > EMBEDDING_BATCH_SIZE:
-                # Large document batch processing
-                
-                all_embeddings = []
-                for i in range(0, len(chunks), EMBEDDING_BATCH_SIZE):
-                    batch_chunks = chunks[i:i+EMBEDDING_BATCH_SIZE]
-                    # Processing batch
-                    
-                    # Run blocking encode in executor
-                    batch_embeddings_list = await loop.run_in_executor(
-                        None, 
-                        lambda: self.embedding_model.encode(batch_chunks, show_progress_bar=False).tolist()
-                    )
-                    all_embeddings.extend(batch_embeddings_list)
-                embeddings = all_embeddings
-            else:
-                # For smaller documents, process all at once
-                # Generating embeddings
-                # Run blocking encode in executor
-                embeddings = await loop.run_in_executor(
-                    None,
-                    lambda: self.embedding_model.encode(chunks, show_progress_bar=False).tolist()
-                )
+            embeddings = await loop.run_in_executor(None, self._encode_chunks, chunks)
             
             # Prepare data for ChromaDB
-            ids = [f"{document_id}_{i}" for i in range(len(chunks))]
+            ids = [self._generate_chunk_id(document_id, i) for i in range(len(chunks))]
             metadatas = [{
                 "document_id": document_id,
                 "document_name": document_name,
@@ -751,19 +1390,16 @@ class DORAPipeline:
                 "timestamp": str(datetime.now().isoformat())
             } for i in range(len(chunks))]
             
-            # Add to collection with our custom embeddings
-            # Run blocking add in executor to prevent main loop blocking and potential UI freezes
+            # Upsert with our custom embeddings (re-adding a document replaces it), then
+            # drop chunks of the previous version beyond the new chunk count
+            # Writes go through the collection's group-commit writer (off the event loop)
             # Saving to ChromaDB
-            await loop.run_in_executor(
-                None,
-                lambda: collection.add(
-                    documents=chunks,
-                    metadatas=metadatas,
-                    ids=ids,
-                    embeddings=embeddings
-                )
-            )
+            stale_ids = await loop.run_in_executor(None, self._stale_chunk_ids, collection, [document_id], ids)
+            await self._writer(collection).upsert(collection, ids, embeddings, metadatas, chunks)
+            if stale_ids:
+                await self._delete_chunk_ids(collection, stale_ids[document_id])
             
+            self.index_layout.note_write(collection.name, [document_id])
             logger.warning(f"✅ Added doc {document_id[:8]}: {len(chunks)} chunks")
             return len(chunks)
             
@@ -771,34 +1407,300 @@ class DORAPipeline:
             logger.error(f"Error adding document {document_id}: {e}")
             raise
 
-    async def remove_document(self, user_id: str, document_id: str) -> bool:
-        """Remove a document from the vector store"""
+    async def update_document(
+        self,
+        user_id: str,
+        document_id: str,
+        content: str,
+        document_name: str,
+        mime_type: str = None,
+        cancel: Optional[CancellationToken] = None
+    ) -> Dict[str, Any]:
+        """
+        Re-index an edited document, embedding only the chunks whose text changed.
+        
+        The new text is re-chunked and every chunk is matched against the stored
+        chunks by content hash: a chunk with the same text at the same position is
+        left untouched, one that only moved (text inserted or removed above it)
+        is rewritten with its stored vector, and only new text is embedded.
+        Chunks the new version no longer has are deleted.
+        
+        Returns:
+            Dict with chunks, unchanged, moved, embedded, removed and
+            embedding_avoided (fraction of chunks that were not re-embedded)
+        """
         try:
             collection = self._get_user_collection(user_id)
+            loop = asyncio.get_running_loop()
             
-            logger.info(f"Attempting to remove document {document_id} for user {user_id}")
+            chunks = self._split_text(content, mime_type)
+            stored = await loop.run_in_executor(
+                None,
+                lambda: collection.get(where={"document_id": document_id}, include=['documents', 'metadatas', 'embeddings'])
+            )
             
-            # Get all chunks for this document
-            results = collection.get(
-                where={"document_id": document_id}
+            stored_ids = list(stored.get('ids') or [])
+            stored_embeddings = stored.get('embeddings')
+            if stored_embeddings is None:
+                stored_embeddings = [None] * len(stored_ids)
+            stored_by_id = {}
+            vectors_by_hash = {}
+            for chunk_id, text, meta, vector in zip(stored_ids, stored['documents'], stored['metadatas'], stored_embeddings):
+                digest = self._chunk_hash(text or "")
+                stored_by_id[chunk_id] = (digest, meta.get('document_name'))
+                if vector is not None:
+                    vectors_by_hash.setdefault(digest, vector)
+            
+            new_ids = [self._generate_chunk_id(document_id, i) for i in range(len(chunks))]
+            vectors: List[Any] = [None] * len(chunks)
+            writes = []
+            to_embed = []
+            for i, chunk in enumerate(chunks):
+                digest = self._chunk_hash(chunk)
+                if stored_by_id.get(new_ids[i]) == (digest, document_name):
+                    continue  # same text, same position: nothing to write
+                writes.append(i)
+                if digest in vectors_by_hash:
+                    vectors[i] = np.asarray(vectors_by_hash[digest], dtype=np.float32)
+                else:
+                    to_embed.append(i)
+            
+            check_cancelled(cancel)
+            if to_embed:
+                embeddings = await loop.run_in_executor(None, self._encode_chunks, [chunks[i] for i in to_embed], cancel)
+                for i, vector in zip(to_embed, embeddings):
+                    vectors[i] = vector
+            check_cancelled(cancel)
+            
+            timestamp = str(datetime.now().isoformat())
+            for start in range(0, len(writes), self.CHROMA_WRITE_BATCH):
+                batch = writes[start:start + self.CHROMA_WRITE_BATCH]
+                await self._writer(collection).upsert(
+                    collection,
+                    ids=[new_ids[i] for i in batch],
+                    embeddings=[vectors[i] for i in batch],
+                    metadatas=[{
+                        "document_id": document_id,
+                        "document_name": document_name,
+                        "chunk_index": i,
+                        "mime_type": mime_type or "text/plain",
+                        "timestamp": timestamp
+                    } for i in batch],
+                    documents=[chunks[i] for i in batch]
+                )
+            
+            removed = sorted(set(stored_ids) - set(new_ids))
+            if removed:
+                await self._delete_chunk_ids(collection, removed)
+            if writes or removed:
+                self.index_layout.note_write(collection.name, [document_id])
+            
+            self.reindex_stats['documents'] += 1
+            self.reindex_stats['chunks'] += len(chunks)
+            self.reindex_stats['embedded'] += len(to_embed)
+            stats = {
+                'chunks': len(chunks),
+                'unchanged': len(chunks) - len(writes),
+                'moved': len(writes) - len(to_embed),
+                'embedded': len(to_embed),
+                'removed': len(removed),
+                'embedding_avoided': round(1 - len(to_embed) / len(chunks), 3) if chunks else 1.0
+            }
+            logger.warning(
+                f"♻️ Re-indexed doc {document_id[:8]}: {stats['embedded']}/{stats['chunks']} chunks embedded, "
+                f"{stats['unchanged']} unchanged, {stats['moved']} moved, {stats['removed']} removed"
             )
+            return stats
             
-            logger.info(f"Found {len(results['ids']) if results['ids'] else 0} chunks for document {document_id}")
+        except Exception as e:
+            logger.error(f"Error updating document {document_id}: {e}")
+            raise
+    
+    async def remove_document(self, user_id: str, document_id: str) -> bool:
+        """
+        Remove a document from the vector store
+        
+        Returns:
+            False if the document has no chunks; store errors are logged and raised
+        """
+        removed = await self.remove_documents(user_id, [document_id])
+        if removed.get(document_id):
+            return True
+        logger.warning(f"No chunks found for document {document_id}. It may have already been deleted.")
+        return False
+    
+    async def remove_documents(self, user_id: str, document_ids: List[str]) -> Dict[str, int]:
+        """
+        Remove many documents from the vector store in one pass
+        
+        One metadata-only lookup finds which documents exist, then a single
+        `$in` delete removes all their chunks; both run off the event loop.
+        
+        Args:
+            user_id: The ID of the user
+            document_ids: Google Drive document IDs to remove
             
-            if results['ids']:
-                collection.delete(ids=results['ids'])
-                logger.info(f"Successfully removed {len(results['ids'])} chunks for document {document_id}")
-                return True
-            else:
-                logger.warning(f"No chunks found for document {document_id}. It may have already been deleted.")
-                return False
+        Returns:
+            Dict of document_id -> chunks removed (0 for documents not in the knowledge base)
+        """
+        document_ids = list(dict.fromkeys(document_ids))
+        removed = {document_id: 0 for document_id in document_ids}
+        if not document_ids:
+            return removed
+        
+        try:
+            collection = self._get_user_collection(user_id)
+            where = {"document_id": {"$in": document_ids}}
+            
+            loop = asyncio.get_running_loop()
+            existing = await loop.run_in_executor(
+                None, lambda: collection.get(where=where, include=["metadatas"])
+            )
+            for metadata in existing.get('metadatas') or []:
+                document_id = (metadata or {}).get('document_id')
+                if document_id in removed:
+                    removed[document_id] += 1
+            
+            found = [document_id for document_id, chunks in removed.items() if chunks]
+            if not found:
+                logger.info(f"No chunks found for {len(document_ids)} documents of user {user_id}")
+                return removed
+            
+            await self._writer(collection).delete(collection, where={"document_id": {"$in": found}})
+            self.index_layout.note_write(collection.name, found)
+            logger.info(f"🗑️ Removed {len(existing['ids'])} chunks of {len(found)}/{len(document_ids)} documents for user {user_id}")
+            return removed
             
         except Exception as e:
-            logger.error(f"Error removing document {document_id}: {e}")
-            logger.error(f"Error type: {type(e)}")
+            logger.error(f"Error removing {len(document_ids)} documents for user {user_id}: {e}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
-            return False
+            raise
+    
+    async def export_archive(self, user_id: str, path: str) -> Dict[str, Any]:
+        """Export a user's collection (vectors, ids, text, metadata) to an archive file"""
+        return await self.export_collection(self._get_user_collection(user_id), path)
+    
+    async def export_collection(self, collection, path: str, progress=None) -> Dict[str, Any]:
+        """
+        Export a collection to an archive file
+        
+        Pages are read by offset, so a write during the export can shift them;
+        the export is repeated (up to 3 times) until no write was committed
+        while it ran.
+        
+        Args:
+            collection: ChromaDB collection
+            path: Archive file to write
+            progress: Called (from the export thread) with the chunks written so far
+            
+        Returns:
+            The archive manifest
+        """
+        loop = asyncio.get_running_loop()
+        for _ in range(3):
+            version = self._compact_versions.get(collection.name, 0)
+            manifest = await loop.run_in_executor(None, write_archive, collection, path, 5000, progress)
+            if self._compact_versions.get(collection.name, 0) == version:
+                break
+        else:
+            logger.warning(f"⚠️ {collection.name} kept changing during export; the archive may miss recent writes")
+        logger.info(f"📦 Exported {manifest['count']} chunks of {collection.name} ({os.path.getsize(path) / 1024 / 1024:.1f}MB)")
+        return manifest
+    
+    async def load_archive(self, collection, source: ArchiveSource, progress=None) -> int:
+        """
+        Upsert every chunk of a collection archive into a collection, without re-embedding
+        
+        Blocks go through the collection writer, so derived indexes and migration
+        tracking follow as for any other write. The next block is read,
+        decompressed and checksummed while the current one is being written.
+        
+        Args:
+            collection: Target ChromaDB collection
+            source: Archive path or seekable file
+            progress: Called with the number of chunks loaded so far
+            
+        Returns:
+            Number of chunks loaded
+        """
+        loop = asyncio.get_running_loop()
+        writer = self._writer(collection)
+        batch = self.CHROMA_WRITE_BATCH
+        blocks = iter_archive(source)
+        loaded = 0
+        pending = loop.run_in_executor(None, next, blocks, None)
+        while True:
+            block = await pending
+            if block is None:
+                break
+            pending = loop.run_in_executor(None, next, blocks, None)
+            ids, embeddings, documents, metadatas = block
+            await asyncio.gather(*(
+                writer.upsert(collection, ids[i:i + batch], embeddings[i:i + batch], metadatas[i:i + batch], documents[i:i + batch])
+                for i in range(0, len(ids), batch)
+            ))
+            self.index_layout.note_write(
+                collection.name, {(meta or {}).get('document_id') for meta in metadatas} - {None}
+            )
+            loaded += len(ids)
+            if progress is not None:
+                progress(loaded)
+        return loaded
+    
+    async def import_archive(self, user_id: str, source: ArchiveSource, replace: bool = False, progress=None) -> Dict[str, Any]:
+        """
+        Load an exported knowledge base into a user's collection
+        
+        Chunks are merged into the existing collection, or replace it when
+        `replace` is set. Vectors are only comparable within one chunker /
+        embedding version, so merging into a non-empty collection built with
+        another version is refused; an empty or replaced collection takes the
+        archive's version (and is rebuilt by the index migrator if that is stale).
+        The whole archive is checksummed before the collection is touched, so a
+        damaged upload never leaves a half-replaced knowledge base.
+        
+        Args:
+            user_id: The ID of the user
+            source: Archive path or seekable file
+            replace: Drop the user's current chunks first
+            progress: Called with the number of chunks loaded so far
+            
+        Returns:
+            Dict with the collection, chunks loaded, and whether the imported version is stale
+        """
+        loop = asyncio.get_running_loop()
+        manifest = await loop.run_in_executor(None, verify_archive, source)
+        archive_version = collection_index_version(manifest['metadata'])
+        collection = self._get_user_collection(user_id)
+        
+        if collection_index_version(collection.metadata) != archive_version:
+            if collection.count() and not replace:
+                raise ValueError(
+                    f"Archive was built with {archive_version}, the knowledge base with "
+                    f"{collection_index_version(collection.metadata)}; import it with replace"
+                )
+            replace = True
+        if replace:
+            self.drop_collection(collection.name)
+            collection = self._create_collection(
+                collection.name,
+                metadata={"hnsw:space": "cosine", **archive_version},
+                expected_chunks=manifest['count']
+            )
+        
+        started = time.time()
+        loaded = await self.load_archive(collection, source, progress=progress)
+        elapsed = time.time() - started
+        logger.warning(f"📦 Imported {loaded} chunks into {collection.name} in {elapsed:.1f}s "
+                       f"({loaded / max(elapsed, 1e-6):.0f} chunks/s)")
+        return {
+            'collection': collection.name,
+            'chunks_imported': loaded,
+            'replaced': replace,
+            'stale': archive_version != current_index_version(),
+            'seconds': round(elapsed, 1)
+        }
     
     async def query(self, user_id: str, query: str, use_fallback: bool = False) -> Dict[str, Any]:
         """Query the RAG system"""
@@ -823,12 +1725,13 @@ class DORAPipeline:
             # Query expanded
             
             # Generate query embedding using our MPNet model
-            query_embedding = self.embedding_model.encode([expanded_query], show_progress_bar=False).tolist()
+            query_embedding = self.embedding_model.encode([expanded_query], show_progress_bar=False)[0]
             
             # Search for relevant chunks with expanded query
             # OPTIMIZED: Reduced n_results for FASTER response time
-            results = collection.query(
-                query_embeddings=query_embedding,
+            results = await self._search(
+                collection,
+                query_embedding,
                 n_results=12  # Optimized for speed while maintaining quality
             )
             
@@ -1181,6 +2084,27 @@ Answer:
             logger.error(f"Error in multi-document query: {e}")
             raise
     
+    def _vector_storage_stats(self, collection_name: str) -> Dict[str, Any]:
+        stats = {'storage': RAGConfig.VECTOR_STORAGE, 'rescore': RAGConfig.VECTOR_RESCORE, 'searches': dict(self.search_stats)}
+        centroids = self._centroid_indexes.get(collection_name)
+        if centroids is not None:
+            stats['centroids'] = {'documents': len(centroids), 'bytes': centroids.nbytes, 'pending': centroids.pending}
+        index = self._compact_indexes.get(collection_name)
+        if index is not None:
+            float32_bytes = len(index) * (index.dimension or 0) * 4
+            stats.update({
+                'loaded': True,
+                'chunks': len(index),
+                'bytes': index.nbytes,
+                'float32_bytes': float32_bytes,
+                'compression': round(float32_bytes / index.nbytes, 2) if index.nbytes else 0.0
+            })
+            if isinstance(index, IVFPQIndex):
+                stats['ivfpq'] = {'nlist': index.nlist, 'nprobe': index.nprobe, 'subquantizers': index.m, 'trained_on': index.trained_on}
+        else:
+            stats['loaded'] = False
+        return stats
+    
     async def get_database_stats(self, user_id: str) -> Dict[str, Any]:
         """Get database statistics for monitoring large scale operations"""
         try:
@@ -1199,11 +2123,20 @@ Answer:
                     if 'document_id' in meta:
                         unique_docs.add(meta['document_id'])
             
+            reindexed = self.reindex_stats
             return {
                 'total_chunks': count,
                 'sample_size': len(sample.get('ids', [])),
                 'estimated_documents': len(unique_docs),
-                'status': 'healthy' if count > 0 else 'empty'
+                'status': 'healthy' if count > 0 else 'empty',
+                'reindex': {
+                    **reindexed,
+                    'embedding_avoided': round(1 - reindexed['embedded'] / reindexed['chunks'], 3) if reindexed['chunks'] else 0.0
+                },
+                'writes': self._writer(collection).get_stats(),
+                'vectors': self._vector_storage_stats(collection.name),
+                'hnsw': collection_hnsw_params(collection),
+                'compact_indexes_loaded': collection.name in self.residency
             }
             
         except Exception as e:
@@ -19,6 +19,7 @@ os.environ['GOOGLE_CLIENT_SECRET'] = 'test_client_secret'
 os.environ['GOOGLE_REDIRECT_URI'] = 'http://localhost:3000/auth/callback'
 os.environ['ENVIRONMENT'] = 'test'
 os.environ['LOG_LEVEL'] = 'WARNING'
+os.environ['TEXT_CACHE_ENABLED'] = 'false'  # tests that need it build their own cache
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -89,3 +90,17 @@ def reset_mocks(mock_chromadb, mock_sentence_transformer, mock_groq_client):
     mock_sentence_transformer.reset_mock()
     mock_groq_client.reset_mock()
     yield
+
+
+@pytest.fixture
+def fake_pipeline(tmp_path):
+    """DORAPipeline backed by an in-memory Chroma client and a deterministic embedding model"""
+    from services.rag_pipeline import DORAPipeline
+    from utils.index_layout import IndexLayout
+    from tests.fake_chroma import FakeChromaClient, FakeEmbeddingModel
+
+    with patch('services.rag_pipeline.chromadb.PersistentClient', return_value=FakeChromaClient()), \
+         patch('services.rag_pipeline.SentenceTransformer', return_value=FakeEmbeddingModel()), \
+         patch('services.rag_pipeline.Groq'), \
+         patch('services.rag_pipeline.get_index_layout', return_value=IndexLayout(str(tmp_path / "index_layout.json"))):
+        yield DORAPipeline()
@@ -0,0 +1,195 @@
+"""
+In-memory fakes of the ChromaDB client / collection API and the embedding model
+Used by vector store tests and benchmarks (no model download, no persistence)
+"""
+
+import hashlib
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def _matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate the subset of Chroma's where syntax the app uses"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == '$or':
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            (op, value), = condition.items()
+            actual = metadata.get(key)
+            if op == '$eq' and actual != value:
+                return False
+            if op == '$ne' and actual == value:
+                return False
+            if op == '$in' and actual not in value:
+                return False
+            if op == '$nin' and actual in value:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """Dict-backed collection with brute-force cosine query"""
+
+    def __init__(self, name: str, metadata: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.metadata = metadata or {}
+        self.configuration: Dict[str, Any] = {}
+        self._records: Dict[str, Dict[str, Any]] = {}  # insertion ordered
+        self.calls: List[str] = []
+
+    def count(self) -> int:
+        return len(self._records)
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None):
+        self.calls.append('add')
+        for record_id in ids:
+            if record_id in self._records:
+                raise ValueError(f"Duplicate id {record_id}")
+        self._write(ids, embeddings, metadatas, documents)
+
+    def modify(self, name=None, metadata=None, configuration=None):
+        self.calls.append('modify')
+        if metadata is not None:
+            self.metadata = dict(metadata)
+        for key, values in (configuration or {}).items():
+            self.configuration[key] = {**self.configuration.get(key, {}), **values}
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None):
+        self.calls.append('upsert')
+        self._write(ids, embeddings, metadatas, documents)
+
+    def _write(self, ids, embeddings, metadatas, documents):
+        for i, record_id in enumerate(ids):
+            self._records[record_id] = {
+                'embedding': np.asarray(embeddings[i], dtype=np.float32) if embeddings is not None else None,
+                'metadata': dict(metadatas[i]) if metadatas is not None else {},
+                'document': documents[i] if documents is not None else None,
+            }
+
+    def _select(self, ids=None, where=None) -> List[str]:
+        candidates = ids if ids is not None else list(self._records)
+        return [
+            record_id for record_id in candidates
+            if record_id in self._records and _matches(self._records[record_id]['metadata'], where)
+        ]
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        self.calls.append('get')
+        include = include if include is not None else ['documents', 'metadatas']
+        selected = self._select(ids, where)
+        start = offset or 0
+        selected = selected[start:start + limit] if limit is not None else selected[start:]
+        result = {'ids': selected}
+        if 'documents' in include:
+            result['documents'] = [self._records[i]['document'] for i in selected]
+        if 'metadatas' in include:
+            result['metadatas'] = [self._records[i]['metadata'] for i in selected]
+        if 'embeddings' in include:
+            result['embeddings'] = [self._records[i]['embedding'] for i in selected]
+        return result
+
+    def delete(self, ids=None, where=None):
+        self.calls.append('delete')
+        for record_id in self._select(ids, where):
+            del self._records[record_id]
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None):
+        self.calls.append('query')
+        selected = self._select(where=where)
+        result = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        if not selected:
+            for key in result:
+                result[key] = [[] for _ in query_embeddings]
+            return result
+
+        matrix = np.stack([self._records[i]['embedding'] for i in selected])
+        matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            query = query / max(np.linalg.norm(query), 1e-12)
+            distances = 1.0 - matrix @ query
+            order = np.argsort(distances, kind='stable')[:n_results]
+            result['ids'].append([selected[i] for i in order])
+            result['documents'].append([self._records[selected[i]]['document'] for i in order])
+            result['metadatas'].append([self._records[selected[i]]['metadata'] for i in order])
+            result['distances'].append([float(distances[i]) for i in order])
+        return result
+
+
+class FakeChromaClient:
+    """Stand-in for chromadb.PersistentClient"""
+
+    def __init__(self, *args, **kwargs):
+        self.collections: Dict[str, FakeCollection] = {}
+
+    def get_collection(self, name: str, **kwargs) -> FakeCollection:
+        if name not in self.collections:
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.collections[name]
+
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None, **kwargs) -> FakeCollection:
+        if name in self.collections:
+            raise ValueError(f"Collection {name} already exists.")
+        self.collections[name] = FakeCollection(name, metadata)
+        return self.collections[name]
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None, **kwargs) -> FakeCollection:
+        if name not in self.collections:
+            return self.create_collection(name, metadata)
+        return self.collections[name]
+
+    def delete_collection(self, name: str):
+        if name not in self.collections:
+            raise ValueError(f"Collection {name} does not exist.")
+        del self.collections[name]
+
+    def list_collections(self) -> List[FakeCollection]:
+        return list(self.collections.values())
+
+
+class FakeEmbeddingModel:
+    """Deterministic bag-of-words embeddings: texts sharing words are close"""
+
+    def __init__(self, dimension: int = 64):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in text.lower().split():
+            bucket = int.from_bytes(hashlib.md5(word.encode('utf-8')).digest()[:4], 'little')
+            vector[bucket % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        return np.stack([self._embed(text) for text in texts]) if texts else np.zeros((0, self.dimension), dtype=np.float32)
+
+
+class CountingModel:
+    """Wraps an embedding model: counts encode() calls and can slow them down"""
+
+    def __init__(self, model, delay: float = 0.0, on_call=None):
+        self.model = model
+        self.delay = delay
+        self.on_call = on_call
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def encode(self, texts, **kwargs):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        if self.on_call:
+            self.on_call(calls)
+        time.sleep(self.delay)
+        return self.model.encode(texts, **kwargs)
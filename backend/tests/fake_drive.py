@@ -0,0 +1,188 @@
+"""
+In-memory fake of the Google Drive files.list / files.get / batch / changes endpoints
+Used by traversal tests and the performance benchmarks (no network needed)
+"""
+
+import asyncio
+import json
+import re
+from typing import Dict, List, Any, Optional
+
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+PARENT_PATTERN = re.compile(r"'([^']+)' in parents")
+MIME_PATTERN = re.compile(r"mimeType='([^']+)'")
+FILE_URL_PATTERN = re.compile(r"/files/([^/?]+)")
+BATCH_GET_PATTERN = re.compile(r"Content-ID: <([^>]+)>\r\n\r\nGET /drive/v3/files/([^?\s]+)")
+
+
+class FakeResponse:
+    """Minimal stand-in for httpx.Response"""
+
+    def __init__(self, status_code: int, payload: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None, text: Optional[str] = None):
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.headers = headers or {}
+        self.text = text if text is not None else str(self._payload)
+        self.content = self.text.encode('utf-8')
+
+    def json(self) -> Dict[str, Any]:
+        return self._payload
+
+
+class FakeDrive:
+    """
+    Fake Drive tree that answers files.list queries of the form
+    "('a' in parents or 'b' in parents) and ..." with real pagination.
+    """
+
+    def __init__(self, page_size: int = 1000, latency: float = 0.0):
+        self.page_size = page_size
+        self.latency = latency  # simulated round-trip time per request (seconds)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.contents: Dict[str, str] = {}
+        self.requests: List[Dict[str, Any]] = []
+        self.change_log: List[str] = []  # file ids in the order they changed; page tokens index into it
+        self.reject_change_tokens = False
+
+    def add_folder(self, folder_id: str, name: str, parent_id: Optional[str] = None) -> str:
+        self.files[folder_id] = {
+            'id': folder_id,
+            'name': name,
+            'mimeType': FOLDER_MIME,
+            'parents': [parent_id] if parent_id else [],
+            'modifiedTime': '2024-01-01T00:00:00.000Z',
+        }
+        self.change_log.append(folder_id)
+        return folder_id
+
+    def add_file(self, file_id: str, name: str, parent_id: str, mime_type: str = 'application/pdf', size: int = 1024, content: Optional[str] = None) -> str:
+        if content is not None:
+            self.contents[file_id] = content
+            size = len(content.encode('utf-8'))
+        self.files[file_id] = {
+            'id': file_id,
+            'name': name,
+            'mimeType': mime_type,
+            'parents': [parent_id],
+            'size': str(size),
+            'createdTime': '2024-01-01T00:00:00.000Z',
+            'modifiedTime': '2024-01-01T00:00:00.000Z',
+            'webViewLink': f'https://drive.google.com/file/d/{file_id}/view',
+        }
+        self.change_log.append(file_id)
+        return file_id
+
+    def modify(self, file_id: str, modified_time: str, **fields):
+        """Edit a file (or folder) the way Drive does: its parent folder's modifiedTime is untouched"""
+        self.files[file_id].update(fields, modifiedTime=modified_time)
+        self.change_log.append(file_id)
+
+    def remove(self, file_id: str):
+        """Delete a file or folder (its children are left in place, as orphans)"""
+        del self.files[file_id]
+        self.change_log.append(file_id)
+
+    @classmethod
+    def build_tree(cls, depth: int, fanout: int, files_per_folder: int) -> "FakeDrive":
+        """Build a uniform tree: every folder has `fanout` subfolders and `files_per_folder` files"""
+        drive = cls()
+        drive.add_folder('root', 'root')
+        level = ['root']
+        for d in range(depth + 1):
+            next_level = []
+            for folder_id in level:
+                for f in range(files_per_folder):
+                    drive.add_file(f"{folder_id}-f{f}", f"{folder_id}-file{f}.pdf", folder_id)
+                if d < depth:
+                    for c in range(fanout):
+                        next_level.append(drive.add_folder(f"{folder_id}-{c}", f"folder {folder_id}-{c}", folder_id))
+            level = next_level
+        return drive
+
+    def _matches(self, file: Dict[str, Any], query: str) -> bool:
+        parent_ids = set(PARENT_PATTERN.findall(query))
+        if parent_ids and not parent_ids.intersection(file.get('parents', [])):
+            return False
+        mime_types = set(MIME_PATTERN.findall(query))
+        if mime_types and file['mimeType'] not in mime_types:
+            return False
+        return True
+
+    async def get(self, url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None):
+        params = params or {}
+        self.requests.append({'url': url, 'params': dict(params)})
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if url.endswith('/changes/startPageToken'):
+            return FakeResponse(200, {'startPageToken': str(len(self.change_log))})
+        if url.endswith('/changes'):
+            return self._list_changes(params)
+        file_match = FILE_URL_PATTERN.search(url)
+        if file_match:
+            return self._get_file(file_match.group(1), url, params)
+
+        query = params.get('q', '')
+        matches = [f for f in self.files.values() if self._matches(f, query)]
+
+        start = int(params.get('pageToken') or 0)
+        page_size = min(int(params.get('pageSize', self.page_size)), self.page_size)
+        page = matches[start:start + page_size]
+        payload = {'files': [dict(f) for f in page]}
+        if start + page_size < len(matches):
+            payload['nextPageToken'] = str(start + page_size)
+        return FakeResponse(200, payload)
+
+    def _list_changes(self, params: Dict[str, Any]):
+        """changes.list: one entry per changed file id (latest state), paginated"""
+        start = int(params['pageToken'])
+        if self.reject_change_tokens or start > len(self.change_log):
+            return FakeResponse(404, {'error': {'code': 404, 'message': 'Invalid page token'}})
+        end = min(len(self.change_log), start + min(int(params.get('pageSize', self.page_size)), self.page_size))
+        changes = []
+        for file_id in dict.fromkeys(self.change_log[start:end]):
+            file = self.files.get(file_id)
+            changes.append({'fileId': file_id, 'removed': file is None, **({'file': dict(file)} if file else {})})
+        payload = {'changes': changes}
+        if end < len(self.change_log):
+            payload['nextPageToken'] = str(end)
+        else:
+            payload['newStartPageToken'] = str(end)
+        return FakeResponse(200, payload)
+
+    def _get_file(self, file_id: str, url: str, params: Dict[str, Any]):
+        """files.get: metadata, or raw content for alt=media"""
+        file = self.files.get(file_id)
+        if file is None:
+            return FakeResponse(404, {'error': {'code': 404, 'message': f'File not found: {file_id}'}})
+        if 'alt=media' in url or params.get('alt') == 'media':
+            return FakeResponse(200, text=self.contents.get(file_id, f"Content of {file['name']}"))
+        return FakeResponse(200, dict(file))
+
+    async def post(self, url: str, content: bytes = b"", headers: Optional[Dict[str, str]] = None, **kwargs):
+        """Multipart batch endpoint: answers each embedded files.get call"""
+        body = content.decode('utf-8') if isinstance(content, bytes) else content
+        calls = BATCH_GET_PATTERN.findall(body)
+        self.requests.append({'url': url, 'batch_size': len(calls)})
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if len(calls) > 100:
+            return FakeResponse(400, {'error': {'code': 400, 'message': 'Too many requests in batch'}})
+
+        boundary = "batch_fake_response"
+        parts = []
+        for content_id, file_id in calls:
+            file = self.files.get(file_id)
+            status, reason = (200, "OK") if file else (404, "Not Found")
+            payload = json.dumps(file if file else {'error': {'code': 404}})
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n"
+                "\r\n"
+                f"HTTP/1.1 {status} {reason}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n"
+                "\r\n"
+                f"{payload}\r\n"
+            )
+        text = "".join(parts) + f"--{boundary}--\r\n"
+        return FakeResponse(200, headers={'content-type': f'multipart/mixed; boundary={boundary}'}, text=text)
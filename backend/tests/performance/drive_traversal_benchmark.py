@@ -0,0 +1,66 @@
+"""
+Drive folder traversal benchmark
+Compares files.list request counts of each traversal strategy on synthetic deep trees
+
+Run with:
+  cd backend && python -m tests.performance.drive_traversal_benchmark
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+# Settings require OAuth client values even though nothing talks to Google here
+os.environ.setdefault('GOOGLE_CLIENT_ID', 'benchmark')
+os.environ.setdefault('GOOGLE_CLIENT_SECRET', 'benchmark')
+# Measure the Drive access pattern itself, not the per-user quota scheduler
+os.environ.setdefault('DRIVE_USER_REQUESTS_PER_SECOND', '1000000')
+os.environ.setdefault('DRIVE_USER_BURST', '1000000')
+os.environ.setdefault('DRIVE_GLOBAL_REQUESTS_PER_SECOND', '1000000')
+os.environ.setdefault('DRIVE_GLOBAL_BURST', '1000000')
+logging.basicConfig(level=logging.WARNING)
+
+from services.google_docs import GoogleDocsService
+from tests.fake_drive import FakeDrive
+
+TREES = [
+    # (depth, fanout, files per folder)
+    (2, 10, 3),
+    (3, 5, 2),
+    (4, 4, 2),
+    (6, 2, 1),
+]
+
+STRATEGIES = ["recursive", "batched", "materialized", "auto"]
+
+
+async def run_strategy(drive: FakeDrive, traversal: str):
+    async def fake_client():
+        return drive
+
+    service = GoogleDocsService()
+    with patch('services.google_docs.get_http_client', fake_client):
+        start = time.perf_counter()
+        documents = await service.list_all_documents_from_folder('root', 'token', traversal=traversal)
+        elapsed = time.perf_counter() - start
+    return len(documents), service.get_request_stats()['files_list'], elapsed
+
+
+async def main():
+    print(f"{'tree (depth x fanout x files)':<30} {'folders':>8} {'strategy':<13} {'docs':>7} {'requests':>9} {'time':>8}")
+    for depth, fanout, files in TREES:
+        drive = FakeDrive.build_tree(depth, fanout, files)
+        folders = sum(1 for f in drive.files.values() if f['mimeType'] == 'application/vnd.google-apps.folder')
+        for traversal in STRATEGIES:
+            docs, requests, elapsed = await run_strategy(drive, traversal)
+            label = f"{depth} x {fanout} x {files}"
+            print(f"{label:<30} {folders:>8} {traversal:<13} {docs:>7} {requests:>9} {elapsed * 1000:>6.0f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Ingestion scheduling benchmark
+Compares total wall time for a skewed folder (many small text files with a few
+very large PDFs scattered through the listing). The old path downloads in listing
+order, 60 files per gather() barrier, then extracts + embeds groups of 15 files.
+The new path downloads largest first on a continuous pool and packs groups to an
+equal estimated chunk count.
+
+Download, extraction and embedding are simulated with sleeps proportional to
+file size / estimated chunks; extraction + embedding run one group at a time, as
+in the /documents/bulk-add-stream endpoint.
+
+Run with:
+  cd backend && python -m tests.performance.ingest_scheduling_benchmark
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+# Settings require OAuth client values even though nothing talks to Google here
+os.environ.setdefault('GOOGLE_CLIENT_ID', 'benchmark')
+os.environ.setdefault('GOOGLE_CLIENT_SECRET', 'benchmark')
+logging.basicConfig(level=logging.WARNING)
+
+from config import settings
+from utils.ingest_scheduler import (
+    PARSE_COST,
+    PDF_MIME,
+    document_mime_type,
+    document_size,
+    estimate_chunks,
+    schedule_ingestion,
+)
+
+KB = 1024
+MB = 1024 * KB
+
+SMALL_FILES = 400
+LARGE_FILES = 4
+LATENCY = 0.02                 # simulated Drive round trip (seconds)
+DOWNLOAD_BYTES_PER_SECOND = 10 * MB
+SECONDS_PER_CHUNK = 0.00002    # simulated extract + embed cost of one chunk
+
+
+def skewed_folder():
+    """Small text files with one huge PDF every SMALL_FILES / LARGE_FILES entries"""
+    documents = [
+        {'id': f"small-{i}", 'mimeType': 'text/plain', 'size': str((4 + i % 16) * KB)}
+        for i in range(SMALL_FILES)
+    ]
+    step = SMALL_FILES // LARGE_FILES
+    for i in range(LARGE_FILES):
+        documents.insert(i * (step + 1) + step // 2, {'id': f"large-{i}", 'mimeType': PDF_MIME, 'size': str(30 * MB)})
+    return documents
+
+
+def chunks_of(document) -> int:
+    return estimate_chunks(document_size(document), document_mime_type(document), settings.chunk_size)
+
+
+async def download(document):
+    await asyncio.sleep(LATENCY + document_size(document) / DOWNLOAD_BYTES_PER_SECOND)
+    return document
+
+
+async def extract_and_embed(group):
+    cost = sum(chunks_of(doc) * PARSE_COST.get(document_mime_type(doc), 1.0) for doc in group)
+    await asyncio.sleep(cost * SECONDS_PER_CHUNK)
+
+
+async def listing_order(documents):
+    """Old path: gather() per download batch, then fixed-size groups"""
+    fetch_size = settings.bulk_upload_batch_size
+    group_size = settings.embedding_batch_size
+    for start in range(0, len(documents), fetch_size):
+        fetched = await asyncio.gather(*(download(doc) for doc in documents[start:start + fetch_size]))
+        for g in range(0, len(fetched), group_size):
+            await extract_and_embed(fetched[g:g + group_size])
+
+
+async def largest_first(documents):
+    """New path: continuous largest-first downloads feeding chunk-balanced groups"""
+    schedule = schedule_ingestion(
+        documents, download, chunks_of,
+        fetch_concurrency=settings.bulk_upload_batch_size,
+        group_max_items=settings.embedding_batch_size,
+        chunk_size=settings.chunk_size
+    )
+    async for kind, group in schedule:
+        if kind == 'group':
+            await extract_and_embed(group)
+
+
+async def main():
+    documents = skewed_folder()
+    print(f"{SMALL_FILES} small text files + {LARGE_FILES} x 30 MB PDFs spread through the listing, "
+          f"fetch concurrency {settings.bulk_upload_batch_size}, group size {settings.embedding_batch_size}")
+    print(f"{'path':<16} {'time':>9}")
+    timings = {}
+    for name, path in (("listing order", listing_order), ("largest first", largest_first)):
+        start = time.perf_counter()
+        await path(documents)
+        timings[name] = time.perf_counter() - start
+        print(f"{name:<16} {timings[name]:>8.2f}s")
+    print(f"speedup: {timings['listing order'] / timings['largest first']:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+IVF-PQ index benchmark
+Resident memory per million chunks, training time, search latency and
+recall@10 of the IVF-PQ index for several nprobe values, with and without
+float32 rescoring of the top candidates, against exact float32 search
+
+Run with:
+  cd backend && python -m tests.performance.ivfpq_benchmark
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from utils.compact_index import CompactVectorIndex, normalize
+from utils.ivfpq_index import IVFPQIndex
+
+CHUNKS = 500_000
+DIMENSION = 384
+TOPICS = 5_000        # chunks cluster around topics, like real document embeddings
+QUERIES = 100
+K = 10
+RESCORE_CANDIDATES = 4  # rescored candidates = K x this (VECTOR_RESCORE_CANDIDATES)
+IVFPQ_RESCORE_CANDIDATES = 10  # IVFPQ_RESCORE_CANDIDATES
+NLIST = 1024
+SUBQUANTIZERS = 48
+TRAIN_SAMPLE = 65536
+NPROBES = (8, 16, 32, 64)
+HNSW_M = 16           # Chroma's default hnsw:M; level-0 keeps 2 x M int32 links per vector
+BUILD_BLOCK = 50_000
+
+
+def build_vectors(rng: np.random.Generator):
+    topics = normalize(rng.standard_normal((TOPICS, DIMENSION)).astype(np.float32))
+    vectors = np.empty((CHUNKS, DIMENSION), dtype=np.float32)
+    for start in range(0, CHUNKS, BUILD_BLOCK):
+        end = min(start + BUILD_BLOCK, CHUNKS)
+        noise = 0.04 * rng.standard_normal((end - start, DIMENSION)).astype(np.float32)
+        vectors[start:end] = normalize(topics[rng.integers(0, TOPICS, end - start)] + noise)
+    picks = rng.integers(0, CHUNKS, QUERIES)
+    queries = normalize(vectors[picks] + 0.05 * rng.standard_normal((QUERIES, DIMENSION)).astype(np.float32))
+    return vectors, queries
+
+
+def per_million(nbytes: float) -> str:
+    return f"{nbytes / CHUNKS * 1_000_000 / 2**20:>8.0f}MB"
+
+
+def main():
+    rng = np.random.default_rng(5)
+    vectors, queries = build_vectors(rng)
+    ids = [f"doc-{i // 40}_chunk_{i % 40}" for i in range(CHUNKS)]
+    document_ids = [f"doc-{i // 40}" for i in range(CHUNKS)]
+    rows = {chunk_id: i for i, chunk_id in enumerate(ids)}
+
+    started = time.perf_counter()
+    truth = []
+    for query in queries:
+        scores = vectors @ query
+        truth.append(set(np.argpartition(-scores, K - 1)[:K]))
+    float32_latency = (time.perf_counter() - started) / QUERIES
+
+    int8 = CompactVectorIndex('int8')
+    for start in range(0, CHUNKS, BUILD_BLOCK):
+        int8.upsert(ids[start:start + BUILD_BLOCK], vectors[start:start + BUILD_BLOCK], document_ids[start:start + BUILD_BLOCK])
+
+    started = time.perf_counter()
+    sample = vectors[rng.choice(CHUNKS, TRAIN_SAMPLE, replace=False)]
+    ivfpq = IVFPQIndex.train(sample, nlist=NLIST, m=SUBQUANTIZERS)
+    train_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for start in range(0, CHUNKS, BUILD_BLOCK):
+        ivfpq.upsert(ids[start:start + BUILD_BLOCK], vectors[start:start + BUILD_BLOCK], document_ids[start:start + BUILD_BLOCK])
+    encode_seconds = time.perf_counter() - started
+
+    print(f"{CHUNKS} chunks x {DIMENSION} dims, {QUERIES} queries, recall@{K} vs exact float32")
+    print(f"IVF-PQ: {ivfpq.nlist} lists x {ivfpq.m} sub-quantizers, trained on {ivfpq.trained_on} vectors "
+          f"in {train_seconds:.1f}s, encoded in {encode_seconds:.1f}s")
+    print(f"{'index':<26} {'per 1M chunks':>13} {'latency':>10} {'recall@10':>10}")
+    hnsw_bytes = CHUNKS * (DIMENSION * 4 + 2 * HNSW_M * 4)
+    print(f"{'float32 + HNSW (estimate)':<26} {per_million(hnsw_bytes):>13} {'-':>10} {'-':>10}")
+    print(f"{'float32 (exact)':<26} {per_million(vectors.nbytes):>13} {float32_latency * 1000:>8.1f}ms {1.0:>10.3f}")
+
+    def run(name, index, rescore, factor=RESCORE_CANDIDATES):
+        recalls = []
+        started = time.perf_counter()
+        for query, expected in zip(queries, truth):
+            if rescore:
+                candidates = [rows[chunk_id] for chunk_id, _ in index.search(query, K * factor)]
+                # Chroma returns the float32 vectors of just these candidates
+                exact = vectors[candidates] @ query
+                found = {candidates[i] for i in np.argsort(-exact)[:K]}
+            else:
+                found = {rows[chunk_id] for chunk_id, _ in index.search(query, K)}
+            recalls.append(len(found & expected) / K)
+        latency = (time.perf_counter() - started) / QUERIES
+        label = f"{name}{' + rescore' if rescore else ''}"
+        print(f"{label:<26} {per_million(index.nbytes):>13} {latency * 1000:>8.1f}ms {np.mean(recalls):>10.3f}")
+
+    run("int8", int8, True)
+    for nprobe in NPROBES:
+        ivfpq.nprobe = nprobe
+        for rescore in (False, True):
+            run(f"ivfpq nprobe={nprobe}", ivfpq, rescore, IVFPQ_RESCORE_CANDIDATES)
+
+
+if __name__ == "__main__":
+    main()
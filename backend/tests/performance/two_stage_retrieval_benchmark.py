@@ -0,0 +1,95 @@
+"""
+Two-stage retrieval benchmark
+Latency and recall@10 of flat chunk search against a document-centroid
+shortlist (top M documents) followed by chunk search within those documents,
+both over the int8 compact index, with exact float32 search as ground truth
+
+Run with:
+  cd backend && python -m tests.performance.two_stage_retrieval_benchmark
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from utils.centroid_index import CentroidAccumulator, CentroidIndex
+from utils.compact_index import CompactVectorIndex, normalize
+
+DOCUMENTS = 12_500
+CHUNKS_PER_DOCUMENT = 40
+DIMENSION = 384
+TOPICS = 500          # documents cluster around topics; chunks around their document
+QUERIES = 100
+K = 10
+TOP_DOCUMENTS = (5, 10, 20, 50, 100)
+BUILD_BLOCK = 50_000
+
+
+def build(rng: np.random.Generator):
+    chunks = DOCUMENTS * CHUNKS_PER_DOCUMENT
+    topics = normalize(rng.standard_normal((TOPICS, DIMENSION)).astype(np.float32))
+    documents = normalize(topics[rng.integers(0, TOPICS, DOCUMENTS)]
+                          + 0.03 * rng.standard_normal((DOCUMENTS, DIMENSION)).astype(np.float32))
+    vectors = np.empty((chunks, DIMENSION), dtype=np.float32)
+    for start in range(0, chunks, BUILD_BLOCK):
+        end = min(start + BUILD_BLOCK, chunks)
+        owners = np.arange(start, end) // CHUNKS_PER_DOCUMENT
+        noise = 0.04 * rng.standard_normal((end - start, DIMENSION)).astype(np.float32)
+        vectors[start:end] = normalize(documents[owners] + noise)
+    picks = rng.integers(0, chunks, QUERIES)
+    queries = normalize(vectors[picks] + 0.05 * rng.standard_normal((QUERIES, DIMENSION)).astype(np.float32))
+    return vectors, queries
+
+
+def main():
+    rng = np.random.default_rng(11)
+    vectors, queries = build(rng)
+    chunks = len(vectors)
+    ids = [f"doc-{i // CHUNKS_PER_DOCUMENT}_chunk_{i % CHUNKS_PER_DOCUMENT}" for i in range(chunks)]
+    document_ids = [f"doc-{i // CHUNKS_PER_DOCUMENT}" for i in range(chunks)]
+    rows = {chunk_id: i for i, chunk_id in enumerate(ids)}
+
+    truth = []
+    for query in queries:
+        scores = vectors @ query
+        top = np.argpartition(-scores, K - 1)[:K]
+        truth.append(set(top))
+
+    index = CompactVectorIndex('int8')
+    for start in range(0, chunks, BUILD_BLOCK):
+        end = min(start + BUILD_BLOCK, chunks)
+        index.upsert(ids[start:end], vectors[start:end], document_ids[start:end])
+    del vectors
+
+    started = time.perf_counter()
+    accumulator = CentroidAccumulator()
+    index.scan(accumulator.add)
+    centroids = CentroidIndex()
+    centroids.update([], accumulator)
+    build_seconds = time.perf_counter() - started
+
+    print(f"{DOCUMENTS} documents x {CHUNKS_PER_DOCUMENT} chunks = {chunks} chunks x {DIMENSION} dims (int8), "
+          f"{QUERIES} queries, recall@{K} vs exact float32")
+    print(f"centroid index: {len(centroids)} documents, {centroids.nbytes / 2**20:.1f}MB, built in {build_seconds:.2f}s")
+    print(f"{'search':<20} {'latency':>10} {'recall@10':>10}")
+
+    def run(name, search):
+        recalls = []
+        started = time.perf_counter()
+        for query, expected in zip(queries, truth):
+            found = {rows[chunk_id] for chunk_id, _ in search(query)}
+            recalls.append(len(found & expected) / K)
+        latency = (time.perf_counter() - started) / QUERIES
+        print(f"{name:<20} {latency * 1000:>8.1f}ms {np.mean(recalls):>10.3f}")
+
+    run("flat", lambda query: index.search(query, K))
+    for m in TOP_DOCUMENTS:
+        run(f"two-stage M={m}", lambda query: index.search(query, K, centroids.top_documents(query, m)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compact vector storage benchmark
+Memory, snapshot size, search latency and recall@10 of float16 / int8 chunk
+vectors against exact float32 search, with and without float32 rescoring of
+the top candidates
+
+Run with:
+  cd backend && python -m tests.performance.vector_storage_benchmark
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from utils.compact_index import CompactVectorIndex, normalize
+
+CHUNKS = 200_000
+DIMENSION = 384
+TOPICS = 2_000        # chunks cluster around topics, like real document embeddings
+QUERIES = 200
+K = 10
+RESCORE_CANDIDATES = 4  # rescored candidates = K x this (VECTOR_RESCORE_CANDIDATES)
+
+
+def build_vectors(rng: np.random.Generator):
+    topics = normalize(rng.standard_normal((TOPICS, DIMENSION)).astype(np.float32))
+    assignment = rng.integers(0, TOPICS, CHUNKS)
+    vectors = normalize(topics[assignment] + 0.07 * rng.standard_normal((CHUNKS, DIMENSION)).astype(np.float32))
+    picks = rng.integers(0, CHUNKS, QUERIES)
+    queries = normalize(vectors[picks] + 0.1 * rng.standard_normal((QUERIES, DIMENSION)).astype(np.float32))
+    return vectors, queries
+
+
+def exact_top(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def main():
+    rng = np.random.default_rng(7)
+    vectors, queries = build_vectors(rng)
+    ids = [f"doc-{i // 40}_chunk_{i % 40}" for i in range(CHUNKS)]
+    rows = {chunk_id: i for i, chunk_id in enumerate(ids)}
+    document_ids = [chunk_id.split('_chunk_')[0] for chunk_id in ids]
+
+    started = time.perf_counter()
+    truth = [set(exact_top(vectors, query, K)) for query in queries]
+    float32_latency = (time.perf_counter() - started) / QUERIES
+
+    with tempfile.TemporaryDirectory() as directory:
+        float32_path = os.path.join(directory, "float32.npy")
+        np.save(float32_path, vectors)
+        float32_disk = os.path.getsize(float32_path)
+
+        print(f"{CHUNKS} chunks x {DIMENSION} dims, {QUERIES} queries, recall@{K} vs exact float32")
+        print(f"{'storage':<18} {'memory':>10} {'disk':>10} {'latency':>10} {'recall@10':>10}")
+        print(f"{'float32 (exact)':<18} {vectors.nbytes / 2**20:>8.1f}MB {float32_disk / 2**20:>8.1f}MB "
+              f"{float32_latency * 1000:>8.1f}ms {1.0:>10.3f}")
+
+        for storage in ('float16', 'int8'):
+            index = CompactVectorIndex(storage)
+            index.upsert(ids, vectors, document_ids)
+            path = os.path.join(directory, f"{storage}.npz")
+            index.save(path)
+            disk = os.path.getsize(path)
+
+            for rescore in (False, True):
+                recalls = []
+                started = time.perf_counter()
+                for query, expected in zip(queries, truth):
+                    if rescore:
+                        candidates = [rows[chunk_id] for chunk_id, _ in index.search(query, K * RESCORE_CANDIDATES)]
+                        # Chroma returns the float32 vectors of just these candidates
+                        exact = vectors[candidates] @ query
+                        found = {candidates[i] for i in np.argsort(-exact)[:K]}
+                    else:
+                        found = {rows[chunk_id] for chunk_id, _ in index.search(query, K)}
+                    recalls.append(len(found & expected) / K)
+                latency = (time.perf_counter() - started) / QUERIES
+
+                name = f"{storage}{' + rescore' if rescore else ''}"
+                print(f"{name:<18} {index.nbytes / 2**20:>8.1f}MB {disk / 2**20:>8.1f}MB "
+                      f"{latency * 1000:>8.1f}ms {np.mean(recalls):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Tests for bulk document removal
+Run with: pytest tests/test_bulk_delete.py -v
+"""
+
+import os
+import pytest
+import sys
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+
+def _doc(doc_id: str, paragraphs: int = 4):
+    content = "\n\n".join(f"Note {i} for {doc_id} about the quarterly plan and its owners. " * 5 for i in range(paragraphs))
+    return {'id': doc_id, 'name': f"{doc_id}.txt", 'mime_type': 'text/plain', 'content': content}
+
+
+def _stored_documents(collection):
+    return {meta['document_id'] for meta in collection.get(include=['metadatas'])['metadatas']}
+
+
+class TestRemoveDocuments:
+    """Many documents are removed with one lookup and one delete"""
+
+    async def test_one_lookup_and_one_delete_for_many_documents(self, fake_pipeline):
+        await fake_pipeline.add_documents_bulk('u1', [_doc(f"doc-{i}") for i in range(30)])
+        collection = fake_pipeline._get_user_collection('u1')
+        collection.calls.clear()
+
+        removed = await fake_pipeline.remove_documents('u1', [f"doc-{i}" for i in range(20)])
+
+        assert collection.calls == ['get', 'delete']
+        assert all(chunks > 0 for chunks in removed.values())
+        assert _stored_documents(collection) == {f"doc-{i}" for i in range(20, 30)}
+
+    async def test_missing_documents_are_reported(self, fake_pipeline):
+        await fake_pipeline.add_documents_bulk('u1', [_doc('alpha'), _doc('beta')])
+        collection = fake_pipeline._get_user_collection('u1')
+        chunks = collection.count()
+        collection.calls.clear()
+
+        removed = await fake_pipeline.remove_documents('u1', ['alpha', 'beta', 'gone', 'alpha'])
+
+        assert list(removed) == ['alpha', 'beta', 'gone']
+        assert removed['gone'] == 0
+        assert removed['alpha'] + removed['beta'] == chunks
+        assert collection.count() == 0
+
+    async def test_nothing_to_remove_skips_delete(self, fake_pipeline):
+        await fake_pipeline.add_documents_bulk('u1', [_doc('alpha')])
+        collection = fake_pipeline._get_user_collection('u1')
+        collection.calls.clear()
+
+        removed = await fake_pipeline.remove_documents('u1', ['gone'])
+
+        assert removed == {'gone': 0}
+        assert 'delete' not in collection.calls
+
+    async def test_removal_is_recorded_for_running_migration(self, fake_pipeline):
+        await fake_pipeline.add_documents_bulk('u1', [_doc('alpha'), _doc('beta')])
+        collection = fake_pipeline._get_user_collection('u1')
+
+        with patch.object(fake_pipeline.index_layout, 'note_write') as note_write:
+            await fake_pipeline.remove_documents('u1', ['alpha', 'beta', 'gone'])
+
+        note_write.assert_called_once_with(collection.name, ['alpha', 'beta'])
+
+    async def test_single_remove_uses_the_same_path(self, fake_pipeline):
+        await fake_pipeline.add_documents_bulk('u1', [_doc('alpha'), _doc('beta')])
+
+        assert await fake_pipeline.remove_document('u1', 'alpha') is True
+        assert await fake_pipeline.remove_document('u1', 'alpha') is False
+        assert _stored_documents(fake_pipeline._get_user_collection('u1')) == {'beta'}
+
+
+class TestDeleteEndpoint:
+    """POST /knowledge-base/delete reports what was removed"""
+
+    async def test_endpoint_reports_deleted_and_missing(self, fake_pipeline):
+        import main
+        from models.schemas import DeleteDocumentsRequest
+
+        await fake_pipeline.add_documents_bulk('u1', [_doc('alpha'), _doc('beta')])
+        chunks = fake_pipeline._get_user_collection('u1').count()
+
+        with patch.object(main, 'dora_pipeline', fake_pipeline):
+            response = await main.delete_documents_bulk(
+                DeleteDocumentsRequest(document_ids=['alpha', 'beta', 'gone']), current_user={'sub': 'u1'}
+            )
+
+        assert response['deleted'] == ['alpha', 'beta']
+        assert response['not_found'] == ['gone']
+        assert response['total_chunks_removed'] == chunks
+
+    async def test_store_error_is_not_reported_as_not_found(self, fake_pipeline):
+        import main
+        from fastapi import HTTPException
+
+        await fake_pipeline.add_documents_bulk('u1', [_doc('alpha')])
+        collection = fake_pipeline._get_user_collection('u1')
+
+        with patch.object(main, 'dora_pipeline', fake_pipeline), \
+             patch.object(type(collection), 'get', side_effect=RuntimeError("sqlite locked")):
+            with pytest.raises(HTTPException) as error:
+                await main.delete_single_document('alpha', current_user={'sub': 'u1'})
+
+        assert error.value.status_code == 500
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,156 @@
+"""
+Tests for cooperative cancellation of ingestion work
+Run with: pytest tests/test_cancellation.py -v
+"""
+
+import asyncio
+import json
+import os
+import pytest
+import sys
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from services.google_docs import GoogleDocsService
+from tests.fake_chroma import CountingModel
+from tests.fake_drive import FakeDrive
+from utils.cancellation import CancellationToken, OperationCancelled
+
+
+def _text(doc_id: str, chunks: int) -> str:
+    """Roughly `chunks` chunks of sentence text at the default chunk size"""
+    sentence = f"Paragraph about {doc_id} and its many details number {{}}. "
+    return "".join(sentence.format(i) for i in range(chunks * 14))
+
+
+class TestCancellationToken:
+    """Child tokens follow their parent"""
+
+    def test_child_is_cancelled_with_parent(self):
+        parent = CancellationToken()
+        child = parent.child()
+
+        parent.cancel("client disconnected")
+
+        assert child.cancelled
+        assert child.reason == "client disconnected"
+        with pytest.raises(OperationCancelled):
+            child.raise_if_cancelled()
+
+    def test_child_cancel_leaves_parent_running(self):
+        parent = CancellationToken()
+        child = parent.child()
+
+        child.cancel("timed out")
+
+        assert child.cancelled and not parent.cancelled
+
+
+class TestPipelineCheckpoints:
+    """add_documents_bulk stops between embedding slices and write batches"""
+
+    async def test_embedding_stops_after_cancel(self, fake_pipeline):
+        cancel = CancellationToken()
+        model = CountingModel(fake_pipeline.embedding_model, on_call=lambda calls: cancel.cancel("client disconnected"))
+        fake_pipeline.embedding_model = model
+        documents = [{'id': f"doc-{i}", 'name': f"doc-{i}", 'content': _text(f"doc-{i}", 200)} for i in range(5)]
+
+        with pytest.raises(OperationCancelled):
+            await fake_pipeline.add_documents_bulk('u1', documents, cancel=cancel)
+
+        assert model.calls == 1
+        assert fake_pipeline._get_user_collection('u1').count() == 0
+
+    async def test_partially_written_document_is_removed(self, fake_pipeline):
+        cancel = CancellationToken()
+        collection = fake_pipeline._get_user_collection('u1')
+        upsert = collection.upsert
+
+        def upsert_then_cancel(**kwargs):
+            upsert(**kwargs)
+            cancel.cancel("client disconnected")
+
+        documents = [
+            {'id': 'complete', 'name': 'complete', 'content': _text('complete', 2)},
+            {'id': 'partial', 'name': 'partial', 'content': _text('partial', 6)},
+        ]
+        complete_chunks = len(fake_pipeline._split_text(documents[0]['content']))
+
+        with patch.object(fake_pipeline, 'CHROMA_WRITE_BATCH', complete_chunks + 1), \
+             patch.object(collection, 'upsert', upsert_then_cancel):
+            with pytest.raises(OperationCancelled):
+                await fake_pipeline.add_documents_bulk('u1', documents, collection=collection, cancel=cancel)
+
+        stored = {meta['document_id'] for meta in collection.get(include=['metadatas'])['metadatas']}
+        assert stored == {'complete'}
+        assert collection.count() == complete_chunks
+
+    async def test_queued_parse_is_skipped(self):
+        service = GoogleDocsService()
+        cancel = CancellationToken()
+        cancel.cancel("client disconnected")
+
+        with patch.object(service, '_parse_pdf_sync') as parse:
+            with pytest.raises(OperationCancelled):
+                await service.extract_text_from_raw(b"%PDF", 'application/pdf', cancel=cancel)
+
+        parse.assert_not_called()
+
+
+class FakeRequest:
+    """Starlette request stand-in whose client can be disconnected"""
+
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+class TestStreamDisconnect:
+    """A client leaving mid-upload stops downloads, parsing and embedding"""
+
+    async def test_disconnect_mid_stream_stops_cpu_work(self, fake_pipeline):
+        import main
+        from models.schemas import FolderRequest
+
+        drive = FakeDrive(latency=0.01)
+        drive.add_folder('root', 'root')
+        for i in range(45):
+            drive.add_file(f"doc-{i}", f"doc-{i}.txt", 'root', mime_type='text/plain', content=_text(f"doc-{i}", 120))
+
+        async def fake_client():
+            return drive
+
+        # ~7 slices of 0.1s per group: longer than the disconnect watcher's poll interval
+        model = CountingModel(fake_pipeline.embedding_model, delay=0.1)
+        fake_pipeline.embedding_model = model
+        request = FakeRequest()
+        statuses = []
+
+        with patch.object(main, 'dora_pipeline', fake_pipeline), \
+             patch('services.google_docs.get_http_client', fake_client):
+            response = await main.bulk_upload_parallel_stream(
+                FolderRequest(folder_url='root'), request, x_google_token='token', current_user={'sub': 'u1'}
+            )
+            async for event in response.body_iterator:
+                status = json.loads(event[len('data: '):])
+                statuses.append(status.get('status'))
+                if status.get('status') == 'fetched':
+                    # Client goes away while the first group is being embedded
+                    request.disconnected = True
+
+            calls_at_end = model.calls
+            await asyncio.sleep(0.5)
+
+        assert statuses.count('fetched') == 1
+        assert 'saved' not in statuses and 'complete' not in statuses
+        # The first group stopped part-way through embedding and nothing ran afterwards
+        assert model.calls == calls_at_end
+        assert fake_pipeline._get_user_collection('u1').count() == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
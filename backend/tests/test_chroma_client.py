@@ -0,0 +1,62 @@
+"""
+Tests for bounding Chroma's HNSW cache at client startup
+Run with: pytest tests/test_chroma_client.py -v
+"""
+
+import os
+import resource
+import sys
+
+import pytest
+from unittest.mock import patch
+from chromadb.config import Settings
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.chroma_client import open_persistent_client, FILES_PER_CACHED_COLLECTION
+
+
+SETTINGS = Settings(anonymized_telemetry=False, allow_reset=True)
+
+
+class TestOpenPersistentClient:
+    """The open-file limit sizes Chroma's HNSW cache and is restored afterwards"""
+
+    @staticmethod
+    def _open(tmp_path, **kwargs):
+        limits = []
+
+        def client(**_):
+            limits.append(resource.getrlimit(resource.RLIMIT_NOFILE)[0])
+            return object()
+
+        with patch('utils.chroma_client.chromadb.PersistentClient', side_effect=client):
+            _, cache_size = open_persistent_client(str(tmp_path), SETTINGS, **kwargs)
+        return limits[0], cache_size
+
+    def test_cache_is_bounded_and_limit_restored(self, tmp_path):
+        before = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+        startup_limit, cache_size = self._open(tmp_path, hnsw_cache_collections=40)
+
+        assert resource.getrlimit(resource.RLIMIT_NOFILE) == before
+        assert startup_limit < before[0]
+        assert cache_size == startup_limit // FILES_PER_CACHED_COLLECTION
+        assert cache_size >= 40
+
+    def test_descriptors_in_use_keep_headroom(self, tmp_path):
+        startup_limit, _ = self._open(tmp_path, hnsw_cache_collections=1)
+
+        assert startup_limit > len(os.listdir('/proc/self/fd'))
+
+    def test_zero_keeps_chroma_default(self, tmp_path):
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+        startup_limit, cache_size = self._open(tmp_path)
+
+        assert startup_limit == soft and cache_size == soft // FILES_PER_CACHED_COLLECTION
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,101 @@
+"""
+Tests for chunk-level diff re-indexing of edited documents
+Run with: pytest tests/test_chunk_diff.py -v
+"""
+
+import os
+import pytest
+import sys
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from tests.fake_chroma import CountingModel
+
+
+def _paragraphs(count: int):
+    return [
+        f"Section {i} covers the rollout plan for region {i}. It lists owners, dates and risks for team {i}. "
+        f"Budget line {i} is reviewed monthly." for i in range(count)
+    ]
+
+
+def _stored(collection):
+    result = collection.get(include=['documents', 'embeddings'])
+    return {chunk_id: (text, tuple(vector)) for chunk_id, text, vector in zip(result['ids'], result['documents'], result['embeddings'])}
+
+
+class TestUpdateDocument:
+    """Only chunks with new text are embedded"""
+
+    async def test_one_paragraph_edit_embeds_one_chunk(self, fake_pipeline):
+        paragraphs = _paragraphs(60)
+        await fake_pipeline.add_document('u1', 'doc', "\n\n".join(paragraphs), 'doc.txt', 'text/plain')
+        model = CountingModel(fake_pipeline.embedding_model)
+        fake_pipeline.embedding_model = model
+
+        paragraphs[30] = "Section 30 was rewritten with a new approach to staffing and hiring."
+        stats = await fake_pipeline.update_document('u1', 'doc', "\n\n".join(paragraphs), 'doc.txt', 'text/plain')
+
+        assert stats['embedded'] == 1
+        assert stats['unchanged'] == stats['chunks'] - 1
+        assert stats['embedding_avoided'] >= 0.8
+        assert model.calls == 1
+
+    async def test_result_matches_full_reingest(self, fake_pipeline):
+        paragraphs = _paragraphs(40)
+        await fake_pipeline.add_document('u1', 'doc', "\n\n".join(paragraphs), 'doc.txt', 'text/plain')
+        edited = "\n\n".join(["A new introduction was added at the top."] + paragraphs[:20] + paragraphs[25:])
+
+        await fake_pipeline.update_document('u1', 'doc', edited, 'doc.txt', 'text/plain')
+        updated = _stored(fake_pipeline._get_user_collection('u1'))
+        await fake_pipeline.remove_document('u1', 'doc')
+        await fake_pipeline.add_document('u1', 'doc', edited, 'doc.txt', 'text/plain')
+
+        assert updated == _stored(fake_pipeline._get_user_collection('u1'))
+
+    async def test_unchanged_document_writes_nothing(self, fake_pipeline):
+        content = "\n\n".join(_paragraphs(20))
+        await fake_pipeline.add_document('u1', 'doc', content, 'doc.txt', 'text/plain')
+        collection = fake_pipeline._get_user_collection('u1')
+        collection.calls.clear()
+
+        stats = await fake_pipeline.update_document('u1', 'doc', content, 'doc.txt', 'text/plain')
+
+        assert stats['embedded'] == 0 and stats['embedding_avoided'] == 1.0
+        assert 'upsert' not in collection.calls and 'delete' not in collection.calls
+
+    async def test_moved_chunks_reuse_vectors_and_removed_are_deleted(self, fake_pipeline):
+        old = ['alpha text', 'beta text', 'gamma text', 'delta text']
+        new = ['beta text', 'gamma text', 'epsilon text']
+        with patch.object(fake_pipeline, '_split_text', return_value=old):
+            await fake_pipeline.add_document('u1', 'doc', 'v1', 'doc.txt')
+        before = {text: vector for text, vector in _stored(fake_pipeline._get_user_collection('u1')).values()}
+        model = CountingModel(fake_pipeline.embedding_model)
+        fake_pipeline.embedding_model = model
+
+        with patch.object(fake_pipeline, '_split_text', return_value=new):
+            stats = await fake_pipeline.update_document('u1', 'doc', 'v2', 'doc.txt')
+
+        after = _stored(fake_pipeline._get_user_collection('u1'))
+        assert stats == {'chunks': 3, 'unchanged': 0, 'moved': 2, 'embedded': 1, 'removed': 1, 'embedding_avoided': 0.667}
+        assert sorted(text for text, _ in after.values()) == sorted(new)
+        assert after['doc_chunk_0'][1] == before['beta text']
+        assert after['doc_chunk_1'][1] == before['gamma text']
+
+    async def test_database_stats_report_work_avoided(self, fake_pipeline):
+        paragraphs = _paragraphs(60)
+        await fake_pipeline.add_document('u1', 'doc', "\n\n".join(paragraphs), 'doc.txt', 'text/plain')
+        paragraphs[45] = "Section 45 now says something different."
+        await fake_pipeline.update_document('u1', 'doc', "\n\n".join(paragraphs), 'doc.txt', 'text/plain')
+
+        reindex = (await fake_pipeline.get_database_stats('u1'))['reindex']
+
+        assert reindex['documents'] == 1
+        assert reindex['embedding_avoided'] == pytest.approx(1 - reindex['embedded'] / reindex['chunks'], abs=1e-3)
+        assert reindex['embedding_avoided'] > 0.5
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,186 @@
+"""
+Tests for cold-tier archival of inactive knowledge bases
+Run with: pytest tests/test_cold_tier.py -v
+"""
+
+import asyncio
+import os
+import pytest
+import sys
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from services.cold_tier import ColdTierManager
+from utils.collection_archive import iter_archive, read_manifest, write_archive
+from tests.fake_chroma import FakeCollection
+
+DAY = 86400
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _doc(doc_id: str, paragraphs: int = 4):
+    content = "\n\n".join(f"Section {i} of {doc_id}: revenue, churn and the hiring plan. " * 5 for i in range(paragraphs))
+    return {'id': doc_id, 'name': f"{doc_id}.txt", 'mime_type': 'text/plain', 'content': content}
+
+
+def _snapshot(collection):
+    page = collection.get(include=['embeddings', 'documents', 'metadatas'])
+    return {
+        chunk_id: (np.asarray(vector).tolist(), document, metadata)
+        for chunk_id, vector, document, metadata in zip(page['ids'], page['embeddings'], page['documents'], page['metadatas'])
+    }
+
+
+@pytest.fixture
+def cold_tier(fake_pipeline, tmp_path):
+    clock = FakeClock()
+    manager = ColdTierManager(fake_pipeline, str(tmp_path / "cold_tier"), inactive_days=30, clock=clock)
+    manager.PAGE_SIZE = 4  # several blocks per archive
+    return manager, clock
+
+
+class TestCollectionArchive:
+    """Archive file format"""
+
+    def test_round_trip(self, tmp_path):
+        collection = FakeCollection('user_a', metadata={'index_version': 'v1'})
+        vectors = np.random.default_rng(0).standard_normal((10, 8)).astype(np.float32)
+        collection.upsert(
+            ids=[f"c{i}" for i in range(10)],
+            embeddings=vectors,
+            metadatas=[{'document_id': f"d{i % 3}", 'chunk_index': i} for i in range(10)],
+            documents=[f"chunk {i} ✓" for i in range(10)]
+        )
+        path = str(tmp_path / "user_a.archive.zip")
+        progress = []
+
+        manifest = write_archive(collection, path, page_size=4, progress=progress.append)
+
+        assert progress == [4, 8, 10]
+        assert manifest['count'] == 10 and manifest['dimension'] == 8 and len(manifest['blocks']) == 3
+        assert read_manifest(path)['metadata'] == {'index_version': 'v1'}
+        restored = FakeCollection('user_a')
+        for ids, embeddings, documents, metadatas in iter_archive(path):
+            restored.upsert(ids, embeddings, metadatas, documents)
+        assert _snapshot(restored) == _snapshot(collection)
+        assert not os.path.exists(f"{path}.tmp")
+
+
+class TestColdTier:
+    """Archive inactive users, restore on their next request"""
+
+    async def test_inactive_user_is_archived_and_restored(self, fake_pipeline, cold_tier):
+        manager, clock = cold_tier
+        await fake_pipeline.add_documents_bulk('a', [_doc('a-1'), _doc('a-2')])
+        await fake_pipeline.add_documents_bulk('b', [_doc('b-1')])
+        name = fake_pipeline.index_layout.active_collection('a')
+        before = _snapshot(fake_pipeline.chroma_client.get_collection(name))
+
+        assert await manager.sweep() == []  # first sighting starts the clock
+        clock.now += 20 * DAY
+        manager.note_activity('b')
+        clock.now += 15 * DAY
+
+        assert await manager.sweep() == ['a']
+        assert name not in fake_pipeline.chroma_client.collections
+        status = manager.get_status('a')
+        assert status['state'] == 'archived' and status['chunks'] == len(before)
+        assert os.path.exists(status['path'])
+
+        status = await manager.ensure_restored('a')
+
+        assert status['state'] == 'hot'
+        assert _snapshot(fake_pipeline.chroma_client.get_collection(name)) == before
+        assert not manager.is_archived('a')
+        stats = manager.get_stats()
+        assert stats['archived'] == 1 and stats['restored'] == 1 and stats['archived_users'] == 0
+
+    async def test_restored_collection_is_searchable(self, fake_pipeline, cold_tier):
+        manager, clock = cold_tier
+        await fake_pipeline.add_documents_bulk('a', [_doc('a-1')])
+        await manager.sweep()
+        clock.now += 31 * DAY
+        await manager.sweep()
+
+        await manager.ensure_restored('a')
+
+        query = fake_pipeline.embedding_model.encode(["churn"])[0]
+        results = await fake_pipeline._search(fake_pipeline._get_user_collection('a'), query, n_results=3)
+        assert {meta['document_id'] for meta in results['metadatas'][0]} == {'a-1'}
+
+    async def test_restore_reports_progress(self, fake_pipeline, cold_tier):
+        manager, clock = cold_tier
+        await fake_pipeline.add_documents_bulk('a', [_doc('a-1', paragraphs=60)])
+        await manager.sweep()
+        clock.now += 31 * DAY
+        await manager.sweep()
+        total = manager.get_status('a')['chunks']
+        assert total > 2 * manager.PAGE_SIZE
+
+        status = await manager.ensure_restored('a', wait=0)
+        assert status['state'] == 'restoring' and status['total'] == total
+        seen = set()
+        while manager.get_status('a')['state'] == 'restoring':
+            seen.add(manager.get_status('a')['chunks'])
+            await asyncio.sleep(0.01)
+
+        assert manager.get_status('a')['state'] == 'hot'
+        assert any(0 < chunks < total for chunks in seen)  # progress was visible mid-restore
+
+    async def test_write_during_export_keeps_collection(self, fake_pipeline, cold_tier):
+        manager, clock = cold_tier
+        await fake_pipeline.add_documents_bulk('a', [_doc('a-1')])
+        await manager.sweep()
+        clock.now += 31 * DAY
+        name = fake_pipeline.index_layout.active_collection('a')
+        original_get = fake_pipeline.chroma_client.get_collection(name).get
+
+        def get_then_write(*args, **kwargs):
+            fake_pipeline.index_layout.note_write(name, ['a-2'])
+            return original_get(*args, **kwargs)
+
+        fake_pipeline.chroma_client.get_collection(name).get = get_then_write
+
+        assert await manager.archive('a') is False
+        assert name in fake_pipeline.chroma_client.collections
+        assert not manager.is_archived('a') and manager.get_stats()['aborted'] == 1
+        assert os.listdir(manager.archive_dir) == ['cold_tier.json']
+
+    async def test_discard_deletes_archive(self, fake_pipeline, cold_tier):
+        manager, clock = cold_tier
+        await fake_pipeline.add_documents_bulk('a', [_doc('a-1')])
+        await manager.sweep()
+        clock.now += 31 * DAY
+        await manager.sweep()
+        path = manager.get_status('a')['path']
+
+        assert await manager.discard('a') > 0
+
+        assert not os.path.exists(path)
+        assert manager.get_status('a')['state'] == 'hot'
+
+    async def test_state_survives_restart(self, fake_pipeline, cold_tier):
+        manager, clock = cold_tier
+        await fake_pipeline.add_documents_bulk('a', [_doc('a-1')])
+        await manager.sweep()
+        clock.now += 31 * DAY
+        await manager.sweep()
+
+        reopened = ColdTierManager(fake_pipeline, manager.archive_dir, inactive_days=30, clock=clock)
+
+        assert reopened.is_archived('a')
+        assert (await reopened.ensure_restored('a'))['state'] == 'hot'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,144 @@
+"""
+Tests for unloading idle collections' search indexes
+Run with: pytest tests/test_collection_residency.py -v
+"""
+
+import os
+import pytest
+import sys
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.collection_residency import CollectionResidency
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _doc(doc_id: str, paragraphs: int = 4):
+    content = "\n\n".join(f"Topic {i} of {doc_id}: budgets, hiring and the launch timeline. " * 5 for i in range(paragraphs))
+    return {'id': doc_id, 'name': f"{doc_id}.txt", 'mime_type': 'text/plain', 'content': content}
+
+
+class TestCollectionResidency:
+    """LRU / TTL bookkeeping"""
+
+    def test_first_touch_is_a_load(self):
+        residency = CollectionResidency()
+
+        assert residency.touch('user_a', 100) is False
+        assert residency.touch('user_a') is True
+        assert residency.resident_bytes == 100
+
+    def test_idle_collections_are_evictable(self):
+        clock = FakeClock()
+        residency = CollectionResidency(idle_ttl=60, clock=clock)
+        residency.touch('user_a', 10)
+        clock.now += 30
+        residency.touch('user_b', 10)
+        clock.now += 40
+
+        assert residency.evictable() == [('user_a', 'idle')]
+        assert residency.evictable(protect='user_a') == []
+
+    def test_budget_evicts_least_recently_used(self):
+        residency = CollectionResidency(budget_bytes=250)
+        for name in ('user_a', 'user_b', 'user_c'):
+            residency.touch(name, 100)
+        residency.touch('user_a')
+
+        assert residency.evictable() == [('user_b', 'budget')]
+
+    def test_count_cap(self):
+        residency = CollectionResidency(max_resident=1)
+        residency.touch('user_a', 1)
+        residency.touch('user_b', 1)
+
+        assert residency.evictable(protect='user_b') == [('user_a', 'budget')]
+
+    def test_stats(self):
+        residency = CollectionResidency(idle_ttl=60)
+        residency.touch('user_a', 2 * 1024 * 1024)
+        residency.record_load('user_a', 0.25)
+        residency.touch('user_b', 0)
+        residency.record_load('user_b', 0.05)
+        residency.discard('user_b', 'idle')
+
+        stats = residency.get_stats()
+        assert stats['loaded_collections'] == 1 and stats['loaded_mb'] == 2.0
+        assert stats['loads'] == 2 and stats['idle_evictions'] == 1
+        assert stats['load_ms']['max'] == 250.0 and stats['load_ms']['last'] == 50.0
+
+
+@pytest.fixture
+def int8_storage(tmp_path):
+    with patch('services.rag_pipeline.RAGConfig.VECTOR_STORAGE', 'int8'), \
+         patch('services.rag_pipeline.RAGConfig.COMPACT_INDEX_DIR', str(tmp_path / "compact_index")):
+        yield
+
+
+class TestPipelineResidency:
+    """Searches load collections and unload idle ones"""
+
+    async def test_idle_collection_is_unloaded_and_reloaded(self, fake_pipeline, int8_storage):
+        clock = FakeClock()
+        fake_pipeline.residency = CollectionResidency(idle_ttl=60, clock=clock)
+        for user_id in ('a', 'b'):
+            await fake_pipeline.add_documents_bulk(user_id, [_doc(f"{user_id}-doc")])
+        first = fake_pipeline._get_user_collection('a')
+        second = fake_pipeline._get_user_collection('b')
+        query = fake_pipeline.embedding_model.encode(["budgets"])[0]
+
+        await fake_pipeline._search(first, query, n_results=3)
+        clock.now += 61
+        await fake_pipeline._search(second, query, n_results=3)
+
+        assert first.name not in fake_pipeline.residency
+        assert first.name not in fake_pipeline._compact_indexes
+        assert os.path.exists(fake_pipeline._compact_index_path(first.name))  # saved before unloading
+
+        results = await fake_pipeline._search(first, query, n_results=3)
+        assert {meta['document_id'] for meta in results['metadatas'][0]} == {'a-doc'}
+        stats = fake_pipeline.residency.get_stats()
+        assert stats['loads'] == 3 and stats['idle_evictions'] == 1
+        assert stats['loaded_collections'] == 2
+
+    async def test_memory_budget_keeps_one_collection(self, fake_pipeline, int8_storage):
+        fake_pipeline.residency = CollectionResidency(budget_bytes=1)
+        for user_id in ('a', 'b'):
+            await fake_pipeline.add_documents_bulk(user_id, [_doc(f"{user_id}-doc")])
+        query = fake_pipeline.embedding_model.encode(["budgets"])[0]
+
+        for user_id in ('a', 'b'):
+            await fake_pipeline._search(fake_pipeline._get_user_collection(user_id), query, n_results=3)
+
+        assert len(fake_pipeline.residency) == 1
+        assert list(fake_pipeline._compact_indexes) == [fake_pipeline._get_user_collection('b').name]
+        assert fake_pipeline.residency.get_stats()['budget_evictions'] == 1
+
+    async def test_chroma_served_collections_are_not_tracked(self, fake_pipeline):
+        clock = FakeClock()
+        fake_pipeline.residency = CollectionResidency(idle_ttl=60, budget_bytes=1, clock=clock)
+        for user_id in ('a', 'b'):
+            await fake_pipeline.add_documents_bulk(user_id, [_doc(f"{user_id}-doc")])
+        query = fake_pipeline.embedding_model.encode(["budgets"])[0]
+
+        with patch('services.rag_pipeline.RAGConfig.VECTOR_STORAGE', 'float32'):
+            for user_id in ('a', 'b'):
+                await fake_pipeline._search(fake_pipeline._get_user_collection(user_id), query, n_results=3)
+                clock.now += 61
+
+        stats = fake_pipeline.residency.get_stats()
+        assert stats['loaded_collections'] == 0 and stats['loaded_mb'] == 0
+        assert stats['loads'] == 0 and stats['evictions'] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,134 @@
+"""
+Tests for the group-commit ChromaDB writer
+Run with: pytest tests/test_collection_writer.py -v
+"""
+
+import asyncio
+import os
+import pytest
+import sys
+import time
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from tests.fake_chroma import FakeCollection
+from utils.collection_writer import CollectionWriter
+
+
+def _vectors(n: int):
+    return [[float(i + 1), 0.0] for i in range(n)]
+
+
+async def _upsert(writer, collection, prefix: str, n: int = 3, text: str = 'text'):
+    ids = [f"{prefix}_chunk_{i}" for i in range(n)]
+    await writer.upsert(collection, ids, _vectors(n), [{'document_id': prefix, 'chunk_index': i} for i in range(n)], [text] * n)
+
+
+class PoisonCollection(FakeCollection):
+    """Rejects any write that contains the id 'poison_chunk_0'"""
+
+    def upsert(self, ids, **kwargs):
+        if 'poison_chunk_0' in ids:
+            raise ValueError("rejected")
+        super().upsert(ids, **kwargs)
+
+
+class TestGroupCommit:
+    """Concurrent writes share commits; each caller sees only its own outcome"""
+
+    async def test_concurrent_upserts_share_one_call(self):
+        collection = FakeCollection('user_u1')
+        writer = CollectionWriter('user_u1', max_batch=4000, max_delay=0.05)
+
+        await asyncio.gather(*(_upsert(writer, collection, f"doc-{i}") for i in range(10)))
+
+        assert collection.calls == ['upsert']
+        assert collection.count() == 30
+        assert writer.get_stats()['writes_per_commit'] == 10
+
+    async def test_order_is_kept_across_kinds(self):
+        collection = FakeCollection('user_u1')
+        writer = CollectionWriter('user_u1', max_delay=0.05)
+
+        await asyncio.gather(
+            _upsert(writer, collection, 'a'),
+            writer.delete(collection, where={'document_id': 'a'}),
+            _upsert(writer, collection, 'b'),
+            _upsert(writer, collection, 'c'),
+        )
+
+        assert collection.calls == ['upsert', 'delete', 'upsert']
+        assert {meta['document_id'] for meta in collection.get()['metadatas']} == {'b', 'c'}
+
+    async def test_later_write_of_same_id_wins(self):
+        collection = FakeCollection('user_u1')
+        writer = CollectionWriter('user_u1', max_delay=0.05)
+
+        await asyncio.gather(
+            _upsert(writer, collection, 'a', text='first'),
+            _upsert(writer, collection, 'a', text='second'),
+        )
+
+        assert collection.get()['documents'] == ['second'] * 3
+
+    async def test_failed_write_does_not_fail_the_others(self):
+        collection = PoisonCollection('user_u1')
+        writer = CollectionWriter('user_u1', max_delay=0.05)
+
+        results = await asyncio.gather(
+            _upsert(writer, collection, 'a'),
+            _upsert(writer, collection, 'poison'),
+            _upsert(writer, collection, 'b'),
+            return_exceptions=True
+        )
+
+        assert results[0] is None and results[2] is None
+        assert isinstance(results[1], ValueError)
+        assert {meta['document_id'] for meta in collection.get()['metadatas']} == {'a', 'b'}
+        assert writer.get_stats()['failed'] == 1
+
+
+class TestLatency:
+    """A write never waits much longer than max_delay"""
+
+    async def test_lone_write_commits_after_max_delay(self):
+        collection = FakeCollection('user_u1')
+        writer = CollectionWriter('user_u1', max_delay=0.05)
+
+        started = time.perf_counter()
+        await _upsert(writer, collection, 'a')
+
+        assert 0.04 <= time.perf_counter() - started < 0.5
+        assert collection.count() == 3
+
+    async def test_full_batch_commits_without_waiting(self):
+        collection = FakeCollection('user_u1')
+        writer = CollectionWriter('user_u1', max_batch=6, max_delay=10.0)
+
+        started = time.perf_counter()
+        await asyncio.gather(_upsert(writer, collection, 'a'), _upsert(writer, collection, 'b'))
+
+        assert time.perf_counter() - started < 1.0
+        assert collection.count() == 6
+
+
+class TestPipelineWrites:
+    """Concurrent uploads for one user go through one writer"""
+
+    async def test_concurrent_bulk_adds_are_coalesced(self, fake_pipeline):
+        batches = [
+            [{'id': f"doc-{b}-{i}", 'name': f"doc-{b}-{i}", 'content': f"Report {b} {i} about quarterly numbers. " * 20} for i in range(3)]
+            for b in range(8)
+        ]
+
+        results = await asyncio.gather(*(fake_pipeline.add_documents_bulk('u1', batch) for batch in batches))
+
+        collection = fake_pipeline._get_user_collection('u1')
+        assert all(r['success'] for result in results for r in result.values())
+        assert 0 < collection.calls.count('upsert') < len(batches)
+        assert len({meta['document_id'] for meta in collection.get()['metadatas']}) == 24
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,186 @@
+"""
+Tests for compact (float16 / int8) vector storage and search
+Run with: pytest tests/test_compact_index.py -v
+"""
+
+import os
+import pytest
+import sys
+from unittest.mock import patch
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.compact_index import CompactVectorIndex, quantize, dequantize, normalize
+
+
+def _vectors(count: int, dimension: int = 64, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+
+
+def _exact_top(vectors: np.ndarray, query: np.ndarray, k: int):
+    scores = normalize(vectors) @ normalize(query)[0]
+    return list(np.argsort(-scores, kind='stable')[:k])
+
+
+def _doc(doc_id: str, paragraphs: int = 6):
+    content = "\n\n".join(f"Topic {i} of {doc_id}: budgets, hiring and the launch timeline. " * 5 for i in range(paragraphs))
+    return {'id': doc_id, 'name': f"{doc_id}.txt", 'mime_type': 'text/plain', 'content': content}
+
+
+class TestQuantize:
+    """Codes decode back close to the unit vectors"""
+
+    def test_int8_error_is_small(self):
+        vectors = _vectors(200)
+        codes, scales = quantize(vectors, 'int8')
+
+        assert codes.dtype == np.int8 and scales.dtype == np.float32
+        assert np.abs(dequantize(codes, scales) - normalize(vectors)).max() < 0.01
+
+    def test_float16_error_is_small(self):
+        vectors = _vectors(200)
+        codes, scales = quantize(vectors, 'float16')
+
+        assert codes.dtype == np.float16 and scales is None
+        assert np.abs(dequantize(codes, None) - normalize(vectors)).max() < 1e-3
+
+    def test_unknown_storage_is_rejected(self):
+        with pytest.raises(ValueError):
+            quantize(_vectors(2), 'int4')
+
+
+class TestCompactVectorIndex:
+    """Upserts, deletes and search over quantized rows"""
+
+    def test_search_matches_exact_ranking(self):
+        vectors = _vectors(2000)
+        index = CompactVectorIndex('int8')
+        index.upsert([f"c{i}" for i in range(2000)], vectors, ['doc'] * 2000)
+
+        recall = []
+        for query in _vectors(20, seed=1):
+            expected = {f"c{i}" for i in _exact_top(vectors, query, 10)}
+            found = {chunk_id for chunk_id, _ in index.search(query, 10)}
+            recall.append(len(expected & found) / 10)
+
+        assert np.mean(recall) >= 0.9
+        assert index.nbytes == 2000 * (64 + 4)
+
+    def test_delete_keeps_rows_consistent(self):
+        vectors = _vectors(50)
+        index = CompactVectorIndex('float16')
+        index.upsert([f"c{i}" for i in range(50)], vectors, [f"doc-{i % 5}" for i in range(50)])
+
+        assert index.delete(['c0', 'c10', 'missing']) == 2
+        assert index.delete_documents(['doc-1']) == 10
+        assert len(index) == 38
+        # Every remaining chunk is still found by its own vector
+        for i in range(50):
+            chunk_id = f"c{i}"
+            if chunk_id in index:
+                assert index.search(vectors[i], 1)[0][0] == chunk_id
+        assert index.document_ids() == {'doc-0', 'doc-2', 'doc-3', 'doc-4'}
+
+    def test_upsert_replaces_vector(self):
+        vectors = _vectors(2)
+        index = CompactVectorIndex('int8')
+        index.upsert(['a'], vectors[:1], ['doc'])
+        index.upsert(['a'], vectors[1:], ['doc'])
+
+        assert len(index) == 1
+        assert index.search(vectors[1], 1)[0][1] == pytest.approx(1.0, abs=0.01)
+
+    def test_snapshot_round_trip(self, tmp_path):
+        vectors = _vectors(300)
+        index = CompactVectorIndex('int8', source_id='collection-1')
+        index.upsert([f"c{i}" for i in range(300)], vectors, [f"doc-{i % 7}" for i in range(300)])
+        path = str(tmp_path / "index.npz")
+
+        index.save(path)
+        loaded = CompactVectorIndex.load(path)
+
+        assert loaded.source_id == 'collection-1' and len(loaded) == 300
+        assert loaded.search(vectors[42], 5) == index.search(vectors[42], 5)
+        loaded.delete_documents(['doc-3'])
+        assert 'doc-3' not in loaded.document_ids()
+
+
+@pytest.fixture
+def int8_storage(tmp_path):
+    with patch('services.rag_pipeline.RAGConfig.VECTOR_STORAGE', 'int8'), \
+         patch('services.rag_pipeline.RAGConfig.COMPACT_INDEX_DIR', str(tmp_path / "compact_index")):
+        yield
+
+
+class TestPipelineCompactSearch:
+    """The pipeline searches the compact index and keeps it in step with Chroma"""
+
+    async def test_rescored_search_matches_float32(self, fake_pipeline, int8_storage):
+        await fake_pipeline.add_documents_bulk('u1', [_doc(f"doc-{i}") for i in range(10)])
+        collection = fake_pipeline._get_user_collection('u1')
+        query = fake_pipeline.embedding_model.encode(["launch timeline for doc-3"])[0]
+
+        compact = await fake_pipeline._search(collection, query, n_results=5)
+        assert 'query' not in collection.calls
+        exact = collection.query(query_embeddings=[query], n_results=5)
+
+        # Same ranking up to ties between equally distant chunks
+        assert compact['distances'][0] == pytest.approx(exact['distances'][0], abs=1e-5)
+        assert compact['ids'][0][0] in {chunk_id for chunk_id, d in zip(exact['ids'][0], exact['distances'][0]) if d <= exact['distances'][0][0] + 1e-5}
+
+    async def test_index_follows_writes(self, fake_pipeline, int8_storage):
+        await fake_pipeline.add_documents_bulk('u1', [_doc('alpha'), _doc('beta')])
+        collection = fake_pipeline._get_user_collection('u1')
+        query = fake_pipeline.embedding_model.encode(["budgets"])[0]
+        await fake_pipeline._search(collection, query, n_results=3)
+        index = fake_pipeline._compact_indexes[collection.name]
+
+        await fake_pipeline.add_documents_bulk('u1', [_doc('gamma')])
+        await fake_pipeline.remove_documents('u1', ['alpha'])
+
+        assert index.document_ids() == {'beta', 'gamma'}
+        assert len(index) == collection.count()
+        results = await fake_pipeline._search(collection, query, n_results=50)
+        assert {meta['document_id'] for meta in results['metadatas'][0]} == {'beta', 'gamma'}
+
+    async def test_snapshot_is_reused_only_while_it_matches(self, fake_pipeline, int8_storage):
+        await fake_pipeline.add_documents_bulk('u1', [_doc('alpha'), _doc('beta')])
+        collection = fake_pipeline._get_user_collection('u1')
+        await fake_pipeline._get_compact_index(collection)
+        with patch.object(fake_pipeline, 'COMPACT_INDEX_SAVE_DELAY', 0):
+            await fake_pipeline._save_compact_index_later(collection.name)
+        fake_pipeline._compact_indexes.clear()
+
+        collection.calls.clear()
+        await fake_pipeline._get_compact_index(collection)
+        assert 'get' not in collection.calls  # loaded from the snapshot
+
+        fake_pipeline._compact_indexes.clear()
+        collection.delete(ids=[collection.get()['ids'][0]])  # changed behind the index's back
+        index = await fake_pipeline._get_compact_index(collection)
+        assert len(index) == collection.count()
+
+    async def test_dropped_collection_drops_its_index(self, fake_pipeline, int8_storage):
+        await fake_pipeline.add_documents_bulk('u1', [_doc('alpha')])
+        collection = fake_pipeline._get_user_collection('u1')
+        await fake_pipeline._get_compact_index(collection)
+        path = fake_pipeline._compact_index_path(collection.name)
+        CompactVectorIndex.write_snapshot(fake_pipeline._compact_indexes[collection.name].snapshot(), path)
+
+        fake_pipeline.drop_collection(collection.name)
+
+        assert collection.name not in fake_pipeline._compact_indexes
+        assert not os.path.exists(path)
+
+    def test_encoder_output_stays_one_float32_array(self, fake_pipeline):
+        embeddings = fake_pipeline._encode_chunks([f"chunk {i}" for i in range(1500)])
+
+        assert isinstance(embeddings, np.ndarray)
+        assert embeddings.dtype == np.float32 and embeddings.shape == (1500, 64)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,114 @@
+"""
+Tests for background compaction of collections after heavy deletes
+Run with: pytest tests/test_compactor.py -v
+"""
+
+import os
+import pytest
+import sys
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from services.compactor import Compactor
+from services.index_migrator import IndexMigrator
+from utils.hnsw_params import parse_tiers
+
+
+def _doc(doc_id: str, paragraphs: int = 8):
+    content = "\n\n".join(f"Part {i} of {doc_id}: quarterly revenue and support tickets. " * 5 for i in range(paragraphs))
+    return {'id': doc_id, 'name': f"{doc_id}.txt", 'mime_type': 'text/plain', 'content': content}
+
+
+def _inspection(hnsw_by_collection, orphaned=()):
+    """inspect_persist_dir result with the given (elements, active) per collection"""
+    return {
+        'collections': {
+            name: {'hnsw': {'elements': elements, 'active': active, 'problems': []}, 'sqlite_rows': active, 'pending': 0}
+            for name, (elements, active) in hnsw_by_collection.items()
+        },
+        'problems': [],
+        'orphaned_segments': list(orphaned),
+        'sqlite': {'bytes': 4096, 'free_bytes': 1024}
+    }
+
+
+@pytest.fixture
+def compactor(fake_pipeline, tmp_path):
+    migrator = IndexMigrator(fake_pipeline, batch_documents=2, pause_seconds=0, retire_delay_seconds=0)
+    return Compactor(fake_pipeline, migrator, str(tmp_path), min_deleted_ratio=0.3, min_deleted=100)
+
+
+class TestCandidates:
+    """Which collections are worth compacting"""
+
+    def test_thresholds_and_active_collections_only(self, fake_pipeline, compactor):
+        fake_pipeline.index_layout.set_active('carol', 2)
+        inspection = _inspection({
+            'user_alice': (1000, 400),       # 60% deleted
+            'user_bob': (1000, 900),         # 10% deleted
+            'user_dave': (105, 10),          # too few deleted elements to bother
+            'user_carol': (5000, 100),       # retired generation
+            'user_carol__v2': (2000, 1000),  # 50% deleted, active
+            'other': (5000, 0)
+        })
+
+        candidates = compactor.candidates(inspection)
+
+        assert [(c['user_id'], c['collection']) for c in candidates] == [('carol', 'user_carol__v2'), ('alice', 'user_alice')]
+        assert candidates[1]['deleted_ratio'] == 0.6
+
+    def test_damaged_or_unmapped_indexes_are_skipped(self, compactor):
+        inspection = _inspection({'user_alice': (1000, 100), 'user_bob': (1000, 100)})
+        inspection['collections']['user_alice']['hnsw']['problems'] = ["data_level0.bin missing"]
+        inspection['collections']['user_bob']['hnsw']['active'] = None
+
+        assert compactor.candidates(inspection) == []
+
+    def test_collections_that_outgrew_their_tier(self, fake_pipeline, compactor):
+        compactor.tiers = parse_tiers("100:16:100:48,0:32:200:96")
+        inspection = _inspection({'user_alice': (500, 500), 'user_bob': (500, 500), 'user_carol': (90, 90)})
+        inspection['collections']['user_alice']['hnsw'].update(M=16, ef_construction=100)
+        inspection['collections']['user_bob']['hnsw'].update(M=32, ef_construction=200)
+        inspection['collections']['user_carol']['hnsw'].update(M=32, ef_construction=200)  # denser is kept
+
+        candidates = compactor.candidates(inspection)
+
+        assert [(c['collection'], c['reason']) for c in candidates] == [('user_alice', 'retier')]
+
+
+class TestSweep:
+    """Compaction runs through the index migrator, one user at a time"""
+
+    async def test_sweep_compacts_bloated_collection(self, fake_pipeline, compactor):
+        await fake_pipeline.add_documents_bulk('alice', [_doc(f"a-{i}") for i in range(4)])
+        count = fake_pipeline._get_user_collection('alice').count()
+
+        with patch('services.compactor.inspect_persist_dir', return_value=_inspection({'user_alice': (1000, 200)})):
+            results = await compactor.sweep()
+
+        assert [result['state'] for result in results] == ['completed']
+        assert results[0]['latency_before_ms'] is not None
+        active = fake_pipeline._get_user_collection('alice')
+        assert active.name == 'user_alice__v1' and active.count() == count
+        status = compactor.get_status()
+        assert status['compacted'] == 1 and status['elements_dropped'] == 800
+        assert status['last_sweep']['sqlite_free_bytes'] == 1024
+
+    async def test_orphaned_segments_are_removed_on_second_sighting(self, compactor, tmp_path):
+        segment = tmp_path / "3f1c-segment"
+        segment.mkdir()
+        (segment / "data_level0.bin").write_bytes(b'\0' * 2048)
+
+        with patch('services.compactor.inspect_persist_dir', return_value=_inspection({}, orphaned=[segment.name])):
+            await compactor.sweep()
+            assert segment.exists()
+            await compactor.sweep()
+
+        assert not segment.exists()
+        assert compactor.get_status()['orphans_removed_bytes'] == 2048
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
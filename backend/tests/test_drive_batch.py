@@ -0,0 +1,106 @@
+"""
+Tests for batched Drive metadata and concurrent document fetching
+Run with: pytest tests/test_drive_batch.py -v
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from services.google_docs import GoogleDocsService
+from tests.fake_drive import FakeDrive, FakeResponse
+
+
+@pytest.fixture
+def drive():
+    drive = FakeDrive()
+    drive.add_folder('root', 'root')
+    for i in range(250):
+        drive.add_file(f"doc-{i}", f"doc-{i}.txt", 'root', mime_type='text/plain', content=f"Body of document {i}")
+    return drive
+
+
+@pytest.fixture
+def service(drive):
+    async def fake_client():
+        return drive
+
+    with patch('services.google_docs.get_http_client', fake_client):
+        yield GoogleDocsService()
+
+
+class TestBatchMetadata:
+    """Metadata for many files comes back in ceil(n / 100) multipart requests"""
+
+    async def test_batches_of_100(self, drive, service):
+        ids = [f"doc-{i}" for i in range(250)]
+
+        metadata = await service.get_documents_metadata_batch('token', ids)
+
+        assert set(metadata) == set(ids)
+        assert metadata['doc-7']['name'] == 'doc-7.txt'
+        assert metadata['doc-7']['mimeType'] == 'text/plain'
+        assert [r['batch_size'] for r in drive.requests] == [100, 100, 50]
+        assert service.get_request_stats()['files_get'] == 0
+
+    async def test_missing_files_map_to_none(self, service):
+        metadata = await service.get_documents_metadata_batch('token', ['doc-1', 'missing', 'doc-1'])
+
+        assert metadata['doc-1']['id'] == 'doc-1'
+        assert metadata['missing'] is None
+        assert service.get_request_stats()['batch'] == 1
+
+    async def test_falls_back_to_single_requests(self, drive, service):
+        async def failing_post(*args, **kwargs):
+            return FakeResponse(503)
+        drive.post = failing_post
+        service._limiter.max_retries = 0
+
+        metadata = await service.get_documents_metadata_batch('token', ['doc-1', 'doc-2', 'missing'])
+
+        assert metadata['doc-2']['name'] == 'doc-2.txt'
+        assert metadata['missing'] is None
+        assert service.get_request_stats()['files_get'] == 3
+
+    def test_parse_batch_response_matches_content_ids(self):
+        text = (
+            "--b1\r\nContent-Type: application/http\r\nContent-ID: <response-item1>\r\n\r\n"
+            "HTTP/1.1 404 Not Found\r\nContent-Type: application/json\r\n\r\n{\"error\": {\"code\": 404}}\r\n"
+            "--b1\r\nContent-Type: application/http\r\nContent-ID: <response-item0>\r\n\r\n"
+            "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{\"id\": \"a\", \"name\": \"A\"}\r\n"
+            "--b1--\r\n"
+        )
+
+        replies = GoogleDocsService()._parse_batch_response(text, 'multipart/mixed; boundary=b1')
+
+        assert replies[0] == (200, {'id': 'a', 'name': 'A'})
+        assert replies[1][0] == 404
+
+
+class TestConcurrentFetch:
+    """Documents are downloaded and extracted concurrently, yielded as they finish"""
+
+    async def test_yields_every_document(self, service):
+        metadata = await service.get_documents_metadata_batch('token', [f"doc-{i}" for i in range(20)] + ['missing'])
+        found = {doc_id: meta for doc_id, meta in metadata.items() if meta}
+
+        results = dict([item async for item in service.iter_documents_text('token', found, concurrency=5)])
+
+        assert len(results) == 20
+        assert results['doc-3'] == {'content': 'Body of document 3'}
+        assert service.get_request_stats()['download'] == 20
+
+    async def test_download_errors_are_reported(self, service):
+        results = dict([
+            item async for item in service.iter_documents_text('token', {'missing': {'mimeType': 'text/plain'}}, concurrency=2)
+        ])
+
+        assert results['missing'] == {'error': 'HTTP 404'}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
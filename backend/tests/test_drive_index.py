@@ -0,0 +1,145 @@
+"""
+Tests for the persistent Drive tree index and incremental refresh
+Run with: pytest tests/test_drive_index.py -v
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from services.google_docs import GoogleDocsService
+from utils.drive_index import DriveTreeIndex
+from tests.fake_drive import FakeDrive
+
+
+@pytest.fixture
+def drive():
+    return FakeDrive.build_tree(depth=2, fanout=3, files_per_folder=2)
+
+
+@pytest.fixture
+def indexed_service(drive):
+    """GoogleDocsService talking to the fake drive with a throwaway in-memory index"""
+    async def fake_client():
+        return drive
+
+    index = DriveTreeIndex(":memory:")
+    with patch('services.google_docs.get_http_client', fake_client), \
+         patch('services.google_docs.get_drive_index', lambda: index):
+        yield GoogleDocsService()
+    index.close()
+
+
+class TestDriveTreeIndex:
+    """Repeat listings come from the index, refreshes only re-list changed folders"""
+
+    async def test_miss_then_hit(self, drive, indexed_service):
+        documents, info = await indexed_service.list_all_documents_indexed('root', 'token', 'user-1')
+        assert info['status'] == 'miss'
+        assert info['relisted_folders'] == 1 + 3 + 9
+        assert len(documents) == 2 * 13
+
+        requests_after_miss = len(drive.requests)
+        cached, info = await indexed_service.list_all_documents_indexed('root', 'token', 'user-1')
+
+        assert info['status'] == 'hit'
+        assert len(drive.requests) == requests_after_miss
+        assert sorted((d['id'], d['source_subfolder']) for d in cached) == \
+            sorted((d['id'], d['source_subfolder']) for d in documents)
+
+    async def test_edited_file_is_refreshed_without_relisting(self, drive, indexed_service):
+        await indexed_service.list_all_documents_indexed('root', 'token', 'user-1')
+
+        # Drive leaves the folder's modifiedTime alone when a file in it is edited
+        drive.modify('root-1-f0', '2024-02-01T00:00:00.000Z')
+        requests_before = len(drive.requests)
+
+        documents, info = await indexed_service.list_all_documents_indexed('root', 'token', 'user-1', refresh='incremental')
+
+        assert info['status'] == 'refresh'
+        assert info['relisted_folders'] == 0
+        # One changes.list call, no folder listing
+        assert len(drive.requests) - requests_before == 1
+        edited = next(d for d in documents if d['id'] == 'root-1-f0')
+        assert edited['modified_time'] == '2024-02-01T00:00:00.000Z'
+        assert len(documents) == 2 * 13
+
+    async def test_added_moved_and_outside_files(self, drive, indexed_service):
+        await indexed_service.list_all_documents_indexed('root', 'token', 'user-1')
+
+        drive.add_file('new-file', 'new.pdf', 'root-1')
+        drive.modify('root-0-f0', '2024-02-01T00:00:00.000Z', parents=['root-2'])
+        drive.add_folder('elsewhere', 'Elsewhere')
+        drive.add_file('outside-file', 'outside.pdf', 'elsewhere')
+
+        documents, info = await indexed_service.list_all_documents_indexed('root', 'token', 'user-1', refresh='incremental')
+
+        by_id = {d['id']: d for d in documents}
+        assert info['relisted_folders'] == 0
+        assert by_id['new-file']['source_subfolder'] == 'folder root-1'
+        assert by_id['root-0-f0']['source_subfolder'] == 'folder root-2'
+        assert 'outside-file' not in by_id
+        assert len(documents) == 2 * 13 + 1
+
+    async def test_removed_folders_are_dropped(self, drive, indexed_service):
+        await indexed_service.list_all_documents_indexed('root', 'token', 'user-1')
+
+        drive.remove('root-2')
+        drive.remove('root-0-f1')
+        documents, info = await indexed_service.list_all_documents_indexed('root', 'token', 'user-1', refresh='incremental')
+
+        assert info['relisted_folders'] == 0
+        assert not any(d['source_subfolder'] and d['source_subfolder'].startswith('folder root-2') for d in documents)
+        assert 'root-0-f1' not in {d['id'] for d in documents}
+        assert len(documents) == 2 * (13 - 4) - 1
+
+    async def test_new_subfolder_is_listed(self, drive, indexed_service):
+        await indexed_service.list_all_documents_indexed('root', 'token', 'user-1')
+
+        drive.add_folder('root-1-new', 'New', 'root-1')
+        drive.add_file('nested-file', 'nested.pdf', 'root-1-new')
+        documents, info = await indexed_service.list_all_documents_indexed('root', 'token', 'user-1', refresh='incremental')
+
+        assert info['relisted_folders'] == 1
+        assert next(d for d in documents if d['id'] == 'nested-file')['source_subfolder'] == 'New'
+
+    async def test_rejected_token_falls_back_to_full_refresh(self, drive, indexed_service):
+        await indexed_service.list_all_documents_indexed('root', 'token', 'user-1')
+
+        drive.reject_change_tokens = True
+        documents, info = await indexed_service.list_all_documents_indexed('root', 'token', 'user-1', refresh='incremental')
+
+        assert info['relisted_folders'] == 13
+        assert len(documents) == 2 * 13
+
+    async def test_users_are_isolated(self, indexed_service):
+        await indexed_service.list_all_documents_indexed('root', 'token', 'user-1')
+
+        _, info = await indexed_service.list_all_documents_indexed('root', 'token', 'user-2')
+
+        assert info['status'] == 'miss'
+
+
+    def test_index_without_changes_token_is_upgraded(self, tmp_path):
+        import sqlite3
+        db_path = str(tmp_path / "drive_index.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE roots (user_id TEXT NOT NULL, root_id TEXT NOT NULL, "
+                     "refreshed_at REAL NOT NULL, PRIMARY KEY (user_id, root_id))")
+        conn.execute("INSERT INTO roots VALUES ('user-1', 'root', 0)")
+        conn.commit()
+        conn.close()
+
+        index = DriveTreeIndex(db_path)
+        try:
+            assert index.get_root('user-1', 'root')['changes_token'] is None
+        finally:
+            index.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,175 @@
+"""
+Tests for Google Drive folder traversal strategies
+Run with: pytest tests/test_drive_traversal.py -v
+"""
+
+import asyncio
+import pytest
+import sys
+import os
+import time
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from services.google_docs import GoogleDocsService
+from tests.fake_drive import FakeDrive
+
+
+def _doc_keys(documents):
+    return sorted((d['id'], d['source_subfolder']) for d in documents)
+
+
+async def _scan(drive, traversal):
+    async def fake_client():
+        return drive
+
+    service = GoogleDocsService()
+    with patch('services.google_docs.get_http_client', fake_client):
+        documents = await service.list_all_documents_from_folder('root', 'token', traversal=traversal)
+    return service, documents
+
+
+class TestBatchedTraversal:
+    """Batched multi-parent scan must match the per-folder recursion"""
+
+    async def test_same_documents_as_recursive(self):
+        drive = FakeDrive.build_tree(depth=3, fanout=3, files_per_folder=2)
+
+        _, recursive_docs = await _scan(drive, "recursive")
+        _, batched_docs = await _scan(drive, "batched")
+
+        assert len(batched_docs) == 2 * (1 + 3 + 9 + 27)
+        assert _doc_keys(batched_docs) == _doc_keys(recursive_docs)
+
+    async def test_fewer_requests_on_deep_tree(self):
+        drive = FakeDrive.build_tree(depth=3, fanout=4, files_per_folder=1)
+
+        recursive_service, _ = await _scan(drive, "recursive")
+        batched_service, _ = await _scan(drive, "batched")
+
+        recursive_calls = recursive_service.get_request_stats()['files_list']
+        batched_calls = batched_service.get_request_stats()['files_list']
+        assert recursive_calls == 1 + 4 + 16 + 64
+        assert batched_calls < recursive_calls / 5
+
+    async def test_batched_follows_pagination(self):
+        drive = FakeDrive.build_tree(depth=1, fanout=5, files_per_folder=7)
+        drive.page_size = 4
+
+        _, documents = await _scan(drive, "batched")
+
+        assert len(documents) == 7 * 6
+
+    def test_pack_parent_queries_respects_limits(self):
+        service = GoogleDocsService()
+        service.batch_query_max_parents = 3
+        folder_ids = [f"folder{i:02d}" for i in range(10)]
+
+        groups = service._pack_parent_queries(folder_ids)
+
+        assert [len(g) for g in groups] == [3, 3, 3, 1]
+        assert [fid for g in groups for fid in g] == folder_ids
+
+
+class TestMaterializedTraversal:
+    """Whole-drive listing rebuilt locally from `parents`"""
+
+    async def test_same_documents_as_recursive(self):
+        drive = FakeDrive.build_tree(depth=3, fanout=3, files_per_folder=2)
+        # Folders and files outside the scanned root must be ignored
+        drive.add_folder('elsewhere', 'Elsewhere')
+        drive.add_file('outside-file', 'outside.pdf', 'elsewhere')
+
+        _, recursive_docs = await _scan(drive, "recursive")
+        service, materialized_docs = await _scan(drive, "materialized")
+
+        assert _doc_keys(materialized_docs) == _doc_keys(recursive_docs)
+        assert 'outside-file' not in {d['id'] for d in materialized_docs}
+        # One folder listing + one document listing, each fits in a single page
+        assert service.get_request_stats()['files_list'] == 2
+
+    async def test_auto_picks_materialized_for_large_share_of_drive(self):
+        drive = FakeDrive.build_tree(depth=4, fanout=4, files_per_folder=1)
+
+        service, documents = await _scan(drive, "auto")
+
+        assert len(documents) == 1 + 4 + 16 + 64 + 256
+        # Estimate page is reused: estimate + document listing only
+        assert service.get_request_stats()['files_list'] == 2
+
+    async def test_auto_picks_batched_for_small_subtree(self):
+        drive = FakeDrive.build_tree(depth=1, fanout=2, files_per_folder=1)
+        for i in range(400):
+            drive.add_folder(f"other-{i}", f"Other {i}")
+
+        service, documents = await _scan(drive, "auto")
+
+        assert len(documents) == 3
+        # Estimate + one batched query per level (root, its 2 children)
+        assert service.get_request_stats()['files_list'] == 3
+
+    async def test_auto_choice_is_reused_per_root(self):
+        drive = FakeDrive.build_tree(depth=1, fanout=2, files_per_folder=1)
+        for i in range(400):
+            drive.add_folder(f"other-{i}", f"Other {i}")
+
+        async def fake_client():
+            return drive
+
+        service = GoogleDocsService()
+        with patch('services.google_docs.get_http_client', fake_client):
+            await service.list_all_documents_from_folder('root', 'token', traversal="auto")
+            first = service.get_request_stats()['files_list']
+            documents = await service.list_all_documents_from_folder('root', 'token', traversal="auto")
+
+        assert len(documents) == 3
+        # No second estimate: only the batched queries
+        assert service.get_request_stats()['files_list'] - first == 2
+
+
+class TestStreamingTraversal:
+    """Documents are yielded page by page and early close cancels outstanding work"""
+
+    async def test_streams_same_documents(self):
+        drive = FakeDrive.build_tree(depth=3, fanout=3, files_per_folder=2)
+        _, recursive_docs = await _scan(drive, "recursive")
+
+        async def fake_client():
+            return drive
+
+        streamed = []
+        with patch('services.google_docs.get_http_client', fake_client):
+            async for batch in GoogleDocsService().iter_documents_from_folder('root', 'token'):
+                streamed.extend(batch)
+
+        assert _doc_keys(streamed) == _doc_keys(recursive_docs)
+
+    async def test_first_batch_after_one_round_trip(self):
+        drive = FakeDrive.build_tree(depth=3, fanout=3, files_per_folder=2)
+        drive.latency = 0.05
+
+        async def fake_client():
+            return drive
+
+        with patch('services.google_docs.get_http_client', fake_client):
+            documents = GoogleDocsService().iter_documents_from_folder('root', 'token')
+            start = time.perf_counter()
+            first_batch = await documents.__anext__()
+            elapsed = time.perf_counter() - start
+
+            assert {d['source_subfolder'] for d in first_batch} == {None}
+            assert elapsed < 2 * drive.latency
+
+            # Closing early cancels the subfolder scans that were already scheduled
+            await documents.aclose()
+            requests_at_close = len(drive.requests)
+            await asyncio.sleep(0.2)
+
+        assert len(drive.requests) == requests_at_close
+        assert requests_at_close < 1 + 3 + 9 + 27
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
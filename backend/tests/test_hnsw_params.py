@@ -0,0 +1,139 @@
+"""
+Tests for HNSW parameters by collection size and the tuning sweep helpers
+Run with: pytest tests/test_hnsw_params.py -v
+"""
+
+import os
+import pytest
+import sys
+from unittest.mock import patch
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from config import RAGConfig
+from hnsw_tuning import exact_neighbors, pareto_frontier, recall_at_k, split_queries
+from tests.fake_chroma import FakeCollection
+from utils.hnsw_params import (
+    CHROMA_DEFAULTS, DEFAULT_HNSW_TIERS, collection_hnsw_params, parse_tiers, search_ef_override, tier_for
+)
+
+TIERS = parse_tiers("100:16:100:48,1000:24:200:96,0:32:400:192")
+
+
+class TestTiers:
+    """Parsing the tier list and picking a collection's tier"""
+
+    def test_default_tiers_parse(self):
+        tiers = parse_tiers(DEFAULT_HNSW_TIERS)
+        assert tiers[0] == {'max_chunks': 20000, 'M': 16, 'construction_ef': 100, 'search_ef': 48}
+        assert tiers[-1]['max_chunks'] == 0
+
+    @pytest.mark.parametrize("spec", [
+        "100:16:100",                       # missing search_ef
+        "100:16:100:x",                     # not a number
+        "100:0:100:48",                     # M below 1
+        "1000:16:100:48,100:24:200:96",     # out of order
+        "0:16:100:48,1000:24:200:96",       # unbounded tier before the last
+    ])
+    def test_malformed_tiers_are_rejected(self, spec):
+        with pytest.raises(ValueError):
+            parse_tiers(spec)
+
+    def test_tier_boundaries(self):
+        assert tier_for(0, TIERS)['M'] == 16
+        assert tier_for(100, TIERS)['M'] == 16
+        assert tier_for(101, TIERS)['M'] == 24
+        assert tier_for(5_000_000, TIERS)['M'] == 32
+
+    def test_bounded_last_tier_covers_larger_collections(self):
+        tiers = parse_tiers("100:16:100:48,1000:24:200:96")
+        assert tier_for(10_000, tiers)['M'] == 24
+
+
+class TestCollectionParams:
+    """Reading the parameters a collection uses"""
+
+    def test_defaults_without_hnsw_metadata(self):
+        assert collection_hnsw_params(FakeCollection('c', {'hnsw:space': 'cosine'})) == CHROMA_DEFAULTS
+
+    def test_configuration_overrides_creation_metadata(self):
+        collection = FakeCollection('c', {'hnsw:M': 24, 'hnsw:construction_ef': 200, 'hnsw:search_ef': 96})
+        assert search_ef_override(collection) is None
+
+        collection.modify(configuration={'hnsw': {'ef_search': 160}})
+
+        assert collection_hnsw_params(collection) == {'M': 24, 'construction_ef': 200, 'search_ef': 160}
+        assert search_ef_override(collection) == 160
+
+
+class TestPipeline:
+    """Collections are created with the tier for their expected size"""
+
+    def test_new_collection_gets_smallest_tier(self, fake_pipeline):
+        with patch.object(RAGConfig, 'HNSW_TIERS', TIERS):
+            collection = fake_pipeline._get_user_collection('alice')
+
+        assert collection.metadata['hnsw:space'] == 'cosine'
+        assert collection_hnsw_params(collection) == {'M': 16, 'construction_ef': 100, 'search_ef': 48}
+
+    def test_expected_size_replaces_copied_parameters(self, fake_pipeline):
+        with patch.object(RAGConfig, 'HNSW_TIERS', TIERS):
+            collection = fake_pipeline._create_collection(
+                'user_bob__v1', metadata={'hnsw:space': 'cosine', 'hnsw:M': 16}, expected_chunks=500
+            )
+
+        assert collection_hnsw_params(collection) == {'M': 24, 'construction_ef': 200, 'search_ef': 96}
+
+    def test_set_search_ef(self, fake_pipeline):
+        before = fake_pipeline.get_index_version('alice')['hnsw']['search_ef']
+        result = fake_pipeline.set_search_ef('alice', 128)
+
+        assert result['hnsw']['search_ef'] == 128
+        assert fake_pipeline.get_index_version('alice')['hnsw']['search_ef'] == 128
+        # The loaded HNSW index keeps the value it was loaded with
+        assert result['active_search_ef'] == before and result['pending'] is True
+        assert fake_pipeline.get_index_version('alice')['active_search_ef'] == before
+
+        result = fake_pipeline.set_search_ef('alice', before)
+        assert result['pending'] is False
+        with pytest.raises(ValueError):
+            fake_pipeline.set_search_ef('alice', 0)
+
+
+class TestTuningSweep:
+    """Recall measurement and frontier of the hnsw_tuning CLI"""
+
+    def test_exact_neighbors_and_recall(self):
+        vectors = np.eye(8, dtype=np.float32) + 0.01
+        queries = vectors[:3]
+
+        truth = exact_neighbors(queries, vectors, k=1)
+
+        assert truth[:, 0].tolist() == [0, 1, 2]
+        assert recall_at_k([[0], [1], [2]], truth) == 1.0
+        assert recall_at_k([[0], [5], [6]], truth) == pytest.approx(1 / 3)
+
+    def test_queries_are_held_out(self):
+        vectors = np.arange(200, dtype=np.float32).reshape(100, 2)
+
+        queries, indexed = split_queries(vectors, queries=50, sample=0)
+
+        assert len(queries) == 10 and len(indexed) == 90
+        assert not {tuple(q) for q in queries} & {tuple(v) for v in indexed}
+
+    def test_frontier_drops_dominated_settings(self):
+        rows = [
+            {'search_ef': 16, 'recall': 0.90, 'latency_ms': 1.0},
+            {'search_ef': 32, 'recall': 0.88, 'latency_ms': 1.2},  # slower and worse
+            {'search_ef': 64, 'recall': 0.97, 'latency_ms': 1.5},
+            {'search_ef': 128, 'recall': 0.97, 'latency_ms': 2.0},  # slower, no better
+        ]
+
+        assert [row['search_ef'] for row in pareto_frontier(rows)] == [16, 64]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
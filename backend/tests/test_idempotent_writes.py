@@ -0,0 +1,108 @@
+"""
+Tests for deterministic chunk ids and upsert writes
+Run with: pytest tests/test_idempotent_writes.py -v
+"""
+
+import os
+import pytest
+import sys
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.cancellation import CancellationToken, OperationCancelled
+
+
+def _doc(doc_id: str, paragraphs: int):
+    content = "\n\n".join(
+        f"Section {i} of {doc_id} explains deployment step {i} in some detail. " * 6 for i in range(paragraphs)
+    )
+    return {'id': doc_id, 'name': f"{doc_id}.txt", 'mime_type': 'text/plain', 'content': content}
+
+
+def _snapshot(collection):
+    result = collection.get(include=['documents', 'metadatas'])
+    return {
+        chunk_id: (document, meta['document_id'], meta['chunk_index'])
+        for chunk_id, document, meta in zip(result['ids'], result['documents'], result['metadatas'])
+    }
+
+
+class TestUpsertWrites:
+    """Re-ingesting converges on the latest version of each document"""
+
+    async def test_reingest_is_idempotent(self, fake_pipeline):
+        documents = [_doc('alpha', 12), _doc('beta', 8)]
+
+        await fake_pipeline.add_documents_bulk('u1', documents)
+        first = _snapshot(fake_pipeline._get_user_collection('u1'))
+        await fake_pipeline.add_documents_bulk('u1', documents)
+
+        collection = fake_pipeline._get_user_collection('u1')
+        assert _snapshot(collection) == first
+        assert 'add' not in collection.calls
+        assert all(chunk_id.startswith(('alpha_chunk_', 'beta_chunk_')) for chunk_id in first)
+
+    async def test_shrunk_document_loses_trailing_chunks(self, fake_pipeline):
+        await fake_pipeline.add_documents_bulk('u1', [_doc('alpha', 20)])
+        shorter = _doc('alpha', 4)
+        expected = len(fake_pipeline._split_text(shorter['content'], 'text/plain'))
+
+        results = await fake_pipeline.add_documents_bulk('u1', [shorter])
+
+        collection = fake_pipeline._get_user_collection('u1')
+        assert results['alpha']['chunks'] == expected
+        assert collection.count() == expected
+        assert sorted(meta['chunk_index'] for meta in collection.get(include=['metadatas'])['metadatas']) == list(range(expected))
+
+    async def test_chunks_in_legacy_id_format_are_replaced(self, fake_pipeline):
+        collection = fake_pipeline._get_user_collection('u1')
+        collection.add(
+            ids=['alpha_0', 'alpha_1'],
+            embeddings=[[0.0] * 64, [0.0] * 64],
+            metadatas=[{'document_id': 'alpha', 'chunk_index': 0}, {'document_id': 'alpha', 'chunk_index': 1}],
+            documents=['old', 'old']
+        )
+
+        await fake_pipeline.add_documents_bulk('u1', [_doc('alpha', 3)])
+
+        assert not {'alpha_0', 'alpha_1'} & set(collection.get()['ids'])
+
+    async def test_add_document_replaces_previous_version(self, fake_pipeline):
+        long_doc = _doc('alpha', 20)
+        short_doc = _doc('alpha', 2)
+
+        await fake_pipeline.add_document('u1', 'alpha', long_doc['content'], 'alpha.txt', 'text/plain')
+        chunks = await fake_pipeline.add_document('u1', 'alpha', short_doc['content'], 'alpha.txt', 'text/plain')
+
+        assert fake_pipeline._get_user_collection('u1').count() == chunks
+
+    async def test_replay_after_interrupted_batch_matches_clean_run(self, fake_pipeline):
+        documents = [_doc('alpha', 6), _doc('beta', 6), _doc('gamma', 6)]
+        collection = fake_pipeline._get_user_collection('u1')
+        cancel = CancellationToken()
+        upsert = collection.upsert
+
+        def upsert_then_cancel(**kwargs):
+            upsert(**kwargs)
+            cancel.cancel("connection lost")
+
+        with patch.object(fake_pipeline, 'CHROMA_WRITE_BATCH', 5), \
+             patch.object(collection, 'upsert', upsert_then_cancel):
+            with pytest.raises(OperationCancelled):
+                await fake_pipeline.add_documents_bulk('u1', documents, cancel=cancel)
+
+        # Retry the whole batch: no pre-scan of what made it in
+        await fake_pipeline.add_documents_bulk('u1', documents)
+        replayed = _snapshot(collection)
+
+        fake_pipeline.chroma_client.delete_collection(collection.name)
+        fake_pipeline._create_collection(collection.name)
+        await fake_pipeline.add_documents_bulk('u1', documents)
+
+        assert replayed == _snapshot(fake_pipeline._get_user_collection('u1'))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
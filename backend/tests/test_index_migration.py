@@ -0,0 +1,233 @@
+"""
+Tests for the versioned index layout and the background shadow-rebuild migrator
+Run with: pytest tests/test_index_migration.py -v
+"""
+
+import asyncio
+import os
+import pytest
+import sys
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from config import RAGConfig
+from services.index_migrator import IndexMigrator
+from utils.hnsw_params import collection_hnsw_params, parse_tiers
+from utils.index_layout import IndexLayout
+
+PARAGRAPH = "Laporan keuangan kuartal ini menunjukkan pertumbuhan pendapatan yang stabil di semua wilayah. "
+
+
+def _document(doc_id: str, paragraphs: int = 30):
+    content = "\n\n".join(f"{PARAGRAPH * 3}Bagian {doc_id}-{i}." for i in range(paragraphs))
+    return {'id': doc_id, 'name': f"{doc_id}.pdf", 'mime_type': 'application/pdf', 'content': content}
+
+
+@pytest.fixture
+def legacy_user(fake_pipeline):
+    """A user whose collection was built before the current chunker version"""
+    asyncio.run(fake_pipeline.add_documents_bulk('alice', [_document(f"doc-{i}") for i in range(5)]))
+    return 'alice'
+
+
+@pytest.fixture
+def chunker_bump():
+    with patch.object(RAGConfig, 'CHUNKER_VERSION', 'adaptive-v2'):
+        yield
+
+
+@pytest.fixture
+def migrator(fake_pipeline):
+    return IndexMigrator(fake_pipeline, batch_documents=2, pause_seconds=0.01, retire_delay_seconds=0)
+
+
+def _document_ids(collection):
+    return {meta['document_id'] for meta in collection.get(include=['metadatas'])['metadatas']}
+
+
+class TestIndexLayout:
+    """The alias map resolves users to collection generations and survives restarts"""
+
+    def test_defaults_to_legacy_collection(self, tmp_path):
+        layout = IndexLayout(str(tmp_path / "layout.json"))
+
+        assert layout.active_collection('alice') == 'user_alice'
+        assert not os.path.exists(tmp_path / "layout.json")
+
+    def test_swap_is_persisted(self, tmp_path):
+        layout = IndexLayout(str(tmp_path / "layout.json"))
+        layout.set_active('alice', 3)
+
+        reopened = IndexLayout(str(tmp_path / "layout.json"))
+
+        assert reopened.active_collection('alice') == 'user_alice__v3'
+        assert reopened.active_collection('bob') == 'user_bob'
+
+    def test_writes_are_tracked_only_during_migration(self, tmp_path):
+        layout = IndexLayout(str(tmp_path / "layout.json"))
+        layout.note_write('user_alice', ['before'])
+        layout.begin_tracking('user_alice')
+        layout.note_write('user_alice', ['during'])
+
+        assert layout.take_dirty('user_alice') == {'during'}
+        assert layout.take_dirty('user_alice') == set()
+
+
+class TestIndexVersion:
+    """Collections record the chunker / embedding version they were built with"""
+
+    def test_new_collections_are_stamped(self, fake_pipeline):
+        collection = fake_pipeline._get_user_collection('bob')
+
+        assert collection.metadata['index_chunker_version'] == RAGConfig.CHUNKER_VERSION
+        assert collection.metadata['index_embedding_model'] == RAGConfig.EMBEDDING_MODEL
+        assert collection.metadata['hnsw:space'] == 'cosine'
+        assert fake_pipeline.get_index_version('bob')['stale'] is False
+
+    def test_unstamped_legacy_collection_matches_default_config(self, fake_pipeline):
+        fake_pipeline.chroma_client.create_collection('user_carol', metadata={'hnsw:space': 'cosine'})
+
+        assert fake_pipeline.get_index_version('carol')['stale'] is False
+
+    def test_config_change_marks_collection_stale(self, fake_pipeline, legacy_user, chunker_bump):
+        version = fake_pipeline.get_index_version(legacy_user)
+
+        assert version['stale'] is True
+        assert version['recorded']['index_chunker_version'] == 'adaptive-v1'
+        assert version['current']['index_chunker_version'] == 'adaptive-v2'
+
+    def test_reassembled_text_rechunks_identically(self, fake_pipeline):
+        chunks = fake_pipeline._split_text(_document('doc-x')['content'], 'application/pdf')
+
+        text = IndexMigrator.reassemble_chunks(chunks, fake_pipeline.chunk_overlap)
+
+        assert len(chunks) > 3
+        assert fake_pipeline._split_text(text, 'application/pdf') == chunks
+
+
+class TestMigration:
+    """Shadow rebuild, atomic swap, and replay of concurrent writes"""
+
+    async def test_migration_swaps_in_rebuilt_collection(self, fake_pipeline, legacy_user, chunker_bump, migrator):
+        old = fake_pipeline._get_user_collection(legacy_user)
+        old_count = old.count()
+
+        status = await migrator.migrate(legacy_user)
+
+        active = fake_pipeline._get_user_collection(legacy_user)
+        assert status['state'] == 'completed'
+        assert status['documents_done'] == 5
+        assert active.name == 'user_alice__v1'
+        assert active.count() == old_count
+        assert _document_ids(active) == {f"doc-{i}" for i in range(5)}
+        assert fake_pipeline.get_index_version(legacy_user)['stale'] is False
+        assert 'user_alice' not in fake_pipeline.chroma_client.collections
+
+    async def test_queries_use_old_index_until_swap(self, fake_pipeline, legacy_user, chunker_bump, migrator):
+        migrator.start(legacy_user)
+        while migrator.get_status(legacy_user).get('documents_done', 0) == 0:
+            await asyncio.sleep(0.001)
+
+        assert fake_pipeline._get_user_collection(legacy_user).name == 'user_alice'
+        assert migrator.get_status(legacy_user)['state'] == 'running'
+
+        await migrator._tasks[legacy_user]
+        assert fake_pipeline._get_user_collection(legacy_user).name == 'user_alice__v1'
+
+    async def test_writes_during_migration_are_replayed(self, fake_pipeline, legacy_user, chunker_bump, migrator):
+        migrator.start(legacy_user)
+        while migrator.get_status(legacy_user).get('documents_done', 0) < 4:
+            await asyncio.sleep(0.001)
+
+        # Both writes land on the old collection, after their documents were copied
+        await fake_pipeline.add_documents_bulk(legacy_user, [_document('doc-new', paragraphs=5)])
+        await fake_pipeline.remove_document(legacy_user, 'doc-0')
+        await migrator._tasks[legacy_user]
+
+        active = fake_pipeline._get_user_collection(legacy_user)
+        assert active.name == 'user_alice__v1'
+        assert _document_ids(active) == {'doc-new', 'doc-1', 'doc-2', 'doc-3', 'doc-4'}
+
+    async def test_failed_migration_keeps_old_index(self, fake_pipeline, legacy_user, chunker_bump, migrator):
+        with patch.object(fake_pipeline, 'add_documents_bulk', side_effect=RuntimeError('embedding failed')):
+            status = await migrator.migrate(legacy_user)
+
+        assert status['state'] == 'failed'
+        assert fake_pipeline._get_user_collection(legacy_user).name == 'user_alice'
+        assert 'user_alice__v1' not in fake_pipeline.chroma_client.collections
+
+    async def test_ensure_current_only_starts_for_stale_collections(self, fake_pipeline, legacy_user, migrator):
+        assert migrator.ensure_current(legacy_user) is False
+
+        with patch.object(RAGConfig, 'CHUNKER_VERSION', 'adaptive-v2'):
+            assert migrator.ensure_current(legacy_user) is True
+            await migrator._tasks[legacy_user]
+
+        assert migrator.get_status(legacy_user)['state'] == 'completed'
+
+
+class TestCompaction:
+    """Same chunks and vectors copied into a fresh collection and swapped in"""
+
+    def _contents(self, collection):
+        page = collection.get(include=['embeddings', 'documents', 'metadatas'])
+        return {
+            chunk_id: (list(vector), document, metadata)
+            for chunk_id, vector, document, metadata in zip(page['ids'], page['embeddings'], page['documents'], page['metadatas'])
+        }
+
+    async def test_compaction_copies_without_reembedding(self, fake_pipeline, legacy_user, migrator):
+        await fake_pipeline.remove_document(legacy_user, 'doc-0')
+        old = fake_pipeline._get_user_collection(legacy_user)
+        before = self._contents(old)
+
+        with patch.object(fake_pipeline, '_encode_chunks', side_effect=AssertionError("re-embedded")):
+            status = await migrator.compact(legacy_user)
+
+        active = fake_pipeline._get_user_collection(legacy_user)
+        assert status['state'] == 'completed' and status['kind'] == 'compaction'
+        assert active.name == 'user_alice__v1'
+        assert self._contents(active) == before
+        assert active.metadata == old.metadata
+        assert status['latency_before_ms'] is not None and status['latency_after_ms'] is not None
+        assert 'user_alice' not in fake_pipeline.chroma_client.collections
+
+    async def test_compaction_moves_to_size_tier(self, fake_pipeline, legacy_user, migrator):
+        fake_pipeline.set_search_ef(legacy_user, 300)
+
+        with patch.object(RAGConfig, 'HNSW_TIERS', parse_tiers("10:16:100:48,0:32:200:96")):
+            status = await migrator.compact(legacy_user)
+
+        active = fake_pipeline._get_user_collection(legacy_user)
+        assert status['state'] == 'completed'
+        assert collection_hnsw_params(active) == {'M': 32, 'construction_ef': 200, 'search_ef': 300}
+        # The rebuilt collection's index is created with the new search_ef
+        assert fake_pipeline.get_index_version(legacy_user)['pending'] is False
+
+    async def test_writes_during_compaction_are_replayed(self, fake_pipeline, legacy_user, migrator):
+        migrator.start(legacy_user, compact=True)
+        while migrator.get_status(legacy_user).get('documents_done', 0) < 4:
+            await asyncio.sleep(0.001)
+
+        await fake_pipeline.add_documents_bulk(legacy_user, [_document('doc-new', paragraphs=5)])
+        await fake_pipeline.remove_document(legacy_user, 'doc-0')
+        status = await migrator.wait(legacy_user)
+
+        active = fake_pipeline._get_user_collection(legacy_user)
+        assert status['state'] == 'completed'
+        assert _document_ids(active) == {'doc-new', 'doc-1', 'doc-2', 'doc-3', 'doc-4'}
+
+    async def test_lost_chunks_abort_the_swap(self, fake_pipeline, legacy_user, migrator):
+        # A chunk without a document id can't be copied by document
+        fake_pipeline._get_user_collection(legacy_user).upsert(['orphan'], [[0.1] * 64], [{'chunk_index': 0}], ["stray"])
+
+        status = await migrator.compact(legacy_user)
+
+        assert status['state'] == 'failed' and 'chunks' in status['error']
+        assert fake_pipeline._get_user_collection(legacy_user).name == 'user_alice'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,166 @@
+"""
+Tests for largest-first ingestion scheduling and chunk-count bin packing
+Run with: pytest tests/test_ingest_scheduler.py -v
+"""
+
+import asyncio
+import os
+import pytest
+import sys
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.ingest_scheduler import (
+    estimate_chunks,
+    order_largest_first,
+    schedule_ingestion,
+    take_group,
+    PDF_MIME,
+)
+from utils.memory_budget import MemoryBudget, MB
+
+KB = 1024
+
+
+def _doc(doc_id: str, size: int, mime_type: str = 'text/plain'):
+    return {'id': doc_id, 'name': doc_id, 'mimeType': mime_type, 'size': str(size)}
+
+
+def _skewed_folder():
+    """One huge PDF in the middle of many small text files"""
+    documents = [_doc(f"small-{i}", 20 * KB) for i in range(20)]
+    documents.insert(10, _doc('huge', 20 * MB, PDF_MIME))
+    return documents
+
+
+async def _collect(schedule):
+    events = []
+    async for kind, payload in schedule:
+        events.append((kind, payload))
+    return events
+
+
+class TestOrderingAndPacking:
+    """Expensive files go first; groups carry about the same chunk count"""
+
+    def test_parse_cost_counts_toward_work(self):
+        # The PDF yields fewer chunks than the text file but parsing makes it the longer job
+        documents = [_doc('notes', 600 * KB), _doc('scan', 1 * MB, PDF_MIME), _doc('memo', 10 * KB)]
+
+        assert [doc['id'] for doc in order_largest_first(documents)] == ['scan', 'notes', 'memo']
+
+    def test_native_google_files_get_a_default_size(self):
+        native = {'id': 'gdoc', 'mimeType': 'application/vnd.google-apps.document'}
+
+        assert order_largest_first([_doc('tiny', 100), native])[0]['id'] == 'gdoc'
+
+    def test_estimate_chunks(self):
+        assert estimate_chunks(8500, 'text/plain', 850) == 10
+        assert estimate_chunks(8500, PDF_MIME, 850) == 3
+        assert estimate_chunks(0, 'text/plain', 850) == 1
+
+    def test_oversized_item_forms_its_own_group(self):
+        ready = [(5, 'a'), (1000, 'huge'), (5, 'b'), (5, 'c')]
+
+        group, remaining = take_group(ready, target_weight=20, max_items=15)
+
+        assert group == [(1000, 'huge')]
+        assert len(remaining) == 3
+
+    def test_small_items_fill_to_target_and_cap(self):
+        ready = [(4, f"doc-{i}") for i in range(10)]
+
+        group, remaining = take_group(ready, target_weight=12, max_items=15)
+        assert len(group) == 3
+
+        group, remaining = take_group(ready, target_weight=100, max_items=4)
+        assert len(group) == 4 and len(remaining) == 6
+
+
+class TestScheduleIngestion:
+    """Continuous largest-first downloads feeding packed groups"""
+
+    async def test_every_document_is_delivered_once(self):
+        documents = _skewed_folder()
+
+        async def fetch(doc):
+            await asyncio.sleep(0.001)
+            return {'doc': doc, 'ok': doc['id'] != 'small-3'}
+
+        events = await _collect(schedule_ingestion(
+            documents, fetch, lambda r: int(r['doc']['size']) // KB if r['ok'] else None,
+            fetch_concurrency=4, group_max_items=5
+        ))
+
+        grouped = [r['doc']['id'] for kind, group in events if kind == 'group' for r in group]
+        failed = [payload['doc']['id'] for kind, payload in events if kind == 'failed']
+        assert failed == ['small-3']
+        assert sorted(grouped + failed) == sorted(doc['id'] for doc in documents)
+        assert all(len(group) <= 5 for kind, group in events if kind == 'group')
+
+    async def test_big_file_starts_first_and_does_not_block_small_groups(self):
+        documents = _skewed_folder()
+        started = []
+
+        async def fetch(doc):
+            started.append(doc['id'])
+            await asyncio.sleep(0.2 if doc['id'] == 'huge' else 0.005)
+            return {'doc': doc}
+
+        groups = []
+        async for kind, group in schedule_ingestion(
+            documents, fetch, lambda r: estimate_chunks(int(r['doc']['size']), r['doc']['mimeType']),
+            fetch_concurrency=4, group_max_items=5
+        ):
+            groups.append([r['doc']['id'] for r in group])
+
+        assert started[0] == 'huge'
+        # Small files were grouped and handed out while the big download was running
+        assert groups[-1] == ['huge']
+        assert sum(len(group) for group in groups[:-1]) == 20
+
+    async def test_groups_are_admitted_by_memory(self):
+        budget = MemoryBudget(200 * MB, rss_reader=lambda: 100 * MB, poll_interval=0.01)
+        documents = [_doc(f"doc-{i}", 40 * MB) for i in range(6)]
+
+        async def fetch(doc):
+            return {'doc': doc}
+
+        group_sizes = []
+        async for kind, payload in schedule_ingestion(
+            documents, fetch, lambda r: 10,
+            fetch_concurrency=6, group_max_items=6,
+            memory_budget=budget, memory_estimate=lambda r: 40 * MB
+        ):
+            if kind == 'group':
+                group_sizes.append(len(payload))
+                assert budget.get_stats()['reserved_mb'] <= 100
+
+        assert sum(group_sizes) == 6
+        assert max(group_sizes) <= 2
+        assert budget.get_stats()['reserved_mb'] == 0
+
+    async def test_closing_cancels_pending_downloads(self):
+        cancelled = []
+
+        async def fetch(doc):
+            try:
+                await asyncio.sleep(0 if doc['id'] == 'small-0' else 10)
+            except asyncio.CancelledError:
+                cancelled.append(doc['id'])
+                raise
+            return {'doc': doc}
+
+        documents = [_doc(f"small-{i}", (10 - i) * KB) for i in range(5)]
+        schedule = schedule_ingestion(documents, fetch, lambda r: 1, fetch_concurrency=5, group_max_items=1)
+        kind, group = await schedule.__anext__()
+        await schedule.aclose()
+        await asyncio.sleep(0)
+
+        assert group[0]['doc']['id'] == 'small-0'
+        assert len(cancelled) == 4
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
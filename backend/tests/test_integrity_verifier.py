@@ -0,0 +1,248 @@
+"""
+Tests for the background vector store integrity checks and snapshots
+Run with: pytest tests/test_integrity_verifier.py -v
+"""
+
+import asyncio
+import os
+import pickle
+import pytest
+import sqlite3
+import sys
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from services.integrity_verifier import IntegrityVerifier
+from utils.chroma_integrity import (
+    HNSW_HEADER, HNSW_METADATA, SQLITE_FILE, inspect_persist_dir, sqlite_space, vacuum_sqlite
+)
+
+ELEMENT_BYTES = 64
+
+
+def _doc(doc_id: str, paragraphs: int = 16):
+    content = "\n\n".join(f"Part {i} of {doc_id}: quarterly revenue and support tickets. " * 5 for i in range(paragraphs))
+    return {'id': doc_id, 'name': f"{doc_id}.txt", 'mime_type': 'text/plain', 'content': content}
+
+
+def _write_store(persist_dir, collections):
+    """
+    Write the parts of a Chroma persist directory the inspection reads
+
+    Args:
+        collections: name -> (sqlite rows, hnsw elements, max seq id)
+    """
+    os.makedirs(persist_dir, exist_ok=True)
+    path = os.path.join(persist_dir, SQLITE_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE collections (id TEXT, name TEXT);
+        CREATE TABLE segments (id TEXT, type TEXT, scope TEXT, collection TEXT);
+        CREATE TABLE embeddings (id INTEGER PRIMARY KEY, segment_id TEXT, embedding_id TEXT, seq_id INTEGER);
+        CREATE TABLE max_seq_id (segment_id TEXT, seq_id INTEGER);
+        CREATE TABLE embeddings_queue (seq_id INTEGER, topic TEXT);
+    """)
+    for n, (name, (rows, elements, seq_id)) in enumerate(collections.items()):
+        collection_id, vector, metadata = f"c{n}", f"vector-{n}", f"metadata-{n}"
+        connection.execute("INSERT INTO collections VALUES (?, ?)", (collection_id, name))
+        connection.execute("INSERT INTO segments VALUES (?, 'hnsw', 'VECTOR', ?)", (vector, collection_id))
+        connection.execute("INSERT INTO segments VALUES (?, 'sqlite', 'METADATA', ?)", (metadata, collection_id))
+        connection.executemany(
+            "INSERT INTO embeddings (segment_id, embedding_id, seq_id) VALUES (?, ?, ?)",
+            [(metadata, f"chunk-{i}", i + 1) for i in range(rows)]
+        )
+        connection.execute("INSERT INTO max_seq_id VALUES (?, ?)", (metadata, seq_id))
+        connection.execute("INSERT INTO max_seq_id VALUES (?, ?)", (vector, seq_id))
+
+        segment_dir = os.path.join(persist_dir, vector)
+        os.makedirs(segment_dir, exist_ok=True)
+        with open(os.path.join(segment_dir, 'header.bin'), 'wb') as f:
+            f.write(HNSW_HEADER.pack(3, 0, max(elements, 1000), elements, ELEMENT_BYTES, 0, 0, 0, 0, 16, 32, 16, 0.36, 100))
+        with open(os.path.join(segment_dir, 'data_level0.bin'), 'wb') as f:
+            f.write(b'\0' * elements * ELEMENT_BYTES)
+        with open(os.path.join(segment_dir, 'length.bin'), 'wb') as f:
+            f.write(b'\0' * elements * 4)
+        with open(os.path.join(segment_dir, HNSW_METADATA), 'wb') as f:
+            pickle.dump({'id_to_label': {f"chunk-{i}": i for i in range(elements)}}, f)
+    connection.commit()
+    connection.close()
+
+
+async def _store(fake_pipeline, persist_dir, users=('a', 'b')):
+    """Index a document per user and describe the collections on disk to match"""
+    collections = {}
+    for user in users:
+        await fake_pipeline.add_documents_bulk(user, [_doc(f"{user}-1")])
+        collection = fake_pipeline._get_user_collection(user)
+        collections[collection.name] = (collection.count(), collection.count(), 10)
+    _write_store(persist_dir, collections)
+    return collections
+
+
+class TestInspection:
+    """Reading chroma.sqlite3 and the persisted HNSW segments"""
+
+    def test_healthy_store(self, tmp_path):
+        _write_store(str(tmp_path), {'user_a': (12, 12, 30)})
+
+        inspection = inspect_persist_dir(str(tmp_path))
+
+        entry = inspection['collections']['user_a']
+        assert inspection['problems'] == [] and entry['hnsw']['problems'] == []
+        assert (entry['sqlite_rows'], entry['hnsw']['elements'], entry['hnsw']['active']) == (12, 12, 12)
+        assert entry['max_seq_id'] == 30 and entry['pending'] == 0
+
+    def test_damaged_segment_and_missing_database(self, tmp_path):
+        _write_store(str(tmp_path), {'user_a': (12, 12, 30)})
+        with open(tmp_path / "vector-0" / "data_level0.bin", 'r+b') as f:
+            f.truncate(100)
+        (tmp_path / "vector-0" / "length.bin").unlink()
+
+        problems = inspect_persist_dir(str(tmp_path))['collections']['user_a']['hnsw']['problems']
+
+        assert any("data_level0.bin truncated" in problem for problem in problems)
+        assert "length.bin missing" in problems
+
+        (tmp_path / SQLITE_FILE).unlink()
+        assert inspect_persist_dir(str(tmp_path))['problems'] == [f"{SQLITE_FILE} missing"]
+
+    def test_vacuum_only_above_free_ratio(self, tmp_path):
+        _write_store(str(tmp_path), {'user_a': (5000, 0, 30)})
+        connection = sqlite3.connect(str(tmp_path / SQLITE_FILE))
+        connection.execute("DELETE FROM embeddings WHERE id % 10 != 0")
+        connection.commit()
+        connection.close()
+        space = sqlite_space(str(tmp_path))
+        assert space['free_bytes'] > space['bytes'] / 2
+
+        assert vacuum_sqlite(str(tmp_path), min_free_ratio=0.95) is None
+        vacuumed = vacuum_sqlite(str(tmp_path), min_free_ratio=0.3)
+
+        assert vacuumed['bytes_after'] < vacuumed['bytes_before']
+        assert sqlite_space(str(tmp_path))['free_bytes'] == 0
+        assert inspect_persist_dir(str(tmp_path))['collections']['user_a']['sqlite_rows'] == 500
+
+
+class TestVerify:
+    """Online checks against the pipeline's collections"""
+
+    async def test_healthy_collections(self, fake_pipeline, tmp_path):
+        persist_dir = str(tmp_path / "chroma")
+        await _store(fake_pipeline, persist_dir)
+        verifier = IntegrityVerifier(fake_pipeline, persist_dir, pause_seconds=0)
+
+        report = await verifier.verify()
+
+        assert report['state'] == 'ok' and report['collections'] == 2
+        details = verifier.get_status()['details']
+        assert all(entry['files'] == 'checked' and entry['samples'] == '5/5' for entry in details.values())
+        assert verifier.summary()['state'] == 'ok'
+
+    async def test_count_mismatch_is_degraded(self, fake_pipeline, tmp_path):
+        persist_dir = str(tmp_path / "chroma")
+        collections = await _store(fake_pipeline, persist_dir)
+        name = fake_pipeline._get_user_collection('a').name
+        rows, _, seq_id = collections[name]
+        # The HNSW index lost vectors that chroma.sqlite3 still has
+        collections[name] = (rows, rows - 3, seq_id)
+        _write_store(persist_dir, collections)
+        verifier = IntegrityVerifier(fake_pipeline, persist_dir, pause_seconds=0)
+
+        report = await verifier.verify()
+
+        assert report['state'] == 'degraded' and report['degraded_collections'] == [name]
+        assert "HNSW index holds" in verifier.get_status()['details'][name]['problems'][0]
+
+    async def test_sample_query_miss_is_degraded(self, fake_pipeline, tmp_path):
+        persist_dir = str(tmp_path / "chroma")
+        await _store(fake_pipeline, persist_dir, users=('a',))
+        collection = fake_pipeline._get_user_collection('a')
+        verifier = IntegrityVerifier(fake_pipeline, persist_dir, sample_queries=3, pause_seconds=0)
+
+        lost = {'ids': [['elsewhere']], 'distances': [[0.7]]}
+        with patch.object(type(collection), 'query', return_value=lost):
+            report = await verifier.verify()
+
+        result = verifier.get_status()['details'][collection.name]
+        assert report['state'] == 'degraded' and result['samples'] == '0/3'
+
+    async def test_waits_for_in_flight_searches(self, fake_pipeline, tmp_path):
+        persist_dir = str(tmp_path / "chroma")
+        await _store(fake_pipeline, persist_dir, users=('a',))
+        verifier = IntegrityVerifier(fake_pipeline, persist_dir, sample_queries=1, pause_seconds=0)
+        fake_pipeline.searches_in_flight = 1
+
+        check = asyncio.create_task(verifier.verify())
+        await asyncio.sleep(0.2)
+        assert not check.done() and verifier.get_status()['running'] == 'verify'
+
+        fake_pipeline.searches_in_flight = 0
+        report = await asyncio.wait_for(check, timeout=5)
+        assert report['state'] == 'ok' and verifier.get_status()['yielded_seconds'] >= 0.2
+
+    async def test_check_now_runs_one_check_at_a_time(self, fake_pipeline, tmp_path):
+        persist_dir = str(tmp_path / "chroma")
+        await _store(fake_pipeline, persist_dir, users=('a',))
+        verifier = IntegrityVerifier(fake_pipeline, persist_dir, sample_queries=1, pause_seconds=0)
+        fake_pipeline.searches_in_flight = 1
+
+        assert verifier.check_now() is True
+        await asyncio.sleep(0.1)
+        assert verifier.check_now() is False
+
+        fake_pipeline.searches_in_flight = 0
+        await asyncio.wait_for(verifier._check_task, timeout=5)
+        assert verifier.get_status()['checks'] == 1 and verifier.get_status()['state'] == 'ok'
+        assert verifier.check_now() is True
+        await asyncio.wait_for(verifier._check_task, timeout=5)
+
+
+class TestSnapshot:
+    """Incremental per-collection snapshots"""
+
+    async def test_unchanged_collections_are_linked(self, fake_pipeline, tmp_path):
+        persist_dir = str(tmp_path / "chroma")
+        snapshot_dir = str(tmp_path / "snapshots")
+        collections = await _store(fake_pipeline, persist_dir)
+        ticks = iter(range(1_700_000_000, 1_700_100_000, 3600))
+        verifier = IntegrityVerifier(fake_pipeline, persist_dir, snapshot_dir=snapshot_dir, keep_snapshots=2,
+                                     pause_seconds=0, clock=lambda: next(ticks))
+
+        first = await verifier.snapshot()
+        assert (first['exported'], first['reused']) == (2, 0)
+
+        # Only user b writes before the next snapshot
+        await fake_pipeline.add_documents_bulk('b', [_doc('b-2')])
+        changed = fake_pipeline._get_user_collection('b')
+        collections[changed.name] = (changed.count(), changed.count(), 20)
+        _write_store(persist_dir, collections)
+        second = await verifier.snapshot()
+
+        assert (second['exported'], second['reused']) == (1, 1)
+        unchanged = f"{fake_pipeline._get_user_collection('a').name}.kb.zip"
+        assert os.path.samefile(os.path.join(first['path'], unchanged), os.path.join(second['path'], unchanged))
+
+        await verifier.snapshot()
+        assert verifier.get_status()['snapshots_kept'] == 2
+        assert not os.path.exists(first['path'])
+        assert not [name for name in os.listdir(snapshot_dir) if name.startswith('.')]
+
+    async def test_snapshot_restores_with_import(self, fake_pipeline, tmp_path):
+        persist_dir = str(tmp_path / "chroma")
+        await _store(fake_pipeline, persist_dir, users=('a',))
+        verifier = IntegrityVerifier(fake_pipeline, persist_dir, snapshot_dir=str(tmp_path / "snapshots"), pause_seconds=0)
+        source = fake_pipeline._get_user_collection('a')
+
+        snapshot = await verifier.snapshot()
+        result = await fake_pipeline.import_archive('c', os.path.join(snapshot['path'], f"{source.name}.kb.zip"))
+
+        assert result['chunks_imported'] == source.count()
+        assert fake_pipeline.document_exists('c', 'a-1')
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
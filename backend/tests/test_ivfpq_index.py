@@ -0,0 +1,164 @@
+"""
+Tests for the IVF-PQ compressed vector index
+Run with: pytest tests/test_ivfpq_index.py -v
+"""
+
+import os
+import pytest
+import sys
+from unittest.mock import patch
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.compact_index import normalize
+from utils.ivfpq_index import IVFPQIndex, subquantizers_for
+
+
+def _clustered(count: int, dimension: int = 32, clusters: int = 20, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.standard_normal((clusters, dimension)).astype(np.float32))
+    noise = 0.1 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return normalize(centers[rng.integers(0, clusters, count)] + noise)
+
+
+def _doc(doc_id: str, paragraphs: int = 6):
+    content = "\n\n".join(f"Topic {i} of {doc_id}: budgets, hiring and the launch timeline. " * 5 for i in range(paragraphs))
+    return {'id': doc_id, 'name': f"{doc_id}.txt", 'mime_type': 'text/plain', 'content': content}
+
+
+@pytest.fixture(scope="module")
+def trained():
+    vectors = _clustered(4000)
+    index = IVFPQIndex.train(vectors, nlist=16, m=8, nprobe=16)
+    index.upsert([f"c{i}" for i in range(4000)], vectors, [f"doc-{i % 50}" for i in range(4000)])
+    return index, vectors
+
+
+class TestTraining:
+    """Quantizer shapes follow the sample and the dimension"""
+
+    def test_lists_are_capped_by_training_points(self):
+        index = IVFPQIndex.train(_clustered(400), nlist=1024, m=8)
+
+        assert index.nlist == 400 // 39
+        assert index.m == 8 and index.trained_on == 400
+        assert len(index) == 0
+
+    def test_subquantizers_divide_the_dimension(self):
+        assert subquantizers_for(384, 48) == 48
+        assert subquantizers_for(384, 50) == 48
+        assert subquantizers_for(30, 8) == 6
+
+
+class TestIVFPQSearch:
+    """Approximate search over PQ codes"""
+
+    def test_probing_every_list_finds_near_neighbours(self, trained):
+        index, vectors = trained
+        recall = []
+        for query in _clustered(20, seed=1):
+            expected = {f"c{i}" for i in np.argsort(-(vectors @ query))[:10]}
+            found = {chunk_id for chunk_id, _ in index.search(query, 40)}
+            recall.append(len(expected & found) / 10)
+
+        assert np.mean(recall) >= 0.8
+        assert index.nbytes == 4000 * (8 + 4) + index._coarse.nbytes + index._codebooks.nbytes
+
+    def test_fewer_probes_score_fewer_chunks(self, trained):
+        index, vectors = trained
+        index.nprobe = 1
+        try:
+            found = index.search(vectors[0], 4000)
+        finally:
+            index.nprobe = 16
+
+        assert 0 < len(found) < 4000
+        assert found[0][0] == 'c0'
+
+    def test_search_within_documents(self, trained):
+        index, vectors = trained
+        found = index.search(vectors[0], 500, document_ids=['doc-0', 'doc-1'])
+
+        assert len(found) == 160
+        assert {int(chunk_id[1:]) % 50 for chunk_id, _ in found} == {0, 1}
+
+    def test_upsert_and_delete_keep_rows_consistent(self):
+        vectors = _clustered(600, seed=2)
+        index = IVFPQIndex.train(vectors, nlist=4, m=8)
+        index.upsert([f"c{i}" for i in range(600)], vectors, [f"doc-{i % 6}" for i in range(600)])
+
+        assert index.delete_documents(['doc-0']) == 100
+        index.upsert(['c1'], vectors[7:8], ['doc-1'])
+
+        assert len(index) == 500
+        assert index.search(vectors[7], 2)[0][0] in {'c1', 'c7'}
+        assert index.document_ids() == {'doc-1', 'doc-2', 'doc-3', 'doc-4', 'doc-5'}
+
+    def test_snapshot_round_trip(self, trained, tmp_path):
+        index, vectors = trained
+        path = str(tmp_path / "index.npz")
+
+        index.save(path)
+        loaded = IVFPQIndex.load(path, nprobe=16)
+
+        assert len(loaded) == len(index) and loaded.trained_on == index.trained_on
+        assert loaded.search(vectors[3], 5) == index.search(vectors[3], 5)
+
+
+@pytest.fixture
+def ivfpq_storage(tmp_path):
+    with patch('services.rag_pipeline.RAGConfig.VECTOR_STORAGE', 'ivfpq'), \
+         patch('services.rag_pipeline.RAGConfig.COMPACT_INDEX_DIR', str(tmp_path / "compact_index")), \
+         patch('services.rag_pipeline.RAGConfig.IVFPQ_MIN_CHUNKS', 20), \
+         patch('services.rag_pipeline.RAGConfig.IVFPQ_SUBQUANTIZERS', 16):
+        yield
+
+
+class TestPipelineIVFPQ:
+    """Collections switch to IVF-PQ once they are large enough to train"""
+
+    async def test_small_collections_use_chroma(self, fake_pipeline, ivfpq_storage):
+        await fake_pipeline.add_documents_bulk('u1', [_doc('alpha')])
+        collection = fake_pipeline._get_user_collection('u1')
+        query = fake_pipeline.embedding_model.encode(["budgets"])[0]
+
+        await fake_pipeline._search(collection, query, n_results=3)
+
+        assert 'query' in collection.calls
+        assert collection.name not in fake_pipeline._compact_indexes
+
+    async def test_trained_index_is_searched_and_rescored(self, fake_pipeline, ivfpq_storage):
+        await fake_pipeline.add_documents_bulk('u1', [_doc(f"doc-{i}") for i in range(10)])
+        collection = fake_pipeline._get_user_collection('u1')
+        query = fake_pipeline.embedding_model.encode(["launch timeline for doc-3"])[0]
+
+        results = await fake_pipeline._search(collection, query, n_results=5)
+        assert 'query' not in collection.calls
+        exact = collection.query(query_embeddings=[query], n_results=5)
+
+        index = fake_pipeline._compact_indexes[collection.name]
+        assert isinstance(index, IVFPQIndex) and len(index) == collection.count()
+        assert results['distances'][0][0] == pytest.approx(exact['distances'][0][0], abs=1e-5)
+        stats = fake_pipeline._vector_storage_stats(collection.name)
+        assert stats['ivfpq']['subquantizers'] == 16
+
+    async def test_new_chunks_are_encoded_with_the_trained_quantizers(self, fake_pipeline, ivfpq_storage):
+        await fake_pipeline.add_documents_bulk('u1', [_doc(f"doc-{i}") for i in range(10)])
+        collection = fake_pipeline._get_user_collection('u1')
+        query = fake_pipeline.embedding_model.encode(["budgets"])[0]
+        await fake_pipeline._search(collection, query, n_results=3)
+        index = fake_pipeline._compact_indexes[collection.name]
+        trained_on = index.trained_on
+
+        await fake_pipeline.add_documents_bulk('u1', [_doc('late')])
+        results = await fake_pipeline._search(collection, query, n_results=200)
+
+        assert index.trained_on == trained_on
+        assert 'late' in {meta['document_id'] for meta in results['metadatas'][0]}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,148 @@
+"""
+Tests for knowledge base export / import without re-embedding
+Run with: pytest tests/test_kb_transfer.py -v
+"""
+
+import json
+import os
+import pytest
+import sys
+import zipfile
+from unittest.mock import patch
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import kb_transfer
+from utils.collection_archive import verify_archive
+from tests.fake_chroma import FakeChromaClient, FakeCollection
+
+
+def _doc(doc_id: str, paragraphs: int = 4):
+    content = "\n\n".join(f"Part {i} of {doc_id}: quarterly revenue and support tickets. " * 5 for i in range(paragraphs))
+    return {'id': doc_id, 'name': f"{doc_id}.txt", 'mime_type': 'text/plain', 'content': content}
+
+
+def _contents(collection):
+    page = collection.get(include=['embeddings', 'documents', 'metadatas'])
+    return {
+        chunk_id: (np.asarray(vector).tolist(), document, metadata)
+        for chunk_id, vector, document, metadata in zip(page['ids'], page['embeddings'], page['documents'], page['metadatas'])
+    }
+
+
+def _corrupt(path: str, member: str):
+    """Rewrite an archive with one member's bytes changed (valid zip, wrong content)"""
+    with zipfile.ZipFile(path) as archive:
+        members = {name: archive.read(name) for name in archive.namelist()}
+    members[member] = members[member].replace(b'revenue', b'REVENUE')
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+@pytest.fixture
+async def exported(fake_pipeline, tmp_path):
+    await fake_pipeline.add_documents_bulk('a', [_doc('a-1'), _doc('a-2', paragraphs=8)])
+    path = str(tmp_path / "a.kb.zip")
+    manifest = await fake_pipeline.export_archive('a', path)
+    return path, manifest
+
+
+class TestPipelineTransfer:
+    """Export from one user, import into another without re-embedding"""
+
+    async def test_round_trip(self, fake_pipeline, exported):
+        path, manifest = exported
+        source = fake_pipeline._get_user_collection('a')
+        assert manifest['count'] == source.count()
+        assert all('vectors_sha256' in block for block in manifest['blocks'])
+
+        with patch.object(fake_pipeline, '_encode_chunks', side_effect=AssertionError("re-embedded")):
+            result = await fake_pipeline.import_archive('b', path)
+
+        target = fake_pipeline._get_user_collection('b')
+        assert result['chunks_imported'] == source.count() and result['stale'] is False
+        assert _contents(target) == _contents(source)
+        assert fake_pipeline.document_exists('b', 'a-2')
+
+    async def test_merge_keeps_existing_documents(self, fake_pipeline, exported):
+        path, _ = exported
+        await fake_pipeline.add_documents_bulk('b', [_doc('b-1')])
+
+        await fake_pipeline.import_archive('b', path)
+
+        assert fake_pipeline.get_existing_document_ids('b', ['a-1', 'a-2', 'b-1']) == {'a-1', 'a-2', 'b-1'}
+
+    async def test_replace_drops_existing_documents(self, fake_pipeline, exported):
+        path, _ = exported
+        await fake_pipeline.add_documents_bulk('b', [_doc('b-1')])
+
+        result = await fake_pipeline.import_archive('b', path, replace=True)
+
+        assert result['replaced'] is True
+        assert fake_pipeline.get_existing_document_ids('b', ['a-1', 'b-1']) == {'a-1'}
+
+    async def test_other_index_version_needs_replace(self, fake_pipeline, exported, tmp_path):
+        path, _ = exported
+        with zipfile.ZipFile(path) as archive:
+            members = {name: archive.read(name) for name in archive.namelist()}
+        manifest = json.loads(members['manifest.json'])
+        manifest['metadata']['index_embedding_model'] = 'some-other-model'
+        members['manifest.json'] = json.dumps(manifest).encode()
+        other = str(tmp_path / "other.kb.zip")
+        with zipfile.ZipFile(other, 'w') as archive:
+            for name, data in members.items():
+                archive.writestr(name, data)
+        await fake_pipeline.add_documents_bulk('b', [_doc('b-1')])
+
+        with pytest.raises(ValueError, match="replace"):
+            await fake_pipeline.import_archive('b', other)
+        result = await fake_pipeline.import_archive('b', other, replace=True)
+
+        assert result['stale'] is True
+        assert fake_pipeline.get_index_version('b')['recorded']['index_embedding_model'] == 'some-other-model'
+
+    async def test_corrupted_archive_is_rejected_before_writing(self, fake_pipeline, exported):
+        path, manifest = exported
+        _corrupt(path, f"records/{len(manifest['blocks']) - 1:05d}.jsonl")
+        await fake_pipeline.add_documents_bulk('b', [_doc('b-1')])
+
+        with pytest.raises(ValueError, match="checksum"):
+            await fake_pipeline.import_archive('b', path, replace=True)
+
+        assert fake_pipeline.get_existing_document_ids('b', ['a-1', 'b-1']) == {'b-1'}
+
+
+class TestCli:
+    """kb_transfer against an in-memory Chroma client"""
+
+    async def test_export_import_between_persist_dirs(self, fake_pipeline, exported, tmp_path):
+        destination = FakeChromaClient()
+        clients = {'src': fake_pipeline.chroma_client, 'dst': destination}
+        out = str(tmp_path / "cli.kb.zip")
+        name = fake_pipeline._get_user_collection('a').name
+
+        with patch.object(kb_transfer, '_client', side_effect=lambda persist_dir: clients[persist_dir]):
+            assert kb_transfer.main(['export', '--persist-dir', 'src', '--collection', name, out]) == 0
+            assert kb_transfer.main(['verify', out]) == 0
+            assert kb_transfer.main(['import', out, '--persist-dir', 'dst']) == 0
+
+        assert _contents(destination.get_collection(name)) == _contents(fake_pipeline._get_user_collection('a'))
+        assert verify_archive(out)['count'] == destination.get_collection(name).count()
+
+    def test_verify_reports_damage(self, tmp_path, capsys):
+        collection = FakeCollection('user_x')
+        collection.upsert(['c0'], [np.ones(4, dtype=np.float32)], [{'document_id': 'd'}], ["quarterly revenue"])
+        path = str(tmp_path / "x.kb.zip")
+        kb_transfer.write_archive(collection, path)
+        _corrupt(path, "records/00000.jsonl")
+
+        assert kb_transfer.main(['verify', path]) == 1
+        assert "checksum" in capsys.readouterr().err
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
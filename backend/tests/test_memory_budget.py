@@ -0,0 +1,129 @@
+"""
+Tests for memory-aware ingestion backpressure
+Run with: pytest tests/test_memory_budget.py -v
+"""
+
+import asyncio
+import os
+import pytest
+import sys
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from services.google_docs import GoogleDocsService
+from utils.memory_budget import MemoryBudget, MB, current_rss
+
+
+class FakeRSS:
+    """Settable RSS reading"""
+
+    def __init__(self, value: int):
+        self.value = value
+
+    def __call__(self) -> int:
+        return self.value
+
+
+def _budget(rss: int = 100 * MB, budget: int = 200 * MB, **kwargs) -> MemoryBudget:
+    return MemoryBudget(budget, rss_reader=FakeRSS(rss), poll_interval=0.01, **kwargs)
+
+
+class TestAdmission:
+    """Documents are admitted while RSS + reservations fit the budget"""
+
+    def test_estimate_uses_drive_size(self):
+        budget = _budget(expansion_factor=4.0, default_document_bytes=2 * MB)
+
+        assert budget.estimate({'size': str(5 * MB)}) == 20 * MB
+        assert budget.estimate({'mimeType': 'application/vnd.google-apps.document'}) == 2 * MB
+
+    def test_admits_until_budget_is_reserved(self):
+        budget = _budget()
+
+        assert budget.admit_batch([30 * MB] * 5) == 3
+        assert budget.get_stats()['reserved_mb'] == 90
+        assert budget.last_decision['action'] == 'pause'
+
+    def test_oversized_document_runs_alone(self):
+        budget = _budget()
+
+        assert budget.try_acquire(500 * MB) is True
+        assert budget.try_acquire(1 * MB) is False
+        budget.release(500 * MB)
+        assert budget.try_acquire(1 * MB) is True
+
+    def test_nothing_admitted_while_rss_is_over_budget(self):
+        budget = _budget(rss=250 * MB)
+
+        assert budget.try_acquire(1 * MB) is False
+
+    async def test_acquire_waits_for_release(self):
+        budget = _budget()
+        budget.try_acquire(90 * MB)
+
+        waiter = asyncio.create_task(budget.acquire(50 * MB))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+
+        budget.release(90 * MB)
+        decision = await waiter
+
+        assert decision['action'] == 'admit'
+        assert decision['paused_seconds'] >= 0.04
+        assert budget.get_stats()['paused'] == 1
+
+    async def test_acquire_resumes_when_rss_drops(self):
+        rss = FakeRSS(250 * MB)
+        budget = MemoryBudget(200 * MB, rss_reader=rss, poll_interval=0.01)
+
+        waiter = asyncio.create_task(budget.acquire(10 * MB))
+        await asyncio.sleep(0.03)
+        assert not waiter.done()
+
+        rss.value = 120 * MB
+        assert (await waiter)['action'] == 'admit'
+
+    async def test_forced_admission_after_max_pause(self):
+        budget = _budget(rss=250 * MB, max_pause_seconds=0.05)
+
+        decision = await budget.acquire(10 * MB)
+
+        assert decision['action'] == 'admit'
+        assert budget.get_stats()['forced'] == 1
+
+    def test_current_rss_reads_this_process(self):
+        assert current_rss() > 10 * MB
+
+
+class TestServiceBackpressure:
+    """iter_documents_text only downloads what the budget admits"""
+
+    async def test_budget_limits_documents_in_flight(self):
+        service = GoogleDocsService()
+        budget = _budget(rss=100 * MB, budget=200 * MB, expansion_factor=1.0)
+        in_flight = 0
+        peak = 0
+
+        async def fake_fetch(access_token, document_id, mime_type, version=None):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return {'content': f"text of {document_id}"}
+
+        # 40 MB each: two fit next to 100 MB RSS, the third must wait
+        documents = {f"doc-{i}": {'mimeType': 'application/pdf', 'size': str(40 * MB)} for i in range(8)}
+        with patch.object(service, 'fetch_document_text', fake_fetch):
+            results = [item async for item in service.iter_documents_text('token', documents, 60, memory_budget=budget)]
+
+        assert len(results) == 8
+        assert peak == 2
+        assert budget.get_stats()['reserved_mb'] == 0
+        assert budget.get_stats()['paused'] >= 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
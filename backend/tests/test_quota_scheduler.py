@@ -0,0 +1,195 @@
+"""
+Tests for the per-user / global Drive quota scheduler
+Run with: pytest tests/test_quota_scheduler.py -v
+"""
+
+import asyncio
+import pytest
+import sys
+import os
+import time
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from services.google_docs import GoogleDocsService
+from utils.quota_scheduler import (
+    DriveQuotaScheduler,
+    set_drive_request_context,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BULK,
+)
+from tests.fake_drive import FakeDrive, FakeResponse
+
+
+async def _grant_order(scheduler, calls):
+    """Queue (user, priority) calls in order and return the users in the order they were granted"""
+    order = []
+
+    async def call(user_id, priority):
+        await scheduler.acquire(user_id, priority)
+        order.append(user_id)
+
+    tasks = []
+    for user_id, priority in calls:
+        tasks.append(asyncio.create_task(call(user_id, priority)))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestTokenBuckets:
+    """Per-user buckets and the global ceiling both pace requests"""
+
+    async def test_user_bucket_limits_rate(self):
+        scheduler = DriveQuotaScheduler(user_rate=100, user_burst=5, global_rate=10000, global_burst=10000)
+
+        start = time.perf_counter()
+        for _ in range(25):
+            await scheduler.acquire('alice', PRIORITY_BULK)
+        elapsed = time.perf_counter() - start
+
+        # 5 from the burst, the other 20 at 100/s
+        assert elapsed >= 0.18
+
+    async def test_other_users_are_not_slowed_by_a_busy_user(self):
+        scheduler = DriveQuotaScheduler(user_rate=10, user_burst=2, global_rate=10000, global_burst=10000)
+        for _ in range(2):
+            await scheduler.acquire('alice', PRIORITY_BULK)
+        alice_waiting = asyncio.create_task(scheduler.acquire('alice', PRIORITY_BULK))
+        await asyncio.sleep(0)
+
+        start = time.perf_counter()
+        await scheduler.acquire('bob', PRIORITY_INTERACTIVE)
+
+        assert time.perf_counter() - start < 0.05
+        assert not alice_waiting.done()
+        await alice_waiting
+
+    async def test_global_ceiling_applies_across_users(self):
+        scheduler = DriveQuotaScheduler(user_rate=10000, user_burst=10000, global_rate=100, global_burst=5)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(scheduler.acquire(f"user-{i % 4}", PRIORITY_BULK) for i in range(25)))
+
+        assert time.perf_counter() - start >= 0.18
+        assert scheduler.get_stats()['granted']['bulk'] == 25
+
+
+class TestFairness:
+    """Round-robin across users, interactive calls ahead of bulk"""
+
+    async def test_round_robin_between_users(self):
+        scheduler = DriveQuotaScheduler(user_rate=10000, user_burst=10000, global_rate=200, global_burst=1)
+
+        order = await _grant_order(scheduler, [('alice', PRIORITY_BULK)] * 10 + [('bob', PRIORITY_BULK)] * 3)
+
+        # Bob queued behind ten of Alice's calls but is served every other turn
+        assert order.index('bob') <= 2
+        assert [i for i, user in enumerate(order) if user == 'bob'][-1] <= 7
+
+    async def test_interactive_before_bulk(self):
+        scheduler = DriveQuotaScheduler(user_rate=10000, user_burst=10000, global_rate=200, global_burst=1)
+
+        order = await _grant_order(scheduler, [('alice', PRIORITY_BULK)] * 8 + [('bob', PRIORITY_INTERACTIVE)] * 3)
+
+        # Alice's first call went straight through; Bob's queued calls jump her backlog
+        bob_turns = [i for i, user in enumerate(order) if user == 'bob']
+        assert bob_turns[-1] <= 4
+
+    async def test_weights_give_more_turns(self):
+        scheduler = DriveQuotaScheduler(user_rate=10000, user_burst=10000, global_rate=200, global_burst=1)
+        scheduler.set_user_weight('alice', 2)
+
+        order = await _grant_order(scheduler, [('alice', PRIORITY_BULK)] * 8 + [('bob', PRIORITY_BULK)] * 8)
+
+        # After Alice's immediate first grant: alice, alice, bob, alice, alice, bob, ...
+        turns = order[1:10]
+        assert turns.count('alice') == 2 * turns.count('bob')
+
+    async def test_cancelled_waiters_are_dropped(self):
+        scheduler = DriveQuotaScheduler(user_rate=10000, user_burst=10000, global_rate=20, global_burst=1)
+        await scheduler.acquire('alice', PRIORITY_BULK)
+
+        waiter = asyncio.create_task(scheduler.acquire('alice', PRIORITY_BULK))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert scheduler.get_stats()['queued'] == {'interactive': 0, 'bulk': 0}
+        await scheduler.acquire('bob', PRIORITY_INTERACTIVE)
+        assert scheduler.get_stats()['granted_by_user'] == {'alice': 1, 'bob': 1}
+
+
+class TestIdleBuckets:
+    """Buckets of users who stopped calling are dropped once refilled"""
+
+    async def test_refilled_buckets_are_evicted(self):
+        scheduler = DriveQuotaScheduler(user_rate=1000, user_burst=5, global_rate=10000, global_burst=10000)
+        for user_id in ('alice', 'bob'):
+            await scheduler.acquire(user_id, PRIORITY_BULK)
+        assert scheduler.get_stats()['tracked_users'] == 2
+
+        await asyncio.sleep(0.01)  # both buckets refill
+        with patch.object(DriveQuotaScheduler, 'IDLE_SWEEP_SECONDS', 0):
+            await scheduler.acquire('carol', PRIORITY_BULK)
+
+        stats = scheduler.get_stats()
+        assert stats['tracked_users'] == 1 and stats['granted_by_user'] == {'carol': 1}
+
+
+class TestServiceIntegration:
+    """Drive calls are attributed to the user and priority set for the request"""
+
+    async def test_calls_use_request_context(self):
+        drive = FakeDrive.build_tree(depth=1, fanout=2, files_per_folder=1)
+
+        async def fake_client():
+            return drive
+
+        service = GoogleDocsService()
+
+        async def scan():
+            set_drive_request_context('carol', PRIORITY_BULK)
+            return await service.list_all_documents_from_folder('root', 'token', traversal="batched")
+
+        with patch('services.google_docs.get_http_client', fake_client):
+            documents = await asyncio.create_task(scan())
+
+        quota = service.get_api_stats()['quota']
+        assert len(documents) == 3
+        assert quota['granted_by_user'] == {'carol': len(drive.requests)}
+        assert quota['granted']['bulk'] == len(drive.requests)
+
+    async def test_throttled_retries_use_quota(self):
+        drive = FakeDrive.build_tree(depth=1, fanout=2, files_per_folder=1)
+        real_get = drive.get
+        throttled = []
+
+        async def flaky_get(url, params=None, headers=None):
+            if not throttled:
+                throttled.append(url)
+                return FakeResponse(429, headers={'retry-after': '0'})
+            return await real_get(url, params=params, headers=headers)
+        drive.get = flaky_get
+
+        async def fake_client():
+            return drive
+
+        service = GoogleDocsService()
+
+        async def scan():
+            set_drive_request_context('carol', PRIORITY_BULK)
+            return await service.list_all_documents_from_folder('root', 'token', traversal="batched")
+
+        with patch('services.google_docs.get_http_client', fake_client):
+            await asyncio.create_task(scan())
+
+        # The throttled attempt and its retry were both admitted by the scheduler
+        assert service.get_api_stats()['quota']['granted_by_user'] == {'carol': len(drive.requests) + 1}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,255 @@
+"""
+Tests for the AIMD adaptive concurrency limiter
+Run with: pytest tests/test_rate_limiter.py -v
+"""
+
+import asyncio
+import pytest
+import sys
+import os
+import time
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from services.google_docs import GoogleDocsService
+from utils.rate_limiter import AdaptiveConcurrencyLimiter
+from utils.quota_scheduler import PRIORITY_INTERACTIVE, PRIORITY_BULK
+from tests.fake_drive import FakeDrive, FakeResponse
+
+RATE_LIMIT_BODY = {'error': {'code': 403, 'errors': [{'reason': 'userRateLimitExceeded'}]}}
+
+
+def _ok():
+    async def send():
+        return FakeResponse(200, {})
+    return send
+
+
+class TestAIMD:
+    """Additive increase on success, multiplicative decrease on throttling"""
+
+    async def test_additive_increase(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=10)
+
+        for _ in range(5):
+            await limiter.request(_ok())
+
+        # +1/limit per success: roughly one extra slot per round of `limit` successes
+        assert limiter.limit == 5
+        assert limiter.get_stats()['successes'] == 5
+
+    async def test_never_exceeds_max_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=3, max_limit=3)
+
+        for _ in range(20):
+            await limiter.request(_ok())
+
+        assert limiter.limit == 3
+
+    async def test_halves_on_rate_limit_and_counts_rejections(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=40, max_retries=3, base_backoff=0.0)
+        responses = [
+            FakeResponse(403, RATE_LIMIT_BODY),
+            FakeResponse(429),
+            FakeResponse(503),
+            FakeResponse(200, {'ok': True}),
+        ]
+
+        async def send():
+            return responses.pop(0)
+
+        with patch('utils.rate_limiter.random.random', return_value=0.0):
+            response = await limiter.request(send)
+
+        stats = limiter.get_stats()
+        assert response.json() == {'ok': True}
+        assert stats['rejections'] == {'403_rate_limit': 1, '429': 1, '5xx': 1}
+        assert stats['retries'] == 3
+        assert limiter.limit == 5
+
+    async def test_plain_403_is_not_throttling(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=8)
+
+        async def send():
+            return FakeResponse(403, {'error': {'errors': [{'reason': 'insufficientFilePermissions'}]}})
+
+        response = await limiter.request(send)
+
+        assert response.status_code == 403
+        assert limiter.get_stats()['rejections'] == {'403_rate_limit': 0, '429': 0, '5xx': 0}
+        assert limiter.limit == 8
+
+    async def test_one_decrease_per_round_of_in_flight_requests(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=16, max_retries=0)
+        release = asyncio.Event()
+
+        async def send():
+            await release.wait()
+            return FakeResponse(429)
+
+        calls = [asyncio.create_task(limiter.request(send)) for _ in range(8)]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*calls)
+
+        # Eight rejections from the same round cut the limit once, not 2^8 times
+        assert limiter.get_stats()['rejections']['429'] == 8
+        assert limiter.get_stats()['decreases'] == 1
+        assert limiter.limit == 8
+
+    async def test_caps_in_flight_requests(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=3, max_limit=3)
+        in_flight = 0
+        peak = 0
+
+        async def send():
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return FakeResponse(200, {})
+
+        await asyncio.gather(*(limiter.request(send) for _ in range(12)))
+
+        assert peak == 3
+
+
+class TestRetryAfter:
+    """Retry-After pauses every caller, not just the throttled one"""
+
+    async def test_retry_after_pauses_new_requests(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=4)
+        responses = [FakeResponse(429, headers={'retry-after': '0.2'}), FakeResponse(200, {})]
+
+        async def throttled_once():
+            return responses.pop(0)
+
+        start = time.perf_counter()
+        first = asyncio.create_task(limiter.request(throttled_once))
+        await asyncio.sleep(0.05)
+        await limiter.request(_ok())
+        other_elapsed = time.perf_counter() - start
+        await first
+
+        assert other_elapsed >= 0.2
+        assert limiter.get_stats()['retry_after_pauses'] == 1
+
+    def test_parses_http_date(self):
+        limiter = AdaptiveConcurrencyLimiter()
+        response = FakeResponse(429, headers={'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+
+        assert limiter._retry_after(response) == 0.0
+
+
+class TestFairSlots:
+    """Free slots go to interactive calls first and rotate across users"""
+
+    async def test_bulk_calls_leave_slots_for_interactive(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=5, max_limit=5)
+        release = asyncio.Event()
+
+        async def download():
+            await release.wait()
+            return FakeResponse(200, {})
+
+        bulk = [asyncio.create_task(limiter.request(download, 'alice', PRIORITY_BULK)) for _ in range(10)]
+        await asyncio.sleep(0.01)
+        listing = await asyncio.wait_for(limiter.request(_ok(), 'bob', PRIORITY_INTERACTIVE), timeout=1)
+
+        stats = limiter.get_stats()
+        assert listing.status_code == 200
+        assert stats['in_flight_bulk'] == limiter.bulk_limit == 4
+        assert stats['waiting'] == {'interactive': 0, 'bulk': 6}
+        release.set()
+        await asyncio.gather(*bulk)
+        assert limiter.get_stats()['in_flight'] == 0
+
+    async def test_slots_rotate_across_users(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1)
+        release = asyncio.Event()
+        order = []
+
+        def send(user_id):
+            async def call():
+                order.append(user_id)
+                await release.wait()
+                return FakeResponse(200, {})
+            return call
+
+        calls = [asyncio.create_task(limiter.request(send('alice'), 'alice', PRIORITY_BULK)) for _ in range(4)]
+        calls.append(asyncio.create_task(limiter.request(send('bob'), 'bob', PRIORITY_BULK)))
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(*calls)
+
+        # Bob queued behind three of Alice's calls but gets the second slot handed out
+        assert order == ['alice', 'alice', 'bob', 'alice', 'alice']
+
+    async def test_per_user_cap(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=4, interactive_reserve=0, max_user_share=0.5)
+        release = asyncio.Event()
+
+        async def download():
+            await release.wait()
+            return FakeResponse(200, {})
+
+        calls = [asyncio.create_task(limiter.request(download, 'alice', PRIORITY_BULK)) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        assert limiter.get_stats()['in_flight'] == 2
+        calls.append(asyncio.create_task(limiter.request(download, 'bob', PRIORITY_BULK)))
+        await asyncio.sleep(0.01)
+        assert limiter.get_stats()['in_flight'] == 3
+
+        release.set()
+        await asyncio.gather(*calls)
+
+    async def test_retries_are_admitted_again(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_retries=2, base_backoff=0.0)
+        responses = [FakeResponse(429), FakeResponse(503), FakeResponse(200, {})]
+        admitted = []
+
+        async def send():
+            return responses.pop(0)
+
+        async def admit():
+            admitted.append(1)
+
+        with patch('utils.rate_limiter.random.random', return_value=0.0):
+            await limiter.request(send, 'alice', PRIORITY_BULK, admit=admit)
+
+        assert len(admitted) == 3
+
+
+class TestServiceIntegration:
+    """Drive listing goes through the shared limiter"""
+
+    async def test_listing_recovers_from_rate_limit(self):
+        drive = FakeDrive.build_tree(depth=1, fanout=2, files_per_folder=1)
+        real_get = drive.get
+        throttled = []
+
+        async def flaky_get(url, params=None, headers=None):
+            if not throttled:
+                throttled.append(url)
+                return FakeResponse(403, RATE_LIMIT_BODY, headers={'retry-after': '0'})
+            return await real_get(url, params=params, headers=headers)
+        drive.get = flaky_get
+
+        async def fake_client():
+            return drive
+
+        service = GoogleDocsService()
+        with patch('services.google_docs.get_http_client', fake_client):
+            documents = await service.list_all_documents_from_folder('root', 'token', traversal="batched")
+
+        stats = service.get_api_stats()
+        assert len(documents) == 3
+        assert stats['rejections']['403_rate_limit'] == 1
+        assert stats['requests']['files_list'] >= 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,162 @@
+"""
+Tests for the compressed extracted-text cache
+Run with: pytest tests/test_text_cache.py -v
+"""
+
+import os
+import pytest
+import random
+import string
+import sys
+import threading
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from services.google_docs import GoogleDocsService
+from utils.text_cache import ExtractedTextCache
+from tests.fake_drive import FakeDrive
+
+
+def _random_text(size: int, seed: int) -> str:
+    """Incompressible text so entry sizes are predictable"""
+    rng = random.Random(seed)
+    return ''.join(rng.choice(string.ascii_letters) for _ in range(size))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExtractedTextCache(str(tmp_path / "text_cache"), max_bytes=10 * 1024 * 1024)
+
+
+class TestExtractedTextCache:
+    """Entries are compressed, versioned and evicted least recently used first"""
+
+    def test_round_trip_is_compressed(self, cache, tmp_path):
+        text = "Quarterly report. " * 2000
+
+        cache.put('file-1', '2024-01-01T00:00:00.000Z', text)
+
+        assert cache.get('file-1', '2024-01-01T00:00:00.000Z') == text
+        assert cache.stats()['total_bytes'] < len(text) / 10
+
+    def test_new_version_is_a_miss(self, cache):
+        cache.put('file-1', '2024-01-01T00:00:00.000Z', 'old text')
+
+        assert cache.get('file-1', '2024-02-01T00:00:00.000Z') is None
+        assert cache.get('file-1', None) is None
+        assert cache.stats()['misses'] == 1
+
+    def test_lru_eviction_by_total_bytes(self, tmp_path):
+        cache = ExtractedTextCache(str(tmp_path / "small"), max_bytes=25 * 1024)
+        for i in range(3):
+            cache.put(f"file-{i}", 'v1', _random_text(10 * 1024, i))
+
+        # Touch file-0 so file-1 becomes the least recently used entry
+        cache.get('file-0', 'v1')
+        cache.put('file-3', 'v1', _random_text(10 * 1024, 3))
+
+        assert cache.get('file-1', 'v1') is None
+        assert cache.get('file-0', 'v1') is not None
+        assert cache.stats()['total_bytes'] <= 25 * 1024
+        assert cache.stats()['evictions'] >= 1
+
+    def test_entries_survive_restart(self, cache, tmp_path):
+        cache.put('file-1', 'v1', 'persisted text')
+
+        reopened = ExtractedTextCache(str(tmp_path / "text_cache"))
+
+        assert reopened.get('file-1', 'v1') == 'persisted text'
+
+    def test_corrupt_entry_is_dropped(self, cache, tmp_path):
+        cache.put('file-1', 'v1', 'some text')
+        for name in os.listdir(tmp_path / "text_cache"):
+            (tmp_path / "text_cache" / name).write_bytes(b"not compressed")
+
+        assert cache.get('file-1', 'v1') is None
+        assert cache.stats()['entries'] == 0
+
+
+class TestServiceUsesCache:
+    """Download/extract paths consult the cache before touching Drive"""
+
+    @pytest.fixture
+    def drive(self):
+        drive = FakeDrive()
+        drive.add_folder('root', 'root')
+        drive.add_file('notes', 'notes.txt', 'root', mime_type='text/plain', content='Meeting notes ' * 20)
+        return drive
+
+    @pytest.fixture
+    def service(self, drive, cache):
+        async def fake_client():
+            return drive
+
+        with patch('services.google_docs.get_http_client', fake_client), \
+             patch('services.google_docs.get_text_cache', lambda: cache):
+            yield GoogleDocsService()
+
+    async def test_second_download_skips_drive(self, drive, service):
+        version = drive.files['notes']['modifiedTime']
+
+        first = await service.fetch_document_text('token', 'notes', 'text/plain', version)
+        downloads_after_first = service.get_request_stats()['download']
+        second = await service.download_document_raw('token', 'notes', 'text/plain', version)
+
+        assert second['cached'] is True
+        assert second['data'] == first['content']
+        assert service.get_request_stats()['download'] == downloads_after_first == 1
+
+    async def test_modified_file_is_downloaded_again(self, drive, service):
+        await service.fetch_document_text('token', 'notes', 'text/plain', '2024-01-01T00:00:00.000Z')
+
+        result = await service.fetch_document_text('token', 'notes', 'text/plain', '2024-03-01T00:00:00.000Z')
+
+        assert result['content'].startswith('Meeting notes')
+        assert service.get_request_stats()['download'] == 2
+
+    async def test_extract_text_from_raw_caches_parsed_text(self, service, cache):
+        await service.extract_text_from_raw(b'parsed once', 'text/plain', 'raw-file', 'v1')
+
+        assert await service.extract_text_from_raw(b'', 'text/plain', 'raw-file', 'v1') == 'parsed once'
+        assert cache.stats()['hits'] == 1
+
+    async def test_failures_are_not_cached(self, service, cache):
+        text = await service.extract_text_from_raw(b'data', 'image/png', 'image-file', 'v1')
+
+        assert text.startswith('Content extraction not supported')
+        assert cache.stats()['writes'] == 0
+
+    async def test_get_document_content_looks_up_version(self, drive, service):
+        await service.get_document_content('token', 'notes')
+        downloads = service.get_request_stats()['download']
+
+        content = await service.get_document_content('token', 'notes')
+
+        assert content.startswith('Meeting notes')
+        # Only the metadata lookup happens on the second call
+        assert service.get_request_stats()['download'] == downloads
+        assert service.get_request_stats()['files_get'] == 2
+
+    async def test_cache_io_runs_off_the_event_loop(self, service, cache):
+        threads = []
+        real_get, real_put = cache.get, cache.put
+
+        def get(*args):
+            threads.append(threading.current_thread())
+            return real_get(*args)
+
+        def put(*args):
+            threads.append(threading.current_thread())
+            return real_put(*args)
+
+        with patch.object(cache, 'get', get), patch.object(cache, 'put', put):
+            await service.extract_text_from_raw(b'parsed once', 'text/plain', 'raw-file', 'v1')
+
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,128 @@
+"""
+Tests for two-stage (document centroid, then chunk) retrieval
+Run with: pytest tests/test_two_stage_retrieval.py -v
+"""
+
+import os
+import pytest
+import sys
+from unittest.mock import patch
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.centroid_index import CentroidAccumulator, CentroidIndex
+from utils.compact_index import normalize
+
+TOPICS = {
+    'finance': "budget revenue invoice forecast margin ledger",
+    'hiring': "candidate interview offer recruiter onboarding salary",
+    'security': "firewall patch vulnerability audit encryption token",
+    'travel': "flight hotel itinerary visa luggage airport",
+}
+
+
+def _doc(doc_id: str, words: str, paragraphs: int = 4):
+    content = "\n\n".join(f"Part {i}. " + " ".join([words] * 8) for i in range(paragraphs))
+    return {'id': doc_id, 'name': f"{doc_id}.txt", 'mime_type': 'text/plain', 'content': content}
+
+
+def _documents_in(results):
+    return {meta['document_id'] for meta in results['metadatas'][0]}
+
+
+@pytest.fixture
+def two_stage():
+    with patch('services.rag_pipeline.RAGConfig.RETRIEVAL_TWO_STAGE', True), \
+         patch('services.rag_pipeline.RAGConfig.RETRIEVAL_TWO_STAGE_MIN_CHUNKS', 0), \
+         patch('services.rag_pipeline.RAGConfig.RETRIEVAL_TOP_DOCUMENTS', 1):
+        yield
+
+
+class TestCentroids:
+    """Centroids are the mean of a document's unit chunk vectors"""
+
+    def test_accumulator_matches_numpy_mean(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((30, 8)).astype(np.float32)
+        owners = [f"doc-{i % 3}" for i in range(30)]
+        accumulator = CentroidAccumulator()
+        accumulator.add(owners[:17], vectors[:17])
+        accumulator.add(owners[17:], vectors[17:])
+
+        document_ids, centroids = accumulator.centroids()
+
+        for document_id, centroid in zip(document_ids, centroids):
+            rows = [i for i, owner in enumerate(owners) if owner == document_id]
+            assert centroid == pytest.approx(normalize(vectors[rows]).sum(axis=0), abs=1e-4)
+
+    def test_update_replaces_and_removes_documents(self):
+        rng = np.random.default_rng(1)
+        vectors = rng.standard_normal((3, 8)).astype(np.float32)
+        index = CentroidIndex()
+        accumulator = CentroidAccumulator()
+        accumulator.add(['a', 'b', 'c'], vectors)
+        index.update([], accumulator)
+
+        index.update(['b'], CentroidAccumulator())
+
+        assert len(index) == 2
+        assert index.top_documents(vectors[2], 1) == ['c']
+
+
+class TestTwoStageSearch:
+    """Chunks are searched only within the shortlisted documents"""
+
+    async def test_search_is_limited_to_top_documents(self, fake_pipeline, two_stage):
+        await fake_pipeline.add_documents_bulk('u1', [_doc(name, words) for name, words in TOPICS.items()])
+        collection = fake_pipeline._get_user_collection('u1')
+        query = fake_pipeline.embedding_model.encode(["interview salary offer"])[0]
+
+        results = await fake_pipeline._search(collection, query, n_results=10)
+
+        assert _documents_in(results) == {'hiring'}
+        assert fake_pipeline.search_stats == {'flat': 0, 'two_stage': 1}
+
+    async def test_small_collections_stay_flat(self, fake_pipeline, two_stage):
+        await fake_pipeline.add_documents_bulk('u1', [_doc(name, words) for name, words in TOPICS.items()])
+        collection = fake_pipeline._get_user_collection('u1')
+        query = fake_pipeline.embedding_model.encode(["interview salary offer"])[0]
+
+        with patch('services.rag_pipeline.RAGConfig.RETRIEVAL_TWO_STAGE_MIN_CHUNKS', collection.count() + 1):
+            results = await fake_pipeline._search(collection, query, n_results=10)
+
+        assert len(_documents_in(results)) > 1
+        assert collection.name not in fake_pipeline._centroid_indexes
+
+    async def test_centroids_follow_writes(self, fake_pipeline, two_stage):
+        await fake_pipeline.add_documents_bulk('u1', [_doc(name, words) for name, words in TOPICS.items()])
+        collection = fake_pipeline._get_user_collection('u1')
+        hiring = fake_pipeline.embedding_model.encode(["interview salary offer"])[0]
+        await fake_pipeline._search(collection, hiring, n_results=5)
+
+        await fake_pipeline.remove_documents('u1', ['hiring'])
+        await fake_pipeline.add_documents_bulk('u1', [_doc('recruiting', TOPICS['hiring'])])
+        results = await fake_pipeline._search(collection, hiring, n_results=5)
+
+        centroids = fake_pipeline._centroid_indexes[collection.name]
+        assert _documents_in(results) == {'recruiting'}
+        assert len(centroids) == 4 and centroids.pending == 0
+
+    async def test_compact_storage_searches_within_documents(self, fake_pipeline, two_stage, tmp_path):
+        await fake_pipeline.add_documents_bulk('u1', [_doc(name, words) for name, words in TOPICS.items()])
+        collection = fake_pipeline._get_user_collection('u1')
+        query = fake_pipeline.embedding_model.encode(["firewall audit"])[0]
+
+        with patch('services.rag_pipeline.RAGConfig.VECTOR_STORAGE', 'int8'), \
+             patch('services.rag_pipeline.RAGConfig.COMPACT_INDEX_DIR', str(tmp_path)):
+            collection.calls.clear()
+            results = await fake_pipeline._search(collection, query, n_results=10)
+
+        assert _documents_in(results) == {'security'}
+        assert 'query' not in collection.calls
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,75 @@
+"""
+Cooperative cancellation for ingestion work
+A token is shared by the event loop and the executor threads doing parsing,
+embedding and Chroma writes, so work stops at the next safe point once the
+client has gone away
+"""
+
+import asyncio
+import threading
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OperationCancelled(Exception):
+    """Raised at a checkpoint once the operation's token has been cancelled"""
+
+
+class CancellationToken:
+    """
+    Thread-safe cancellation flag.
+
+    Child tokens are cancelled together with their parent but can also be
+    cancelled on their own (e.g. one timed-out group inside a whole upload).
+    """
+
+    def __init__(self, parent: Optional["CancellationToken"] = None):
+        self._event = threading.Event()
+        self._parent = parent
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self._parent is not None and self._parent.cancelled:
+            self.reason = self._parent.reason
+            return True
+        return False
+
+    def raise_if_cancelled(self):
+        """Checkpoint: raise OperationCancelled if the work should stop"""
+        if self.cancelled:
+            raise OperationCancelled(self.reason)
+
+    def child(self) -> "CancellationToken":
+        return CancellationToken(parent=self)
+
+
+def check_cancelled(cancel: Optional[CancellationToken]):
+    """Checkpoint for code where the token is optional"""
+    if cancel is not None:
+        cancel.raise_if_cancelled()
+
+
+async def watch_disconnect(request, cancel: CancellationToken, interval: float = 0.5):
+    """
+    Cancel `cancel` as soon as the HTTP client disconnects
+
+    Run as a background task next to a streaming response: the stream itself
+    only notices a disconnect when it next yields, which can be minutes away
+    while a large group is being embedded.
+    """
+    while not cancel.cancelled:
+        if await request.is_disconnected():
+            logger.info("❌ Client disconnected, cancelling in-flight ingestion")
+            cancel.cancel("client disconnected")
+            return
+        await asyncio.sleep(interval)
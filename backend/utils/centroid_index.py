@@ -0,0 +1,98 @@
+"""
+Document-level centroid index for two-stage retrieval
+One vector per document (the normalized mean of its chunk vectors) picks the
+top-M documents for a query; chunks are then searched only within them
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+import numpy as np
+
+from utils.compact_index import CompactVectorIndex, normalize
+
+logger = logging.getLogger(__name__)
+
+
+class CentroidAccumulator:
+    """Running per-document sums of unit chunk vectors"""
+
+    def __init__(self):
+        self._slots: Dict[str, int] = {}
+        self._sums: Optional[np.ndarray] = None
+
+    def add(self, document_ids: List[str], vectors):
+        if len(document_ids) == 0:
+            return
+        vectors = normalize(vectors)
+        slots = np.fromiter((self._slots.setdefault(document_id, len(self._slots)) for document_id in document_ids), dtype=np.int64)
+        if self._sums is None:
+            self._sums = np.zeros((max(len(self._slots), 64), vectors.shape[1]), dtype=np.float64)
+        elif len(self._slots) > self._sums.shape[0]:
+            grown = np.zeros((max(len(self._slots), self._sums.shape[0] * 2), self._sums.shape[1]), dtype=np.float64)
+            grown[:self._sums.shape[0]] = self._sums
+            self._sums = grown
+        # Sum runs of equal slots (chunks of a document arrive together) instead of np.add.at
+        order = np.argsort(slots, kind='stable')
+        slots = slots[order]
+        starts = np.flatnonzero(np.r_[True, slots[1:] != slots[:-1]])
+        self._sums[slots[starts]] += np.add.reduceat(vectors[order], starts, axis=0)
+
+    def centroids(self) -> Tuple[List[str], np.ndarray]:
+        """Document ids and their (unnormalized) mean directions"""
+        document_ids = list(self._slots)
+        if self._sums is None:
+            return document_ids, np.empty((0, 0), dtype=np.float32)
+        return document_ids, self._sums[:len(document_ids)].astype(np.float32)
+
+
+class CentroidIndex:
+    """
+    Document id -> centroid, searched to shortlist documents for a query.
+
+    Writes to the collection only mark documents dirty; their centroids are
+    recomputed from the current chunk vectors before the next search, so a
+    document written in several batches is averaged once.
+    """
+
+    def __init__(self, source_id: Optional[str] = None):
+        # float16 is plenty for a shortlist and halves the footprint
+        self._index = CompactVectorIndex('float16', source_id=source_id)
+        self._dirty: Set[str] = set()
+        self._dirty_lock = threading.Lock()
+        # Set when a write could not be attributed to documents: rebuild before use
+        self.stale = False
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def nbytes(self) -> int:
+        return self._index.nbytes
+
+    def mark_dirty(self, document_ids: Iterable[str]):
+        with self._dirty_lock:
+            self._dirty.update(document_id for document_id in document_ids if document_id)
+
+    def take_dirty(self) -> Set[str]:
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+            return dirty
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def update(self, document_ids: Iterable[str], accumulator: CentroidAccumulator):
+        """Replace the centroids of `document_ids`; those with no chunks left are removed"""
+        found, centroids = accumulator.centroids()
+        if found:
+            self._index.upsert(found, centroids, found)
+        missing = set(document_ids) - set(found)
+        if missing:
+            self._index.delete(missing)
+
+    def top_documents(self, query, m: int) -> List[str]:
+        """The `m` documents whose centroids are closest to the query"""
+        return [document_id for document_id, _ in self._index.search(query, m)]
@@ -0,0 +1,72 @@
+"""
+Persistent Chroma client with a bounded HNSW cache
+chromadb 1.x keeps the HNSW indexes of up to RLIMIT_NOFILE / 5 collections
+loaded and unloads the least recently used one beyond that. It reads the limit
+once, when the client starts, and offers no setting for it or call to unload a
+given collection, so the only handle on that memory is the open-file limit at
+startup.
+"""
+
+import os
+import logging
+from typing import Optional, Tuple
+
+import chromadb
+from chromadb.config import Settings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Chroma's cache size is the soft open-file limit divided by this
+FILES_PER_CACHED_COLLECTION = 5
+
+# Descriptors left free above those in use while the client starts (sqlite, WAL, runtime)
+STARTUP_FD_HEADROOM = 64
+
+
+def _open_descriptors() -> Optional[int]:
+    for fd_dir in ('/proc/self/fd', '/dev/fd'):
+        try:
+            return len(os.listdir(fd_dir))
+        except OSError:
+            continue
+    return None
+
+
+def open_persistent_client(path: str, settings: Settings, hnsw_cache_collections: int = 0) -> Tuple[chromadb.ClientAPI, Optional[int]]:
+    """
+    Open a PersistentClient whose HNSW cache holds about `hnsw_cache_collections` collections
+
+    The soft RLIMIT_NOFILE is lowered while the client starts and restored right
+    after; other threads opening files in that window could hit the lower limit,
+    so call this at startup. The cache never gets smaller than the descriptors in
+    use allow, nor larger than Chroma's default.
+
+    Args:
+        path: Chroma persist directory
+        settings: Client settings
+        hnsw_cache_collections: Wanted cache size in collections (0 = Chroma's default)
+
+    Returns:
+        The client and its HNSW cache size in collections (None if the limit can't be read)
+    """
+    if resource is None:
+        return chromadb.PersistentClient(path=path, settings=settings), None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    limit = soft
+    in_use = _open_descriptors()
+    if hnsw_cache_collections > 0 and in_use is not None:
+        limit = min(soft, max(hnsw_cache_collections * FILES_PER_CACHED_COLLECTION, in_use + STARTUP_FD_HEADROOM))
+
+    if limit != soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+    try:
+        client = chromadb.PersistentClient(path=path, settings=settings)
+    finally:
+        if limit != soft:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    return client, limit // FILES_PER_CACHED_COLLECTION
@@ -0,0 +1,229 @@
+"""
+Read-only inspection of a ChromaDB persist directory
+Reads what Chroma keeps on disk for each collection (row counts in
+chroma.sqlite3, and the header, data files and id map of the persisted HNSW
+index) without going through Chroma, so damage shows up as a mismatch instead
+of as a crash or as silently missing search results. vacuum_sqlite is the one
+writer here and must only run while no ChromaDB client has the directory open.
+"""
+
+import os
+import pickle
+import sqlite3
+import struct
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+SQLITE_FILE = 'chroma.sqlite3'
+
+# hnswlib header as persisted by Chroma: persistence version, offsetLevel0,
+# max_elements, cur_element_count, size_data_per_element, label_offset,
+# offsetData, maxlevel, enterpoint_node, maxM, maxM0, M, mult, ef_construction
+HNSW_HEADER = struct.Struct('<iQQQQQQiIQQQdQ')
+
+HNSW_METADATA = 'index_metadata.pickle'
+
+
+class _PlainUnpickler(pickle.Unpickler):
+    """The id map is plain dicts / ints / strings; refuse anything that would import code"""
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"unexpected object {module}.{name}")
+
+
+def read_hnsw_header(segment_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(segment_dir, 'header.bin'), 'rb') as f:
+        raw = f.read(HNSW_HEADER.size)
+    if len(raw) < HNSW_HEADER.size:
+        raise ValueError(f"header.bin is {len(raw)} bytes, expected {HNSW_HEADER.size}")
+    fields = HNSW_HEADER.unpack(raw)
+    return {
+        'version': fields[0],
+        'max_elements': fields[2],
+        'elements': fields[3],
+        'element_bytes': fields[4],
+        'max_level': fields[7],
+        'M': fields[11],
+        'ef_construction': fields[13]
+    }
+
+
+def inspect_hnsw_segment(segment_dir: str) -> Dict[str, Any]:
+    """
+    Check one persisted HNSW segment
+
+    Returns:
+        Dict with elements (slots used, including deleted ones), active (ids
+        mapped, None if the id map was never written), header fields and a
+        list of problems
+    """
+    result: Dict[str, Any] = {'elements': 0, 'active': None, 'problems': []}
+    problems = result['problems']
+    try:
+        header = read_hnsw_header(segment_dir)
+    except FileNotFoundError:
+        problems.append("header.bin missing")
+        return result
+    except (OSError, ValueError, struct.error) as e:
+        problems.append(f"header.bin unreadable: {e}")
+        return result
+    result.update(header)
+    elements = header['elements']
+
+    if elements > header['max_elements']:
+        problems.append(f"header claims {elements} elements but capacity {header['max_elements']}")
+    expected = {'data_level0.bin': elements * header['element_bytes'], 'length.bin': elements * 4}
+    for filename, minimum in expected.items():
+        path = os.path.join(segment_dir, filename)
+        if not os.path.exists(path):
+            problems.append(f"{filename} missing")
+        elif os.path.getsize(path) < minimum:
+            problems.append(f"{filename} truncated ({os.path.getsize(path)} of {minimum} bytes)")
+    if elements and header['max_level'] > 0 and not os.path.exists(os.path.join(segment_dir, 'link_lists.bin')):
+        problems.append("link_lists.bin missing")
+
+    metadata_path = os.path.join(segment_dir, HNSW_METADATA)
+    if os.path.exists(metadata_path):
+        try:
+            with open(metadata_path, 'rb') as f:
+                metadata = _PlainUnpickler(f).load()
+            result['active'] = len(metadata['id_to_label'])
+        except Exception as e:
+            problems.append(f"{HNSW_METADATA} unreadable: {e}")
+    elif elements:
+        problems.append(f"{HNSW_METADATA} missing")
+    if result['active'] is not None and result['active'] > elements:
+        problems.append(f"{result['active']} ids mapped to {elements} elements")
+    return result
+
+
+def _sqlite_state(persist_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Per collection: ids, rows in the metadata segment, seq ids, and queued writes not yet in the HNSW index"""
+    uri = f"file:{os.path.join(os.path.abspath(persist_dir), SQLITE_FILE)}?mode=ro"
+    connection = sqlite3.connect(uri, uri=True, timeout=5)
+    try:
+        collections: Dict[str, Dict[str, Any]] = {}
+        for collection_id, name in connection.execute("SELECT id, name FROM collections"):
+            collections[name] = {'id': collection_id, 'sqlite_rows': 0, 'pending': 0,
+                                 'vector_segment': None, 'max_seq_id': None}
+        by_id = {entry['id']: entry for entry in collections.values()}
+
+        for segment_id, scope, collection_id in connection.execute("SELECT id, scope, collection FROM segments"):
+            entry = by_id.get(collection_id)
+            if entry is not None:
+                entry['vector_segment' if scope == 'VECTOR' else 'metadata_segment'] = segment_id
+        seq_ids = dict(connection.execute("SELECT segment_id, seq_id FROM max_seq_id"))
+        rows = dict(connection.execute("SELECT segment_id, COUNT(*) FROM embeddings GROUP BY segment_id"))
+
+        for entry in collections.values():
+            metadata_segment = entry.get('metadata_segment')
+            entry['sqlite_rows'] = rows.get(metadata_segment, 0)
+            entry['max_seq_id'] = seq_ids.get(metadata_segment)
+            applied = seq_ids.get(entry['vector_segment']) or 0
+            # Writes are applied to the HNSW index (and persisted) in batches
+            entry['pending'] = connection.execute(
+                "SELECT COUNT(*) FROM embeddings_queue WHERE topic LIKE ? AND seq_id > ?",
+                (f"%{entry['id']}", applied)
+            ).fetchone()[0]
+        return collections
+    finally:
+        connection.close()
+
+
+def sqlite_space(persist_dir: str) -> Dict[str, int]:
+    """File size and bytes held by free pages of chroma.sqlite3 (reused by later writes, never returned to the OS)"""
+    uri = f"file:{os.path.join(os.path.abspath(persist_dir), SQLITE_FILE)}?mode=ro"
+    connection = sqlite3.connect(uri, uri=True, timeout=5)
+    try:
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        pages = connection.execute("PRAGMA page_count").fetchone()[0]
+        free = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        connection.close()
+    return {'bytes': pages * page_size, 'free_bytes': free * page_size}
+
+
+def vacuum_sqlite(persist_dir: str, min_free_ratio: float) -> Optional[Dict[str, int]]:
+    """
+    Rewrite chroma.sqlite3 without its free pages if they make up at least min_free_ratio of it
+
+    Offline only: Chroma keeps its own SQLite connections, and a VACUUM run
+    next to them from this process corrupts the database.
+
+    Returns:
+        Sizes before / after, or None if the file was left alone
+    """
+    path = os.path.join(persist_dir, SQLITE_FILE)
+    if min_free_ratio <= 0 or not os.path.exists(path):
+        return None
+    before = sqlite_space(persist_dir)
+    if not before['bytes'] or before['free_bytes'] / before['bytes'] < min_free_ratio:
+        return None
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    try:
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+    return {'bytes_before': before['bytes'], 'bytes_after': sqlite_space(persist_dir)['bytes']}
+
+
+def inspect_persist_dir(persist_dir: str) -> Dict[str, Any]:
+    """
+    Inspect every collection of a persist directory (blocking, read-only)
+
+    Returns:
+        Dict with 'collections' (name -> sqlite and hnsw state), directory-level
+        'problems', 'orphaned_segments' (segment directories no collection uses)
+        and 'sqlite' (sqlite_space, None if unreadable)
+    """
+    result: Dict[str, Any] = {'collections': {}, 'problems': [], 'orphaned_segments': [], 'sqlite': None}
+    if not os.path.exists(os.path.join(persist_dir, SQLITE_FILE)):
+        result['problems'].append(f"{SQLITE_FILE} missing")
+        return result
+    try:
+        collections = _sqlite_state(persist_dir)
+        result['sqlite'] = sqlite_space(persist_dir)
+    except sqlite3.Error as e:
+        result['problems'].append(f"{SQLITE_FILE} unreadable: {e}")
+        return result
+
+    for name, entry in collections.items():
+        segment = entry['vector_segment']
+        segment_dir = os.path.join(persist_dir, segment) if segment else None
+        if segment_dir is not None and os.path.isdir(segment_dir):
+            entry['hnsw'] = inspect_hnsw_segment(segment_dir)
+        else:
+            # Not persisted yet: every write is still pending
+            entry['hnsw'] = {'elements': 0, 'active': 0, 'problems': []}
+        result['collections'][name] = entry
+
+    used = {entry['vector_segment'] for entry in collections.values()}
+    result['orphaned_segments'] = sorted(
+        name for name in os.listdir(persist_dir)
+        if os.path.isdir(os.path.join(persist_dir, name)) and os.path.exists(os.path.join(persist_dir, name, 'header.bin'))
+        and name not in used
+    )
+    return result
+
+
+def collection_problems(entry: Dict[str, Any], api_count: int) -> List[str]:
+    """
+    Compare what Chroma reports for a collection with its files
+
+    Args:
+        entry: The collection's inspect_persist_dir entry
+        api_count: collection.count()
+    """
+    problems = [f"hnsw: {problem}" for problem in entry['hnsw']['problems']]
+    if entry['sqlite_rows'] != api_count:
+        problems.append(f"count() is {api_count} but chroma.sqlite3 holds {entry['sqlite_rows']} rows")
+    hnsw = entry['hnsw']
+    indexed = hnsw['active'] if hnsw['active'] is not None else hnsw['elements']
+    if abs(indexed - entry['sqlite_rows']) > entry['pending']:
+        problems.append(
+            f"HNSW index holds {indexed} vectors but chroma.sqlite3 {entry['sqlite_rows']} rows "
+            f"({entry['pending']} writes pending)"
+        )
+    return problems
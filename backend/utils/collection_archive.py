@@ -0,0 +1,173 @@
+"""
+Compressed archives of ChromaDB collections
+A collection is written page by page into one zip file: float32 vectors as
+.npy blocks, ids / text / metadata as JSON lines, and a manifest with a SHA-256
+per block, so neither writing nor restoring ever holds more than one page in
+memory. The format is backend-neutral: any vector store that takes ids,
+vectors, text and metadata can be loaded from it without re-embedding.
+"""
+
+import hashlib
+import io
+import json
+import os
+import time
+import zipfile
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT = 1
+MANIFEST = 'manifest.json'
+
+# An archive path, or a seekable binary file (e.g. an upload's spooled file)
+ArchiveSource = Union[str, BinaryIO]
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_archive(
+    collection,
+    path: str,
+    page_size: int = 5000,
+    progress: Optional[Callable[[int], None]] = None
+) -> Dict[str, Any]:
+    """
+    Export every chunk of a collection (blocking)
+
+    Args:
+        collection: ChromaDB collection
+        path: Archive file to create (written to a temp file, then renamed)
+        page_size: Chunks read from Chroma and stored per block
+        progress: Called with the number of chunks written so far
+
+    Returns:
+        The archive manifest
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    blocks = []
+    count = 0
+    dimension = None
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+            while True:
+                page = collection.get(
+                    include=['embeddings', 'documents', 'metadatas'], limit=page_size, offset=count
+                )
+                ids = page['ids']
+                if len(ids) == 0:
+                    break
+                vectors = np.asarray(page['embeddings'], dtype=np.float32)
+                dimension = vectors.shape[1]
+                block = len(blocks)
+                buffer = io.BytesIO()
+                np.save(buffer, vectors)
+                vector_bytes = buffer.getvalue()
+                archive.writestr(f"vectors/{block:05d}.npy", vector_bytes)
+                records = "".join(
+                    json.dumps({'id': chunk_id, 'document': document, 'metadata': metadata}, ensure_ascii=False) + "\n"
+                    for chunk_id, document, metadata in zip(ids, page['documents'], page['metadatas'])
+                ).encode('utf-8')
+                archive.writestr(f"records/{block:05d}.jsonl", records)
+                blocks.append({
+                    'block': block,
+                    'count': len(ids),
+                    'vectors_sha256': _sha256(vector_bytes),
+                    'records_sha256': _sha256(records)
+                })
+                count += len(ids)
+                if progress is not None:
+                    progress(count)
+                if len(ids) < page_size:
+                    break
+
+            manifest = {
+                'format': ARCHIVE_FORMAT,
+                'collection': collection.name,
+                'metadata': collection.metadata or {},
+                'count': count,
+                'dimension': dimension,
+                'blocks': blocks,
+                'created_at': time.time()
+            }
+            archive.writestr(MANIFEST, json.dumps(manifest, indent=2))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return manifest
+
+
+def _read_manifest(archive: zipfile.ZipFile, source: ArchiveSource) -> Dict[str, Any]:
+    try:
+        manifest = json.loads(archive.read(MANIFEST))
+    except KeyError:
+        raise ValueError(f"{source} is not a collection archive (no {MANIFEST})")
+    if manifest.get('format') != ARCHIVE_FORMAT:
+        raise ValueError(f"Unsupported archive format {manifest.get('format')} in {source}")
+    return manifest
+
+
+def _rewind(source: ArchiveSource):
+    if not isinstance(source, str):
+        source.seek(0)
+
+
+def read_manifest(source: ArchiveSource) -> Dict[str, Any]:
+    _rewind(source)
+    try:
+        with zipfile.ZipFile(source) as archive:
+            return _read_manifest(archive, source)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"{source} is not a collection archive: {e}")
+
+
+def iter_archive(source: ArchiveSource) -> Iterator[Tuple[List[str], np.ndarray, List[str], List[Dict[str, Any]]]]:
+    """
+    Yield (ids, embeddings, documents, metadatas) for each block of an archive
+
+    Every block is checked against the manifest (count and SHA-256) before it
+    is yielded, so a truncated or corrupted archive fails at the bad block
+    instead of loading garbage.
+    """
+    _rewind(source)
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"{source} is not a collection archive: {e}")
+    with archive:
+        manifest = _read_manifest(archive, source)
+        for block in manifest['blocks']:
+            try:
+                vector_bytes = archive.read(f"vectors/{block['block']:05d}.npy")
+                record_bytes = archive.read(f"records/{block['block']:05d}.jsonl")
+            except (KeyError, zipfile.BadZipFile) as e:
+                raise ValueError(f"Block {block['block']} of {source} is missing or damaged: {e}")
+            if _sha256(vector_bytes) != block['vectors_sha256'] or _sha256(record_bytes) != block['records_sha256']:
+                raise ValueError(f"Block {block['block']} of {source} failed its checksum")
+            vectors = np.load(io.BytesIO(vector_bytes))
+            records = [json.loads(line) for line in record_bytes.splitlines() if line]
+            if len(records) != len(vectors) or len(records) != block['count']:
+                raise ValueError(f"Block {block['block']} of {source} is inconsistent")
+            yield (
+                [record['id'] for record in records],
+                vectors,
+                [record['document'] for record in records],
+                [record['metadata'] for record in records]
+            )
+
+
+def verify_archive(source: ArchiveSource) -> Dict[str, Any]:
+    """Check every block of an archive (blocking); returns the manifest, raises ValueError if damaged"""
+    manifest = read_manifest(source)
+    count = sum(len(ids) for ids, _, _, _ in iter_archive(source))
+    if count != manifest['count']:
+        raise ValueError(f"{source} holds {count} chunks, its manifest says {manifest['count']}")
+    return manifest
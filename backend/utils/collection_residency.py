@@ -0,0 +1,149 @@
+"""
+Residency tracking for per-user search indexes
+Records when each user collection was last searched and roughly how much
+memory its loaded indexes hold, and picks idle collections to unload: any
+collection idle past a TTL, then least recently used ones while the total is
+over a memory budget or a resident-count cap
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Load latencies kept for percentiles
+LATENCY_WINDOW = 256
+
+
+class CollectionResidency:
+    """
+    LRU of resident collections with idle TTL and memory budget.
+
+    The caller loads and unloads the actual indexes; this class only keeps the
+    bookkeeping: `touch` on every search, `record_load` with how long a cold
+    search took, and `evictable` to ask which collections should go.
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int = 0,
+        idle_ttl: float = 0,
+        max_resident: int = 0,
+        clock=time.monotonic
+    ):
+        """
+        Initialize residency tracking
+
+        Args:
+            budget_bytes: Estimated bytes all resident collections may hold (0 = unlimited)
+            idle_ttl: Seconds without a search before a collection is unloaded (0 = never)
+            max_resident: Most collections kept loaded at once (0 = unlimited)
+            clock: Monotonic time source (injectable for tests)
+        """
+        self.budget_bytes = budget_bytes
+        self.idle_ttl = idle_ttl
+        self.max_resident = max_resident
+        self._clock = clock
+        # name -> (last access, estimated bytes), least recently used first
+        self._resident: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._load_seconds: List[float] = []
+        self._stats = {'loads': 0, 'evictions': 0, 'idle_evictions': 0, 'budget_evictions': 0}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._resident
+
+    def __len__(self) -> int:
+        return len(self._resident)
+
+    @property
+    def resident_bytes(self) -> int:
+        return int(sum(nbytes for _, nbytes in self._resident.values()))
+
+    def touch(self, name: str, nbytes: Optional[int] = None) -> bool:
+        """
+        Mark a collection as just used
+
+        Args:
+            name: Collection name
+            nbytes: Current estimate of its resident size (unchanged if None)
+
+        Returns:
+            True if it was already resident, False if this access loaded it
+        """
+        entry = self._resident.pop(name, None)
+        resident = entry is not None
+        if entry is None:
+            entry = [0.0, 0]
+        entry[0] = self._clock()
+        if nbytes is not None:
+            entry[1] = nbytes
+        self._resident[name] = entry
+        return resident
+
+    def record_load(self, name: str, seconds: float):
+        """Record how long the first search after a (re)load took"""
+        self._stats['loads'] += 1
+        self._load_seconds.append(seconds)
+        if len(self._load_seconds) > LATENCY_WINDOW:
+            del self._load_seconds[:-LATENCY_WINDOW]
+        logger.info(f"📥 Loaded {name} in {seconds * 1000:.0f}ms ({len(self._resident)} collections resident)")
+
+    def discard(self, name: str, reason: str = 'dropped'):
+        """Forget a collection (unloaded, or deleted)"""
+        if self._resident.pop(name, None) is not None and reason in ('idle', 'budget'):
+            self._stats['evictions'] += 1
+            self._stats[f"{reason}_evictions"] += 1
+
+    def evictable(self, protect: Optional[str] = None) -> List[tuple]:
+        """
+        Collections to unload now, as (name, reason) pairs
+
+        Idle ones (reason "idle") come first; then the least recently used
+        (reason "budget") until the rest fit the budget and the count cap.
+        `protect` (the collection being searched) is never chosen.
+        """
+        now = self._clock()
+        chosen = []
+        remaining_bytes = self.resident_bytes
+        remaining = len(self._resident)
+        for name, (last_access, nbytes) in self._resident.items():
+            if name == protect:
+                continue
+            if self.idle_ttl and now - last_access >= self.idle_ttl:
+                reason = 'idle'
+            elif (self.budget_bytes and remaining_bytes > self.budget_bytes) or \
+                    (self.max_resident and remaining > self.max_resident):
+                reason = 'budget'
+            else:
+                continue
+            chosen.append((name, reason))
+            remaining_bytes -= nbytes
+            remaining -= 1
+        return chosen
+
+    def get_stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._load_seconds)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        return {
+            'loaded_collections': len(self._resident),
+            'loaded_mb': round(self.resident_bytes / MB, 1),
+            'budget_mb': round(self.budget_bytes / MB, 1) if self.budget_bytes else None,
+            'idle_ttl_seconds': self.idle_ttl or None,
+            'max_resident': self.max_resident or None,
+            **self._stats,
+            'load_ms': {
+                'last': round(self._load_seconds[-1] * 1000, 1) if self._load_seconds else 0.0,
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'max': round(latencies[-1] * 1000, 1) if latencies else 0.0
+            }
+        }
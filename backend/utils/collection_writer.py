@@ -0,0 +1,219 @@
+"""
+Group-commit writer for ChromaDB collections
+Concurrent upserts and deletes for one collection are queued and applied by a
+single writer task in coalesced batches, instead of many executor threads
+contending for Chroma's SQLite / HNSW persistence with small calls
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _WriteOp:
+    __slots__ = ('kind', 'collection', 'payload', 'size', 'future', 'enqueued')
+
+    def __init__(self, kind: str, collection, payload: Dict[str, Any], size: int, future: asyncio.Future, enqueued: float):
+        self.kind = kind
+        self.collection = collection
+        self.payload = payload
+        self.size = size
+        self.future = future
+        self.enqueued = enqueued
+
+
+def _collection_key(collection) -> Any:
+    # A collection dropped and recreated under the same name is a different target
+    return getattr(collection, 'id', None) or id(collection)
+
+
+class CollectionWriter:
+    """
+    Single writer for one collection name.
+
+    Callers enqueue an upsert or delete and await the commit that contains it.
+    The writer task waits at most `max_delay` after the oldest pending write (or
+    until `max_batch` items are pending), then applies everything queued in
+    order, merging consecutive writes of the same kind into one Chroma call.
+    A write that has been queued is always applied, even if its caller is
+    cancelled while waiting.
+
+    `on_commit(kind, collection, payload)` is called on the event loop for every
+    write once Chroma has accepted it, in commit order, so derived indexes can
+    follow the collection.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_batch: int = 4000,
+        max_delay: float = 0.02,
+        executor=None,
+        on_commit: Optional[Callable[[str, Any, Dict[str, Any]], None]] = None
+    ):
+        """
+        Initialize writer
+
+        Args:
+            name: Collection name (for logs and stats)
+            max_batch: Items per coalesced Chroma call (Chroma rejects ~5461+)
+            max_delay: Longest a write waits for others to join its batch (seconds)
+            executor: Executor for the blocking Chroma calls (default executor if None)
+            on_commit: Listener for committed writes (kind is upsert, delete_ids or delete_where)
+        """
+        self.name = name
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self._executor = executor
+        self._on_commit = on_commit
+        self._pending: Deque[_WriteOp] = deque()
+        self._pending_items = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stats = {'writes': 0, 'commits': 0, 'calls': 0, 'items': 0, 'failed': 0}
+
+    async def upsert(self, collection, ids: List[str], embeddings, metadatas, documents):
+        """Upsert chunks; returns once they are committed"""
+        await self._submit('upsert', collection, {
+            'ids': list(ids), 'embeddings': list(embeddings), 'metadatas': list(metadatas), 'documents': list(documents)
+        }, len(ids))
+
+    async def delete(self, collection, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        """Delete chunks by id or by metadata filter; returns once committed"""
+        if ids is not None:
+            if not ids:
+                return
+            await self._submit('delete_ids', collection, {'ids': list(ids)}, len(ids))
+        else:
+            await self._submit('delete_where', collection, {'where': where}, 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['pending'] = len(self._pending)
+        stats['writes_per_commit'] = round(stats['writes'] / stats['commits'], 2) if stats['commits'] else 0.0
+        return stats
+
+    async def _submit(self, kind: str, collection, payload: Dict[str, Any], size: int):
+        loop = asyncio.get_running_loop()
+        op = _WriteOp(kind, collection, payload, size, loop.create_future(), loop.time())
+        self._pending.append(op)
+        self._pending_items += size
+        self._stats['writes'] += 1
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        elif self._pending_items >= self.max_batch:
+            self._wakeup.set()
+
+        await asyncio.shield(op.future)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            # Bounded latency: wait for company until the batch fills or the oldest write is due
+            while self._pending_items < self.max_batch:
+                remaining = self.max_delay - (loop.time() - self._pending[0].enqueued)
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            ops = []
+            items = 0
+            while self._pending and (not ops or items + self._pending[0].size <= self.max_batch):
+                op = self._pending.popleft()
+                self._pending_items -= op.size
+                items += op.size
+                ops.append(op)
+            await self._commit(ops)
+
+    async def _commit(self, ops: List[_WriteOp]):
+        """Apply `ops` in order, one Chroma call per run of same-kind writes"""
+        self._stats['commits'] += 1
+        runs: List[List[_WriteOp]] = []
+        for op in ops:
+            if runs and runs[-1][0].kind == op.kind and _collection_key(runs[-1][0].collection) == _collection_key(op.collection):
+                runs[-1].append(op)
+            else:
+                runs.append([op])
+
+        loop = asyncio.get_running_loop()
+        for run in runs:
+            try:
+                await loop.run_in_executor(self._executor, self._merged_call(run))
+                self._stats['calls'] += 1
+                self._stats['items'] += sum(op.size for op in run)
+                for op in run:
+                    self._notify(op)
+                    if not op.future.done():
+                        op.future.set_result(None)
+            except Exception as e:
+                if len(run) == 1:
+                    self._fail(run[0], e)
+                    continue
+                # One bad write must not fail the others it was merged with
+                logger.warning(f"⚠️ Coalesced {run[0].kind} of {len(run)} writes to {self.name} failed ({e}), retrying one by one")
+                for op in run:
+                    try:
+                        await loop.run_in_executor(self._executor, self._merged_call([op]))
+                        self._stats['calls'] += 1
+                        self._stats['items'] += op.size
+                        self._notify(op)
+                        if not op.future.done():
+                            op.future.set_result(None)
+                    except Exception as op_error:
+                        self._fail(op, op_error)
+
+    def _notify(self, op: _WriteOp):
+        if self._on_commit is None:
+            return
+        try:
+            self._on_commit(op.kind, op.collection, op.payload)
+        except Exception as e:
+            # The write itself succeeded; a broken listener must not fail it
+            logger.error(f"❌ Commit listener for {self.name} failed: {e}")
+
+    def _fail(self, op: _WriteOp, error: Exception):
+        self._stats['failed'] += 1
+        if not op.future.done():
+            op.future.set_exception(error)
+
+    @staticmethod
+    def _merged_call(run: List[_WriteOp]) -> Callable[[], Any]:
+        collection = run[-1].collection
+        kind = run[0].kind
+
+        if kind == 'upsert':
+            # Later writes of the same id win (Chroma rejects duplicate ids in one call)
+            position: Dict[str, int] = {}
+            merged: Dict[str, list] = {'ids': [], 'embeddings': [], 'metadatas': [], 'documents': []}
+            for op in run:
+                for i, chunk_id in enumerate(op.payload['ids']):
+                    if chunk_id in position:
+                        slot = position[chunk_id]
+                        for key in merged:
+                            merged[key][slot] = op.payload[key][i]
+                    else:
+                        position[chunk_id] = len(merged['ids'])
+                        for key in merged:
+                            merged[key].append(op.payload[key][i])
+            # One float32 matrix: Chroma takes it as is, whether rows came as arrays or lists
+            merged['embeddings'] = np.asarray(merged['embeddings'], dtype=np.float32)
+            return lambda: collection.upsert(**merged)
+
+        if kind == 'delete_ids':
+            ids = list(dict.fromkeys(chunk_id for op in run for chunk_id in op.payload['ids']))
+            return lambda: collection.delete(ids=ids)
+
+        wheres = [op.payload['where'] for op in run]
+        where = wheres[0] if len(wheres) == 1 else {'$or': wheres}
+        return lambda: collection.delete(where=where)
@@ -0,0 +1,319 @@
+"""
+Compact in-memory vector index for chunk search
+Chunk vectors are held as float16 or scalar-quantized int8 NumPy arrays (one
+float32 scale per vector) and searched by blocked dot products. Chroma stays
+the source of truth for the float32 vectors, text and metadata, so the top
+candidates can be rescored exactly.
+"""
+
+import io
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "float32" means no compact index: search goes straight to Chroma's HNSW
+STORAGE_TYPES = ('float32', 'float16', 'int8')
+
+# Rows scored per matmul: bounds the float32 temporary to ~25MB at 384 dims
+SEARCH_BLOCK_ROWS = 16384
+
+
+def normalize(vectors) -> np.ndarray:
+    """2-D float32 array of unit vectors (cosine similarity becomes a dot product)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize(vectors, storage: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Encode vectors for compact storage
+
+    Args:
+        vectors: (n, dim) embeddings, normalized here
+        storage: "float16" or "int8" ("float32" returns the unit vectors unchanged)
+
+    Returns:
+        Tuple of (codes, scales); scales is None except for int8, where
+        vector ~= codes * scale with one scale per row
+    """
+    vectors = normalize(vectors)
+    if storage == 'float32':
+        return vectors, None
+    if storage == 'float16':
+        return vectors.astype(np.float16), None
+    if storage == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown vector storage '{storage}' (expected one of {', '.join(STORAGE_TYPES)})")
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    """Approximate float32 vectors back from their codes"""
+    vectors = codes.astype(np.float32)
+    if scales is not None:
+        vectors *= scales[:, None]
+    return vectors
+
+
+def _pack_strings(values: List[str]) -> np.ndarray:
+    return np.frombuffer("\n".join(values).encode('utf-8'), dtype=np.uint8)
+
+
+def _unpack_strings(packed: np.ndarray, count: int) -> List[str]:
+    if count == 0:
+        return []
+    return packed.tobytes().decode('utf-8').split("\n")
+
+
+class CompactVectorIndex:
+    """
+    Chunk id -> quantized unit vector, with exact top-k search by brute force.
+
+    Rows are kept dense: deleting a chunk moves the last row into its slot.
+    Writes (applied on the event loop) and searches (run in executor threads)
+    are serialized by a lock.
+    """
+
+    def __init__(self, storage: str = 'int8', dimension: Optional[int] = None, source_id: Optional[str] = None):
+        """
+        Initialize an empty index
+
+        Args:
+            storage: "float16" or "int8"
+            dimension: Embedding dimension (taken from the first vectors if None)
+            source_id: Id of the Chroma collection the index mirrors (checked on load)
+        """
+        if storage not in STORAGE_TYPES or storage == 'float32':
+            raise ValueError(f"Compact index storage must be float16 or int8, got '{storage}'")
+        self.storage = storage
+        self.dimension = dimension
+        self.source_id = source_id
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._document_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._by_document: Dict[str, Set[str]] = {}
+        self._codes = np.empty((0, dimension or 0), dtype=np.int8 if storage == 'int8' else np.float16)
+        self._scales = np.empty(0, dtype=np.float32) if storage == 'int8' else None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._rows
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes of the vector data (excluding ids)"""
+        per_row = self._codes.itemsize * (self.dimension or 0) + (4 if self._scales is not None else 0)
+        return len(self._ids) * per_row
+
+    def _row_arrays(self) -> List[str]:
+        """Attributes holding one entry per row, kept aligned by upserts and deletes"""
+        return ['_codes'] if self._scales is None else ['_codes', '_scales']
+
+    def _reserve(self, rows: int):
+        capacity = self._codes.shape[0]
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, 1024)
+        for name in self._row_arrays():
+            current = getattr(self, name)
+            grown = np.empty((capacity,) + current.shape[1:], dtype=current.dtype)
+            grown[:len(self._ids)] = current[:len(self._ids)]
+            setattr(self, name, grown)
+
+    def upsert(self, ids: List[str], embeddings, document_ids: List[str]):
+        """Insert or replace chunk vectors"""
+        if len(ids) == 0:
+            return
+        codes, scales = quantize(embeddings, self.storage)
+        with self._lock:
+            if self.dimension is None or not self._ids:
+                if self.dimension != codes.shape[1]:
+                    self.dimension = codes.shape[1]
+                    self._codes = np.empty((0, self.dimension), dtype=self._codes.dtype)
+            elif codes.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-dim vectors, got {codes.shape[1]}")
+            self._reserve(len(self._ids) + len(ids))
+            self._upsert_rows(ids, [codes] if scales is None else [codes, scales], document_ids)
+
+    def _upsert_rows(self, ids: List[str], values: List[np.ndarray], document_ids: List[str]):
+        arrays = [getattr(self, name) for name in self._row_arrays()]
+        for i, (chunk_id, document_id) in enumerate(zip(ids, document_ids)):
+            row = self._rows.get(chunk_id)
+            if row is None:
+                row = len(self._ids)
+                self._rows[chunk_id] = row
+                self._ids.append(chunk_id)
+                self._document_ids.append(document_id)
+            elif self._document_ids[row] != document_id:
+                previous = self._by_document.get(self._document_ids[row])
+                if previous is not None:
+                    previous.discard(chunk_id)
+                    if not previous:
+                        del self._by_document[self._document_ids[row]]
+                self._document_ids[row] = document_id
+            self._by_document.setdefault(document_id, set()).add(chunk_id)
+            for array, value in zip(arrays, values):
+                array[row] = value[i]
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """Remove chunks by id; returns how many were present"""
+        with self._lock:
+            return self._delete_rows(ids)
+
+    def _delete_rows(self, ids: Iterable[str]) -> int:
+        arrays = [getattr(self, name) for name in self._row_arrays()]
+        removed = 0
+        for chunk_id in ids:
+            row = self._rows.pop(chunk_id, None)
+            if row is None:
+                continue
+            removed += 1
+            document_id = self._document_ids[row]
+            chunks = self._by_document.get(document_id)
+            if chunks is not None:
+                chunks.discard(chunk_id)
+                if not chunks:
+                    del self._by_document[document_id]
+
+            last = len(self._ids) - 1
+            if row != last:
+                moved = self._ids[last]
+                self._ids[row] = moved
+                self._document_ids[row] = self._document_ids[last]
+                self._rows[moved] = row
+                for array in arrays:
+                    array[row] = array[last]
+            self._ids.pop()
+            self._document_ids.pop()
+        return removed
+
+    def delete_documents(self, document_ids: Iterable[str]) -> int:
+        """Remove every chunk of the given documents"""
+        with self._lock:
+            ids = [chunk_id for document_id in document_ids for chunk_id in self._by_document.get(document_id, ())]
+            return self._delete_rows(ids)
+
+    def document_ids(self) -> Set[str]:
+        with self._lock:
+            return set(self._by_document)
+
+    def _document_rows(self, document_ids: Iterable[str]) -> np.ndarray:
+        return np.fromiter(
+            (self._rows[chunk_id] for document_id in document_ids for chunk_id in self._by_document.get(document_id, ())),
+            dtype=np.int64
+        )
+
+    def search(self, query, k: int, document_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Top-k chunks by approximate cosine similarity
+
+        Args:
+            query: Query vector
+            k: Number of results
+            document_ids: Only score the chunks of these documents (all chunks if None)
+
+        Returns:
+            List of (chunk_id, similarity), best first
+        """
+        query = normalize(query)[0]
+        with self._lock:
+            rows = self._document_rows(document_ids) if document_ids is not None else None
+            size = len(self._ids) if rows is None else len(rows)
+            if size == 0 or k <= 0:
+                return []
+            scores = np.empty(size, dtype=np.float32)
+            for start in range(0, size, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, size)
+                selected = slice(start, end) if rows is None else rows[start:end]
+                block = self._codes[selected].astype(np.float32) @ query
+                if self._scales is not None:
+                    block *= self._scales[selected]
+                scores[start:end] = block
+
+            k = min(k, size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            if rows is not None:
+                return [(self._ids[rows[i]], float(scores[i])) for i in top]
+            return [(self._ids[row], float(scores[row])) for row in top]
+
+    def scan(self, visit: Callable[[List[str], np.ndarray], None], document_ids: Optional[Iterable[str]] = None):
+        """
+        Call visit(document_ids, vectors) for blocks of rows, with vectors
+        decoded to float32 (all rows, or only the chunks of `document_ids`)
+        """
+        with self._lock:
+            rows = self._document_rows(document_ids) if document_ids is not None else None
+            size = len(self._ids) if rows is None else len(rows)
+            for start in range(0, size, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, size)
+                selected = np.arange(start, end) if rows is None else rows[start:end]
+                scales = self._scales[selected] if self._scales is not None else None
+                visit([self._document_ids[row] for row in selected], dequantize(self._codes[selected], scales))
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Copy of the index as arrays (cheap to take, safe to write from another thread)"""
+        with self._lock:
+            size = len(self._ids)
+            arrays = {
+                'storage': np.array(self.storage),
+                'source_id': np.array(self.source_id or ''),
+                'count': np.array(size),
+                'codes': self._codes[:size].copy(),
+                'ids': _pack_strings(self._ids),
+                'document_ids': _pack_strings(self._document_ids),
+            }
+            if self._scales is not None:
+                arrays['scales'] = self._scales[:size].copy()
+            return arrays
+
+    @staticmethod
+    def write_snapshot(arrays: Dict[str, np.ndarray], path: str):
+        """Write a snapshot atomically (readers never see a partial file)"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.getbuffer())
+        os.replace(tmp_path, path)
+
+    def save(self, path: str):
+        self.write_snapshot(self.snapshot(), path)
+
+    @classmethod
+    def load(cls, path: str) -> "CompactVectorIndex":
+        with np.load(path) as data:
+            count = int(data['count'])
+            codes = data['codes']
+            index = cls(str(data['storage']), codes.shape[1], str(data['source_id']) or None)
+            index._ids = _unpack_strings(data['ids'], count)
+            index._document_ids = _unpack_strings(data['document_ids'], count)
+            index._codes = codes
+            if index._scales is not None:
+                index._scales = data['scales']
+        index._index_rows(path, count)
+        return index
+
+    def _index_rows(self, path: str, count: int):
+        """Rebuild the id lookups after loading `count` rows from a snapshot"""
+        if len(self._ids) != count or len(self._document_ids) != count or any(
+            getattr(self, name).shape[0] != count for name in self._row_arrays()
+        ):
+            raise ValueError(f"Corrupt compact index snapshot {path}")
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        for chunk_id, document_id in zip(self._ids, self._document_ids):
+            self._by_document.setdefault(document_id, set()).add(chunk_id)
@@ -0,0 +1,261 @@
+"""
+Persistent SQLite catalog of scanned Google Drive folder trees
+Lets repeat folder listings be served without walking Drive again
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DriveTreeIndex:
+    """
+    Per-user catalog of folders and files under a scanned root folder.
+
+    Folders and files are keyed by Drive id and store their modifiedTime. Each
+    root also keeps a Drive Changes API page token, so a refresh only has to
+    apply the files changed since then (and re-list folders when the tree changed).
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Initialize index
+
+        Args:
+            db_path: SQLite file path (":memory:" for a throwaway index)
+        """
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        logger.info(f"Initialized Drive tree index at {db_path}")
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS roots (
+                    user_id TEXT NOT NULL,
+                    root_id TEXT NOT NULL,
+                    refreshed_at REAL NOT NULL,
+                    changes_token TEXT,
+                    PRIMARY KEY (user_id, root_id)
+                );
+                CREATE TABLE IF NOT EXISTS folders (
+                    user_id TEXT NOT NULL,
+                    root_id TEXT NOT NULL,
+                    folder_id TEXT NOT NULL,
+                    name TEXT,
+                    parent_id TEXT,
+                    modified_time TEXT,
+                    PRIMARY KEY (user_id, root_id, folder_id)
+                );
+                CREATE TABLE IF NOT EXISTS files (
+                    user_id TEXT NOT NULL,
+                    root_id TEXT NOT NULL,
+                    folder_id TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    modified_time TEXT,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (user_id, root_id, folder_id, file_id)
+                );
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(roots)")}
+            if 'changes_token' not in columns:
+                # Indexes written before change tracking: the first refresh re-lists folders
+                self._conn.execute("ALTER TABLE roots ADD COLUMN changes_token TEXT")
+
+    def get_root(self, user_id: str, root_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get index status for a scanned root
+
+        Returns:
+            {'refreshed_at': epoch seconds, 'age_seconds': float, 'changes_token': str or None}
+            or None if never indexed
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT refreshed_at, changes_token FROM roots WHERE user_id = ? AND root_id = ?",
+                (user_id, root_id)
+            ).fetchone()
+        if not row:
+            return None
+        return {'refreshed_at': row[0], 'age_seconds': max(0.0, time.time() - row[0]), 'changes_token': row[1]}
+
+    def get_folder_times(self, user_id: str, root_id: str) -> Dict[str, Optional[str]]:
+        """Get {folder_id: modifiedTime} for every indexed folder under root"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT folder_id, modified_time FROM folders WHERE user_id = ? AND root_id = ?",
+                (user_id, root_id)
+            ).fetchall()
+        return {folder_id: modified_time for folder_id, modified_time in rows}
+
+    def apply_refresh(
+        self,
+        user_id: str,
+        root_id: str,
+        folders: Dict[str, Dict[str, Any]],
+        files_by_folder: Dict[str, List[Dict[str, Any]]],
+        changes_token: Optional[str] = None
+    ):
+        """
+        Store the result of a (possibly partial) refresh in one transaction.
+
+        Args:
+            folders: Complete current subtree {folder_id: {'name', 'parent_id', 'modified_time'}}.
+                     Indexed folders missing from it are dropped together with their files.
+            files_by_folder: Fresh listings for re-listed folders only; their old files are replaced.
+            changes_token: Changes API page token the listings are current as of (None = keep the stored one)
+        """
+        with self._lock, self._conn:
+            stale = set(
+                row[0] for row in self._conn.execute(
+                    "SELECT folder_id FROM folders WHERE user_id = ? AND root_id = ?",
+                    (user_id, root_id)
+                )
+            ) - set(folders)
+
+            for folder_id in stale:
+                self._conn.execute(
+                    "DELETE FROM folders WHERE user_id = ? AND root_id = ? AND folder_id = ?",
+                    (user_id, root_id, folder_id)
+                )
+                self._conn.execute(
+                    "DELETE FROM files WHERE user_id = ? AND root_id = ? AND folder_id = ?",
+                    (user_id, root_id, folder_id)
+                )
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO folders (user_id, root_id, folder_id, name, parent_id, modified_time) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (user_id, root_id, folder_id, info.get('name'), info.get('parent_id'), info.get('modified_time'))
+                    for folder_id, info in folders.items()
+                ]
+            )
+
+            for folder_id, documents in files_by_folder.items():
+                self._conn.execute(
+                    "DELETE FROM files WHERE user_id = ? AND root_id = ? AND folder_id = ?",
+                    (user_id, root_id, folder_id)
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO files (user_id, root_id, folder_id, file_id, modified_time, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (user_id, root_id, folder_id, doc['id'], doc.get('modified_time'), json.dumps(doc))
+                        for doc in documents
+                    ]
+                )
+
+            self._touch_root(user_id, root_id, changes_token)
+
+        logger.debug(f"Index refresh for {root_id}: {len(folders)} folders, {len(files_by_folder)} re-listed, {len(stale)} dropped")
+
+    def apply_file_changes(
+        self,
+        user_id: str,
+        root_id: str,
+        removed: List[str],
+        files_by_folder: Dict[str, List[Dict[str, Any]]],
+        changes_token: str
+    ):
+        """
+        Apply changed files from the Changes API in one transaction.
+
+        Args:
+            removed: File ids that were deleted, trashed or moved out of the indexed folders
+            files_by_folder: Current entries of changed files, by indexed parent folder;
+                             any older entry of the same file (in any folder) is replaced
+            changes_token: Page token to resume from next time
+        """
+        changed = set(removed) | {doc['id'] for documents in files_by_folder.values() for doc in documents}
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM files WHERE user_id = ? AND root_id = ? AND file_id = ?",
+                [(user_id, root_id, file_id) for file_id in changed]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (user_id, root_id, folder_id, file_id, modified_time, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (user_id, root_id, folder_id, doc['id'], doc.get('modified_time'), json.dumps(doc))
+                    for folder_id, documents in files_by_folder.items() for doc in documents
+                ]
+            )
+            self._touch_root(user_id, root_id, changes_token)
+
+    def _touch_root(self, user_id: str, root_id: str, changes_token: Optional[str]):
+        # Caller holds the lock and the transaction
+        self._conn.execute(
+            "INSERT INTO roots (user_id, root_id, refreshed_at, changes_token) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id, root_id) DO UPDATE SET refreshed_at = excluded.refreshed_at, "
+            "changes_token = COALESCE(excluded.changes_token, roots.changes_token)",
+            (user_id, root_id, time.time(), changes_token)
+        )
+
+    def get_documents(self, user_id: str, root_id: str) -> List[Dict[str, Any]]:
+        """Get all indexed documents under root, with source_subfolder taken from the current folder name"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT f.data, d.folder_id, d.name FROM files f "
+                "JOIN folders d ON d.user_id = f.user_id AND d.root_id = f.root_id AND d.folder_id = f.folder_id "
+                "WHERE f.user_id = ? AND f.root_id = ?",
+                (user_id, root_id)
+            ).fetchall()
+
+        documents = []
+        for data, folder_id, folder_name in rows:
+            doc = json.loads(data)
+            doc['source_subfolder'] = folder_name if folder_id != root_id and folder_name else None
+            documents.append(doc)
+        return documents
+
+    def invalidate(self, user_id: str, root_id: str = None):
+        """Drop one indexed root (or every root for the user)"""
+        clause = "user_id = ?" + (" AND root_id = ?" if root_id else "")
+        args = (user_id, root_id) if root_id else (user_id,)
+        with self._lock, self._conn:
+            for table in ("roots", "folders", "files"):
+                self._conn.execute(f"DELETE FROM {table} WHERE {clause}", args)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get index statistics"""
+        with self._lock:
+            roots = self._conn.execute("SELECT COUNT(*) FROM roots").fetchone()[0]
+            folders = self._conn.execute("SELECT COUNT(*) FROM folders").fetchone()[0]
+            files = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        return {
+            'db_path': self._db_path,
+            'indexed_roots': roots,
+            'indexed_folders': folders,
+            'indexed_files': files
+        }
+
+    def close(self):
+        """Close the SQLite connection"""
+        with self._lock:
+            self._conn.close()
+
+
+# Global index instance (created lazily so importing never touches disk)
+_drive_index: Optional[DriveTreeIndex] = None
+_drive_index_lock = threading.Lock()
+
+
+def get_drive_index() -> DriveTreeIndex:
+    """Get the Drive tree index"""
+    global _drive_index
+    if _drive_index is None:
+        with _drive_index_lock:
+            if _drive_index is None:
+                from config import settings
+                _drive_index = DriveTreeIndex(settings.drive_index_path)
+    return _drive_index
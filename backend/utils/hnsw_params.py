@@ -0,0 +1,85 @@
+"""
+HNSW parameters by collection size
+Chroma fixes a collection's graph degree (M) and construction_ef when it is
+created, while search_ef can be changed at any time. Small knowledge bases
+reach full recall with cheap settings; large ones need denser graphs and a
+wider search to keep recall up, so the parameters follow size tiers.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+# max_chunks:M:construction_ef:search_ef per tier, smallest first; 0 = no upper bound
+DEFAULT_HNSW_TIERS = "20000:16:100:48,200000:16:200:96,1000000:24:200:128,0:32:400:192"
+
+# Chroma's defaults, which collections created without hnsw:* metadata use
+CHROMA_DEFAULTS = {'M': 16, 'construction_ef': 100, 'search_ef': 100}
+
+
+def parse_tiers(spec: str) -> List[Dict[str, int]]:
+    """
+    Parse a tier list like DEFAULT_HNSW_TIERS
+
+    Raises:
+        ValueError: On a malformed tier or tiers out of order
+    """
+    tiers = []
+    for part in spec.split(","):
+        fields = part.strip().split(":")
+        if len(fields) != 4:
+            raise ValueError(f"HNSW tier '{part}' is not max_chunks:M:construction_ef:search_ef")
+        max_chunks, m, construction_ef, search_ef = (int(field) for field in fields)
+        if min(m, construction_ef, search_ef) < 1:
+            raise ValueError(f"HNSW tier '{part}' has a parameter below 1")
+        tiers.append({'max_chunks': max_chunks, 'M': m, 'construction_ef': construction_ef, 'search_ef': search_ef})
+    bounds = [tier['max_chunks'] for tier in tiers[:-1]]
+    if 0 in bounds or bounds != sorted(bounds) or (tiers[-1]['max_chunks'] and bounds and tiers[-1]['max_chunks'] <= bounds[-1]):
+        raise ValueError("HNSW tiers must be ordered by max_chunks, with 0 (unbounded) only on the last")
+    return tiers
+
+
+def tier_for(chunks: int, tiers: Sequence[Dict[str, int]]) -> Dict[str, int]:
+    """The first tier whose max_chunks holds `chunks` (the last tier if none does)"""
+    for tier in tiers:
+        if not tier['max_chunks'] or chunks <= tier['max_chunks']:
+            return tier
+    return tiers[-1]
+
+
+def hnsw_metadata(params: Dict[str, int]) -> Dict[str, int]:
+    """Collection metadata keys Chroma reads the parameters from at creation"""
+    return {
+        'hnsw:M': params['M'],
+        'hnsw:construction_ef': params['construction_ef'],
+        'hnsw:search_ef': params['search_ef']
+    }
+
+
+def collection_hnsw_params(collection) -> Dict[str, int]:
+    """
+    Parameters a collection is using
+
+    search_ef comes from the collection configuration when Chroma exposes it,
+    since changing it at runtime does not update the creation metadata.
+    """
+    metadata = collection.metadata or {}
+    params = {
+        'M': metadata.get('hnsw:M', CHROMA_DEFAULTS['M']),
+        'construction_ef': metadata.get('hnsw:construction_ef', CHROMA_DEFAULTS['construction_ef']),
+        'search_ef': metadata.get('hnsw:search_ef', CHROMA_DEFAULTS['search_ef'])
+    }
+    hnsw: Optional[Dict[str, Any]] = (getattr(collection, 'configuration', None) or {}).get('hnsw')
+    if hnsw:
+        params.update(
+            M=hnsw.get('max_neighbors', params['M']),
+            construction_ef=hnsw.get('ef_construction', params['construction_ef']),
+            search_ef=hnsw.get('ef_search', params['search_ef'])
+        )
+    return params
+
+
+def search_ef_override(collection) -> Optional[int]:
+    """search_ef set at runtime (differing from the one the collection was created with), if any"""
+    hnsw = (getattr(collection, 'configuration', None) or {}).get('hnsw') or {}
+    created = (collection.metadata or {}).get('hnsw:search_ef', CHROMA_DEFAULTS['search_ef'])
+    current = hnsw.get('ef_search')
+    return current if current is not None and current != created else None
@@ -0,0 +1,153 @@
+"""
+Versioned index layout
+Maps each user to the ChromaDB collection currently serving their queries, so a
+rebuilt (shadow) collection can be swapped in atomically by switching a pointer
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IndexLayout:
+    """
+    Persistent user -> active collection alias map.
+
+    Generation 0 is the legacy `user_{id}` collection; rebuilt collections are
+    named `user_{id}__v{generation}`. The map is a small JSON file replaced
+    atomically on every swap.
+
+    While a collection is being migrated its writes are tracked (document ids
+    added or removed) so the migrator can replay them into the shadow before
+    and right after the swap.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize layout
+
+        Args:
+            path: JSON file holding the alias map (created on first swap)
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._active: Dict[str, Dict[str, Any]] = {}
+        self._dirty: Dict[str, Set[str]] = {}
+        self._load()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                self._active = json.load(f).get('users', {})
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read index layout {self._path}: {e}")
+
+    def _save(self):
+        # Caller holds the lock
+        directory = os.path.dirname(os.path.abspath(self._path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'users': self._active}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._path)
+
+    @staticmethod
+    def collection_name(user_id: str, generation: int) -> str:
+        """Physical collection name for a user's index generation"""
+        if generation == 0:
+            return f"user_{user_id}"
+        return f"user_{user_id}__v{generation}"
+
+    def generation(self, user_id: str) -> int:
+        """Generation number of the user's active collection"""
+        with self._lock:
+            return self._active.get(user_id, {}).get('generation', 0)
+
+    def active_collection(self, user_id: str) -> str:
+        """Name of the collection queries and writes should use"""
+        return self.collection_name(user_id, self.generation(user_id))
+
+    def set_active(self, user_id: str, generation: int):
+        """Atomically point the user at another collection generation"""
+        with self._lock:
+            self._active[user_id] = {'generation': generation}
+            self._save()
+        logger.info(f"🔀 Index for user {user_id} now served by {self.collection_name(user_id, generation)}")
+
+    def begin_tracking(self, collection_name: str):
+        """Start recording writes to a collection that is being migrated"""
+        with self._lock:
+            self._dirty.setdefault(collection_name, set())
+
+    def end_tracking(self, collection_name: str):
+        with self._lock:
+            self._dirty.pop(collection_name, None)
+
+    def note_write(self, collection_name: str, document_ids: Iterable[str]):
+        """Record documents changed in a collection (no-op unless it is tracked)"""
+        with self._lock:
+            dirty = self._dirty.get(collection_name)
+            if dirty is not None:
+                dirty.update(document_ids)
+
+    def take_dirty(self, collection_name: str) -> Set[str]:
+        """Return and reset the documents changed since the last call"""
+        with self._lock:
+            dirty = self._dirty.get(collection_name)
+            if not dirty:
+                return set()
+            self._dirty[collection_name] = set()
+            return dirty
+
+
+def current_index_version() -> Dict[str, Any]:
+    """Chunker / embedding parameters new collections are built with"""
+    from config import RAGConfig
+    return {
+        'index_chunker_version': RAGConfig.CHUNKER_VERSION,
+        'index_chunk_size': RAGConfig.DEFAULT_CHUNK_SIZE,
+        'index_chunk_overlap': RAGConfig.DEFAULT_OVERLAP,
+        'index_embedding_model': RAGConfig.EMBEDDING_MODEL,
+    }
+
+
+def collection_index_version(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Version recorded on a collection
+
+    Collections created before versioning carry no index_* keys; they were built
+    with the first adaptive chunker (850/85) and MiniLM embeddings.
+    """
+    metadata = metadata or {}
+    return {
+        'index_chunker_version': metadata.get('index_chunker_version', 'adaptive-v1'),
+        'index_chunk_size': metadata.get('index_chunk_size', 850),
+        'index_chunk_overlap': metadata.get('index_chunk_overlap', 85),
+        'index_embedding_model': metadata.get('index_embedding_model', 'all-MiniLM-L6-v2'),
+    }
+
+
+# Global layout instance (created lazily so importing never touches disk)
+_index_layout: Optional[IndexLayout] = None
+_index_layout_lock = threading.Lock()
+
+
+def get_index_layout() -> IndexLayout:
+    """Get the shared index layout"""
+    global _index_layout
+    if _index_layout is None:
+        with _index_layout_lock:
+            if _index_layout is None:
+                from config import settings
+                _index_layout = IndexLayout(settings.index_layout_path)
+    return _index_layout
@@ -0,0 +1,250 @@
+"""
+Size-aware ingestion scheduling
+Downloads start largest first on a continuous worker pool (no per-batch barrier),
+and extract + embed groups are packed to an equal estimated chunk count
+"""
+
+import asyncio
+import math
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+PDF_MIME = 'application/pdf'
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+PPTX_MIME = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+
+# Extracted characters per byte of file (binary formats carry fonts, images and XML)
+TEXT_PER_BYTE = {
+    PDF_MIME: 0.25,
+    DOCX_MIME: 0.3,
+    PPTX_MIME: 0.1,
+}
+DEFAULT_TEXT_PER_BYTE = 1.0
+
+# Relative CPU cost of turning one chunk of text out of each format
+PARSE_COST = {
+    PDF_MIME: 3.0,
+    PPTX_MIME: 2.0,
+    DOCX_MIME: 1.5,
+}
+
+# Native Google Docs / Sheets / Slides have no Drive size; assume a typical export
+NATIVE_EXPORT_BYTES = 64 * 1024
+
+# How often a cancellable schedule re-checks its token while waiting for downloads
+CANCEL_POLL_SECONDS = 0.25
+
+
+def document_size(document: Dict[str, Any]) -> int:
+    """Drive size of a listed file in bytes (estimated for native Google files)"""
+    try:
+        size = int(document.get('size') or 0)
+    except (TypeError, ValueError):
+        size = 0
+    return size if size > 0 else NATIVE_EXPORT_BYTES
+
+
+def document_mime_type(document: Dict[str, Any]) -> Optional[str]:
+    return document.get('mimeType', document.get('mime_type'))
+
+
+def estimate_chunks(size_bytes: int, mime_type: Optional[str], chunk_size: int = 850) -> int:
+    """Estimated number of chunks a file of `size_bytes` produces"""
+    text_chars = size_bytes * TEXT_PER_BYTE.get(mime_type, DEFAULT_TEXT_PER_BYTE)
+    return max(1, math.ceil(text_chars / chunk_size))
+
+
+def estimate_work(document: Dict[str, Any], chunk_size: int = 850) -> float:
+    """Relative download + parse + embed cost of a listed file"""
+    mime_type = document_mime_type(document)
+    return estimate_chunks(document_size(document), mime_type, chunk_size) * PARSE_COST.get(mime_type, 1.0)
+
+
+def order_largest_first(documents: List[Dict[str, Any]], chunk_size: int = 850) -> List[Dict[str, Any]]:
+    """
+    Most expensive files first (longest-processing-time-first): the long tail
+    starts immediately and small files fill the pool around it
+    """
+    return sorted(documents, key=lambda doc: estimate_work(doc, chunk_size), reverse=True)
+
+
+def take_group(ready: List[Tuple[float, Any]], target_weight: float, max_items: int) -> Tuple[List[Tuple[float, Any]], List[Tuple[float, Any]]]:
+    """
+    Pack one group of up to `max_items` whose total weight is close to `target_weight`
+
+    The heaviest ready item always goes in (so an oversized file forms its own
+    group); lighter items are added while they still fit under the target.
+
+    Returns:
+        (group, remaining), both as (weight, item) lists
+    """
+    ordered = sorted(ready, key=lambda entry: entry[0], reverse=True)
+    group = [ordered[0]]
+    load = ordered[0][0]
+    remaining = []
+    for entry in ordered[1:]:
+        if len(group) < max_items and load + entry[0] <= target_weight:
+            group.append(entry)
+            load += entry[0]
+        else:
+            remaining.append(entry)
+    return group, remaining
+
+
+async def schedule_ingestion(
+    documents: List[Dict[str, Any]],
+    fetch: Callable[[Dict[str, Any]], Any],
+    weight: Callable[[Any], Optional[float]],
+    fetch_concurrency: int,
+    group_max_items: int,
+    memory_budget=None,
+    memory_estimate: Optional[Callable[[Any], int]] = None,
+    chunk_size: int = 850,
+    cancel=None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Fetch documents largest first and hand them back in packed groups.
+
+    Downloads run on a pool of `fetch_concurrency` workers that keeps going while
+    the caller extracts and embeds a group. Groups hold up to `group_max_items`
+    results and roughly the same estimated chunk count (total estimate divided
+    by the number of groups the item cap would give).
+
+    Args:
+        documents: Listed Drive files (with 'size' / 'mimeType' when known)
+        fetch: async callable(document) -> result; must not raise
+        weight: Estimated chunk count of a fetched result, or None when it failed
+        memory_budget: Optional MemoryBudget gating each download and each group
+        memory_estimate: Bytes a result needs for extraction (for group admission)
+        cancel: Optional CancellationToken; once cancelled no new download starts
+            and no further group is handed out (closing the generator aborts the
+            downloads still in flight)
+
+    Yields:
+        ('memory_pause', decision) when admission waits for memory,
+        ('failed', result) for results whose weight is None,
+        ('group', [result, ...]) to extract + embed; the group's memory
+        reservation is released when the caller asks for the next item
+    """
+    ordered = order_largest_first(documents, chunk_size)
+    total_weight = sum(estimate_chunks(document_size(doc), document_mime_type(doc), chunk_size) for doc in ordered)
+    group_count = max(1, math.ceil(len(ordered) / max(1, group_max_items)))
+    target_weight = max(1.0, total_weight / group_count)
+
+    inbox: Deque[Tuple[str, Any]] = deque()
+    arrived = asyncio.Event()
+    state = {'in_flight': 0}
+    fetch_tasks = set()
+
+    def post(kind: str, payload: Any = None):
+        inbox.append((kind, payload))
+        arrived.set()
+
+    async def fetch_one(document, reserved: int, slots: asyncio.Semaphore):
+        try:
+            post('fetched', await fetch(document))
+        except Exception as e:
+            post('error', e)
+        finally:
+            state['in_flight'] -= 1
+            if reserved:
+                memory_budget.release(reserved)
+            slots.release()
+
+    async def produce():
+        slots = asyncio.Semaphore(max(1, fetch_concurrency))
+        try:
+            for document in ordered:
+                await slots.acquire()
+                if cancel is not None and cancel.cancelled:
+                    slots.release()
+                    break
+                reserved = 0
+                if memory_budget is not None:
+                    nbytes = memory_budget.estimate(document)
+                    if not memory_budget.try_acquire(nbytes):
+                        post('memory_pause', dict(memory_budget.last_decision))
+                        await memory_budget.acquire(nbytes)
+                    reserved = nbytes
+                state['in_flight'] += 1
+                task = asyncio.create_task(fetch_one(document, reserved, slots))
+                fetch_tasks.add(task)
+                task.add_done_callback(fetch_tasks.discard)
+            while fetch_tasks:
+                await asyncio.gather(*list(fetch_tasks))
+        finally:
+            post('done')
+
+    producer = asyncio.create_task(produce())
+    ready: List[Tuple[float, Any]] = []
+    done = False
+    paused = False
+
+    try:
+        while True:
+            # Take in everything that finished while the caller was busy
+            while inbox:
+                kind, payload = inbox.popleft()
+                if kind == 'done':
+                    done = True
+                elif kind == 'error':
+                    raise payload
+                elif kind == 'memory_pause':
+                    paused = True
+                    yield 'memory_pause', payload
+                else:
+                    result_weight = weight(payload)
+                    if result_weight is None:
+                        yield 'failed', payload
+                    else:
+                        ready.append((result_weight, payload))
+
+            if done and not ready:
+                return
+            if cancel is not None and cancel.cancelled:
+                return
+
+            load = sum(entry[0] for entry in ready)
+            # Flush a group when it is full, when downloads are finished or stalled
+            # on memory (held results are what has to drain first), or when nothing
+            # else is coming soon
+            if ready and (done or paused or load >= target_weight or len(ready) >= group_max_items or state['in_flight'] == 0):
+                group, ready = take_group(ready, target_weight, group_max_items)
+                paused = False
+
+                reserved: List[int] = []
+                if memory_budget is not None and memory_estimate is not None:
+                    estimates = [memory_estimate(entry[1]) for entry in group]
+                    admitted = memory_budget.admit_batch(estimates)
+                    if admitted == 0:
+                        yield 'memory_pause', dict(memory_budget.last_decision)
+                        await memory_budget.acquire(estimates[0])
+                        admitted = 1
+                    ready.extend(group[admitted:])
+                    group = group[:admitted]
+                    reserved = estimates[:admitted]
+
+                try:
+                    yield 'group', [entry[1] for entry in group]
+                finally:
+                    for nbytes in reserved:
+                        memory_budget.release(nbytes)
+                continue
+
+            arrived.clear()
+            if not inbox:
+                if cancel is None:
+                    await arrived.wait()
+                else:
+                    # Wake up periodically so a cancel is seen during a long download
+                    try:
+                        await asyncio.wait_for(arrived.wait(), timeout=CANCEL_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+    finally:
+        producer.cancel()
+        for task in list(fetch_tasks):
+            task.cancel()
@@ -0,0 +1,287 @@
+"""
+IVF-PQ compressed vector index for memory-constrained deployments
+Unit vectors are assigned to the nearest of `nlist` coarse centroids (the
+inverted lists) and the residual is product-quantized: split into `m`
+sub-vectors, each stored as a one-byte code into a 256-entry codebook. A
+384-dim chunk costs m + 4 bytes instead of 1536. Search scores only the
+chunks in the `nprobe` lists closest to the query.
+"""
+
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from utils.compact_index import SEARCH_BLOCK_ROWS, CompactVectorIndex, _unpack_strings, normalize
+
+logger = logging.getLogger(__name__)
+
+# Codes are one byte per sub-vector
+CODEBOOK_SIZE = 256
+
+# k-means needs a few dozen training points per centroid to be meaningful
+MIN_POINTS_PER_CENTROID = 39
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int, rng: np.random.Generator, spherical: bool = False) -> np.ndarray:
+    """
+    Lloyd's k-means over float32 rows
+
+    Args:
+        vectors: (n, d) training vectors
+        k: Number of centroids (at most n)
+        iterations: Assignment / update rounds
+        rng: Random generator for the initial centroids
+        spherical: Keep centroids unit length and assign by inner product
+
+    Returns:
+        (k, d) float32 centroids
+    """
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _assign(vectors, centroids, spherical)
+        counts = np.bincount(assignment, minlength=k)
+        # Per-cluster sums over runs of the sorted assignment (np.add.at is far slower)
+        order = np.argsort(assignment, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        sums = np.zeros(centroids.shape, dtype=np.float64)
+        present = counts > 0
+        sums[present] = np.add.reduceat(vectors[order], starts[present], axis=0)
+        empty = ~present
+        centroids = (sums / np.maximum(counts, 1)[:, None]).astype(np.float32)
+        if empty.any():
+            # Re-seed empty clusters on random points so every code stays usable
+            centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        if spherical:
+            centroids = normalize(centroids)
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, spherical: bool = False) -> np.ndarray:
+    """Index of the nearest centroid for every row (blocked to bound the score matrix)"""
+    bias = 0.0 if spherical else -0.5 * np.einsum('ij,ij->i', centroids, centroids)
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    block = max(1, SEARCH_BLOCK_ROWS * 64 // max(len(centroids), 1))
+    for start in range(0, len(vectors), block):
+        scores = vectors[start:start + block] @ centroids.T + bias
+        assignment[start:start + block] = scores.argmax(axis=1)
+    return assignment
+
+
+def subquantizers_for(dimension: int, m: int) -> int:
+    """The largest sub-vector count <= m that divides the dimension"""
+    m = max(1, min(m, dimension))
+    while dimension % m:
+        m -= 1
+    return m
+
+
+class IVFPQIndex(CompactVectorIndex):
+    """
+    Chunk id -> (inverted list, PQ codes), searched approximately.
+
+    Must be trained (IVFPQIndex.train) before vectors can be added; vectors
+    upserted later are encoded with the trained centroids and codebooks.
+    Scores are inner products of the query with the reconstructed vectors:
+    q.c_list + sum_j q_j.codebook_j[code_j], where the second term is read
+    from a per-query lookup table shared by all lists.
+    """
+
+    def __init__(
+        self,
+        coarse: np.ndarray,
+        codebooks: np.ndarray,
+        source_id: Optional[str] = None,
+        nprobe: int = 16,
+        trained_on: int = 0
+    ):
+        """
+        Initialize an empty index from trained quantizers
+
+        Args:
+            coarse: (nlist, dim) unit coarse centroids
+            codebooks: (m, 256, dim / m) residual sub-vector codebooks
+            source_id: Id of the Chroma collection the index mirrors (checked on load)
+            nprobe: Inverted lists scored per query
+            trained_on: Number of vectors the quantizers were trained on
+        """
+        self.storage = 'ivfpq'
+        self.dimension = coarse.shape[1]
+        self.source_id = source_id
+        self.nprobe = nprobe
+        self.trained_on = trained_on
+        self._coarse = np.ascontiguousarray(coarse, dtype=np.float32)
+        self._codebooks = np.ascontiguousarray(codebooks, dtype=np.float32)
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._document_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._by_document: Dict[str, set] = {}
+        self._codes = np.empty((0, codebooks.shape[0]), dtype=np.uint8)
+        self._lists = np.empty(0, dtype=np.int32)
+        self._scales = None
+
+    @classmethod
+    def train(
+        cls,
+        vectors,
+        nlist: int,
+        m: int,
+        source_id: Optional[str] = None,
+        nprobe: int = 16,
+        iterations: int = 10,
+        seed: int = 0
+    ) -> "IVFPQIndex":
+        """
+        Train coarse centroids and residual codebooks on a sample of vectors
+
+        Args:
+            vectors: (n, dim) training sample, normalized here
+            nlist: Number of inverted lists (capped so each has enough training points)
+            m: Number of sub-vectors (lowered to a divisor of dim if needed)
+            source_id: Id of the Chroma collection the index mirrors
+            nprobe: Inverted lists scored per query
+            iterations: k-means rounds for both quantizers
+            seed: Random seed (training is deterministic for a given sample)
+
+        Returns:
+            An empty, trained index
+        """
+        vectors = normalize(vectors)
+        rng = np.random.default_rng(seed)
+        dimension = vectors.shape[1]
+        nlist = max(1, min(nlist, len(vectors) // MIN_POINTS_PER_CENTROID))
+        m = subquantizers_for(dimension, m)
+
+        coarse = _kmeans(vectors, nlist, iterations, rng, spherical=True)
+        residuals = vectors - coarse[_assign(vectors, coarse, spherical=True)]
+        subvectors = residuals.reshape(len(vectors), m, dimension // m)
+        codebooks = np.zeros((m, CODEBOOK_SIZE, dimension // m), dtype=np.float32)
+        for j in range(m):
+            trained = _kmeans(np.ascontiguousarray(subvectors[:, j]), CODEBOOK_SIZE, iterations, rng)
+            codebooks[j, :len(trained)] = trained
+        return cls(coarse, codebooks, source_id=source_id, nprobe=nprobe, trained_on=len(vectors))
+
+    @property
+    def nlist(self) -> int:
+        return self._coarse.shape[0]
+
+    @property
+    def m(self) -> int:
+        return self._codebooks.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes of the codes, list assignments and quantizers (excluding ids)"""
+        return len(self._ids) * (self.m + 4) + self._coarse.nbytes + self._codebooks.nbytes
+
+    def _row_arrays(self) -> List[str]:
+        return ['_codes', '_lists']
+
+    def encode(self, embeddings) -> Tuple[np.ndarray, np.ndarray]:
+        """(lists, codes) for vectors: their inverted list and residual PQ codes"""
+        vectors = normalize(embeddings)
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dim vectors, got {vectors.shape[1]}")
+        lists = _assign(vectors, self._coarse, spherical=True)
+        residuals = (vectors - self._coarse[lists]).reshape(len(vectors), self.m, -1)
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = _assign(np.ascontiguousarray(residuals[:, j]), self._codebooks[j])
+        return lists.astype(np.int32), codes
+
+    def decode(self, lists: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate float32 vectors back from their list and codes"""
+        residuals = self._codebooks[np.arange(self.m), codes]
+        return self._coarse[lists] + residuals.reshape(len(codes), -1)
+
+    def upsert(self, ids: List[str], embeddings, document_ids: List[str]):
+        """Insert or replace chunk vectors"""
+        if len(ids) == 0:
+            return
+        lists, codes = self.encode(embeddings)
+        with self._lock:
+            self._reserve(len(self._ids) + len(ids))
+            self._upsert_rows(ids, [codes, lists], document_ids)
+
+    def search(self, query, k: int, document_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Top-k chunks by approximate cosine similarity
+
+        Args:
+            query: Query vector
+            k: Number of results
+            document_ids: Score every chunk of these documents instead of probing lists
+
+        Returns:
+            List of (chunk_id, similarity), best first
+        """
+        query = normalize(query)[0]
+        coarse_scores = self._coarse @ query
+        # One lookup table for all lists: table[j, c] = q_j . codebook_j[c]
+        table = np.einsum('jcd,jd->jc', self._codebooks, query.reshape(self.m, -1)).ravel()
+        offsets = np.arange(self.m) * CODEBOOK_SIZE
+
+        with self._lock:
+            size = len(self._ids)
+            if document_ids is not None:
+                rows = self._document_rows(document_ids)
+            else:
+                nprobe = min(self.nprobe, self.nlist)
+                probed = np.zeros(self.nlist, dtype=bool)
+                probed[np.argpartition(-coarse_scores, nprobe - 1)[:nprobe]] = True
+                rows = np.flatnonzero(probed[self._lists[:size]])
+            if len(rows) == 0 or k <= 0:
+                return []
+            scores = np.empty(len(rows), dtype=np.float32)
+            for start in range(0, len(rows), SEARCH_BLOCK_ROWS):
+                selected = rows[start:start + SEARCH_BLOCK_ROWS]
+                block = np.take(table, self._codes[selected] + offsets).sum(axis=1)
+                scores[start:start + len(selected)] = block + coarse_scores[self._lists[selected]]
+
+            k = min(k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(self._ids[rows[i]], float(scores[i])) for i in top]
+
+    def scan(self, visit: Callable[[List[str], np.ndarray], None], document_ids: Optional[Iterable[str]] = None):
+        """
+        Call visit(document_ids, vectors) for blocks of rows, with vectors
+        reconstructed from their codes (all rows, or only the chunks of `document_ids`)
+        """
+        with self._lock:
+            rows = self._document_rows(document_ids) if document_ids is not None else None
+            size = len(self._ids) if rows is None else len(rows)
+            for start in range(0, size, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, size)
+                selected = np.arange(start, end) if rows is None else rows[start:end]
+                visit([self._document_ids[row] for row in selected], self.decode(self._lists[selected], self._codes[selected]))
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Copy of the index, quantizers included, as arrays"""
+        arrays = super().snapshot()
+        with self._lock:
+            arrays.update({
+                'lists': self._lists[:len(self._ids)].copy(),
+                'coarse': self._coarse,
+                'codebooks': self._codebooks,
+                'trained_on': np.array(self.trained_on),
+            })
+        return arrays
+
+    @classmethod
+    def load(cls, path: str, nprobe: int = 16) -> "IVFPQIndex":
+        with np.load(path) as data:
+            if str(data['storage']) != 'ivfpq':
+                raise ValueError(f"{path} is not an IVF-PQ snapshot")
+            count = int(data['count'])
+            index = cls(data['coarse'], data['codebooks'], str(data['source_id']) or None, nprobe, int(data['trained_on']))
+            index._ids = _unpack_strings(data['ids'], count)
+            index._document_ids = _unpack_strings(data['document_ids'], count)
+            index._codes = data['codes']
+            index._lists = data['lists']
+        index._index_rows(path, count)
+        return index
+
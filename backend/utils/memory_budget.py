@@ -0,0 +1,249 @@
+"""
+Memory-aware admission control for document ingestion
+Documents are admitted while process RSS plus the estimated footprint of the
+documents already in flight stays under a memory budget
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+# psutil gives RSS on every platform; /proc is the Linux fallback
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# cgroup v2 / v1 memory limits (Railway, Docker, Kubernetes)
+CGROUP_LIMIT_FILES = ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes')
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes"""
+    if PSUTIL_AVAILABLE:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        # Peak rather than current RSS, in KiB on Linux: the closest portable value
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def detect_memory_limit() -> Optional[int]:
+    """Container memory limit if one is set, otherwise physical memory"""
+    for path in CGROUP_LIMIT_FILES:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:  # "max" / huge value means unlimited
+            return int(value)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class MemoryBudget:
+    """
+    Admission controller for ingestion work.
+
+    A document is admitted when `rss + reserved + estimate <= budget`, where
+    `reserved` is the sum of estimates for documents that were admitted but
+    whose memory is not yet visible in RSS (download / extraction in flight).
+    A lone document is always admitted while RSS is under budget, so a file
+    larger than the whole budget still gets processed, just on its own.
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int,
+        expansion_factor: float = 4.0,
+        default_document_bytes: int = 2 * MB,
+        max_pause_seconds: float = 30.0,
+        poll_interval: float = 0.25,
+        rss_reader=current_rss
+    ):
+        """
+        Initialize budget
+
+        Args:
+            budget_bytes: Memory the process may use while ingesting
+            expansion_factor: Peak bytes per byte of Drive `size` (raw bytes +
+                parser objects + extracted text + chunks)
+            default_document_bytes: Estimate for files Drive reports no size for
+                (native Google Docs / Sheets / Slides)
+            max_pause_seconds: After pausing this long with nothing in flight,
+                admit one document anyway so ingestion cannot stall forever
+            poll_interval: How often RSS is re-read while paused
+            rss_reader: Callable returning current RSS (injectable for tests)
+        """
+        self.budget_bytes = budget_bytes
+        self.expansion_factor = expansion_factor
+        self.default_document_bytes = default_document_bytes
+        self.max_pause_seconds = max_pause_seconds
+        self.poll_interval = poll_interval
+        self._rss_reader = rss_reader
+        self._reserved = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._released: Optional[asyncio.Event] = None
+        self._stats = {
+            'admitted': 0,
+            'paused': 0,
+            'forced': 0,
+            'pause_seconds': 0.0,
+            'peak_rss': 0
+        }
+        self.last_decision: Dict[str, Any] = {}
+
+    def estimate(self, metadata: Dict[str, Any]) -> int:
+        """Estimated peak memory for ingesting one document, from its Drive metadata"""
+        try:
+            size = int(metadata.get('size') or 0)
+        except (TypeError, ValueError):
+            size = 0
+        if size <= 0:
+            return self.default_document_bytes
+        return int(size * self.expansion_factor)
+
+    def rss(self) -> int:
+        rss = self._rss_reader()
+        if rss > self._stats['peak_rss']:
+            self._stats['peak_rss'] = rss
+        return rss
+
+    def _decide(self, nbytes: int, force: bool = False) -> Dict[str, Any]:
+        rss = self.rss()
+        with self._lock:
+            fits = rss + self._reserved + nbytes <= self.budget_bytes
+            alone = self._in_flight == 0 and rss < self.budget_bytes
+            admitted = fits or alone or (force and self._in_flight == 0)
+            if admitted:
+                self._reserved += nbytes
+                self._in_flight += 1
+                self._stats['admitted'] += 1
+                if force and not (fits or alone):
+                    self._stats['forced'] += 1
+            self.last_decision = {
+                'action': 'admit' if admitted else 'pause',
+                'estimate_mb': round(nbytes / MB, 1),
+                'rss_mb': round(rss / MB, 1),
+                'reserved_mb': round(self._reserved / MB, 1),
+                'budget_mb': round(self.budget_bytes / MB, 1),
+                'in_flight': self._in_flight
+            }
+            return dict(self.last_decision)
+
+    def try_acquire(self, nbytes: int) -> bool:
+        """Reserve memory for one document if it fits right now"""
+        return self._decide(nbytes)['action'] == 'admit'
+
+    async def acquire(self, nbytes: int) -> Dict[str, Any]:
+        """
+        Wait until one document of `nbytes` fits in the budget, then reserve it
+
+        Returns:
+            The admission decision (rss / reserved / budget in MB, paused_seconds)
+        """
+        decision = self._decide(nbytes)
+        if decision['action'] == 'admit':
+            return decision
+
+        self._stats['paused'] += 1
+        logger.warning(
+            f"⏸️ Ingestion paused: RSS {decision['rss_mb']} MB + reserved {decision['reserved_mb']} MB "
+            f"+ {decision['estimate_mb']} MB > budget {decision['budget_mb']} MB"
+        )
+        if self._released is None:
+            self._released = asyncio.Event()
+
+        started = time.monotonic()
+        while True:
+            waited = time.monotonic() - started
+            decision = self._decide(nbytes, force=waited >= self.max_pause_seconds)
+            if decision['action'] == 'admit':
+                self._stats['pause_seconds'] += waited
+                decision['paused_seconds'] = round(waited, 2)
+                return decision
+            self._released.clear()
+            try:
+                await asyncio.wait_for(self._released.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def admit_batch(self, estimates: List[int]) -> int:
+        """
+        Reserve as many of `estimates` (in order) as fit right now
+
+        Returns:
+            Number of leading items admitted (0 when even the first must wait)
+        """
+        admitted = 0
+        for nbytes in estimates:
+            if not self.try_acquire(nbytes):
+                break
+            admitted += 1
+        return admitted
+
+    def release(self, nbytes: int):
+        """Give back a reservation once its memory shows up in RSS (or is freed)"""
+        with self._lock:
+            self._reserved = max(0, self._reserved - nbytes)
+            self._in_flight = max(0, self._in_flight - 1)
+        if self._released is not None:
+            self._released.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Current accounting and admission counters"""
+        rss = self.rss()
+        with self._lock:
+            return {
+                'budget_mb': round(self.budget_bytes / MB, 1),
+                'rss_mb': round(rss / MB, 1),
+                'reserved_mb': round(self._reserved / MB, 1),
+                'in_flight': self._in_flight,
+                'peak_rss_mb': round(self._stats['peak_rss'] / MB, 1),
+                'admitted': self._stats['admitted'],
+                'paused': self._stats['paused'],
+                'forced': self._stats['forced'],
+                'pause_seconds': round(self._stats['pause_seconds'], 2),
+                'last_decision': dict(self.last_decision)
+            }
+
+
+# Global budget instance (created lazily so the limit is read once, from settings)
+_memory_budget: Optional[MemoryBudget] = None
+_memory_budget_lock = threading.Lock()
+
+
+def get_memory_budget() -> MemoryBudget:
+    """Get the process-wide ingestion memory budget"""
+    global _memory_budget
+    if _memory_budget is None:
+        with _memory_budget_lock:
+            if _memory_budget is None:
+                from config import settings
+                if settings.ingest_memory_budget_mb > 0:
+                    budget = settings.ingest_memory_budget_mb * MB
+                else:
+                    limit = detect_memory_limit() or 2048 * MB
+                    budget = int(limit * settings.ingest_memory_budget_fraction)
+                _memory_budget = MemoryBudget(
+                    budget,
+                    expansion_factor=settings.ingest_memory_expansion_factor,
+                    default_document_bytes=int(settings.ingest_memory_default_document_mb * MB)
+                )
+                logger.info(f"🧮 Ingestion memory budget: {budget // MB} MB")
+    return _memory_budget
@@ -0,0 +1,244 @@
+"""
+Per-user and global Drive quota scheduler
+Token buckets per user plus a global ceiling, served round-robin across users
+with interactive calls ahead of bulk work
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Request priorities (lower is served first)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BULK: 'bulk'}
+
+# (user_id, priority) of the API request currently being handled. Set once per
+# endpoint; tasks spawned from it inherit the value.
+_drive_request_context: ContextVar[Tuple[str, int]] = ContextVar(
+    'drive_request_context', default=('default_user', PRIORITY_INTERACTIVE)
+)
+
+
+def set_drive_request_context(user_id: str, priority: int = PRIORITY_INTERACTIVE):
+    """Attribute Google API calls made by the current request to a user and priority"""
+    return _drive_request_context.set((user_id, priority))
+
+
+def get_drive_request_context() -> Tuple[str, int]:
+    """Get (user_id, priority) for the current request"""
+    return _drive_request_context.get()
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` stored"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self, now: float) -> bool:
+        self._refill(now)
+        return self._tokens >= 1
+
+    def take(self, now: float):
+        self._refill(now)
+        self._tokens -= 1
+
+    def full(self, now: float) -> bool:
+        """Whether the bucket is back at capacity (indistinguishable from a new one)"""
+        self._refill(now)
+        return self._tokens >= self.capacity
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available"""
+        self._refill(now)
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+
+class DriveQuotaScheduler:
+    """
+    Admits Google API calls against per-user token buckets and a global bucket.
+
+    Waiting calls are queued per priority and per user. Whenever tokens are
+    available the scheduler serves the highest priority first and, within a
+    priority, rotates across users (deficit round-robin: a user with weight w
+    gets up to w grants per turn). A single user's bulk scan therefore only
+    ever consumes its own bucket's tokens. This paces how fast calls start;
+    how many run at once is shared out by AdaptiveConcurrencyLimiter.
+    """
+
+    # How often buckets of users without queued calls are dropped once refilled
+    IDLE_SWEEP_SECONDS = 60.0
+
+    def __init__(
+        self,
+        user_rate: float = 100.0,
+        user_burst: float = 200.0,
+        global_rate: float = 200.0,
+        global_burst: float = 400.0
+    ):
+        """
+        Initialize scheduler
+
+        Args:
+            user_rate / user_burst: Per-user requests per second and bucket size
+            global_rate / global_burst: Requests per second and bucket size across all users
+        """
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self._global = TokenBucket(global_rate, global_burst)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._weights: Dict[str, int] = {}
+        # priority -> OrderedDict(user_id -> deque of waiting futures); order is the rotation
+        self._queues: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            priority: OrderedDict() for priority in PRIORITY_NAMES
+        }
+        self._served_in_turn: Dict[Tuple[int, str], int] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._last_sweep = time.monotonic()
+        self._stats = {
+            'granted': {name: 0 for name in PRIORITY_NAMES.values()},
+            'waited': {name: 0 for name in PRIORITY_NAMES.values()},
+            'granted_by_user': {}
+        }
+
+    def set_user_weight(self, user_id: str, weight: int):
+        """Give a user `weight` grants per round-robin turn (default 1)"""
+        self._weights[user_id] = max(1, int(weight))
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        return bucket
+
+    def _evict_idle_buckets(self, now: float):
+        """Forget users whose bucket has refilled and who have nothing queued"""
+        self._last_sweep = now
+        queued = {user_id for users in self._queues.values() for user_id in users}
+        for user_id, bucket in list(self._buckets.items()):
+            if user_id not in queued and bucket.full(now):
+                del self._buckets[user_id]
+                self._stats['granted_by_user'].pop(user_id, None)
+
+    def _grant(self, user_id: str, priority: int, now: float):
+        self._global.take(now)
+        self._bucket(user_id).take(now)
+        self._stats['granted'][PRIORITY_NAMES[priority]] += 1
+        by_user = self._stats['granted_by_user']
+        by_user[user_id] = by_user.get(user_id, 0) + 1
+
+    async def acquire(self, user_id: Optional[str] = None, priority: Optional[int] = None):
+        """
+        Wait until the call may be sent (defaults come from the request context)
+        """
+        context_user, context_priority = get_drive_request_context()
+        user_id = user_id if user_id is not None else context_user
+        priority = priority if priority is not None else context_priority
+
+        now = time.monotonic()
+        if now - self._last_sweep >= self.IDLE_SWEEP_SECONDS:
+            self._evict_idle_buckets(now)
+        if not self._has_waiters() and self._global.available(now) and self._bucket(user_id).available(now):
+            self._grant(user_id, priority, now)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(user_id, deque()).append(future)
+        self._stats['waited'][PRIORITY_NAMES[priority]] += 1
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            self._discard(priority, user_id, future)
+            raise
+
+    def _has_waiters(self) -> bool:
+        return any(self._queues[priority] for priority in self._queues)
+
+    def _discard(self, priority: int, user_id: str, future: asyncio.Future):
+        waiters = self._queues[priority].get(user_id)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del self._queues[priority][user_id]
+                self._served_in_turn.pop((priority, user_id), None)
+
+    def _next_grant(self, now: float) -> Optional[Tuple[int, str]]:
+        """Pick (priority, user) to serve next, rotating users within a priority"""
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            for user_id in list(users):
+                if self._bucket(user_id).available(now):
+                    return priority, user_id
+                # Out of tokens: let the next user take this turn
+                users.move_to_end(user_id)
+                self._served_in_turn.pop((priority, user_id), None)
+        return None
+
+    def _dispatch(self):
+        """Grant as many waiting calls as the buckets allow, then arm a timer for the rest"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        now = time.monotonic()
+        while self._has_waiters() and self._global.available(now):
+            choice = self._next_grant(now)
+            if choice is None:
+                break
+            priority, user_id = choice
+            users = self._queues[priority]
+            future = users[user_id].popleft()
+            if future.done():  # cancelled while queued
+                if not users[user_id]:
+                    del users[user_id]
+                continue
+
+            self._grant(user_id, priority, now)
+            future.set_result(None)
+
+            key = (priority, user_id)
+            self._served_in_turn[key] = self._served_in_turn.get(key, 0) + 1
+            if not users[user_id]:
+                del users[user_id]
+                self._served_in_turn.pop(key, None)
+            elif self._served_in_turn[key] >= self._weights.get(user_id, 1):
+                users.move_to_end(user_id)
+                self._served_in_turn.pop(key, None)
+
+        if self._has_waiters():
+            waits = [
+                self._bucket(user_id).wait_time(now)
+                for users in self._queues.values() for user_id in users
+            ]
+            delay = max(self._global.wait_time(now), min(waits))
+            self._timer = asyncio.get_running_loop().call_later(max(delay, 0.001), self._dispatch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depths and grant counters (per user: users with a live bucket)"""
+        return {
+            'user_rate': self.user_rate,
+            'global_rate': self._global.rate,
+            'queued': {
+                PRIORITY_NAMES[priority]: sum(len(waiters) for waiters in users.values())
+                for priority, users in self._queues.items()
+            },
+            'tracked_users': len(self._buckets),
+            'queued_users': sorted({user_id for users in self._queues.values() for user_id in users}),
+            'granted': dict(self._stats['granted']),
+            'waited': dict(self._stats['waited']),
+            'granted_by_user': dict(self._stats['granted_by_user'])
+        }
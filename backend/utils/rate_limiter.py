@@ -0,0 +1,296 @@
+"""
+AIMD adaptive concurrency limiter for Google API calls
+Grows concurrency while calls succeed, halves it when Google starts throttling.
+Free slots go to interactive calls first and rotate across users.
+"""
+
+import asyncio
+import random
+import time
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+import logging
+
+from utils.quota_scheduler import PRIORITY_INTERACTIVE, PRIORITY_NAMES, get_drive_request_context
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Additive-increase / multiplicative-decrease limit on in-flight requests.
+
+    Every successful response raises the limit by `additive_increase / limit`
+    (about +1 per round of requests). A throttled response (403 rate limit,
+    429, 5xx) halves it, at most once per round: responses to requests that
+    were already in flight when the limit was cut do not cut it again.
+    A Retry-After header pauses every new request until it has elapsed.
+
+    Waiting calls are queued per priority and per user like in
+    DriveQuotaScheduler: a free slot goes to the highest priority first and,
+    within a priority, to the next user in turn. Bulk calls never hold the
+    last `interactive_reserve` share of the slots, so one user's long
+    downloads cannot keep other users' listings waiting for a slot.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 50,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        max_retries: int = 5,
+        additive_increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 64.0,
+        interactive_reserve: float = 0.2,
+        max_user_share: float = 1.0
+    ):
+        """
+        Initialize limiter
+
+        Args:
+            initial_limit: Concurrency to start from
+            min_limit / max_limit: Bounds for the adaptive limit
+            max_retries: Retries of a throttled request before its response is returned as-is
+            base_backoff / max_backoff: Exponential backoff (seconds) when no Retry-After is given
+            interactive_reserve: Share of the limit bulk calls may not use (at least one slot when limit > 1)
+            max_user_share: Share of the limit one user may hold at once (1.0 = no per-user cap)
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.max_retries = max_retries
+        self.additive_increase = additive_increase
+        self.decrease_factor = decrease_factor
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.interactive_reserve = interactive_reserve
+        self.max_user_share = max_user_share
+
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._bulk_in_flight = 0
+        self._user_in_flight: Dict[str, int] = {}
+        self._epoch = 0  # bumped on every decrease
+        self._paused_until = 0.0
+        # priority -> OrderedDict(user_id -> deque of waiting futures); order is the rotation
+        self._waiting: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            priority: OrderedDict() for priority in PRIORITY_NAMES
+        }
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stats = {
+            'successes': 0,
+            'retries': 0,
+            'decreases': 0,
+            'retry_after_pauses': 0,
+            'rejections': {'403_rate_limit': 0, '429': 0, '5xx': 0}
+        }
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit"""
+        return int(self._limit)
+
+    @property
+    def bulk_limit(self) -> int:
+        """Slots bulk calls may hold; the rest are kept for interactive calls"""
+        limit = self.limit
+        if not self.interactive_reserve or limit <= 1:
+            return limit
+        return max(1, limit - max(1, int(limit * self.interactive_reserve)))
+
+    def _admissible(self, user_id: str, priority: int) -> bool:
+        if self._in_flight >= self.limit:
+            return False
+        if priority != PRIORITY_INTERACTIVE and self._bulk_in_flight >= self.bulk_limit:
+            return False
+        return self._user_in_flight.get(user_id, 0) < max(1, int(self.limit * self.max_user_share))
+
+    def _take(self, user_id: str, priority: int):
+        self._in_flight += 1
+        if priority != PRIORITY_INTERACTIVE:
+            self._bulk_in_flight += 1
+        self._user_in_flight[user_id] = self._user_in_flight.get(user_id, 0) + 1
+
+    def _release(self, user_id: str, priority: int):
+        self._in_flight -= 1
+        if priority != PRIORITY_INTERACTIVE:
+            self._bulk_in_flight -= 1
+        remaining = self._user_in_flight.get(user_id, 0) - 1
+        if remaining > 0:
+            self._user_in_flight[user_id] = remaining
+        else:
+            self._user_in_flight.pop(user_id, None)
+        self._dispatch()
+
+    async def _acquire(self, user_id: str, priority: int) -> int:
+        """Wait for a slot; returns the decrease epoch it was granted in"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[priority].setdefault(user_id, deque()).append(future)
+        self._dispatch()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before the cancellation arrived
+                self._release(user_id, priority)
+            else:
+                self._discard(priority, user_id, future)
+            raise
+
+    def _discard(self, priority: int, user_id: str, future: asyncio.Future):
+        waiters = self._waiting[priority].get(user_id)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del self._waiting[priority][user_id]
+
+    def _next_waiter(self) -> Optional[Tuple[int, str]]:
+        """Pick (priority, user) to get the next slot"""
+        for priority in sorted(self._waiting):
+            for user_id in self._waiting[priority]:
+                if self._admissible(user_id, priority):
+                    return priority, user_id
+        return None
+
+    def _dispatch(self):
+        """Hand free slots to waiting calls, one per user per turn"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            if any(self._waiting.values()):
+                self._timer = asyncio.get_running_loop().call_later(pause, self._dispatch)
+            return
+
+        while True:
+            choice = self._next_waiter()
+            if choice is None:
+                break
+            priority, user_id = choice
+            users = self._waiting[priority]
+            future = users[user_id].popleft()
+            if users[user_id]:
+                users.move_to_end(user_id)
+            else:
+                del users[user_id]
+            if future.done():  # cancelled while queued
+                continue
+            self._take(user_id, priority)
+            future.set_result(self._epoch)
+
+    def _classify(self, response: Any) -> Optional[str]:
+        """Return the rejection kind for a throttled response, None otherwise"""
+        status = response.status_code
+        if status == 429:
+            return '429'
+        if 500 <= status < 600:
+            return '5xx'
+        if status == 403:
+            text = getattr(response, 'text', '') or ''
+            if 'ratelimitexceeded' in text.lower():  # rateLimitExceeded / userRateLimitExceeded
+                return '403_rate_limit'
+        return None
+
+    def _retry_after(self, response: Any) -> Optional[float]:
+        """Parse Retry-After (delta seconds or HTTP date) into seconds"""
+        headers = getattr(response, 'headers', None) or {}
+        value = headers.get('retry-after') or headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _on_success(self):
+        self._stats['successes'] += 1
+        self._limit = min(self.max_limit, self._limit + self.additive_increase / self._limit)
+
+    def _on_throttled(self, kind: str, epoch: int, retry_after: Optional[float]):
+        self._stats['rejections'][kind] += 1
+        if epoch == self._epoch:
+            previous = self.limit
+            self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+            self._epoch += 1
+            self._stats['decreases'] += 1
+            logger.warning(f"🚦 Google API throttled ({kind}): concurrency {previous} -> {self.limit}")
+        if retry_after:
+            self._stats['retry_after_pauses'] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    async def request(
+        self,
+        send: Callable[[], Awaitable[Any]],
+        user_id: Optional[str] = None,
+        priority: Optional[int] = None,
+        admit: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> Any:
+        """
+        Run one API call under the limiter, retrying it while Google throttles.
+
+        Args:
+            send: Zero-argument coroutine function performing the HTTP call
+            user_id / priority: Whose call this is (defaults come from the request context)
+            admit: Awaited before every attempt, retries included (e.g. the quota scheduler)
+
+        Returns:
+            The final response (throttled responses are returned once retries run out).
+            Network errors propagate to the caller without affecting the limit.
+        """
+        context_user, context_priority = get_drive_request_context()
+        user_id = user_id if user_id is not None else context_user
+        priority = priority if priority is not None else context_priority
+
+        attempt = 0
+        while True:
+            if admit is not None:
+                await admit()
+            epoch = await self._acquire(user_id, priority)
+            try:
+                response = await send()
+            finally:
+                self._release(user_id, priority)
+
+            kind = self._classify(response)
+            if kind is None:
+                self._on_success()
+                return response
+
+            retry_after = self._retry_after(response)
+            self._on_throttled(kind, epoch, retry_after)
+            if attempt >= self.max_retries:
+                logger.error(f"❌ Google API still throttled after {attempt} retries ({response.status_code})")
+                return response
+
+            attempt += 1
+            self._stats['retries'] += 1
+            if retry_after is None:
+                # Retry-After already pauses every caller; otherwise back off this request only
+                delay = min(self.max_backoff, self.base_backoff * (2 ** (attempt - 1))) + random.random()
+                await asyncio.sleep(delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get current limit, in-flight and queued counts and rejection counters"""
+        return {
+            'limit': self.limit,
+            'bulk_limit': self.bulk_limit,
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'in_flight': self._in_flight,
+            'in_flight_bulk': self._bulk_in_flight,
+            'waiting': {
+                PRIORITY_NAMES[priority]: sum(len(waiters) for waiters in users.values())
+                for priority, users in self._waiting.items()
+            },
+            'paused_seconds': round(max(0.0, self._paused_until - time.monotonic()), 2),
+            **self._stats,
+            'rejections': dict(self._stats['rejections'])
+        }
@@ -0,0 +1,203 @@
+"""
+Compressed on-disk cache of extracted document text
+Keyed by Drive file id + version (modifiedTime or md5Checksum) so re-ingesting
+unchanged files skips the download and the PDF/DOCX/PPTX parsing
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import logging
+
+# zstd is faster and smaller; gzip (stdlib) is the fallback
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Errors raised when decompressing a corrupt or truncated entry
+DECOMPRESS_ERRORS = (zlib.error, EOFError) + ((zstandard.ZstdError,) if ZSTD_AVAILABLE else ())
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractedTextCache:
+    """
+    LRU cache of extracted text, one compressed file per (file id, version).
+
+    The total compressed size is bounded by `max_bytes`; least recently used
+    entries are evicted first. Recency survives restarts through file mtimes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Initialize cache
+
+        Args:
+            directory: Cache directory (created if missing)
+            max_bytes: Upper bound on the total size of cached (compressed) files
+        """
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._codec = 'zst' if ZSTD_AVAILABLE else 'gz'
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # filename -> size, oldest first
+        self._total_bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_existing()
+        logger.info(f"Initialized text cache at {directory} ({len(self._entries)} entries, {self._total_bytes} bytes, {self._codec})")
+
+    def _load_existing(self):
+        existing = []
+        for name in os.listdir(self._directory):
+            if not name.endswith(('.zst', '.gz')):
+                continue
+            try:
+                stat = os.stat(os.path.join(self._directory, name))
+            except OSError:
+                continue
+            existing.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(existing):
+            self._entries[name] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _filename(self, file_id: str, version: str) -> str:
+        digest = hashlib.sha256(f"{file_id}\0{version}".encode('utf-8')).hexdigest()
+        return f"{digest}.txt.{self._codec}"
+
+    def _compress(self, data: bytes) -> bytes:
+        if self._codec == 'zst':
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    def _decompress(self, name: str, data: bytes) -> bytes:
+        if name.endswith('.zst'):
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def get(self, file_id: str, version: Optional[str]) -> Optional[str]:
+        """
+        Get cached text
+
+        Returns:
+            Extracted text, or None on a miss (or when no version is known)
+        """
+        if not version:
+            return None
+
+        name = self._filename(file_id, version)
+        path = os.path.join(self._directory, name)
+        with self._lock:
+            if name not in self._entries:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(name)
+            self._stats['hits'] += 1
+
+        try:
+            with open(path, 'rb') as f:
+                text = self._decompress(name, f.read()).decode('utf-8')
+            os.utime(path)  # keep LRU order across restarts
+            return text
+        except (OSError, ValueError) + DECOMPRESS_ERRORS as e:
+            logger.warning(f"Dropping unreadable text cache entry for {file_id}: {e}")
+            self._remove(name)
+            return None
+
+    def put(self, file_id: str, version: Optional[str], text: str):
+        """Store extracted text (no-op without a version)"""
+        if not version or text is None:
+            return
+
+        name = self._filename(file_id, version)
+        path = os.path.join(self._directory, name)
+        data = self._compress(text.encode('utf-8'))
+        if len(data) > self._max_bytes:
+            return
+
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write text cache entry for {file_id}: {e}")
+            return
+
+        with self._lock:
+            self._total_bytes += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._stats['writes'] += 1
+            self._evict()
+
+    def _evict(self):
+        # Caller holds the lock (or is the constructor)
+        while self._total_bytes > self._max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._stats['evictions'] += 1
+            try:
+                os.remove(os.path.join(self._directory, name))
+            except OSError:
+                pass
+
+    def _remove(self, name: str):
+        with self._lock:
+            size = self._entries.pop(name, None)
+            if size is not None:
+                self._total_bytes -= size
+        try:
+            os.remove(os.path.join(self._directory, name))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            names = list(self._entries)
+            self._entries.clear()
+            self._total_bytes = 0
+        for name in names:
+            try:
+                os.remove(os.path.join(self._directory, name))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        with self._lock:
+            return {
+                'directory': self._directory,
+                'codec': self._codec,
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self._max_bytes,
+                **self._stats
+            }
+
+
+# Global cache instance (created lazily so importing never touches disk)
+_text_cache: Optional[ExtractedTextCache] = None
+_text_cache_lock = threading.Lock()
+
+
+def get_text_cache() -> Optional[ExtractedTextCache]:
+    """Get the extracted text cache, or None when disabled"""
+    global _text_cache
+    if _text_cache is None:
+        with _text_cache_lock:
+            if _text_cache is None:
+                from config import settings
+                if not settings.text_cache_enabled:
+                    return None
+                _text_cache = ExtractedTextCache(settings.text_cache_dir, settings.text_cache_max_bytes)
+    return _text_cache
@@ -816,6 +816,9 @@ function Dashboard({ user, onLogout }: DashboardProps) {
               } else if (data.status === 'fetched') {
                 // New status: files fetched, now embedding
                 setBulkUploadStatus(data.message);
+              } else if (data.status === 'memory_pause') {
+                // Server is waiting for memory before admitting more files
+                setBulkUploadStatus(data.message);
               } else if (data.status === 'saved') {
                 // 🎯 KEY FEATURE: Update progress AND refresh knowledge base immediately!
                 setBulkUploadProgress({